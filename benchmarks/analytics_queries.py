@@ -0,0 +1,149 @@
+"""
+Round trips and bytes on the wire for the analytics tab: the old
+per-student access pattern, server-side aggregation over raw events, and
+the per-student counters in course_student_stats.
+
+Seeds a scratch database on a MongoDB server (a local mongod by default):
+
+    python -m benchmarks.analytics_queries --uri mongodb://localhost:27017 --students 200 --questions 5000
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+
+import bson
+from pymongo import MongoClient, monitoring
+
+from src.database.analytics import AnalyticsQueries
+from src.database.course_stats import CourseStats
+from src.database.event_series import SERIES_COLLECTIONS, create_series_collection, event_document, event_filter
+from src.database.indexes import apply_indexes
+
+
+class WireCounter(monitoring.CommandListener):
+    """Counts commands and BSON bytes sent and received"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands = {}
+        self.reset()
+
+    def reset(self):
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def started(self, event):
+        with self._lock:
+            self.round_trips += 1
+            self.bytes_sent += len(bson.encode(event.command))
+
+    def succeeded(self, event):
+        with self._lock:
+            self.bytes_received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, course_id, students, questions, hand_raises, rng):
+    db.students.insert_many([
+        {
+            'student_id': i, 'course_id': course_id, 'name': f"Student {i}",
+            # Registered students carry an embedding and a photo, as in the app
+            'face_embedding': bytes(1024), 'photo': bytes(40_000), 'created_at': datetime.utcnow()
+        }
+        for i in range(1, students + 1)
+    ])
+    for name in SERIES_COLLECTIONS:
+        create_series_collection(db, name)
+    db.questions.insert_many([
+        event_document(
+            course_id, rng.randint(1, students),
+            question_text="How does regularization reduce overfitting in linear models?",
+            is_relevant=rng.random() < 0.7, reason="Canned reason for benchmarking.",
+            relevance_source='llm', timestamp=datetime.now()
+        )
+        for _ in range(questions)
+    ])
+    db.hand_raises.insert_many([
+        event_document(course_id, rng.randint(1, students), timestamp=datetime.utcnow())
+        for _ in range(hand_raises)
+    ])
+    apply_indexes(db)
+
+
+def before(db, course_id):
+    """The analytics tab's former access pattern"""
+    # get_course_questions: registered students, then every question document
+    registered = {s['student_id']: s['name'] for s in db.students.find({'course_id': course_id})}
+    questions = list(db.questions.find(event_filter(course_id, list(registered))))
+    counts = {}
+    for q in questions:
+        entry = counts.setdefault(q['meta']['student_id'], {'relevant': 0, 'irrelevant': 0})
+        entry['relevant' if q.get('is_relevant', True) else 'irrelevant'] += 1
+    # _create_student_section: one get_student_by_id per displayed student
+    for metric in ('relevant', 'irrelevant'):
+        for student_id, _ in sorted(counts.items(), key=lambda x: x[1][metric], reverse=True)[:3]:
+            db.students.find_one({'student_id': student_id})
+    # create_hand_raises_chart: full student documents, then one count per student
+    students = list(db.students.find({'course_id': course_id}))
+    for student in students:
+        db.hand_raises.count_documents(event_filter(course_id, student['student_id']))
+
+
+def load_roster(db, course_id):
+    return {
+        s['student_id']: s['name']
+        for s in db.students.find({'course_id': course_id}, {'student_id': 1, 'name': 1, '_id': 0})
+    }
+
+
+def after(db, course_id):
+    roster = load_roster(db, course_id)
+    AnalyticsQueries(db, lambda _: roster).course_summary(course_id)
+
+
+def counters(db, course_id):
+    roster = load_roster(db, course_id)
+    AnalyticsQueries(db, lambda _: roster, CourseStats(db)).course_summary(course_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics round-trip and transfer benchmark")
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='aifred_benchmark')
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--hand-raises', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    counter = WireCounter()
+    client = MongoClient(args.uri, event_listeners=[counter])
+    client.drop_database(args.database)
+    db = client[args.database]
+    course_id = bson.ObjectId()
+    seed(db, course_id, args.students, args.questions, args.hand_raises, random.Random(args.seed))
+    CourseStats(db).rebuild(course_id)
+
+    print(f"{args.students} students, {args.questions} questions, {args.hand_raises} hand raises\n")
+    print(f"{'variant':<10}{'round trips':>14}{'KB sent':>12}{'KB received':>14}{'ms':>10}")
+    try:
+        for name, run in (('before', before), ('after', after), ('counters', counters)):
+            run(db, course_id)  # warm up
+            counter.reset()
+            start = time.perf_counter()
+            run(db, course_id)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{name:<10}{counter.round_trips:>14}{counter.bytes_sent / 1024:>12.1f}"
+                  f"{counter.bytes_received / 1024:>14.1f}{elapsed:>10.1f}")
+    finally:
+        client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
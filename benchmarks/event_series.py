@@ -0,0 +1,157 @@
+"""
+Storage and query latency of hand raises and questions before and after
+the move to time-series collections (src/database/event_series.py).
+
+Seeds the same events twice in a scratch database on a MongoDB server:
+once as one ordinary document per event with the former
+(course_id, student_id, timestamp) index, once in time-series collections
+with the catalogue's meta index. Then prints collStats sizes and the
+median latency of the event queries the app issues:
+
+    python -m benchmarks.event_series --uri mongodb://localhost:27017 --courses 4 --students 100 --days 90
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from src.database.analytics import AnalyticsQueries
+from src.database.event_series import SERIES_COLLECTIONS, create_series_collection, event_filter, pack
+from src.database.indexes import INDEXES
+
+BATCH = 5000
+
+
+def events(course_ids, students, days, per_day, rng):
+    """(collection, flat document) for every seeded event"""
+    start = datetime.utcnow().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    for course_id in course_ids:
+        for day in range(days):
+            lecture = start + timedelta(days=day)
+            for student_id in range(1, students + 1):
+                for _ in range(rng.randint(0, per_day)):
+                    at = lecture + timedelta(seconds=rng.randint(0, 5400))
+                    yield 'hand_raises', {'_id': ObjectId(), 'course_id': course_id, 'student_id': student_id,
+                                          'timestamp': at}
+                if rng.random() < 0.3:
+                    yield 'questions', {
+                        '_id': ObjectId(), 'course_id': course_id, 'student_id': student_id,
+                        'question_text': "How does regularization reduce overfitting in linear models?",
+                        'is_relevant': rng.random() < 0.7, 'reason': "Canned reason for benchmarking.",
+                        'relevance_source': 'llm', 'timestamp': lecture + timedelta(seconds=rng.randint(0, 5400))
+                    }
+
+
+def seed(db, course_ids, students, days, per_day, rng):
+    for name in SERIES_COLLECTIONS:
+        create_series_collection(db, name)
+        db[f'{name}_flat'].create_index([('course_id', 1), ('student_id', 1), ('timestamp', -1)])
+    for spec in INDEXES:
+        if spec['collection'] in SERIES_COLLECTIONS:
+            db[spec['collection']].create_index(spec['keys'], name=spec['name'])
+
+    pending = {name: [] for name in SERIES_COLLECTIONS}
+    counts = dict.fromkeys(SERIES_COLLECTIONS, 0)
+
+    def flush(name):
+        db[f'{name}_flat'].insert_many(pending[name], ordered=False)
+        db[name].insert_many([pack(dict(doc)) for doc in pending[name]], ordered=False)
+        counts[name] += len(pending[name])
+        pending[name] = []
+
+    for name, doc in events(course_ids, students, days, per_day, rng):
+        pending[name].append(doc)
+        if len(pending[name]) >= BATCH:
+            flush(name)
+    for name in SERIES_COLLECTIONS:
+        if pending[name]:
+            flush(name)
+    return counts
+
+
+def storage(db, name):
+    stats = db.command('collStats', name)
+    return stats.get('storageSize', 0), stats.get('totalIndexSize', 0)
+
+
+def queries(db, course_id, student_id, roster):
+    """name -> (before, after): the same query against the flat and the time-series layout"""
+    analytics = AnalyticsQueries(db, lambda _: roster)
+    student_ids = list(roster)
+    flat_match = {'$match': {'course_id': course_id, 'student_id': {'$in': student_ids}}}
+    return {
+        'student hand raises': (
+            lambda: db.hand_raises_flat.count_documents({'course_id': course_id, 'student_id': student_id}),
+            lambda: db.hand_raises.count_documents(event_filter(course_id, student_id)),
+        ),
+        'course hand raises': (
+            lambda: list(db.hand_raises_flat.aggregate([
+                flat_match, {'$group': {'_id': '$student_id', 'count': {'$sum': 1}}}
+            ] + analytics.hand_raise_pipeline(course_id, student_ids)[2:])),
+            lambda: list(db.hand_raises.aggregate(analytics.hand_raise_pipeline(course_id, student_ids))),
+        ),
+        'student questions': (
+            lambda: list(db.questions_flat.find({'course_id': course_id, 'student_id': student_id}).sort('timestamp', -1)),
+            lambda: list(db.questions.find(event_filter(course_id, student_id)).sort('timestamp', -1)),
+        ),
+        'course questions': (
+            lambda: list(db.questions_flat.aggregate([
+                flat_match, {'$project': {'student_id': 1, 'is_relevant': 1}}
+            ] + analytics.question_pipeline(course_id, student_ids, 3)[2:])),
+            lambda: list(db.questions.aggregate(analytics.question_pipeline(course_id, student_ids, 3))),
+        ),
+    }
+
+
+def median_ms(run, repeat):
+    run()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event storage and latency: ordinary vs time-series collections")
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='aifred_event_series_benchmark')
+    parser.add_argument('--courses', type=int, default=4)
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--hand-raises-per-day', type=int, default=4, help="per student, uniformly 0..N")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    client.drop_database(args.database)
+    db = client[args.database]
+    course_ids = [ObjectId() for _ in range(args.courses)]
+    try:
+        counts = seed(db, course_ids, args.students, args.days, args.hand_raises_per_day, random.Random(args.seed))
+        print(f"{args.courses} courses x {args.students} students x {args.days} days: "
+              f"{counts['hand_raises']} hand raises, {counts['questions']} questions\n")
+
+        print(f"{'collection':<14}{'layout':<13}{'storage MB':>12}{'index MB':>10}")
+        for name in SERIES_COLLECTIONS:
+            for layout, collection in (('before', f'{name}_flat'), ('time-series', name)):
+                data, index = storage(db, collection)
+                print(f"{name:<14}{layout:<13}{data / 1e6:>12.2f}{index / 1e6:>10.2f}")
+
+        roster = {student_id: f"Student {student_id}" for student_id in range(1, args.students + 1)}
+        print(f"\n{'query':<22}{'before ms':>12}{'after ms':>12}")
+        for name, (before, after) in queries(db, course_ids[0], 1, roster).items():
+            print(f"{name:<22}{median_ms(before, args.repeat):>12.2f}{median_ms(after, args.repeat):>12.2f}")
+    finally:
+        client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+End-to-end latency benchmark for the question pipeline.
+
+Drives N concurrent simulated questions through capture -> ASR ->
+relevance classification -> log_question and reports p50/p95/p99 latency
+per stage and end to end. By default everything runs against the local
+stand-in server (src.utils.asr_standin), so no network access is needed:
+
+    python -m benchmarks.question_pipeline --questions 200 --concurrency 16
+
+Pass --asr-backend openai to transcribe through Whisper instead, --openai-chat
+to classify through the real chat API, and --mongo to log into the
+configured MongoDB rather than an in-memory log.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from bson import ObjectId
+from openai import OpenAI
+
+from src.utils.ai_gateway import AIGateway
+from src.utils.asr import LocalASRBackend, OpenAIASRBackend
+from src.utils.asr_standin import start_standin
+from src.utils.question_batcher import QuestionBatcher
+from src.utils.relevance_analyzer import RelevanceAnalyzer
+from src.utils.transcription import ChunkedTranscriber
+
+RATE = 44100
+COURSE = {'_id': 'benchmark-course', 'course_name': 'Data Science', 'description': 'Introduction to machine learning'}
+STAGES = ('capture', 'asr', 'classify', 'log', 'total')
+
+
+class InMemoryQuestionLog:
+    """Stands in for DatabaseManager.log_question"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.questions = []
+
+    def log_question(self, student_id, course_id, question_text, is_relevant, reason="", relevance_source="llm"):
+        with self._lock:
+            self.questions.append((student_id, course_id, question_text, is_relevant, reason, relevance_source))
+
+
+def simulate_capture(rng, min_seconds, max_seconds):
+    """Synthesize a spoken question: tone bursts separated by short pauses, as 1024-sample frames"""
+    samples = []
+    remaining = rng.uniform(min_seconds, max_seconds)
+    while remaining > 0:
+        burst = rng.uniform(0.4, 1.5)
+        t = np.arange(int(burst * RATE)) / RATE
+        samples.append((8000 * np.sin(2 * np.pi * rng.uniform(120, 300) * t)).astype(np.int16))
+        pause = rng.uniform(0.1, 0.4)
+        samples.append(rng.normal(0, 30, int(pause * RATE)).astype(np.int16))
+        remaining -= burst + pause
+    audio = np.concatenate(samples)
+    return [audio[i:i + 1024].tobytes() for i in range(0, len(audio), 1024)]
+
+
+def percentiles(values):
+    if not values:
+        return None
+    return tuple(float(np.percentile(values, p)) * 1000 for p in (50, 95, 99))
+
+
+def run_question(index, transcriber, batcher, question_log, rng, args):
+    timings = {}
+    start = time.perf_counter()
+
+    frames = simulate_capture(rng, args.min_seconds, args.max_seconds)
+    timings['capture'] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    question_text = transcriber.transcribe_frames(frames, rate=RATE)
+    timings['asr'] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    done = threading.Event()
+    outcome = {}
+
+    def on_result(is_relevant, reason, source):
+        outcome['result'] = (is_relevant, reason, source)
+        done.set()
+
+    def on_error(error):
+        outcome['error'] = error
+        done.set()
+
+    batcher.submit(COURSE, question_text, on_result, on_error)
+    done.wait()
+    if 'error' in outcome:
+        raise outcome['error']
+    timings['classify'] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    is_relevant, reason, source = outcome['result']
+    question_log.log_question(f"STU{index:04d}", COURSE['_id'], question_text, is_relevant, reason, relevance_source=source)
+    timings['log'] = time.perf_counter() - mark
+
+    timings['total'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Question pipeline latency benchmark")
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8, help="simulated students asking at once")
+    parser.add_argument('--min-seconds', type=float, default=2.0, help="shortest simulated question")
+    parser.add_argument('--max-seconds', type=float, default=10.0, help="longest simulated question")
+    parser.add_argument('--asr-backend', choices=('local', 'openai'), default='local')
+    parser.add_argument('--asr-latency-ms', type=float, default=300)
+    parser.add_argument('--chat-latency-ms', type=float, default=250)
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-chat', action='store_true', help="classify with the real chat API")
+    parser.add_argument('--batch-window', type=float, default=1.5, help="QuestionBatcher window in seconds")
+    parser.add_argument('--gateway-concurrency', type=int, default=4)
+    parser.add_argument('--mongo', action='store_true', help="log questions into the configured MongoDB")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_standin(
+        latency_ms=args.asr_latency_ms, jitter_ms=args.jitter_ms,
+        chat_latency_ms=args.chat_latency_ms, error_rate=args.error_rate, seed=args.seed
+    )
+    client = OpenAI() if args.openai_chat else OpenAI(base_url=f"{server.url}/v1", api_key="stand-in")
+    if args.asr_backend == 'local':
+        asr = LocalASRBackend(f"{server.url}/transcribe")
+    else:
+        asr = OpenAIASRBackend(OpenAI())
+    gateway = AIGateway(client=client, asr_backend=asr, max_concurrency=args.gateway_concurrency)
+    transcriber = ChunkedTranscriber(gateway)
+    analyzer = RelevanceAnalyzer(client, model=gateway.chat_model)
+    batcher = QuestionBatcher(analyzer, window_seconds=args.batch_window)
+
+    if args.mongo:
+        from src.database.db_manager import DatabaseManager
+        question_log = DatabaseManager()
+        COURSE['_id'] = ObjectId()
+    else:
+        question_log = InMemoryQuestionLog()
+
+    results = {stage: [] for stage in STAGES}
+    failures = 0
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(run_question, i, transcriber, batcher, question_log,
+                        np.random.default_rng(args.seed + i), args)
+            for i in range(args.questions)
+        ]
+        for future in futures:
+            try:
+                timings = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"question failed: {e}")
+                continue
+            for stage in STAGES:
+                results[stage].append(timings[stage])
+    wall = time.perf_counter() - wall_start
+
+    batcher.stop()
+    gateway.shutdown()
+    server.shutdown()
+
+    print(f"\n{args.questions} questions, concurrency {args.concurrency}, ASR backend {asr.name}, "
+          f"{failures} failed, {server.errors}/{server.requests} stand-in errors injected")
+    print(f"wall time {wall:.2f}s, throughput {len(results['total']) / wall:.1f} questions/s\n")
+    print(f"{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage in STAGES:
+        stats = percentiles(results[stage])
+        if stats:
+            print(f"{stage:<10}{stats[0]:>10.1f}{stats[1]:>10.1f}{stats[2]:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Latency of every public DatabaseManager method on each storage backend
+(src/database/backends.py) at several course sizes.
+
+Each (backend, students) pair gets a fresh database seeded through the
+public API: one course with that many students, ten days of attendance,
+three questions and two hand raises per student, relevance cache entries
+and some questions with archived audio. Every method then runs --repeat
+times; setup work (e.g. creating the student that remove_student deletes)
+is not timed.
+
+    python -m benchmarks.storage_backends --backends memory local --students 50 500 5000
+
+`local` needs a mongod at --local-uri and `atlas` the usual credentials;
+both use the scratch database --database, which is dropped afterwards.
+"""
+import argparse
+import json
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+from src.database.attendance_matrix import version_operation
+from src.database.backends import AtlasBackend, LocalMongoBackend, MemoryBackend
+from src.database.db_manager import DatabaseManager
+
+DAYS = 10
+# No local journal: the write-behind EventWriter goes straight to the backend
+CONFIG = {'app_settings': {'local_store_path': ''}}
+
+
+def create_backend(name, args):
+    if name == 'memory':
+        return MemoryBackend(args.database)
+    if name == 'local':
+        return LocalMongoBackend(args.local_uri, args.database)
+    if name == 'atlas':
+        return AtlasBackend.from_environment(args.database)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def student_entries(count, rng, prefix="Student"):
+    photo = np.zeros((96, 96, 3), dtype=np.uint8)
+    return [
+        {'name': f"{prefix} {i}", 'face_embedding': rng.random(128), 'photo_data': photo}
+        for i in range(count)
+    ]
+
+
+def seed(db_manager, students, rng):
+    """Seed one course through the public API; returns the parameters the benchmarks use"""
+    course_id = db_manager.create_course("Benchmark Course", "BENCH", "Storage backend benchmark").inserted_id
+    student_ids = db_manager.add_students(course_id, student_entries(students, rng))
+    first_day = date.today() - timedelta(days=DAYS)
+    for day in range(DAYS):
+        for student_id in student_ids:
+            if rng.random() < 0.85:
+                db_manager.mark_attendance(student_id, first_day + timedelta(days=day), course_id=course_id,
+                                           background=True)
+    for student_id in student_ids:
+        for i in range(3):
+            audio = {'key': f"{course_id}/{student_id}-{i}.wav"} if i == 0 and student_id % 10 == 0 else None
+            db_manager.log_question(student_id, course_id, f"Question {i} from {student_id}?", rng.random() < 0.7,
+                                    reason="Seeded", audio=audio, background=True)
+        for _ in range(2):
+            db_manager.log_hand_raise(student_id, course_id, background=True)
+    db_manager.flush_events(timeout=600)
+    # Roll up through today so trend queries have rollups to read
+    db_manager.rollups.run(now=datetime.now() + timedelta(days=1))
+    for i in range(200):
+        db_manager.save_relevance_cache_entry({
+            '_id': f"seed-{i}", 'course_id': course_id, 'topic_hash': f"topic-{i % 4}",
+            'question_norm': f"question {i}", 'is_relevant': True, 'reason': "Seeded",
+            'signature': [0] * 16, 'latency': 0.1, 'created_at': datetime.utcnow()
+        })
+    student_id = student_ids[len(student_ids) // 2]
+    return {
+        'course_id': course_id,
+        'course_code': "BENCH",
+        'student_id': student_id,
+        'student_oid': db_manager.get_student_by_id(student_id, course_id)['_id'],
+        'date': first_day + timedelta(days=DAYS // 2),
+        'students': len(student_ids),
+        'rng': rng,
+    }
+
+
+def _reanalysis_results(m, p, i):
+    questions = m.get_questions_for_reanalysis(limit=10, course_id=p['course_id'])
+    return [{
+        '_id': q['_id'], 'course_id': q['course_id'], 'student_id': q['student_id'],
+        'question_text': q['question_text'], 'is_relevant': not q.get('is_relevant', True),
+        'reason': "Benchmark", 'relevance_source': 'llm',
+        'previous': {'question_text': q['question_text'], 'is_relevant': q.get('is_relevant'), 'reason': q.get('reason')}
+    } for q in questions]
+
+
+def _verdicts(m, p, i):
+    questions = [q for _, q in zip(range(20), m.iter_course_questions(p['course_id']))]
+    return [(q, not q.get('is_relevant', True), "Benchmark", 'local') for q in questions]
+
+
+def _queue_events(m, p, i):
+    for _ in range(20):
+        m.log_hand_raise(p['student_id'], p['course_id'], background=True)
+
+
+def _student(m, p, i):
+    return (i % p['students']) + 1
+
+
+# method -> (setup(db_manager, params, i) -> args, run(db_manager, params, args)); only `run` is timed
+METHODS = {
+    # Courses
+    'create_course': (lambda m, p, i: f"NEW-{i}", lambda m, p, code: m.create_course("New", code)),
+    'get_all_courses': (None, lambda m, p, _: m.get_all_courses()),
+    'get_course': (None, lambda m, p, _: m.get_course(p['course_id'])),
+    'get_course_by_code': (None, lambda m, p, _: m.get_course_by_code(p['course_code'])),
+    'update_course': (lambda m, p, i: f"Description {i}",
+                      lambda m, p, text: m.update_course(p['course_id'], description=text)),
+    'delete_course': (lambda m, p, i: m.create_course("Doomed", f"DEL-{i}").inserted_id,
+                      lambda m, p, course_id: m.delete_course(course_id)),
+
+    # Enrollment and rosters
+    'add_student': (lambda m, p, i: student_entries(1, p['rng'], "Added")[0],
+                    lambda m, p, s: m.add_student(s['name'], s['face_embedding'], p['course_id'], s['photo_data'])),
+    'add_students': (lambda m, p, i: student_entries(10, p['rng'], "Bulk"),
+                     lambda m, p, entries: m.add_students(p['course_id'], entries)),
+    'reserve_student_ids': (None, lambda m, p, _: m.reserve_student_ids(p['course_id'])),
+    'seed_student_counters': (None, lambda m, p, _: m.seed_student_counters()),
+    'remove_student': (lambda m, p, i: m.add_student("Leaving", p['rng'].random(128), p['course_id'],
+                                                     np.zeros((96, 96, 3), dtype=np.uint8)).inserted_id,
+                       lambda m, p, oid: m.remove_student(m.get_student(oid)['student_id'], p['course_id'])),
+    'get_course_students': (None, lambda m, p, _: m.get_course_students(p['course_id'])),
+    'get_course_student_list': (None, lambda m, p, _: m.get_course_student_list(p['course_id'])),
+    'get_course_student_embeddings': (None, lambda m, p, _: m.get_course_student_embeddings(p['course_id'])),
+    'get_course_face_embeddings': (None, lambda m, p, _: m.get_course_face_embeddings(p['course_id'])),
+    'get_course_roster': (None, lambda m, p, _: m.get_course_roster(p['course_id'])),
+    'get_all_students': (None, lambda m, p, _: m.get_all_students()),
+    'get_student': (None, lambda m, p, _: m.get_student(p['student_oid'])),
+    'get_student_by_id': (None, lambda m, p, _: m.get_student_by_id(p['student_id'], p['course_id'])),
+    'get_student_name': (None, lambda m, p, _: m.get_student_name(p['student_id'], p['course_id'])),
+    'get_student_photo': (None, lambda m, p, _: m.get_student_photo(p['student_id'], p['course_id'])),
+    'get_student_thumbnail': (None, lambda m, p, _: m.get_student_thumbnail(p['student_id'], p['course_id'])),
+    'update_student_name': (lambda m, p, i: f"Renamed {i}",
+                            lambda m, p, name: m.update_student_name(p['student_id'], p['course_id'], name)),
+
+    # Attendance
+    'mark_attendance': (_student, lambda m, p, s: m.mark_attendance(s, date.today(), course_id=p['course_id'])),
+    'get_attendance_records': (None, lambda m, p, _: m.get_attendance_records(p['course_id'], p['date'])),
+    'get_today_attendance': (None, lambda m, p, _: m.get_today_attendance(p['course_id'])),
+    'get_student_attendance_rate': (None, lambda m, p, _: m.get_student_attendance_rate(p['student_id'], p['course_id'])),
+    # The setup marks attendance as changed, so every timed call runs the aggregation
+    'get_attendance_matrix': (lambda m, p, i: m.db.counters.bulk_write([version_operation(p['course_id'])]),
+                              lambda m, p, _: m.get_attendance_matrix(p['course_id'])),
+
+    # Engagement events
+    'log_engagement': (_student, lambda m, p, s: m.log_engagement(s, hand_raises=1)),
+    'log_hand_raise': (_student, lambda m, p, s: m.log_hand_raise(s, p['course_id'])),
+    'log_question': (_student, lambda m, p, s: m.log_question(s, p['course_id'], "What is a tensor?", True)),
+    'get_student_hand_raises': (None, lambda m, p, _: m.get_student_hand_raises(p['student_id'], p['course_id'])),
+    'get_student_questions': (None, lambda m, p, _: m.get_student_questions(p['student_id'], p['course_id'])),
+    'get_course_questions': (None, lambda m, p, _: m.get_course_questions(p['course_id'])),
+    'count_course_questions': (None, lambda m, p, _: m.count_course_questions(p['course_id'])),
+    'iter_course_questions': (None, lambda m, p, _: sum(1 for _ in m.iter_course_questions(p['course_id']))),
+    'get_labelled_questions': (None, lambda m, p, _: m.get_labelled_questions(p['course_id'])),
+    'update_question_verdicts': (_verdicts, lambda m, p, verdicts: m.update_question_verdicts(verdicts)),
+    'get_course_analytics': (None, lambda m, p, _: m.get_course_analytics(p['course_id'])),
+    'get_course_trends': (None, lambda m, p, _: m.get_course_trends(p['course_id'])),
+    'flush_events': (_queue_events, lambda m, p, _: m.flush_events(timeout=60)),
+    'event_stats': (None, lambda m, p, _: m.event_stats()),
+    'connection_stats': (None, lambda m, p, _: m.connection_stats()),
+
+    # Re-analysis and relevance cache
+    'get_questions_for_reanalysis': (None, lambda m, p, _: m.get_questions_for_reanalysis(course_id=p['course_id'])),
+    'save_question_reanalysis': (_reanalysis_results, lambda m, p, results: m.save_question_reanalysis(results)),
+    'get_reanalysis_progress': (None, lambda m, p, _: m.get_reanalysis_progress('benchmark')),
+    'save_reanalysis_progress': (lambda m, p, i: {'last_id': ObjectId(), 'processed': i},
+                                 lambda m, p, progress: m.save_reanalysis_progress('benchmark', progress)),
+    'get_relevance_cache_entries': (None, lambda m, p, _: m.get_relevance_cache_entries(p['course_id'], 'topic-1')),
+    'save_relevance_cache_entry': (
+        lambda m, p, i: {'_id': f"new-{i}", 'course_id': p['course_id'], 'topic_hash': 'topic-9',
+                         'question_norm': f"new {i}", 'is_relevant': True, 'reason': "", 'signature': [0] * 16,
+                         'latency': 0.1, 'created_at': datetime.utcnow()},
+        lambda m, p, entry: m.save_relevance_cache_entry(entry)),
+    'clear_relevance_cache': (lambda m, p, i: m.create_course("Cache", f"CACHE-{i}").inserted_id,
+                              lambda m, p, course_id: m.clear_relevance_cache(course_id)),
+
+    # Schema maintenance
+    'initialize': (None, lambda m, p, _: m.initialize()),
+    'verify_collections': (None, lambda m, p, _: m.verify_collections()),
+    'verify_questions_collection': (None, lambda m, p, _: m.verify_questions_collection()),
+}
+
+# Ends the DatabaseManager; it runs once per backend when the benchmark finishes
+NOT_BENCHMARKED = {'close'}
+
+
+def run(backend, students, repeat, methods=None, seed_value=0):
+    """{method: [seconds per call]} for one backend and course size"""
+    db_manager = DatabaseManager(CONFIG, allow_offline=False, backend=backend)
+    try:
+        params = seed(db_manager, students, np.random.default_rng(seed_value))
+        timings = {}
+        for name in methods or METHODS:
+            setup, call = METHODS[name]
+            samples = []
+            for i in range(repeat):
+                args = setup(db_manager, params, i) if setup else None
+                start = time.perf_counter()
+                call(db_manager, params, args)
+                samples.append(time.perf_counter() - start)
+            timings[name] = samples
+        return timings
+    finally:
+        if db_manager.client is not None:
+            db_manager.client.drop_database(backend.database)
+        db_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DatabaseManager latency per storage backend and course size")
+    parser.add_argument('--backends', nargs='+', default=['memory'], choices=['memory', 'local', 'atlas'])
+    parser.add_argument('--students', nargs='+', type=int, default=[50, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--methods', nargs='+', choices=sorted(METHODS))
+    parser.add_argument('--local-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='aifred_backend_benchmark')
+    parser.add_argument('--json', help="Also write every sample to this file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    columns, results = [], {}
+    for backend_name in args.backends:
+        for students in args.students:
+            column = f"{backend_name}/{students}"
+            start = time.perf_counter()
+            results[column] = run(create_backend(backend_name, args), students, args.repeat, args.methods, args.seed)
+            columns.append(column)
+            print(f"{column}: seeded and measured in {time.perf_counter() - start:.1f} s")
+
+    print(f"\nmedian ms per call ({args.repeat} calls each; p95 in --json output)")
+    print(f"{'method':<32}" + ''.join(f"{column:>16}" for column in columns))
+    for name in args.methods or METHODS:
+        cells = [float(np.median(results[column][name])) * 1000 for column in columns]
+        print(f"{name:<32}" + ''.join(f"{cell:>16.3f}" for cell in cells))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                column: {
+                    name: {'median_ms': float(np.median(samples)) * 1000,
+                           'p95_ms': float(np.percentile(samples, 95)) * 1000,
+                           'samples_ms': [s * 1000 for s in samples]}
+                    for name, samples in timings.items()
+                }
+                for column, timings in results.items()
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+from src.database.event_series import event_filter
+from src.utils.logger import logger
+
+
+def relevant_flag():
+    """1 for relevant questions; a missing is_relevant counts as relevant, as in the UI"""
+    return {'$cond': [{'$eq': ['$is_relevant', False]}, 0, 1]}
+
+
+class AnalyticsQueries:
+    """
+    Course analytics computed server-side.
+
+    With a CourseStats store, course_summary() reads one counters document per
+    student (O(students), independent of how many events were logged).
+    Without one it falls back to two aggregations over the raw events (one
+    $facet over questions, one $group over hand raises). Student names come
+    from the course roster, which also restricts results to currently
+    registered students.
+    """
+
+    def __init__(self, db, get_roster, course_stats=None):
+        self.db = db
+        self.get_roster = get_roster  # course_id -> {student_id: name}
+        self.course_stats = course_stats
+
+    def question_pipeline(self, course_id, student_ids, top_k):
+        per_student = [
+            {'$group': {
+                '_id': '$student_id',
+                'relevant': {'$sum': relevant_flag()},
+                'total': {'$sum': 1}
+            }},
+            {'$project': {
+                'relevant': 1,
+                'irrelevant': {'$subtract': ['$total', '$relevant']}
+            }}
+        ]
+        return [
+            {'$match': event_filter(course_id, student_ids)},
+            {'$project': {'student_id': '$meta.student_id', 'is_relevant': 1}},
+            {'$facet': {
+                'totals': [
+                    {'$group': {'_id': None, 'questions': {'$sum': 1}, 'relevant': {'$sum': relevant_flag()}}}
+                ],
+                'top_relevant': per_student + [
+                    {'$match': {'relevant': {'$gt': 0}}},
+                    {'$sort': {'relevant': -1, '_id': 1}},
+                    {'$limit': top_k}
+                ],
+                'top_irrelevant': per_student + [
+                    {'$match': {'irrelevant': {'$gt': 0}}},
+                    {'$sort': {'irrelevant': -1, '_id': 1}},
+                    {'$limit': top_k}
+                ]
+            }}
+        ]
+
+    def hand_raise_pipeline(self, course_id, student_ids):
+        return [
+            {'$match': event_filter(course_id, student_ids)},
+            {'$group': {'_id': '$meta.student_id', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        ]
+
+    @staticmethod
+    def empty_summary(students=0):
+        return {
+            'totals': {'students': students, 'questions': 0, 'relevant': 0, 'irrelevant': 0, 'hand_raises': 0},
+            'top_relevant': [],
+            'top_irrelevant': [],
+            'hand_raises': []
+        }
+
+    def course_summary(self, course_id, top_k=3):
+        """
+        Return {
+            'totals': {'students', 'questions', 'relevant', 'irrelevant', 'hand_raises'},
+            'top_relevant' / 'top_irrelevant': [(student_id, {'name', 'relevant', 'irrelevant'})],
+            'hand_raises': [(name, count)] in descending order
+        }
+        """
+        roster = self.get_roster(course_id)
+        summary = self.empty_summary(len(roster))
+        if not roster:
+            return summary
+        if self.course_stats is None:
+            return self._summary_from_events(course_id, roster, top_k, summary)
+
+        try:
+            stats = self.course_stats.read(course_id)
+        except Exception as e:
+            logger.error(f"Error reading course stats: {str(e)}")
+            return summary
+
+        counts = {}
+        for student_id, name in roster.items():
+            doc = stats.get(student_id, {})
+            counts[student_id] = {
+                'name': name,
+                'relevant': doc.get('relevant_questions', 0),
+                'irrelevant': doc.get('irrelevant_questions', 0),
+                'hand_raises': doc.get('hand_raises', 0)
+            }
+
+        totals = summary['totals']
+        totals['relevant'] = sum(c['relevant'] for c in counts.values())
+        totals['irrelevant'] = sum(c['irrelevant'] for c in counts.values())
+        totals['questions'] = totals['relevant'] + totals['irrelevant']
+        totals['hand_raises'] = sum(c['hand_raises'] for c in counts.values())
+
+        for key, metric in (('top_relevant', 'relevant'), ('top_irrelevant', 'irrelevant')):
+            ranked = sorted(
+                (item for item in counts.items() if item[1][metric] > 0),
+                key=lambda item: (-item[1][metric], item[0])
+            )[:top_k]
+            summary[key] = [
+                (student_id, {'name': c['name'], 'relevant': c['relevant'], 'irrelevant': c['irrelevant']})
+                for student_id, c in ranked
+            ]
+        summary['hand_raises'] = [
+            (c['name'], c['hand_raises'])
+            for _, c in sorted(counts.items(), key=lambda item: (-item[1]['hand_raises'], item[0]))
+            if c['hand_raises'] > 0
+        ]
+        return summary
+
+    def _summary_from_events(self, course_id, roster, top_k, summary):
+        student_ids = list(roster)
+        try:
+            facets = next(self.db.questions.aggregate(self.question_pipeline(course_id, student_ids, top_k)), {})
+            totals = (facets.get('totals') or [{}])[0]
+            summary['totals']['questions'] = totals.get('questions', 0)
+            summary['totals']['relevant'] = totals.get('relevant', 0)
+            summary['totals']['irrelevant'] = totals.get('questions', 0) - totals.get('relevant', 0)
+            for key in ('top_relevant', 'top_irrelevant'):
+                summary[key] = [
+                    (row['_id'], {
+                        'name': roster.get(row['_id'], 'Unknown Student'),
+                        'relevant': row['relevant'],
+                        'irrelevant': row['irrelevant']
+                    })
+                    for row in facets.get(key, [])
+                ]
+
+            for row in self.db.hand_raises.aggregate(self.hand_raise_pipeline(course_id, student_ids)):
+                summary['hand_raises'].append((roster.get(row['_id'], 'Unknown Student'), row['count']))
+                summary['totals']['hand_raises'] += row['count']
+        except Exception as e:
+            logger.error(f"Error computing course analytics: {str(e)}")
+        return summary
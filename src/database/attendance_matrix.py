@@ -0,0 +1,128 @@
+"""
+Course attendance as a dense students x sessions matrix.
+
+One aggregation groups a course's attendance records by date, so a session
+is any day attendance was taken. AttendanceMatrix keeps the result as NumPy
+arrays: a boolean `present` matrix with a row per roster student and a
+column per session, indexed by `student_ids` and `dates` (datetime64[D]).
+Rates, streaks and calendar grids are computed over the whole matrix
+without Python loops.
+
+Every attendance write also increments the course's attendance version in
+`counters` ({_id: 'attendance:<course_id>'}). DatabaseManager caches the
+last matrix of each course with that version and reuses it until
+attendance changes.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import UpdateOne
+
+
+def version_key(course_id):
+    return {'_id': f'attendance:{course_id}'}
+
+
+def version_operation(course_id):
+    """UpdateOne that marks a course's attendance as changed"""
+    return UpdateOne(version_key(course_id), {'$inc': {'seq': 1}}, upsert=True)
+
+
+def read_version(db, course_id):
+    counter = db.counters.find_one(version_key(course_id), {'seq': 1})
+    return counter['seq'] if counter else 0
+
+
+def _day(value):
+    return datetime.combine(value.date() if isinstance(value, datetime) else value, datetime.min.time())
+
+
+def matrix_pipeline(course_id, start=None, end=None):
+    """Sessions of a course between the days start and end (both included), with the students present"""
+    match = {'course_id': course_id}
+    if start is not None or end is not None:
+        match['date'] = {}
+        if start is not None:
+            match['date']['$gte'] = _day(start)
+        if end is not None:
+            match['date']['$lt'] = _day(end) + timedelta(days=1)
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': '$date',
+            'present': {'$push': {'$cond': [{'$eq': ['$status', 'Present']}, '$student_id', None]}}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+
+
+class AttendanceMatrix:
+    def __init__(self, present, student_ids, dates):
+        self.present = present
+        self.student_ids = student_ids
+        self.dates = dates
+        # Shared through the cache, so callers must not modify it
+        for array in (present, student_ids, dates):
+            array.flags.writeable = False
+
+    @classmethod
+    def build(cls, student_ids, sessions):
+        """From roster student IDs and matrix_pipeline() rows"""
+        student_ids = np.array(sorted(student_ids), dtype=np.int64)
+        sessions = list(sessions)
+        dates = np.array([session['_id'] for session in sessions], dtype='datetime64[D]')
+        present = np.zeros((len(student_ids), len(dates)), dtype=bool)
+
+        attended = [[sid for sid in session['present'] if sid is not None] for session in sessions]
+        ids = np.fromiter((sid for row in attended for sid in row), dtype=np.int64)
+        columns = np.repeat(np.arange(len(dates)), [len(row) for row in attended])
+        rows = np.searchsorted(student_ids, ids)
+        # Records of students no longer on the roster have no row
+        enrolled = rows < len(student_ids)
+        enrolled[enrolled] = student_ids[rows[enrolled]] == ids[enrolled]
+        present[rows[enrolled], columns[enrolled]] = True
+        return cls(present, student_ids, dates)
+
+    def index(self, student_id):
+        """Row of a student, or None when they are not on the roster"""
+        row = np.searchsorted(self.student_ids, student_id)
+        if row < len(self.student_ids) and self.student_ids[row] == student_id:
+            return int(row)
+        return None
+
+    def rates(self):
+        """Percentage of sessions attended, per student"""
+        if not len(self.dates):
+            return np.zeros(len(self.student_ids))
+        return self.present.mean(axis=1) * 100
+
+    def streaks(self):
+        """(current, longest) runs of consecutive sessions attended, per student"""
+        padded = np.pad(self.present.astype(np.int8), ((0, 0), (1, 1)))
+        # +1 where a run starts, -1 one past where it ends; row-major order pairs them up
+        starts = np.nonzero(np.diff(padded, axis=1) == 1)
+        ends = np.nonzero(np.diff(padded, axis=1) == -1)[1]
+        lengths = ends - starts[1]
+        longest = np.zeros(len(self.student_ids), dtype=np.int64)
+        np.maximum.at(longest, starts[0], lengths)
+        current = np.zeros(len(self.student_ids), dtype=np.int64)
+        running = ends == len(self.dates)
+        current[starts[0][running]] = lengths[running]
+        return current, longest
+
+    def calendar(self, row):
+        """
+        (weeks, grid) for one student's row: weeks holds each week's Monday and
+        grid is weeks x 7 with 1 present, 0 absent and -1 for days without a session
+        """
+        if not len(self.dates):
+            return np.array([], dtype='datetime64[D]'), np.full((0, 7), -1, dtype=np.int8)
+        days = self.dates.astype(np.int64)
+        # 1970-01-01 was a Thursday
+        weekdays = (days + 3) % 7
+        first_monday = days[0] - weekdays[0]
+        week_index = (days - first_monday) // 7
+        grid = np.full((week_index[-1] + 1, 7), -1, dtype=np.int8)
+        grid[week_index, weekdays] = self.present[row]
+        weeks = (first_monday + 7 * np.arange(len(grid))).astype('datetime64[D]')
+        return weeks, grid
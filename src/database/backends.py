@@ -0,0 +1,113 @@
+"""
+Storage backends behind DatabaseManager.
+
+A backend opens the client and database that DatabaseManager, CourseStats,
+StudentPhotoStore and AnalyticsQueries query through the pymongo API:
+
+- `atlas` (default): MongoDB Atlas over SRV, from MONGODB_USERNAME,
+  MONGODB_PASSWORD and MONGODB_CLUSTER.
+- `local`: a mongod on this machine (`database.local_uri`, env
+  AIFRED_LOCAL_MONGODB_URI, default mongodb://localhost:27017). Transactions
+  are used only when it runs as a replica set.
+- `memory`: src/database/memory_store.py, indexed dicts in this process.
+  Needs no server or credentials; data lasts as long as the backend object.
+
+The backend is chosen by `database.backend` in config.json or the
+AIFRED_DB_BACKEND environment variable.
+"""
+import os
+
+import certifi
+from pymongo import MongoClient
+
+from src.database.memory_store import MemoryClient
+from src.utils.logger import logger
+
+
+class StorageBackend:
+    """Where DatabaseManager keeps its data"""
+
+    name = 'base'
+    # The config block (under `database`) its MongoClient options come from
+    options_key = 'options'
+    # Whether session events are journaled to the local store before they are written
+    journal = True
+
+    def __init__(self, database='aifred'):
+        self.database = database
+
+    def connect(self, options=None, event_listeners=None):
+        """Return (client, db); raises if the server cannot be reached"""
+        raise NotImplementedError
+
+
+class AtlasBackend(StorageBackend):
+    """MongoDB Atlas over SRV with TLS"""
+
+    name = 'atlas'
+
+    def __init__(self, uri, database='aifred'):
+        super().__init__(database)
+        self.uri = uri
+
+    @classmethod
+    def from_environment(cls, database='aifred'):
+        username = os.getenv('MONGODB_USERNAME')
+        password = os.getenv('MONGODB_PASSWORD')
+        cluster = os.getenv('MONGODB_CLUSTER')
+        if not all([username, password, cluster]):
+            raise ValueError("MongoDB Atlas credentials not found in environment variables")
+        return cls(f"mongodb+srv://{username}:{password}@{cluster}/", database)
+
+    def connect(self, options=None, event_listeners=None):
+        client = MongoClient(
+            self.uri, tlsCAFile=certifi.where(), event_listeners=event_listeners or [], **(options or {})
+        )
+        return client, client[self.database]
+
+
+class LocalMongoBackend(StorageBackend):
+    """A mongod reachable without TLS, typically on localhost"""
+
+    name = 'local'
+    # `database.options` holds Atlas settings (TLS among them) a plain mongod rejects
+    options_key = 'local_options'
+
+    def __init__(self, uri='mongodb://localhost:27017', database='aifred'):
+        super().__init__(database)
+        self.uri = uri
+
+    def connect(self, options=None, event_listeners=None):
+        client = MongoClient(self.uri, event_listeners=event_listeners or [], **(options or {}))
+        return client, client[self.database]
+
+
+class MemoryBackend(StorageBackend):
+    """In-process indexed dicts with pymongo semantics"""
+
+    name = 'memory'
+    journal = False
+
+    def __init__(self, database='aifred'):
+        super().__init__(database)
+        self.client = MemoryClient()
+
+    def connect(self, options=None, event_listeners=None):
+        return self.client, self.client[self.database]
+
+
+def create_storage_backend(config=None):
+    """Build the backend selected by config (database.backend) or AIFRED_DB_BACKEND"""
+    db_config = (config or {}).get('database') or {}
+    backend = os.getenv('AIFRED_DB_BACKEND', db_config.get('backend', 'atlas'))
+
+    if backend == 'memory':
+        logger.info("Using in-memory database backend")
+        return MemoryBackend()
+    if backend == 'local':
+        uri = os.getenv('AIFRED_LOCAL_MONGODB_URI', db_config.get('local_uri', 'mongodb://localhost:27017'))
+        logger.info(f"Using local MongoDB backend at {uri}")
+        return LocalMongoBackend(uri)
+    if backend != 'atlas':
+        raise ValueError(f"Unknown database backend: {backend}")
+    return AtlasBackend.from_environment()
@@ -0,0 +1,211 @@
+"""
+Cascading deletes of students and courses, run as resumable jobs.
+
+Removing a student or a course first marks its document with a tombstone
+(`deleted_at`). Every read of students and courses skips tombstoned ones,
+so the student or course disappears at once. A job in `delete_jobs` then
+deletes the dependent documents one collection at a time, in chunks of at
+most `chunk_size`. Each chunk reads the next _ids after the last one
+deleted, deletes that _id range and saves the new position and counts in
+the job. The student or course document itself goes last.
+
+Hand raises and questions are time-series collections, where no index
+orders the _ids. They are deleted one student series per chunk instead,
+found in student_id order on the (meta.course_id, meta.student_id,
+timestamp) index; a delete filtering on `meta` alone drops whole buckets.
+
+A job interrupted by a crash or restart resumes from its saved positions:
+DatabaseManager restarts unfinished jobs when it connects. Deleting a range
+again is harmless. Chunks run outside transactions, since hand raises and
+questions are time-series collections and cannot be written inside one.
+"""
+import threading
+from datetime import datetime
+
+from src.database.event_series import META_FIELD, SERIES_COLLECTIONS, event_filter
+from src.utils.logger import logger
+
+TOMBSTONE = 'deleted_at'
+SERIES_STUDENT = f'{META_FIELD}.student_id'
+# Merged into reads of students and courses
+LIVE = {TOMBSTONE: {'$exists': False}}
+CHUNK_SIZE = 500
+
+
+def job_key(course_id, student_id=None):
+    if student_id is None:
+        return f'course:{course_id}'
+    return f'student:{course_id}:{student_id}'
+
+
+def targets(job):
+    """(collection, filter) for everything a job deletes, in deletion order"""
+    course_id, student_id = job['course_id'], job.get('student_id')
+    owned = {'course_id': course_id}
+    if student_id is not None:
+        owned['student_id'] = student_id
+    events = event_filter(course_id, student_id)
+    plan = [
+        ('attendance', owned),
+        ('questions', events),
+        ('hand_raises', events),
+        ('course_student_stats', owned),
+        ('engagement_daily', owned),
+        ('student_photos', owned),
+    ]
+    if student_id is not None:
+        # Engagement records predate courses and carry only the student
+        return plan + [('engagement', {'student_id': student_id}), ('students', owned)]
+    return plan + [
+        ('relevance_cache', owned),
+        ('students', owned),
+        ('counters', {'_id': {'$in': [f'student_id:{course_id}', f'attendance:{course_id}']}}),
+        ('courses', {'_id': course_id}),
+    ]
+
+
+def _with_id(query, condition):
+    if '_id' in query:
+        return {'$and': [query, {'_id': condition}]}
+    return {**query, '_id': condition}
+
+
+class DeleteJobs:
+    def __init__(self, db, chunk_size=CHUNK_SIZE):
+        self.db = db
+        self.collection = db.delete_jobs
+        self.chunk_size = chunk_size
+        # One job deletes at a time; the others wait their turn
+        self._run_lock = threading.Lock()
+
+    def begin(self, course_id, student_id=None):
+        """
+        Tombstone a student (or a course) and record its delete job.
+        Returns (tombstone UpdateResult, job).
+        """
+        now = datetime.utcnow()
+        if student_id is None:
+            entity = self.db.courses
+            key = {'_id': course_id}
+        else:
+            entity = self.db.students
+            key = {'course_id': course_id, 'student_id': student_id}
+        result = entity.update_one({**key, **LIVE}, {'$set': {TOMBSTONE: now}})
+        job = {
+            '_id': job_key(course_id, student_id),
+            'kind': 'course' if student_id is None else 'student',
+            'course_id': course_id,
+            'student_id': student_id,
+            'status': 'pending',
+            'positions': {},
+            'finished': {},
+            'deleted': {},
+            'created_at': now,
+            'updated_at': now
+        }
+        self.collection.update_one({'_id': job['_id']}, {'$setOnInsert': job}, upsert=True)
+        return result, self.collection.find_one({'_id': job['_id']})
+
+    def pending(self):
+        """Jobs that have not completed, oldest first"""
+        return list(self.collection.find({'status': {'$ne': 'completed'}}).sort('created_at', 1))
+
+    def run(self, job_id, on_progress=None):
+        """Delete everything a job covers, from its saved positions; returns the finished job"""
+        with self._run_lock:
+            job = self.collection.find_one({'_id': job_id})
+            if job is None or job['status'] == 'completed':
+                return job
+            plan = targets(job)
+            total = job.get('total')
+            if total is None:
+                total = sum(self.db[name].count_documents(query) for name, query in plan)
+                job['total'] = total
+            self._save(job_id, {'status': 'running', 'total': total})
+
+            deleted = dict(job.get('deleted') or {})
+            finished = job.get('finished') or {}
+            for name, query in plan:
+                if finished.get(name):
+                    continue
+                after = (job.get('positions') or {}).get(name)
+                while True:
+                    after, count = self._delete_chunk(name, query, after)
+                    if after is None:
+                        break
+                    deleted[name] = deleted.get(name, 0) + count
+                    self._save(job_id, {f'positions.{name}': after, f'deleted.{name}': deleted[name]})
+                    if on_progress:
+                        on_progress(sum(deleted.values()), total)
+                self._save(job_id, {f'finished.{name}': True})
+
+            self._save(job_id, {'status': 'completed', 'completed_at': datetime.utcnow()})
+            logger.info(f"Delete job {job_id} removed {sum(deleted.values())} documents: {deleted}")
+            return self.collection.find_one({'_id': job_id})
+
+    def start(self, job_id, on_progress=None, on_done=None):
+        """
+        Run a job on a background thread. on_progress(deleted, total) is
+        called after every chunk and on_done(job) once it ends; job is None
+        when it failed and will be resumed on the next start.
+        """
+        def work():
+            job = None
+            try:
+                job = self.run(job_id, on_progress)
+            except Exception as e:
+                logger.error(f"Delete job {job_id} stopped: {str(e)}")
+            if on_done:
+                on_done(job)
+
+        thread = threading.Thread(target=work, name=f'delete-{job_id}', daemon=True)
+        thread.start()
+        return thread
+
+    def resume(self):
+        """Run every unfinished job on one background thread; None when there are none"""
+        jobs = [job['_id'] for job in self.pending()]
+        if not jobs:
+            return None
+
+        def work():
+            for job_id in jobs:
+                try:
+                    self.run(job_id)
+                except Exception as e:
+                    logger.error(f"Delete job {job_id} stopped: {str(e)}")
+
+        logger.info(f"Resuming {len(jobs)} unfinished delete jobs")
+        thread = threading.Thread(target=work, name='delete-resume', daemon=True)
+        thread.start()
+        return thread
+
+    def _delete_chunk(self, name, query, after):
+        """Delete the next chunk after `after`; (last deleted _id, count), or (None, 0) when none are left"""
+        if name in SERIES_COLLECTIONS:
+            return self._delete_series(name, query, after)
+        chunk = query if after is None else _with_id(query, {'$gt': after})
+        ids = [doc['_id'] for doc in self.db[name].find(chunk, {'_id': 1}).sort('_id', 1).limit(self.chunk_size)]
+        if not ids:
+            return None, 0
+        result = self.db[name].delete_many(_with_id(query, {'$gte': ids[0], '$lte': ids[-1]}))
+        return ids[-1], result.deleted_count
+
+    def _delete_series(self, name, query, after):
+        """Delete the next student's events after student `after`; (student_id, count), or (None, 0)"""
+        if SERIES_STUDENT in query:
+            # A student job covers a single series
+            if after is not None:
+                return None, 0
+            chunk = query
+        else:
+            chunk = query if after is None else {**query, SERIES_STUDENT: {'$gt': after}}
+        first = self.db[name].find_one(chunk, {SERIES_STUDENT: 1}, sort=[(SERIES_STUDENT, 1)])
+        if first is None:
+            return None, 0
+        student_id = first[META_FIELD]['student_id']
+        result = self.db[name].delete_many({**query, SERIES_STUDENT: student_id})
+        return student_id, result.deleted_count
+
+    def _save(self, job_id, fields):
+        self.collection.update_one({'_id': job_id}, {'$set': {**fields, 'updated_at': datetime.utcnow()}})
@@ -0,0 +1,212 @@
+"""
+MongoClient settings and connection-level metrics.
+
+Options are layered: DEFAULT_OPTIONS, then the `database.options` block of
+the config (`database.local_options` for a local mongod, so Atlas settings
+such as `ssl` stay off it), then MONGODB_* environment variables (see
+ENV_OPTIONS). Wire
+compressors whose Python package is missing are dropped, so the client
+negotiates the best of zstd, snappy and zlib that both sides support.
+Analytics reads use `database.analytics_read_preference`
+(env MONGODB_ANALYTICS_READ_PREFERENCE), secondaryPreferred by default.
+"""
+import os
+import threading
+import time
+
+import bson
+from pymongo import monitoring
+from pymongo.read_preferences import ReadPreference
+
+from src.utils.logger import logger
+
+DEFAULT_OPTIONS = {
+    'appName': 'aifred',
+    'maxPoolSize': 20,
+    'minPoolSize': 2,
+    'maxIdleTimeMS': 300000,
+    'waitQueueTimeoutMS': 10000,
+    'serverSelectionTimeoutMS': 5000,
+    'connectTimeoutMS': 10000,
+    'socketTimeoutMS': 20000,
+    'compressors': 'zstd,snappy,zlib',
+    'retryWrites': True,
+    'retryReads': True,
+    'w': 'majority',
+}
+
+# env var -> (option, type)
+ENV_OPTIONS = {
+    'MONGODB_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGODB_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGODB_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGODB_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGODB_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGODB_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGODB_COMPRESSORS': ('compressors', str),
+    'MONGODB_RETRY_WRITES': ('retryWrites', bool),
+}
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+# compressor -> Python package pymongo needs for it
+COMPRESSOR_PACKAGES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def available_compressors(names):
+    """Keep the compressors (in preference order) whose packages are importable"""
+    available = []
+    for name in [n.strip() for n in names.split(',') if n.strip()]:
+        package = COMPRESSOR_PACKAGES.get(name)
+        try:
+            __import__(package)
+            available.append(name)
+        except (ImportError, TypeError):
+            logger.info(f"Wire compressor {name} unavailable, skipping")
+    return ','.join(available)
+
+
+def client_options(config=None, environ=None, key='options'):
+    """MongoClient keyword options from defaults, the config block `key` and environment"""
+    environ = os.environ if environ is None else environ
+    options = dict(DEFAULT_OPTIONS)
+    options.update(((config or {}).get('database') or {}).get(key) or {})
+    for variable, (option, kind) in ENV_OPTIONS.items():
+        if environ.get(variable):
+            value = environ[variable]
+            options[option] = _parse_bool(value) if kind is bool else kind(value)
+    if options.get('compressors'):
+        compressors = available_compressors(options['compressors'])
+        if compressors:
+            options['compressors'] = compressors
+        else:
+            options.pop('compressors')
+    return options
+
+
+def analytics_read_preference(config=None, environ=None):
+    environ = os.environ if environ is None else environ
+    name = environ.get('MONGODB_ANALYTICS_READ_PREFERENCE') or \
+        ((config or {}).get('database') or {}).get('analytics_read_preference', 'secondaryPreferred')
+    if name not in READ_PREFERENCES:
+        logger.warning(f"Unknown read preference {name}, using primary")
+    return READ_PREFERENCES.get(name, ReadPreference.PRIMARY)
+
+
+class ConnectionMetrics(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    """
+    Pool and wire counters: checkouts, time spent waiting for a connection,
+    connections opened/closed, commands, and BSON bytes sent and received.
+    Byte counts re-encode each command and reply, which costs CPU on every
+    query, so they are off unless measure_bytes=True
+    (`database.measure_command_bytes`). They are uncompressed BSON sizes,
+    not the bytes on the wire.
+    """
+
+    def __init__(self, measure_bytes=False):
+        self.measure_bytes = measure_bytes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_ms = 0.0
+        self.max_checkout_wait_ms = 0.0
+        self.checked_in = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.commands = 0
+        self.command_failures = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'in_use': self.checkouts - self.checked_in,
+                'checkout_wait_ms_avg': self.checkout_wait_ms / self.checkouts if self.checkouts else 0.0,
+                'checkout_wait_ms_max': self.max_checkout_wait_ms,
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'commands': self.commands,
+                'command_failures': self.command_failures,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+            }
+
+    def _waited(self, event):
+        """Checkout wait in ms; pymongo reports it on newer versions, otherwise timed per thread"""
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            return duration * 1000
+        started = getattr(self._local, 'checkout_started', None)
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    # ConnectionPoolListener
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._waited(event)
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_ms += waited
+            self.max_checkout_wait_ms = max(self.max_checkout_wait_ms, waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_in += 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    # CommandListener
+    def started(self, event):
+        size = len(bson.encode(event.command)) if self.measure_bytes else 0
+        with self._lock:
+            self.commands += 1
+            self.bytes_sent += size
+
+    def succeeded(self, event):
+        size = len(bson.encode(event.reply)) if self.measure_bytes else 0
+        with self._lock:
+            self.bytes_received += size
+
+    def failed(self, event):
+        with self._lock:
+            self.command_failures += 1
@@ -0,0 +1,175 @@
+"""
+Per-student engagement counters for each course (`course_student_stats`).
+
+Counters are kept current on write: every hand raise, question and
+attendance record also sends an $inc / $addToSet to its student's stats
+document in the same flush. The rebuild command recomputes them from the raw
+events and verifies the result:
+
+    python -m src.database.course_stats --rebuild --verify [--course CS101]
+"""
+import argparse
+
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+from src.database.event_series import event_filter
+from src.database.rollups import DailyRollups
+from src.utils.logger import logger
+
+COUNTERS = ('hand_raises', 'relevant_questions', 'irrelevant_questions')
+
+
+class CourseStats:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.course_student_stats
+
+    @staticmethod
+    def update_operation(course_id, student_id, hand_raises=0, relevant=0, irrelevant=0, day=None):
+        """UpdateOne that applies one event's contribution to a student's counters"""
+        update = {'$inc': {
+            'hand_raises': hand_raises,
+            'relevant_questions': relevant,
+            'irrelevant_questions': irrelevant
+        }}
+        if day is not None:
+            # A set, so repeated attendance for the same day is a no-op
+            update['$addToSet'] = {'days': day}
+        return UpdateOne({'course_id': course_id, 'student_id': student_id}, update, upsert=True)
+
+    @classmethod
+    def question_operation(cls, course_id, student_id, is_relevant):
+        return cls.update_operation(
+            course_id, student_id, relevant=int(bool(is_relevant)), irrelevant=int(not is_relevant)
+        )
+
+    def read(self, course_id):
+        """{student_id: counters and days_present} for a course, one document per student"""
+        cursor = self.collection.find(
+            {'course_id': course_id},
+            {'_id': 0, 'student_id': 1, **{name: 1 for name in COUNTERS},
+             'days_present': {'$size': {'$ifNull': ['$days', []]}}}
+        )
+        return {doc['student_id']: doc for doc in cursor}
+
+    def compute_from_events(self, course_id):
+        """
+        Recompute a course's counters from the raw event collections. Days
+        whose raw events were deleted by rollup retention count from their rollups.
+        """
+        stats = {}
+
+        def entry(student_id):
+            return stats.setdefault(student_id, {
+                'course_id': course_id, 'student_id': student_id,
+                **{name: 0 for name in COUNTERS}, 'days': []
+            })
+
+        rollups = DailyRollups(self.db)
+        events = event_filter(course_id)
+        retained_from = rollups.state().get('retained_from')
+        if retained_from is not None:
+            events['timestamp'] = {'$gte': retained_from}
+            for student_id, totals in rollups.totals_before(course_id, retained_from).items():
+                for name in COUNTERS:
+                    entry(student_id)[name] += totals.get(name, 0)
+
+        for row in self.db.hand_raises.aggregate([
+            {'$match': events},
+            {'$group': {'_id': '$meta.student_id', 'count': {'$sum': 1}}}
+        ]):
+            entry(row['_id'])['hand_raises'] += row['count']
+
+        for row in self.db.questions.aggregate([
+            {'$match': events},
+            {'$group': {
+                '_id': '$meta.student_id',
+                'relevant': {'$sum': {'$cond': [{'$eq': ['$is_relevant', False]}, 0, 1]}},
+                'total': {'$sum': 1}
+            }}
+        ]):
+            entry(row['_id'])['relevant_questions'] += row['relevant']
+            entry(row['_id'])['irrelevant_questions'] += row['total'] - row['relevant']
+
+        for row in self.db.attendance.aggregate([
+            {'$match': {'course_id': course_id, 'status': 'Present'}},
+            {'$group': {'_id': '$student_id', 'days': {'$addToSet': '$date'}}}
+        ]):
+            entry(row['_id'])['days'] = sorted(row['days'])
+
+        return stats
+
+    def rebuild(self, course_id):
+        """
+        Replace a course's counters with values recomputed from raw events.
+        Run while the course is not in session; increments that land between
+        the recompute and the replace are overwritten.
+        """
+        stats = self.compute_from_events(course_id)
+        operations = [
+            ReplaceOne({'course_id': course_id, 'student_id': student_id}, doc, upsert=True)
+            for student_id, doc in stats.items()
+        ]
+        operations.append(DeleteMany({'course_id': course_id, 'student_id': {'$nin': list(stats)}}))
+        self.collection.bulk_write(operations, ordered=False)
+        logger.info(f"Rebuilt engagement counters for {len(stats)} students in course {course_id}")
+        return stats
+
+    def verify(self, course_id):
+        """Compare stored counters with the raw events; returns a list of mismatches"""
+        expected = self.compute_from_events(course_id)
+        stored = {doc['student_id']: doc for doc in self.collection.find({'course_id': course_id})}
+        mismatches = []
+        for student_id in set(expected) | set(stored):
+            want = expected.get(student_id, {name: 0 for name in COUNTERS})
+            have = stored.get(student_id, {})
+            for name in COUNTERS:
+                if want.get(name, 0) != have.get(name, 0):
+                    mismatches.append((student_id, name, want.get(name, 0), have.get(name, 0)))
+            if sorted(want.get('days', [])) != sorted(have.get('days', [])):
+                mismatches.append((student_id, 'days', len(want.get('days', [])), len(have.get('days', []))))
+        return mismatches
+
+    def delete(self, course_id, student_id=None):
+        query = {'course_id': course_id}
+        if student_id is not None:
+            query['student_id'] = student_id
+        return self.collection.delete_many(query)
+
+
+def main():
+    from src.database.db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Rebuild and verify course_student_stats")
+    parser.add_argument('--course', help="course code (default: all courses)")
+    parser.add_argument('--rebuild', action='store_true', help="recompute counters from raw events")
+    parser.add_argument('--verify', action='store_true', help="compare counters with raw events")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(allow_offline=False)
+    if args.course:
+        course = db_manager.get_course_by_code(args.course)
+        if course is None:
+            raise SystemExit(f"Unknown course {args.course}")
+        courses = [course]
+    else:
+        courses = db_manager.get_all_courses()
+
+    failed = False
+    for course in courses:
+        label = f"{course['course_name']} {course['course_code']}"
+        if args.rebuild:
+            stats = db_manager.course_stats.rebuild(course['_id'])
+            print(f"{label}: rebuilt counters for {len(stats)} students")
+        if args.verify or not args.rebuild:
+            mismatches = db_manager.course_stats.verify(course['_id'])
+            failed = failed or bool(mismatches)
+            print(f"{label}: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+            for student_id, counter, expected, stored in mismatches[:20]:
+                print(f"  student {student_id} {counter}: expected {expected}, stored {stored}")
+    db_manager.close()
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,134 @@
-from pymongo import MongoClient
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import threading
+import time
+from bson import ObjectId
 import os
 from dotenv import load_dotenv
 from src.utils.logger import logger
-import certifi
+from src.database.event_writer import EventWriter
+from src.database.local_store import LocalStore, JournalSyncWorker
+from src.database.analytics import AnalyticsQueries
+from src.database.attendance_matrix import AttendanceMatrix, matrix_pipeline, read_version, version_operation
+from src.database.cascade import DeleteJobs, LIVE, CHUNK_SIZE
+from src.database.course_stats import CourseStats
+from src.database.event_series import (
+    SERIES_COLLECTIONS, create_series_collection, event_document, event_filter, event_key, unpack
+)
+from src.database.photo_store import StudentPhotoStore
+from src.database.rollups import DailyRollups
+from src.database.migrations import ensure_schema, SCHEMA_VERSION
+from src.database.backends import create_storage_backend
+from src.database.connection import client_options, analytics_read_preference, ConnectionMetrics
+from src.utils.config import load_config
 from datetime import datetime, date, timedelta
-import cv2
 import numpy as np
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, config=None, allow_offline=True, backend=None):
         load_dotenv()
+        config = load_config() if config is None else config
         
-        # Construct MongoDB Atlas URI
-        username = os.getenv('MONGODB_USERNAME')
-        password = os.getenv('MONGODB_PASSWORD')
-        cluster = os.getenv('MONGODB_CLUSTER')
+        # Atlas, a local mongod or the in-memory store (src/database/backends.py)
+        self.backend = backend or create_storage_backend(config)
         
-        if not all([username, password, cluster]):
-            raise ValueError("MongoDB Atlas credentials not found in environment variables")
+        # Pool, timeout, compression and retry settings come from src/database/connection.py
+        db_config = config.get('database') or {}
+        self._options = client_options(config, key=self.backend.options_key)
+        self._read_preference = analytics_read_preference(config)
+        self._delete_chunk_size = db_config.get('delete_chunk_size', CHUNK_SIZE)
+        self.connection_metrics = ConnectionMetrics(measure_bytes=db_config.get('measure_command_bytes', False))
+        self._connect_lock = threading.Lock()
         
-        uri = f"mongodb+srv://{username}:{password}@{cluster}/?retryWrites=true&w=majority&appName=aifred"
+        # course_id -> {student_id: name}, loaded once per course
+        self._rosters = {}
+        self._roster_lock = threading.Lock()
+        
+        # course_id -> (range, attendance version, roster, AttendanceMatrix)
+        self._matrices = {}
+        
+        self.client = self.db = None
+        self.course_stats = self.photos = self.analytics = self.rollups = self.deletes = None
+        
+        # Local journal and snapshots let a class run while Atlas is unreachable;
+        # app_settings.local_store_path = "" turns them off
+        path = os.getenv('AIFRED_LOCAL_STORE', config.get('app_settings', {}).get('local_store_path', 'data/local_store.db'))
+        self.local = LocalStore(path) if path and self.backend.journal else None
         
         try:
-            self.client = MongoClient(uri, tlsCAFile=certifi.where())
-            self.db = self.client['aifred']
-            
-            # Test connection
-            self.db.command('ping')
-            logger.info("Successfully connected to MongoDB")
-            
-            # Verify collections
-            self.verify_collections()
-            
-            self._setup_indexes()
-            
+            self._connect()
         except Exception as e:
-            logger.error(f"Failed to connect to database: {str(e)}")
+            if self.local is None or not allow_offline:
+                logger.error(f"Failed to connect to database: {str(e)}")
+                raise
+            logger.warning(f"MongoDB unreachable, starting offline from the local store: {str(e)}")
+        
+        if self.local is not None:
+            # Session events are journaled locally and replayed to MongoDB
+            self.event_writer = JournalSyncWorker(
+                self.local, lambda: self.db, reconnect=self._reconnect, on_online=self._came_online
+            )
+            self.event_writer.online = self.db is not None
+            self.event_writer.start()
+        else:
+            # Session events are written behind in batches
+            self.event_writer = EventWriter(self.db)
+        
+    def _connect(self):
+        """Connect and bring the schema up to date; attributes are only set once this succeeds"""
+        client, db = self.backend.connect(self._options, [self.connection_metrics])
+        try:
+            self.db, self.client = db, client
+            self.course_stats = CourseStats(db)
+            self.photos = StudentPhotoStore(db)
+            self.rollups = DailyRollups(db)
+            self.deletes = DeleteJobs(db, self._delete_chunk_size)
+            
+            # One read of the schema version doubles as the connection test;
+            # collections and indexes are only touched when it is out of date
+            start = time.perf_counter()
+            applied = ensure_schema(self)
+            self.startup_ms = (time.perf_counter() - start) * 1000
+        except Exception:
+            self.db = self.client = None
+            client.close()
             raise
-
+        logger.info("Successfully connected to MongoDB")
+        if applied:
+            logger.info(f"Database ready in {self.startup_ms:.0f} ms after migrating to schema v{SCHEMA_VERSION}")
+        else:
+            logger.info(f"Database ready in {self.startup_ms:.0f} ms (schema v{SCHEMA_VERSION}, no DDL)")
+        
+        # Analytics tolerate slightly stale reads, so they may go to a secondary
+        analytics_db = db.with_options(read_preference=self._read_preference)
+        self.analytics = AnalyticsQueries(analytics_db, self.get_course_roster, CourseStats(analytics_db))
+        
+        # Finish deletes a previous run left half done
+        self.deletes.resume()
+        
+    def _reconnect(self):
+        """Called by the sync worker while offline; True once MongoDB answers"""
+        with self._connect_lock:
+            try:
+                if self.db is None:
+                    self._connect()
+                else:
+                    self.db.command('ping')
+                return True
+            except Exception as e:
+                logger.debug(f"Reconnect failed: {str(e)}")
+                return False
+        
+    def _came_online(self):
+        """Rosters loaded from snapshots while offline are reloaded from MongoDB"""
+        with self._roster_lock:
+            self._rosters.clear()
+        
+    @property
+    def online(self):
+        """False while MongoDB is unreachable and the app runs from the local store"""
+        return self.db is not None and getattr(self.event_writer, 'online', True)
+        
     def verify_collections(self):
         """Verify all required collections exist"""
         try:
@@ -47,16 +138,11 @@ class DatabaseManager:
             for collection in required_collections:
                 if collection not in existing:
                     logger.info(f"Creating {collection} collection...")
-                    self.db.create_collection(collection)
+                    if collection in SERIES_COLLECTIONS:
+                        create_series_collection(self.db, collection)
+                    else:
+                        self.db.create_collection(collection)
                     
-                    # Create indexes for the new collection
-                    if collection == 'questions':
-                        self.db.questions.create_index([
-                            ('student_id', 1),
-                            ('course_id', 1),
-                            ('timestamp', -1)
-                        ])
-                        
             logger.info("All required collections verified")
             
         except Exception as e:
@@ -64,60 +150,9 @@ class DatabaseManager:
             raise
 
     def initialize(self):
-        """Initialize the database collections and indexes"""
+        """Re-run every schema migration (collections, indexes, backfills) regardless of the stored version"""
         try:
-            # Create courses collection
-            if 'courses' not in self.db.list_collection_names():
-                self.db.create_collection('courses')
-                self.db.courses.create_index('course_code', unique=True)
-                logger.info("Created courses collection")
-            
-            # Update students collection to include course reference
-            if 'students' not in self.db.list_collection_names():
-                self.db.create_collection('students')
-                self.db.students.create_index([
-                    ('student_id', 1),
-                    ('course_id', 1)
-                ], unique=True)
-                logger.info("Created students collection")
-            
-            if 'attendance' not in self.db.list_collection_names():
-                self.db.create_collection('attendance')
-                self.db.attendance.create_index([('date', 1), ('student_id', 1)])
-                logger.info("Created attendance collection")
-            
-            if 'engagement' not in self.db.list_collection_names():
-                self.db.create_collection('engagement')
-                self.db.engagement.create_index('student_id')
-                logger.info("Created engagement collection")
-                
-            # Add questions collection with proper logging
-            if 'questions' not in self.db.list_collection_names():
-                logger.info("Creating questions collection...")
-                self.db.create_collection('questions')
-                self.db.questions.create_index([
-                    ('student_id', 1),
-                    ('course_id', 1),
-                    ('timestamp', -1)
-                ])
-                logger.info("Successfully created questions collection")
-                
-                # Verify collection creation
-                if 'questions' in self.db.list_collection_names():
-                    logger.info("Verified questions collection exists")
-                else:
-                    logger.error("Failed to create questions collection")
-                
-            # Add hand raises collection
-            if 'hand_raises' not in self.db.list_collection_names():
-                self.db.create_collection('hand_raises')
-                self.db.hand_raises.create_index([
-                    ('student_id', 1),
-                    ('course_id', 1),
-                    ('timestamp', -1)
-                ])
-                logger.info("Created hand raises collection")
-                
+            ensure_schema(self, force=True)
         except Exception as e:
             logger.error(f"Failed to initialize database: {str(e)}")
             raise
@@ -133,34 +168,38 @@ class DatabaseManager:
         return self.db.courses.insert_one(course)
     
     def get_all_courses(self):
-        """Get all courses"""
-        return list(self.db.courses.find())
+        """Get all courses; served from the local snapshot while offline"""
+        if self.online:
+            try:
+                courses = list(self.db.courses.find(LIVE))
+                self._save_snapshot('courses', courses)
+                return courses
+            except Exception as e:
+                if self.local is None:
+                    raise
+                logger.warning(f"Loading courses from the local snapshot: {str(e)}")
+        return self._load_snapshot('courses') or []
     
     def get_course(self, course_id):
         """Get course by ID"""
-        return self.db.courses.find_one({'_id': course_id})
+        if self.online:
+            try:
+                return self.db.courses.find_one({'_id': course_id, **LIVE})
+            except Exception as e:
+                if self.local is None:
+                    raise
+                logger.warning(f"Loading course from the local snapshot: {str(e)}")
+        return next((c for c in self._load_snapshot('courses') or [] if c['_id'] == course_id), None)
     
-    def add_student(self, name, face_embedding, course_id, photo_data):
-        """Add a new student to a specific course"""
+    def add_student(self, name, face_embedding, course_id, photo_data, face_location=None):
+        """
+        Add a new student to a specific course.
+        The photo is stored separately as a face crop around face_location plus a thumbnail.
+        """
         try:
-            # Get all students in this specific course
-            course_students = list(self.db.students.find({'course_id': course_id}))
-            
-            # If there are no students in this course, start with ID 1
-            if not course_students:
-                student_id = 1
-            else:
-                # Find the highest student_id in this course
-                max_id = max(student.get('student_id', 0) for student in course_students)
-                student_id = max_id + 1
-            
-            # Encode photo data with quality parameter
-            encode_params = [cv2.IMWRITE_JPEG_QUALITY, 95]
-            _, buffer = cv2.imencode('.jpg', photo_data, encode_params)
-            if buffer is None or len(buffer) == 0:
-                raise ValueError("Failed to encode photo")
-            
-            photo_bytes = buffer.tobytes()
+            # Allocate the ID atomically, then encode the face crop and thumbnail
+            student_id = self.reserve_student_ids(course_id)[0]
+            photo = self.photos.document(course_id, student_id, photo_data, face_location)
             
             # Create the student document
             student = {
@@ -168,22 +207,13 @@ class DatabaseManager:
                 'course_id': course_id,
                 'name': name,
                 'face_embedding': face_embedding.tobytes(),
-                'photo': photo_bytes,
                 'created_at': datetime.utcnow()
             }
             
-            # Create a compound index for student_id and course_id if it doesn't exist
-            try:
-                self.db.students.create_index(
-                    [('student_id', 1), ('course_id', 1)],
-                    unique=True,
-                    name='student_course_unique'
-                )
-            except Exception as e:
-                logger.debug(f"Index already exists: {str(e)}")
-            
             # Insert the student document
             result = self.db.students.insert_one(student)
+            self.photos.put(photo)
+            self._update_roster(course_id, student_id, name)
             logger.info(f"Successfully added student {name} with ID {student_id} to course {course_id}")
             return result
             
@@ -191,20 +221,150 @@ class DatabaseManager:
             logger.error(f"Error adding student: {str(e)}")
             raise
     
+    def add_students(self, course_id, students):
+        """
+        Enroll several students at once; each entry is a dict with name,
+        face_embedding, photo_data and optionally face_location.
+        IDs are reserved as one block. Returns the new student IDs.
+        """
+        if not students:
+            return []
+        try:
+            student_ids = self.reserve_student_ids(course_id, len(students))
+            now = datetime.utcnow()
+            documents, photos = [], []
+            for student_id, entry in zip(student_ids, students):
+                documents.append({
+                    'student_id': student_id,
+                    'course_id': course_id,
+                    'name': entry['name'],
+                    'face_embedding': entry['face_embedding'].tobytes(),
+                    'created_at': now
+                })
+                photos.append(self.photos.document(
+                    course_id, student_id, entry['photo_data'], entry.get('face_location')
+                ))
+            
+            self.db.students.insert_many(documents, ordered=False)
+            self.photos.collection.insert_many(photos, ordered=False)
+            for document in documents:
+                self._update_roster(course_id, document['student_id'], document['name'])
+            logger.info(f"Enrolled {len(documents)} students in course {course_id}")
+            return student_ids
+            
+        except Exception as e:
+            logger.error(f"Error enrolling students: {str(e)}")
+            raise
+    
+    def reserve_student_ids(self, course_id, count=1):
+        """Atomically reserve `count` consecutive student IDs in a course"""
+        key = {'_id': f"student_id:{course_id}"}
+        counter = self.db.counters.find_one_and_update(
+            key, {'$inc': {'seq': count}}, return_document=ReturnDocument.AFTER
+        )
+        if counter is None:
+            # First allocation for this course: start after any existing students
+            self._seed_student_counter(course_id)
+            counter = self.db.counters.find_one_and_update(
+                key, {'$inc': {'seq': count}}, return_document=ReturnDocument.AFTER
+            )
+        last = counter['seq']
+        return list(range(last - count + 1, last + 1))
+    
+    def _seed_student_counter(self, course_id, highest=None):
+        """Make sure a course's counter is at least its highest existing student_id"""
+        if highest is None:
+            row = next(self.db.students.aggregate([
+                {'$match': {'course_id': course_id}},
+                {'$group': {'_id': None, 'highest': {'$max': '$student_id'}}}
+            ]), None)
+            highest = row['highest'] if row else 0
+        # $max never moves a counter backwards, so seeding is safe to repeat
+        try:
+            self.db.counters.update_one(
+                {'_id': f"student_id:{course_id}"},
+                {'$max': {'seq': highest or 0}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Seeded concurrently by another writer
+    
+    def seed_student_counters(self):
+        """Seed every course's student_id counter from existing students; returns the number seeded"""
+        seeded = 0
+        for row in self.db.students.aggregate([
+            {'$group': {'_id': '$course_id', 'highest': {'$max': '$student_id'}}}
+        ]):
+            self._seed_student_counter(row['_id'], row['highest'])
+            seeded += 1
+        logger.info(f"Seeded student_id counters for {seeded} courses")
+        return seeded
+    
     def get_course_students(self, course_id):
-        """Get all students in a course"""
+        """Get full student documents for a course, including photos and embeddings"""
         try:
-            return list(self.db.students.find({'course_id': course_id}))
+            return list(self.db.students.find({'course_id': course_id, **LIVE}))
         except Exception as e:
             logger.error(f"Error getting course students: {str(e)}")
             return []
         
+    def get_course_student_list(self, course_id):
+        """Get a course's students as {'student_id', 'name'} dicts, from the in-memory roster"""
+        try:
+            return [{'student_id': student_id, 'name': name} for student_id, name in self._roster(course_id).items()]
+        except Exception as e:
+            logger.error(f"Error getting course student list: {str(e)}")
+            return []
+        
+    def get_course_student_embeddings(self, course_id):
+        """Get student_id, name and face_embedding for every student in a course"""
+        snapshot = f"embeddings:{course_id}"
+        if self.online:
+            try:
+                students = list(self.db.students.find(
+                    {'course_id': course_id, **LIVE},
+                    {'_id': 0, 'student_id': 1, 'name': 1, 'face_embedding': 1}
+                ))
+                self._save_snapshot(snapshot, students)
+                return students
+            except Exception as e:
+                logger.error(f"Error getting course face embeddings: {str(e)}")
+        return self._load_snapshot(snapshot) or []
+        
+    def get_student_photo(self, student_id, course_id):
+        """Get one student's JPEG face crop, or the inline photo of a not yet migrated student"""
+        try:
+            photo = self.photos.get_photo(course_id, student_id)
+            if photo is not None:
+                return photo
+            student = self.db.students.find_one(
+                {'student_id': student_id, 'course_id': course_id},
+                {'_id': 0, 'photo': 1}
+            )
+            return student.get('photo') if student else None
+        except Exception as e:
+            logger.error(f"Error getting student photo: {str(e)}")
+            return None
+        
+    def get_student_thumbnail(self, student_id, course_id):
+        """Get one student's small pre-encoded JPEG thumbnail, or None"""
+        try:
+            return self.photos.get_thumbnail(course_id, student_id)
+        except Exception as e:
+            logger.error(f"Error getting student thumbnail: {str(e)}")
+            return None
+        
     def get_student(self, student_id):
         """Retrieve a student by ID"""
-        return self.db.students.find_one({'_id': student_id})
+        return self.db.students.find_one({'_id': student_id, **LIVE})
         
-    def mark_attendance(self, student_id, date_param, status='Present', course_id=None):
-        """Mark attendance for a student"""
+    def mark_attendance(self, student_id, date_param, status='Present', course_id=None, student_name=None,
+                        background=False):
+        """
+        Mark attendance for a student.
+        With background=True the record is queued as an idempotent upsert and
+        this returns immediately.
+        """
         try:
             # Convert date to datetime at start of day if it's a date object
             if isinstance(date_param, date):
@@ -212,31 +372,45 @@ class DatabaseManager:
             else:
                 date_start = date_param.replace(hour=0, minute=0, second=0, microsecond=0)
             
-            # Check if attendance already exists for today
-            existing = self.db.attendance.find_one({
-                'student_id': student_id,
-                'course_id': course_id,
-                'date': date_start
-            })
+            if student_name is None:
+                student_name = self.get_student_name(student_id, course_id)
+                if student_name is None:
+                    raise Exception("Student not found")
             
-            if existing:
-                return existing
+            # One idempotent upsert: the unique (course_id, student_id, date)
+            # index makes repeats and concurrent writers no-ops
+            key = {'course_id': course_id, 'student_id': student_id, 'date': date_start}
+            operation = {'$setOnInsert': {
+                'status': status,
+                'timestamp': datetime.utcnow(),
+                'student_name': student_name
+            }}
             
-            # Get student name
-            student = self.get_student_by_id(student_id)
-            if not student:
-                raise Exception("Student not found")
+            # Days present are a set on the stats document, so repeats are no-ops too
+            stats = []
+            if status == 'Present':
+                stats = [CourseStats.update_operation(course_id, student_id, day=date_start)]
             
-            # Create attendance record
-            attendance = {
-                'student_id': student_id,
-                'course_id': course_id,
-                'date': date_start,  # Using datetime object
-                'status': status,
-                'timestamp': datetime.utcnow(),  # Changed from datetime.datetime.utcnow()
-                'student_name': student.get('name', 'Unknown')
-            }
-            return self.db.attendance.insert_one(attendance)
+            # Offline, every event goes to the local journal
+            if background or not self.online:
+                self.event_writer.enqueue(
+                    'attendance',
+                    UpdateOne(key, operation, upsert=True),
+                    key=(course_id, student_id, date_start),
+                    followups=[('course_student_stats', op) for op in stats] + [('counters', version_operation(course_id))]
+                )
+                return None
+            
+            try:
+                result = self.db.attendance.update_one(key, operation, upsert=True)
+            except DuplicateKeyError:
+                # Lost an upsert race; the record exists
+                result = self.db.attendance.update_one(key, operation)
+            if stats:
+                self.course_stats.collection.bulk_write(stats)
+            if result.upserted_id is not None:
+                self.db.counters.bulk_write([version_operation(course_id)])
+            return result
             
         except Exception as e:
             logger.error(f"Error marking attendance: {str(e)}")
@@ -253,7 +427,7 @@ class DatabaseManager:
         return self.db.engagement.insert_one(engagement)
         
     def get_course_by_code(self, course_code):
-        """Get course by course code"""
+        """Get course by course code; a course being deleted keeps its code until its delete job ends"""
         return self.db.courses.find_one({'course_code': course_code})
         
     def update_course(self, course_id, course_name=None, course_code=None, description=None):
@@ -263,29 +437,42 @@ class DatabaseManager:
             update_data['course_name'] = course_name
         if course_code:
             update_data['course_code'] = course_code
-        if description:
+        if description is not None:
             update_data['description'] = description
         
         if update_data:
+            # Relevance verdicts were made against the old topic
+            if 'description' in update_data:
+                current = self.db.courses.find_one({'_id': course_id}, {'description': 1})
+                if current and current.get('description', '') != description:
+                    self.clear_relevance_cache(course_id)
+            
             return self.db.courses.update_one(
                 {'_id': course_id},
                 {'$set': update_data}
             )
         
-    def delete_course(self, course_id):
-        """Delete course and its students"""
-        # Start a session for atomic operations
-        with self.client.start_session() as session:
-            with session.start_transaction():
-                # Delete all students in the course
-                self.db.students.delete_many({'course_id': course_id})
-                # Delete the course
-                result = self.db.courses.delete_one({'_id': course_id})
-                return result 
+    def delete_course(self, course_id, background=False, on_progress=None, on_done=None):
+        """
+        Delete a course, its students and all their records. The course is
+        hidden at once, then a delete job (src/database/cascade.py) removes
+        its data in chunks, on a background thread with background=True.
+        Returns the tombstone's UpdateResult.
+        """
+        try:
+            result, job = self.deletes.begin(course_id)
+            with self._roster_lock:
+                self._rosters.pop(course_id, None)
+                self._matrices.pop(course_id, None)
+            self._run_delete_job(job, background, on_progress, on_done)
+            return result
+        except Exception as e:
+            logger.error(f"Error deleting course: {str(e)}")
+            raise
         
     def get_course_face_embeddings(self, course_id):
         """Get face embeddings for all students in a course"""
-        students = self.get_course_students(course_id)
+        students = self.get_course_student_embeddings(course_id)
         face_data = {}
         for student in students:
             # Convert bytes back to numpy array
@@ -304,72 +491,76 @@ class DatabaseManager:
             'date': today
         })) 
         
-    def remove_student(self, student_id, course_id):
-        """Remove a student and all their associated data from a course"""
-        with self.client.start_session() as session:
-            with session.start_transaction():
-                try:
-                    # Remove student record
-                    result = self.db.students.delete_one({
-                        'student_id': student_id,
-                        'course_id': course_id
-                    })
-                    
-                    # Remove associated attendance records
-                    self.db.attendance.delete_many({
-                        'student_id': student_id,
-                        'course_id': course_id
-                    })
-                    
-                    # Remove associated engagement records
-                    self.db.engagement.delete_many({
-                        'student_id': student_id
-                    })
-                    
-                    # Remove associated questions
-                    self.db.questions.delete_many({
-                        'student_id': student_id,
-                        'course_id': course_id
-                    })
-                    
-                    # Remove associated hand raises
-                    self.db.hand_raises.delete_many({
-                        'student_id': student_id,
-                        'course_id': course_id
-                    })
-                    
-                    return result
-                    
-                except Exception as e:
-                    logger.error(f"Error removing student and associated data: {str(e)}")
-                    session.abort_transaction()
-                    raise
+    def remove_student(self, student_id, course_id, background=False, on_progress=None, on_done=None):
+        """
+        Remove a student and all their associated data from a course. The
+        student is hidden at once, then a delete job removes their records in
+        chunks, on a background thread with background=True; on_progress(deleted, total)
+        and on_done(job) report on it. Returns the tombstone's UpdateResult.
+        """
+        try:
+            result, job = self.deletes.begin(course_id, student_id)
+            self._update_roster(course_id, student_id)
+            self._run_delete_job(job, background, on_progress, on_done)
+            return result
+        except Exception as e:
+            logger.error(f"Error removing student and associated data: {str(e)}")
+            raise
         
-    def log_hand_raise(self, student_id, course_id):
-        """Log a hand raise event"""
-        hand_raise = {
-            'student_id': student_id,
-            'course_id': course_id,
-            'timestamp': datetime.utcnow()
-        }
-        return self.db.hand_raises.insert_one(hand_raise)
+    def _run_delete_job(self, job, background, on_progress, on_done):
+        if background:
+            self.deletes.start(job['_id'], on_progress, on_done)
+            return
+        job = self.deletes.run(job['_id'], on_progress)
+        if on_done:
+            on_done(job)
         
-    def log_question(self, student_id, course_id, question_text, is_relevant, reason=""):
-        """Log a question to the database"""
+    def log_hand_raise(self, student_id, course_id, background=False):
+        """Log a hand raise event; with background=True it is queued and its _id returned"""
+        hand_raise = event_document(course_id, student_id, _id=ObjectId(), timestamp=datetime.utcnow())
+        stats = CourseStats.update_operation(course_id, student_id, hand_raises=1)
+        if background or not self.online:
+            self.event_writer.enqueue(
+                'hand_raises', InsertOne(hand_raise), key=hand_raise['_id'],
+                followups=[('course_student_stats', stats)]
+            )
+            return hand_raise['_id']
+        result = self.db.hand_raises.insert_one(hand_raise)
+        self.course_stats.collection.bulk_write([stats])
+        return result
+        
+    def log_question(self, student_id, course_id, question_text, is_relevant, reason="", relevance_source="llm",
+                     audio=None, background=False, on_written=None):
+        """
+        Log a question to the database, with a reference to its archived audio if any.
+        With background=True the question is queued and its _id returned at once;
+        on_written(success) is called once it has been stored in MongoDB.
+        """
         try:
-            # Create questions collection if it doesn't exist
-            if 'questions' not in self.db.list_collection_names():
-                self.db.create_collection('questions')
-            
             # Insert question document
-            result = self.db.questions.insert_one({
-                'student_id': student_id,
-                'course_id': course_id,
-                'question_text': question_text,
-                'is_relevant': is_relevant,
-                'reason': reason,  # Add reason field
-                'timestamp': datetime.now()
-            })
+            question = event_document(
+                course_id, student_id,
+                _id=ObjectId(),
+                question_text=question_text,
+                is_relevant=is_relevant,
+                reason=reason,
+                relevance_source=relevance_source,
+                timestamp=datetime.now()
+            )
+            if audio:
+                question['audio'] = audio
+            
+            stats = CourseStats.question_operation(course_id, student_id, is_relevant)
+            # Offline, every event goes to the local journal
+            if background or not self.online:
+                self.event_writer.enqueue(
+                    'questions', InsertOne(question), key=question['_id'], on_written=on_written,
+                    followups=[('course_student_stats', stats)]
+                )
+                return question['_id']
+            
+            result = self.db.questions.insert_one(question)
+            self.course_stats.collection.bulk_write([stats])
             
             return result
             
@@ -381,16 +572,30 @@ class DatabaseManager:
         """Get all questions asked by a student in a course"""
         try:
             logger.info(f"Fetching questions for student {student_id} in course {course_id}")
-            questions = list(self.db.questions.find({
-                'student_id': student_id,
-                'course_id': course_id
-            }).sort('timestamp', -1))
+            questions = [
+                unpack(question)
+                for question in self.db.questions.find(event_filter(course_id, student_id)).sort('timestamp', -1)
+            ]
             logger.info(f"Found {len(questions)} questions")
             return questions
         except Exception as e:
             logger.error(f"Error fetching student questions: {str(e)}")
             return []
         
+    def get_labelled_questions(self, course_id, limit=5000):
+        """Get question texts and verdicts for a course, excluding locally classified ones"""
+        try:
+            return list(self.db.questions.find(
+                {
+                    **event_filter(course_id),
+                    'relevance_source': {'$ne': 'local'}
+                },
+                {'question_text': 1, 'is_relevant': 1, '_id': 0}
+            ).sort('timestamp', -1).limit(limit))
+        except Exception as e:
+            logger.error(f"Error getting labelled questions: {str(e)}")
+            return []
+        
     def verify_questions_collection(self):
         """Verify the questions collection exists and is accessible"""
         try:
@@ -418,22 +623,21 @@ class DatabaseManager:
         
     def get_all_students(self):
         """Get all students across all courses"""
-        return list(self.db.students.find())
+        return list(self.db.students.find(LIVE))
         
     def get_course_questions(self, course_id):
         """Get all questions for a course"""
         try:
-            # Get all registered students in the course first
-            registered_students = {
-                student['student_id']: student['name']
-                for student in self.db.students.find({'course_id': course_id})
-            }
+            # Registered students' names from the cached roster, not their documents
+            registered_students = self._roster(course_id)
             
             # Get questions only for registered students
-            questions = list(self.db.questions.find({
-                'course_id': course_id,
-                'student_id': {'$in': list(registered_students.keys())}
-            }).sort('timestamp', -1))
+            questions = [
+                unpack(question)
+                for question in self.db.questions.find(
+                    event_filter(course_id, list(registered_students))
+                ).sort('timestamp', -1)
+            ]
             
             # Add student names to questions
             for question in questions:
@@ -445,35 +649,99 @@ class DatabaseManager:
             logger.error(f"Error getting course questions: {str(e)}")
             return []
         
+    def count_course_questions(self, course_id):
+        """Count all questions logged for a course"""
+        return self.db.questions.count_documents(event_filter(course_id))
+        
+    def iter_course_questions(self, course_id, batch_size=200):
+        """Stream a course's question texts with a cursor instead of loading them all"""
+        cursor = self.db.questions.find(
+            event_filter(course_id),
+            {'question_text': 1, 'meta': 1, 'is_relevant': 1}
+        ).batch_size(batch_size)
+        return (unpack(question) for question in cursor)
+        
+    def update_question_verdicts(self, verdicts):
+        """
+        Write (question, is_relevant, reason, source) verdicts in one unordered bulk write,
+        where question is the document from iter_course_questions
+        """
+        if not verdicts:
+            return None
+        now = datetime.now()
+        # Time-series collections only take multi-document updates
+        result = self.db.questions.bulk_write([
+            UpdateMany(
+                event_key(question),
+                {'$set': {
+                    'is_relevant': is_relevant,
+                    'reason': reason,
+                    'relevance_source': source,
+                    'reclassified_at': now
+                }}
+            )
+            for question, is_relevant, reason, source in verdicts
+        ], ordered=False)
+        self._apply_verdict_changes([
+            (question, is_relevant) for question, is_relevant, _, _ in verdicts
+        ])
+        return result
+        
+    def _apply_verdict_changes(self, changes):
+        """Move a student's counter between relevant and irrelevant for each flipped verdict"""
+        operations = []
+        for question, is_relevant in changes:
+            was_relevant = question.get('is_relevant') is not False
+            if question.get('student_id') is None or was_relevant == bool(is_relevant):
+                continue
+            delta = 1 if is_relevant else -1
+            operations.append(CourseStats.update_operation(
+                question['course_id'], question['student_id'], relevant=delta, irrelevant=-delta
+            ))
+        if operations:
+            self.course_stats.collection.bulk_write(operations, ordered=False)
+        
     def get_student_attendance_rate(self, student_id, course_id):
-        """Calculate student's attendance rate"""
+        """Calculate a student's attendance rate over the course's sessions"""
         try:
-            # Get all attendance records for the student
-            total_records = self.db.attendance.count_documents({
-                'student_id': student_id,
-                'course_id': course_id
-            })
-            
-            # Get present records
-            present_records = self.db.attendance.count_documents({
-                'student_id': student_id,
-                'course_id': course_id,
-                'status': 'Present'
-            })
-            
-            # Calculate rate
-            rate = (present_records / total_records * 100) if total_records > 0 else 0
-            
+            matrix = self.get_attendance_matrix(course_id)
+            row = matrix.index(student_id)
+            if row is None or not len(matrix.dates):
+                return {'rate': 0, 'total_days': 0, 'days_present': 0}
             return {
-                'rate': rate,
-                'total_days': total_records,
-                'days_present': present_records
+                'rate': float(matrix.rates()[row]),
+                'total_days': len(matrix.dates),
+                'days_present': int(matrix.present[row].sum())
             }
             
         except Exception as e:
             logger.error(f"Error calculating attendance rate: {str(e)}")
             return {'rate': 0, 'total_days': 0, 'days_present': 0}
         
+    def get_attendance_matrix(self, course_id, start=None, end=None):
+        """
+        Attendance of every student in a course at every session between the
+        days start and end, as an AttendanceMatrix, from one aggregation.
+        The last matrix per course is reused until its attendance changes.
+        """
+        roster = tuple(sorted(self._roster(course_id)))
+        if not self.online:
+            return AttendanceMatrix.build(roster, [])
+        try:
+            version = read_version(self.db, course_id)
+            with self._roster_lock:
+                cached = self._matrices.get(course_id)
+            if cached is not None and cached[:3] == ((start, end), version, roster):
+                return cached[3]
+            sessions = self.db.attendance.aggregate(matrix_pipeline(course_id, start, end))
+            matrix = AttendanceMatrix.build(roster, sessions)
+            with self._roster_lock:
+                self._matrices[course_id] = ((start, end), version, roster, matrix)
+            return matrix
+        except Exception as e:
+            logger.error(f"Error getting attendance matrix: {str(e)}")
+            return AttendanceMatrix.build(roster, [])
+        
     def update_student_name(self, student_id, course_id, new_name):
         """Update a student's name in the database"""
         try:
@@ -490,13 +758,11 @@ class DatabaseManager:
             
             if result.modified_count == 0:
                 raise Exception("No student found with the given ID")
+            self._update_roster(course_id, student_id, new_name)
             
             # Update name in questions collection
             self.db.questions.update_many(
-                {
-                    'student_id': student_id,
-                    'course_id': course_id
-                },
+                event_filter(course_id, student_id),
                 {
                     '$set': {'student_name': new_name}
                 }
@@ -521,6 +787,8 @@ class DatabaseManager:
         
     def get_attendance_records(self, course_id, date_param):
         """Get attendance records for a specific course and date"""
+        if not self.online:
+            return []
         try:
             # Convert date to datetime at start of day if it's a date object
             if isinstance(date_param, date):
@@ -541,10 +809,13 @@ class DatabaseManager:
             logger.error(f"Error getting attendance records: {str(e)}")
             return []
         
-    def get_student_by_id(self, student_id):
-        """Get student by ID"""
+    def get_student_by_id(self, student_id, course_id=None):
+        """Get student by ID; student IDs are only unique within a course, so pass course_id"""
         try:
-            return self.db.students.find_one({'student_id': student_id})
+            query = {'student_id': student_id, **LIVE}
+            if course_id is not None:
+                query['course_id'] = course_id
+            return self.db.students.find_one(query)
         except Exception as e:
             logger.error(f"Error getting student by ID: {str(e)}")
             return None
@@ -552,26 +823,206 @@ class DatabaseManager:
     def get_student_hand_raises(self, student_id, course_id):
         """Get the number of hand raises for a student in a course"""
         try:
-            return self.db.hand_raises.count_documents({
-                'student_id': student_id,
-                'course_id': course_id
-            })
+            # One counters document instead of counting the student's events
+            stats = self.course_stats.collection.find_one(
+                {'course_id': course_id, 'student_id': student_id}, {'hand_raises': 1}
+            )
+            if stats is not None:
+                return stats.get('hand_raises', 0)
+            return self.db.hand_raises.count_documents(event_filter(course_id, student_id))
         except Exception as e:
             logger.error(f"Error getting hand raises count: {str(e)}")
             return 0
         
-    def _setup_indexes(self):
-        """Setup proper indexes for collections"""
+    def get_relevance_cache_entries(self, course_id, topic_hash, limit=2048):
+        """Get cached relevance verdicts for a course topic, most recent first"""
         try:
-            # Drop the old single-field index if it exists
-            self.db.students.drop_index('student_id_1')
-        except Exception:
-            pass  # Index might not exist
+            return list(self.db.relevance_cache.find({
+                'course_id': course_id,
+                'topic_hash': topic_hash
+            }).sort('created_at', -1).limit(limit))
+        except Exception as e:
+            logger.error(f"Error getting relevance cache entries: {str(e)}")
+            return []
+        
+    def save_relevance_cache_entry(self, entry):
+        """Persist a cached relevance verdict"""
+        return self.db.relevance_cache.replace_one({'_id': entry['_id']}, entry, upsert=True)
         
-        # Create the new compound index
-        self.db.students.create_index(
-            [('student_id', 1), ('course_id', 1)],
-            unique=True,
-            name='student_course_unique'
+    def clear_relevance_cache(self, course_id):
+        """Invalidate all cached relevance verdicts for a course"""
+        try:
+            result = self.db.relevance_cache.delete_many({'course_id': course_id})
+            logger.info(f"Cleared {result.deleted_count} cached relevance verdicts for course {course_id}")
+            return result
+        except Exception as e:
+            logger.error(f"Error clearing relevance cache: {str(e)}")
+            return None
+        
+    def get_questions_for_reanalysis(self, after_id=None, limit=32, course_id=None):
+        """Get questions with archived audio in _id order, starting after `after_id`"""
+        query = {'audio.key': {'$exists': True}}
+        if after_id is not None:
+            query['_id'] = {'$gt': after_id}
+        if course_id is not None:
+            query.update(event_filter(course_id))
+        try:
+            return [unpack(question) for question in self.db.questions.find(
+                query,
+                {'meta': 1, 'question_text': 1, 'is_relevant': 1, 'reason': 1, 'audio': 1}
+            ).sort('_id', 1).limit(limit)]
+        except Exception as e:
+            logger.error(f"Error getting questions for reanalysis: {str(e)}")
+            raise
+        
+    def save_question_reanalysis(self, results):
+        """
+        Write re-transcribed and reclassified questions in one unordered bulk write.
+        The previous transcript and verdict are kept in the question's history.
+        """
+        if not results:
+            return None
+        now = datetime.now()
+        operations = [
+            UpdateMany(
+                event_key(result),
+                {
+                    '$set': {
+                        'question_text': result['question_text'],
+                        'is_relevant': result['is_relevant'],
+                        'reason': result['reason'],
+                        'relevance_source': result['relevance_source'],
+                        'reanalyzed_at': now
+                    },
+                    '$push': {'history': result['previous']}
+                }
+            )
+            for result in results
+        ]
+        written = self.db.questions.bulk_write(operations, ordered=False)
+        self._apply_verdict_changes([
+            ({**result['previous'], 'course_id': result.get('course_id'), 'student_id': result.get('student_id')},
+             result['is_relevant'])
+            for result in results
+        ])
+        return written
+        
+    def get_reanalysis_progress(self, job_id):
+        """Get the saved progress of a re-analysis job"""
+        return self.db.reanalysis_jobs.find_one({'_id': job_id})
+        
+    def save_reanalysis_progress(self, job_id, progress):
+        """Persist a re-analysis job's checkpoint"""
+        return self.db.reanalysis_jobs.update_one(
+            {'_id': job_id},
+            {'$set': {**progress, 'updated_at': datetime.now()}},
+            upsert=True
         )
+        
+    def flush_events(self, timeout=10.0):
+        """Wait until all queued session events are written; False if some are still pending"""
+        return self.event_writer.flush(timeout)
+        
+    def event_stats(self):
+        """Write-behind queue depth, flush latency and counters"""
+        return self.event_writer.stats()
+        
+    def connection_stats(self):
+        """Pool checkouts, checkout wait time, commands and bytes on the wire"""
+        return self.connection_metrics.snapshot()
+        
+    def close(self):
+        """Drain queued events and close the connection"""
+        self.event_writer.close()
+        if self.client is not None:
+            logger.info(f"Connection stats: {self.connection_stats()}")
+            self.client.close()
+        if self.local is not None:
+            self.local.close()
+        
+    def _save_snapshot(self, name, items):
+        if self.local is None:
+            return
+        try:
+            self.local.save_snapshot(name, items)
+        except Exception as e:
+            logger.warning(f"Could not save local snapshot {name}: {str(e)}")
+        
+    def _load_snapshot(self, name):
+        if self.local is None:
+            return None
+        try:
+            return self.local.load_snapshot(name)
+        except Exception as e:
+            logger.warning(f"Could not load local snapshot {name}: {str(e)}")
+            return None
+        
+    def get_course_roster(self, course_id):
+        """In-memory {student_id: name} roster of a course, loaded once"""
+        return dict(self._roster(course_id))
+        
+    def _roster(self, course_id):
+        with self._roster_lock:
+            roster = self._rosters.get(course_id)
+        if roster is None:
+            roster = self._load_roster(course_id)
+            if roster is None:
+                # Offline with no snapshot; don't cache the empty roster
+                return {}
+            with self._roster_lock:
+                roster = self._rosters.setdefault(course_id, roster)
+        return roster
+        
+    def _load_roster(self, course_id):
+        """Roster from MongoDB (saved as a local snapshot), or from the snapshot while offline"""
+        snapshot = f"roster:{course_id}"
+        if self.online:
+            try:
+                roster = {
+                    student['student_id']: student.get('name', 'Unknown')
+                    for student in self.db.students.find(
+                        {'course_id': course_id, **LIVE}, {'student_id': 1, 'name': 1, '_id': 0}
+                    )
+                }
+                self._save_snapshot(snapshot, [[student_id, name] for student_id, name in roster.items()])
+                return roster
+            except Exception as e:
+                if self.local is None:
+                    raise
+                logger.warning(f"Loading roster from the local snapshot: {str(e)}")
+        saved = self._load_snapshot(snapshot)
+        return {student_id: name for student_id, name in saved} if saved is not None else None
+        
+    def get_student_name(self, student_id, course_id):
+        """Resolve a student's name from the in-memory course roster"""
+        return self._roster(course_id).get(student_id)
+        
+    def get_course_analytics(self, course_id, top_k=3):
+        """Question counts, top students and hand raises for a course in two aggregations"""
+        if not self.online or self.analytics is None:
+            return AnalyticsQueries.empty_summary(len(self._roster(course_id)))
+        return self.analytics.course_summary(course_id, top_k)
+        
+    def get_course_trends(self, course_id, weeks=8, student_id=None):
+        """Weekly engagement totals for the last `weeks` weeks, read from the daily rollups"""
+        if not self.online or self.rollups is None:
+            return []
+        try:
+            return self.rollups.weekly_trend(course_id, weeks, student_id)
+        except Exception as e:
+            logger.error(f"Error getting course trends: {str(e)}")
+            return []
+        
+    def _update_roster(self, course_id, student_id, name=None):
+        """Keep a loaded roster in step with a student change; name=None removes the student"""
+        with self._roster_lock:
+            roster = self._rosters.get(course_id)
+            if roster is None:
+                return
+            if name is None:
+                roster.pop(student_id, None)
+            else:
+                roster[student_id] = name
+            saved = [[sid, student_name] for sid, student_name in roster.items()]
+        self._save_snapshot(f"roster:{course_id}", saved)
         
\ No newline at end of file
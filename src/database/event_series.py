@@ -0,0 +1,257 @@
+"""
+Hand raises and questions as time-series collections.
+
+Each event keeps its time in `timestamp` and the series it belongs to in
+`meta`: {'course_id', 'student_id'}. The server stores the events of one
+series together in compressed buckets, and the secondary index on
+(meta.course_id, meta.student_id, timestamp) holds one key per bucket
+instead of one per event, so storage and index size grow far slower than
+with a document and an index key per event.
+
+Servers below featureCompatibilityVersion 7.0 get an ordinary collection
+with the same document shape and indexes, so every query is the same on
+both. MongoDB 5.0 and 6.x do have time-series collections, but reject the
+updates and deletes filtering on fields outside `meta` (verdicts, student
+names, cascade deletes) that the app issues.
+
+Time-series collections restrict writes, and the callers here follow:
+- _id is not unique, so re-inserting an event stores a second copy:
+  writers that may repeat an insert look its _id up first (stored_ids);
+- updates must be multi-document (update_many / UpdateMany) and cannot upsert;
+- writes cannot run inside a transaction;
+- the collection cannot be renamed.
+
+Readers get course_id and student_id back at the top level with unpack().
+"""
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import InsertOne
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
+
+from src.utils.logger import logger
+
+SERIES_COLLECTIONS = ('hand_raises', 'questions')
+TIME_FIELD = 'timestamp'
+META_FIELD = 'meta'
+META_KEYS = ('course_id', 'student_id')
+# A student raises a hand or asks a few times an hour at most
+GRANULARITY = 'hours'
+# Oldest featureCompatibilityVersion whose time-series collections take every write the app makes
+SERIES_MIN_VERSION = (7, 0)
+MIGRATION_BATCH = 1000
+# A migrating instance renews its lease every batch; a lease not renewed for this long is taken over
+LEASE_SECONDS = 60
+LEASE_POLL = 1.0
+
+
+class LeaseLost(Exception):
+    """Another instance took over a migration whose lease expired"""
+
+
+def series_options():
+    return {'timeField': TIME_FIELD, 'metaField': META_FIELD, 'granularity': GRANULARITY}
+
+
+def event_document(course_id, student_id, **fields):
+    """A new event document; fields must include the timestamp"""
+    return {**fields, META_FIELD: {'course_id': course_id, 'student_id': student_id}}
+
+
+def pack(doc):
+    """Move top-level course_id/student_id into meta; documents already packed are returned as is"""
+    if META_FIELD in doc:
+        return doc
+    meta = {key: doc.pop(key) for key in META_KEYS if key in doc}
+    doc[META_FIELD] = meta
+    return doc
+
+
+def unpack(doc):
+    """Lift meta.course_id/student_id back to the top level of a stored event"""
+    meta = doc.pop(META_FIELD, None) or {}
+    doc.update(meta)
+    return doc
+
+
+def event_filter(course_id=None, student_id=None):
+    """Filter on an event's series; student_id may be a list of IDs"""
+    query = {}
+    if course_id is not None:
+        query[f'{META_FIELD}.course_id'] = course_id
+    if isinstance(student_id, (list, tuple, set)):
+        query[f'{META_FIELD}.student_id'] = {'$in': list(student_id)}
+    elif student_id is not None:
+        query[f'{META_FIELD}.student_id'] = student_id
+    return query
+
+
+def event_key(event):
+    """
+    Filter on one unpacked event. No index covers an event's _id in a
+    time-series collection, so its series leads the filter for the index.
+    """
+    return {**event_filter(event.get('course_id'), event.get('student_id')), '_id': event['_id']}
+
+
+def is_time_series(db, name):
+    return 'timeseries' in db[name].options()
+
+
+def stored_ids(collection, events):
+    """_ids of the packed `events` already in `collection`, looked up through the course index"""
+    events = [doc for doc in events if '_id' in doc]
+    if not events:
+        return set()
+    course_ids = list({doc[META_FIELD].get('course_id') for doc in events})
+    return {
+        doc['_id'] for doc in collection.find(
+            {f'{META_FIELD}.course_id': {'$in': course_ids}, '_id': {'$in': [doc['_id'] for doc in events]}},
+            {'_id': 1}
+        )
+    }
+
+
+def stored_inserts(collection, operations):
+    """Indexes of the event inserts among `operations` whose _id `collection` already holds"""
+    inserts = {
+        index: operation._doc for index, operation in enumerate(operations)
+        if isinstance(operation, InsertOne) and META_FIELD in operation._doc and '_id' in operation._doc
+    }
+    stored = stored_ids(collection, inserts.values())
+    return {index for index, doc in inserts.items() if doc['_id'] in stored}
+
+
+def feature_version(db):
+    """The server's featureCompatibilityVersion as (major, minor), or its binary version where that is hidden"""
+    admin = db.client.admin
+    try:
+        version = admin.command({'getParameter': 1, 'featureCompatibilityVersion': 1})
+        version = version['featureCompatibilityVersion']['version']
+    except (OperationFailure, KeyError, TypeError):
+        # Shared Atlas tiers do not allow getParameter
+        version = admin.command('buildInfo').get('version', '0')
+    return tuple(int(part) for part in (version.split('.') + ['0'])[:2])
+
+
+def create_series_collection(db, name):
+    """Create `name` as a time-series collection, or as an ordinary one where the server's are too limited"""
+    version = feature_version(db)
+    if version < SERIES_MIN_VERSION:
+        logger.warning(f"featureCompatibilityVersion {'.'.join(map(str, version))} is below "
+                       f"{'.'.join(map(str, SERIES_MIN_VERSION))}, creating {name} as a regular collection")
+        try:
+            db.create_collection(name)
+        except CollectionInvalid:
+            pass
+        return
+    try:
+        db.create_collection(name, timeseries=series_options())
+        logger.info(f"Created time-series collection {name}")
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        logger.warning(f"Time-series collections unavailable, creating {name} as a regular collection: {str(e)}")
+        try:
+            db.create_collection(name)
+        except CollectionInvalid:
+            pass
+
+
+def migrate_collection(db, name, batch_size=MIGRATION_BATCH):
+    """
+    Move an ordinary event collection into a time-series one: rename it to
+    `<name>_legacy`, create the new collection and copy the events across in
+    _id order. Progress is kept in `meta` so an interrupted copy resumes
+    where it stopped; the legacy collection is dropped at the end.
+
+    The copy holds a lease in `meta`, renewed every batch. Another instance
+    starting meanwhile waits for it to be released, then finds nothing left
+    to copy; a lease left behind by a crashed instance expires after
+    LEASE_SECONDS and the copy resumes from the saved progress.
+    """
+    owner = ObjectId()
+    copied = 0
+    while True:
+        if not _take_lease(db, name, owner):
+            logger.info(f"Another instance is migrating {name}, waiting")
+            time.sleep(LEASE_POLL)
+            continue
+        try:
+            return copied + _migrate(db, name, batch_size, owner)
+        except LeaseLost as e:
+            copied += e.args[0]
+            logger.warning(f"Lost the {name} migration lease to another instance, waiting")
+        finally:
+            db.meta.delete_one({'_id': _lease_id(name), 'owner': owner})
+
+
+def _lease_id(name):
+    return f'series_migration_lease:{name}'
+
+
+def _take_lease(db, name, owner):
+    """Take or renew the migration lease on `name`; False while another instance holds a live one"""
+    now = datetime.utcnow()
+    try:
+        db.meta.update_one(
+            {'_id': _lease_id(name), '$or': [{'owner': owner}, {'expires_at': {'$lt': now}}]},
+            {'$set': {'owner': owner, 'expires_at': now + timedelta(seconds=LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def _migrate(db, name, batch_size, owner):
+    legacy = f'{name}_legacy'
+    existing = set(db.list_collection_names())
+    if name in existing and not is_time_series(db, name):
+        if db[name].estimated_document_count() == 0:
+            db.drop_collection(name)
+        else:
+            db[name].rename(legacy)
+            existing.add(legacy)
+        existing.discard(name)
+    if name not in existing:
+        create_series_collection(db, name)
+    if legacy not in existing:
+        return 0
+
+    progress_key = {'_id': f'series_migration:{name}'}
+    progress = db.meta.find_one(progress_key)
+    query = {'_id': {'$gt': progress['copied_through']}} if progress else {}
+    resumed = progress is not None
+    copied = 0
+    batch = []
+    cursor = db[legacy].find(query).sort('_id', 1).batch_size(batch_size)
+    for doc in cursor:
+        batch.append(pack(doc))
+        if len(batch) >= batch_size:
+            if not _take_lease(db, name, owner):
+                raise LeaseLost(copied)
+            copied += _copy_batch(db, name, batch, progress_key, resumed)
+            batch, resumed = [], False
+    if not _take_lease(db, name, owner):
+        raise LeaseLost(copied)
+    if batch:
+        copied += _copy_batch(db, name, batch, progress_key, resumed)
+    db.drop_collection(legacy)
+    db.meta.delete_one(progress_key)
+    logger.info(f"Copied {copied} events from {legacy} into {name}")
+    return copied
+
+
+def _copy_batch(db, name, batch, progress_key, resumed):
+    if resumed:
+        # The batch after an interruption may have been partly written; _id is not unique here
+        written = stored_ids(db[name], batch)
+        pending = [doc for doc in batch if doc['_id'] not in written]
+    else:
+        pending = batch
+    if pending:
+        db[name].insert_many(pending, ordered=False)
+    db.meta.update_one(progress_key, {'$set': {'copied_through': batch[-1]['_id']}}, upsert=True)
+    return len(pending)
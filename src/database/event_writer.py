@@ -0,0 +1,243 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from src.database.event_series import stored_inserts
+from src.utils.logger import logger
+
+DUPLICATE_KEY = 11000
+
+
+class EventWriter:
+    """
+    Write-behind queue for session events (attendance, hand raises, questions).
+
+    enqueue() only appends to an in-memory queue and returns immediately; a
+    background thread flushes pending operations with one unordered
+    bulk_write per collection once `max_batch` events are waiting or the
+    oldest has waited `flush_interval` seconds.
+
+    Every operation carries an idempotency key: inserts use a client-generated
+    _id and upserts match on their natural key, so a batch retried after a
+    network error cannot create duplicates (duplicate-key errors are treated
+    as already written). Time-series collections do not enforce a unique
+    _id, so before a retry the events an earlier attempt already stored are
+    looked up and left out. Events enqueued under the same coalesce key
+    while still pending are written once.
+
+    An event may carry follow-up operations on other collections (such as
+    counter updates); they are written in the same flush, right after the
+    events they belong to have been stored. They are sent once and never
+    retried, since a retry after a lost reply would apply an $inc twice: a
+    network error there under-counts until CourseStats.rebuild() recounts.
+    """
+
+    def __init__(self, db, max_batch=100, flush_interval=0.5, max_retries=5, retry_backoff=0.5):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._pending = OrderedDict()  # key -> [collection, operation, callbacks, enqueued_at, followups]
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        self._flush_now = False
+        self._thread = None
+
+        self.flush_count = 0
+        self.written = 0
+        self.coalesced = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.retries = 0
+        self.flush_latencies = deque(maxlen=200)  # seconds per bulk_write
+        self.queue_delays = deque(maxlen=200)  # seconds from enqueue to write
+
+    def enqueue(self, collection, operation, key, on_written=None, followups=None):
+        """
+        Queue a pymongo write operation without blocking.
+        followups is a list of (collection, operation) applied once the event is stored.
+        on_written(success) is called from the writer thread once the event is stored.
+        """
+        with self._condition:
+            if self._closing:
+                raise RuntimeError("Event writer is closed")
+            self._ensure_thread()
+            callbacks = [on_written] if on_written else []
+            pending = self._pending.get((collection, key))
+            if pending is not None:
+                pending[2].extend(callbacks)
+                self.coalesced += 1
+                return
+            self._pending[(collection, key)] = [collection, operation, callbacks, time.monotonic(), followups or []]
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Write everything queued so far and wait for it; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flush_now = True
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None or not self._thread.is_alive():
+                    break
+                self._condition.wait(remaining)
+            self._flush_now = False
+            return not self._pending and not self._in_flight
+
+    def close(self, timeout=10.0):
+        """Drain the queue and stop the writer thread"""
+        drained = self.flush(timeout)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+            lost = len(self._pending)
+        if self._thread is not None:
+            self._thread.join(timeout=max(1.0, self.flush_interval * 2))
+        if lost:
+            logger.error(f"Event writer closed with {lost} unwritten events")
+        logger.info(f"Event writer closed, stats: {self.stats()}")
+        return drained
+
+    def stats(self):
+        """Queue depth, flush latency and write counters"""
+        with self._condition:
+            depth = len(self._pending)
+            in_flight = self._in_flight
+            latencies = sorted(self.flush_latencies)
+            delays = sorted(self.queue_delays)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else None
+
+        return {
+            'queue_depth': depth,
+            'in_flight': in_flight,
+            'flushes': self.flush_count,
+            'written': self.written,
+            'coalesced': self.coalesced,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'retries': self.retries,
+            'flush_ms_p50': percentile(latencies, 0.5),
+            'flush_ms_p95': percentile(latencies, 0.95),
+            'queue_delay_ms_p95': percentile(delays, 0.95)
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name='event-writer')
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closing:
+                    self._condition.wait()
+                if not self._pending and self._closing:
+                    return
+                # Wait for a full batch or until the oldest event is due
+                while (len(self._pending) < self.max_batch and not self._flush_now and not self._closing):
+                    oldest = next(iter(self._pending.values()))[3]
+                    remaining = oldest + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                keys = list(self._pending)[:self.max_batch]
+                batch = [self._pending.pop(key) for key in keys]
+                self._in_flight = len(batch)
+
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
+
+    def _write_batch(self, batch):
+        by_collection = OrderedDict()
+        for item in batch:
+            by_collection.setdefault(item[0], []).append(item)
+
+        followups = OrderedDict()
+        completed = []
+        for collection, items in by_collection.items():
+            failed = self._bulk_write(collection, [item[1] for item in items])
+            for index, item in enumerate(items):
+                ok = index not in failed
+                completed.append((item, ok))
+                if ok:
+                    for followup_collection, operation in item[4]:
+                        followups.setdefault(followup_collection, []).append(operation)
+
+        # Follow-ups ($inc counters) are not idempotent: a retry after a lost reply
+        # would apply them twice, so they are sent once and a network error drops them
+        for collection, operations in followups.items():
+            self._bulk_write(collection, operations, retries=0)
+
+        now = time.monotonic()
+        for (_, _, callbacks, enqueued_at, _), ok in completed:
+            if ok:
+                self.queue_delays.append(now - enqueued_at)
+            for callback in callbacks:
+                try:
+                    callback(ok)
+                except Exception as e:
+                    logger.error(f"Error in event write callback: {str(e)}")
+
+    def _bulk_write(self, collection, operations, retries=None):
+        """Write one collection's operations, retrying transient failures; returns failed indexes"""
+        retries = self.max_retries if retries is None else retries
+        # Indexes into `operations` still to be written
+        remaining = list(range(len(operations)))
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                if attempt:
+                    # Already written by an earlier attempt whose reply was lost
+                    stored = stored_inserts(self.db[collection], [operations[i] for i in remaining])
+                    self.duplicates += len(stored)
+                    remaining = [i for n, i in enumerate(remaining) if n not in stored]
+                    if not remaining:
+                        return set()
+                self.db[collection].bulk_write([operations[i] for i in remaining], ordered=False)
+                self._record_flush(start, len(remaining))
+                return set()
+            except BulkWriteError as e:
+                failed = set()
+                duplicates = 0
+                for error in e.details.get('writeErrors', []):
+                    if error.get('code') == DUPLICATE_KEY:
+                        # Already written by an earlier attempt
+                        duplicates += 1
+                    else:
+                        failed.add(remaining[error['index']])
+                        logger.error(f"Dropping {collection} event: {error.get('errmsg')}")
+                self._record_flush(start, len(remaining) - duplicates - len(failed))
+                self.duplicates += duplicates
+                self.failed += len(failed)
+                return failed
+            except PyMongoError as e:
+                if attempt == retries:
+                    logger.error(f"Giving up on {len(remaining)} {collection} events: {str(e)}")
+                    self.failed += len(remaining)
+                    return set(remaining)
+                self.retries += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Retrying {collection} bulk write in {delay:.1f}s: {str(e)}")
+                time.sleep(delay)
+
+    def _record_flush(self, start, written):
+        elapsed = time.perf_counter() - start
+        self.flush_latencies.append(elapsed)
+        self.flush_count += 1
+        self.written += written
+        logger.debug(f"Flushed {written} events in {elapsed * 1000:.0f} ms")
+        if self.flush_count % 100 == 0:
+            logger.info(f"Event writer stats: {self.stats()}")
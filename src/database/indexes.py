@@ -0,0 +1,208 @@
+"""
+The index catalogue: every index the app relies on, and the queries each
+one serves.
+
+apply_indexes() creates the indexes and drops the ones they replace; it is
+idempotent and runs as a schema migration (src/database/migrations.py), so
+changing this catalogue needs a new migration and SCHEMA_VERSION. QUERIES
+lists the filter and sort of every DatabaseManager query (aggregations by
+their leading $match) together with the index expected to serve it, so
+tests/test_index_catalogue.py can check each plan with explain() against a
+local mongod.
+"""
+from datetime import datetime, timedelta
+
+from pymongo import DeleteMany
+from pymongo.errors import OperationFailure
+
+from src.database.event_series import event_filter, event_key
+from src.utils.logger import logger
+
+DUPLICATE_KEY = 11000
+INDEX_CONFLICT_CODES = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+MISSING_CODES = (26, 27)  # NamespaceNotFound, IndexNotFound
+
+
+def dedupe_attendance(db):
+    """Keep the earliest attendance record of each (course, student, day)"""
+    duplicates = db.attendance.aggregate([
+        {'$sort': {'_id': 1}},
+        {'$group': {
+            '_id': {'course_id': '$course_id', 'student_id': '$student_id', 'date': '$date'},
+            'ids': {'$push': '$_id'},
+            'count': {'$sum': 1}
+        }},
+        {'$match': {'count': {'$gt': 1}}}
+    ], allowDiskUse=True)
+    operations = [DeleteMany({'_id': {'$in': group['ids'][1:]}}) for group in duplicates]
+    if operations:
+        result = db.attendance.bulk_write(operations, ordered=False)
+        logger.info(f"Removed {result.deleted_count} duplicate attendance records")
+
+
+INDEXES = [
+    {'collection': 'courses', 'name': 'course_code_1', 'keys': [('course_code', 1)], 'unique': True},
+    {'collection': 'students', 'name': 'students_course_student_unique',
+     'keys': [('course_id', 1), ('student_id', 1)], 'unique': True},
+    {'collection': 'attendance', 'name': 'attendance_course_student_date_unique',
+     'keys': [('course_id', 1), ('student_id', 1), ('date', 1)], 'unique': True,
+     'dedupe': dedupe_attendance},
+    {'collection': 'attendance', 'name': 'attendance_course_date',
+     'keys': [('course_id', 1), ('date', 1)]},
+    # questions and hand_raises are time-series collections (src/database/event_series.py)
+    {'collection': 'questions', 'name': 'questions_meta_time',
+     'keys': [('meta.course_id', 1), ('meta.student_id', 1), ('timestamp', -1)]},
+    {'collection': 'questions', 'name': 'questions_audio_id',
+     'keys': [('audio.key', 1), ('_id', 1)]},
+    {'collection': 'hand_raises', 'name': 'hand_raises_meta_time',
+     'keys': [('meta.course_id', 1), ('meta.student_id', 1), ('timestamp', -1)]},
+    {'collection': 'engagement', 'name': 'student_id_1', 'keys': [('student_id', 1)]},
+    {'collection': 'relevance_cache', 'name': 'course_id_1_topic_hash_1_created_at_-1',
+     'keys': [('course_id', 1), ('topic_hash', 1), ('created_at', -1)]},
+    {'collection': 'course_student_stats', 'name': 'course_student_unique',
+     'keys': [('course_id', 1), ('student_id', 1)], 'unique': True},
+    {'collection': 'student_photos', 'name': 'photo_course_student_unique',
+     'keys': [('course_id', 1), ('student_id', 1)], 'unique': True},
+    {'collection': 'engagement_daily', 'name': 'daily_course_student_day_unique',
+     'keys': [('course_id', 1), ('student_id', 1), ('day', 1)], 'unique': True},
+    {'collection': 'engagement_daily', 'name': 'daily_course_day',
+     'keys': [('course_id', 1), ('day', 1)]},
+    {'collection': 'delete_jobs', 'name': 'delete_jobs_status_created',
+     'keys': [('status', 1), ('created_at', 1)]},
+]
+
+# Superseded by the catalogue above; dropped once their replacements exist
+RETIRED_INDEXES = [
+    ('students', 'student_id_1'),
+    ('students', 'student_course_unique'),
+    ('students', 'student_id_1_course_id_1'),
+    ('attendance', 'date_1_student_id_1'),
+    ('questions', 'student_id_1_course_id_1_timestamp_-1'),
+    ('hand_raises', 'student_id_1_course_id_1_timestamp_-1'),
+]
+
+
+def _day(p):
+    return datetime.combine(p['date'], datetime.min.time())
+
+
+# method -> the collection, filter and sort it issues, and the index that serves it.
+# Filters are built from sample parameters: course_id, student_id, date, course_code,
+# topic_hash and after_id.
+QUERIES = [
+    {'method': 'get_course_by_code', 'collection': 'courses',
+     'filter': lambda p: {'course_code': p['course_code']}, 'index': 'course_code_1'},
+    {'method': 'get_course', 'collection': 'courses',
+     'filter': lambda p: {'_id': p['course_id']}, 'index': '_id_'},
+
+    {'method': 'get_course_student_list', 'collection': 'students',
+     'filter': lambda p: {'course_id': p['course_id']}, 'index': 'students_course_student_unique'},
+    {'method': 'get_course_student_embeddings', 'collection': 'students',
+     'filter': lambda p: {'course_id': p['course_id']}, 'index': 'students_course_student_unique'},
+    {'method': 'get_student_by_id', 'collection': 'students',
+     'filter': lambda p: {'student_id': p['student_id'], 'course_id': p['course_id']},
+     'index': 'students_course_student_unique'},
+    {'method': 'reserve_student_ids', 'collection': 'counters',
+     'filter': lambda p: {'_id': f"student_id:{p['course_id']}"}, 'index': '_id_'},
+
+    {'method': 'mark_attendance', 'collection': 'attendance',
+     'filter': lambda p: {'course_id': p['course_id'], 'student_id': p['student_id'], 'date': _day(p)},
+     'index': 'attendance_course_student_date_unique'},
+    {'method': 'get_attendance_records', 'collection': 'attendance',
+     'filter': lambda p: {'course_id': p['course_id'],
+                          'date': {'$gte': _day(p), '$lt': _day(p) + timedelta(days=1)}},
+     'index': 'attendance_course_date'},
+    {'method': 'get_today_attendance', 'collection': 'attendance',
+     'filter': lambda p: {'course_id': p['course_id'], 'date': _day(p)}, 'index': 'attendance_course_date'},
+    {'method': 'get_attendance_matrix', 'collection': 'attendance',
+     'filter': lambda p: {'course_id': p['course_id'],
+                          'date': {'$gte': _day(p) - timedelta(days=7), '$lt': _day(p) + timedelta(days=1)}},
+     'index': 'attendance_course_date'},
+    {'method': 'CourseStats.compute_from_events', 'collection': 'attendance',
+     'filter': lambda p: {'course_id': p['course_id'], 'status': 'Present'}, 'index': 'attendance_course_date'},
+
+    {'method': 'get_student_questions', 'collection': 'questions',
+     'filter': lambda p: event_filter(p['course_id'], p['student_id']),
+     'sort': [('timestamp', -1)], 'index': 'questions_meta_time'},
+    {'method': 'get_course_questions', 'collection': 'questions',
+     'filter': lambda p: event_filter(p['course_id'], [p['student_id']]),
+     'sort': [('timestamp', -1)], 'index': 'questions_meta_time'},
+    {'method': 'get_labelled_questions', 'collection': 'questions',
+     'filter': lambda p: {**event_filter(p['course_id']), 'relevance_source': {'$ne': 'local'}},
+     'sort': [('timestamp', -1)], 'index': 'questions_meta_time'},
+    {'method': 'iter_course_questions', 'collection': 'questions',
+     'filter': lambda p: event_filter(p['course_id']), 'index': 'questions_meta_time'},
+    {'method': 'get_questions_for_reanalysis', 'collection': 'questions',
+     'filter': lambda p: {'audio.key': {'$exists': True}, '_id': {'$gt': p['after_id']}},
+     'sort': [('_id', 1)], 'index': 'questions_audio_id'},
+    {'method': 'update_question_verdicts', 'collection': 'questions',
+     'filter': lambda p: event_key({'course_id': p['course_id'], 'student_id': p['student_id'], '_id': p['after_id']}),
+     'index': 'questions_meta_time'},
+    {'method': 'save_question_reanalysis', 'collection': 'questions',
+     'filter': lambda p: event_key({'course_id': p['course_id'], 'student_id': p['student_id'], '_id': p['after_id']}),
+     'index': 'questions_meta_time'},
+
+    {'method': 'AnalyticsQueries.hand_raise_pipeline', 'collection': 'hand_raises',
+     'filter': lambda p: event_filter(p['course_id'], [p['student_id']]),
+     'index': 'hand_raises_meta_time'},
+
+    {'method': 'DeleteJobs.run', 'collection': 'questions',
+     'filter': lambda p: {**event_filter(p['course_id']), 'meta.student_id': {'$gt': p['student_id']}},
+     'sort': [('meta.student_id', 1)], 'index': 'questions_meta_time'},
+    {'method': 'DeleteJobs.run', 'collection': 'hand_raises',
+     'filter': lambda p: {**event_filter(p['course_id']), 'meta.student_id': {'$gt': p['student_id']}},
+     'sort': [('meta.student_id', 1)], 'index': 'hand_raises_meta_time'},
+    {'method': 'DeleteJobs.run', 'collection': 'engagement',
+     'filter': lambda p: {'student_id': p['student_id']}, 'index': 'student_id_1'},
+
+    {'method': 'get_relevance_cache_entries', 'collection': 'relevance_cache',
+     'filter': lambda p: {'course_id': p['course_id'], 'topic_hash': p['topic_hash']},
+     'sort': [('created_at', -1)], 'index': 'course_id_1_topic_hash_1_created_at_-1'},
+    {'method': 'clear_relevance_cache', 'collection': 'relevance_cache',
+     'filter': lambda p: {'course_id': p['course_id']}, 'index': 'course_id_1_topic_hash_1_created_at_-1'},
+
+    {'method': 'CourseStats.read', 'collection': 'course_student_stats',
+     'filter': lambda p: {'course_id': p['course_id']}, 'index': 'course_student_unique'},
+    {'method': 'get_student_hand_raises', 'collection': 'course_student_stats',
+     'filter': lambda p: {'course_id': p['course_id'], 'student_id': p['student_id']},
+     'index': 'course_student_unique'},
+    {'method': 'get_student_thumbnail', 'collection': 'student_photos',
+     'filter': lambda p: {'course_id': p['course_id'], 'student_id': p['student_id']},
+     'index': 'photo_course_student_unique'},
+
+    {'method': 'get_course_trends', 'collection': 'engagement_daily',
+     'filter': lambda p: {'course_id': p['course_id'], 'day': {'$gte': _day(p)}}, 'index': 'daily_course_day'},
+    {'method': 'DailyRollups.totals_before', 'collection': 'engagement_daily',
+     'filter': lambda p: {'course_id': p['course_id'], 'day': {'$lt': _day(p)}}, 'index': 'daily_course_day'},
+
+    {'method': 'DeleteJobs.pending', 'collection': 'delete_jobs',
+     'filter': lambda p: {'status': {'$ne': 'completed'}}, 'sort': [('created_at', 1)],
+     'index': 'delete_jobs_status_created'},
+]
+
+
+def apply_indexes(db):
+    """Create every catalogued index and drop retired ones; safe to run repeatedly"""
+    for spec in INDEXES:
+        collection = db[spec['collection']]
+        options = {'name': spec['name'], 'unique': spec.get('unique', False)}
+        try:
+            collection.create_index(spec['keys'], **options)
+        except OperationFailure as e:
+            if e.code == DUPLICATE_KEY and spec.get('dedupe'):
+                logger.warning(f"Duplicates block index {spec['name']}, removing them first")
+                spec['dedupe'](db)
+                collection.create_index(spec['keys'], **options)
+            elif e.code in INDEX_CONFLICT_CODES:
+                # An equivalent index exists under another name
+                logger.warning(f"Index {spec['name']} conflicts with an existing index: {str(e)}")
+            else:
+                raise
+
+    for collection, name in RETIRED_INDEXES:
+        try:
+            db[collection].drop_index(name)
+            logger.info(f"Dropped retired index {collection}.{name}")
+        except OperationFailure as e:
+            if e.code not in MISSING_CODES:
+                raise
@@ -0,0 +1,377 @@
+"""
+Offline-first local store: a SQLite (WAL) journal of session events plus
+snapshots of the data a class needs (course list, rosters, face embeddings).
+
+Every session event is committed to the journal before anything touches
+the network, so a class keeps running while Atlas is slow or unreachable.
+JournalSyncWorker replays the journal to MongoDB in unordered batches and
+deletes rows once they are stored; network errors back off exponentially
+and the rows stay in SQLite, across restarts if need be. Replays are
+idempotent for the same reasons as EventWriter's retries: inserts carry a
+client-generated _id (looked up before the write in time-series
+collections, which do not enforce it) and upserts match on their natural
+key. Follow-ups ($inc counters) are not, so an event whose insert turns
+out to be a duplicate on replay has its follow-ups skipped: they went out
+with the replay that stored it, even if its reply was lost. A replay cut
+off between the two writes therefore under-counts rather than counting
+twice; CourseStats.rebuild() recounts from the events.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+import bson
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from src.database.event_series import stored_inserts
+from src.utils.logger import logger
+
+DUPLICATE_KEY = 11000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (collection, key)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    saved_at REAL NOT NULL
+);
+"""
+
+
+def encode_operation(operation):
+    """Serialisable form of a pymongo InsertOne / UpdateOne / ReplaceOne"""
+    if isinstance(operation, InsertOne):
+        return {'op': 'insert', 'document': operation._doc}
+    if isinstance(operation, UpdateOne):
+        return {'op': 'update', 'filter': operation._filter, 'update': operation._doc,
+                'upsert': bool(operation._upsert)}
+    if isinstance(operation, ReplaceOne):
+        return {'op': 'replace', 'filter': operation._filter, 'replacement': operation._doc,
+                'upsert': bool(operation._upsert)}
+    raise TypeError(f"Cannot journal {type(operation).__name__}")
+
+
+def decode_operation(spec):
+    if spec['op'] == 'insert':
+        return InsertOne(spec['document'])
+    if spec['op'] == 'update':
+        return UpdateOne(spec['filter'], spec['update'], upsert=spec['upsert'])
+    return ReplaceOne(spec['filter'], spec['replacement'], upsert=spec['upsert'])
+
+
+class LocalStore:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: durable across app crashes, one fsync per checkpoint rather than per event
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Journal
+    def append(self, collection, operation, key, followups=None):
+        """Journal one event; returns False if an event with the same key is already pending"""
+        payload = bson.encode({
+            'operation': encode_operation(operation),
+            'followups': [[name, encode_operation(op)] for name, op in (followups or [])]
+        })
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO journal (collection, key, payload, created_at) VALUES (?, ?, ?, ?)",
+                (collection, repr(key), payload, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def pending(self, limit=200):
+        """Oldest journaled events as (seq, collection, operation, followups, created_at)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, collection, payload, created_at FROM journal ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        events = []
+        for seq, collection, payload, created_at in rows:
+            doc = bson.decode(payload)
+            followups = [(name, decode_operation(spec)) for name, spec in doc['followups']]
+            events.append((seq, collection, decode_operation(doc['operation']), followups, created_at))
+        return events
+
+    def seq(self, collection, key):
+        """Journal sequence number of the pending event with this key, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq FROM journal WHERE collection = ? AND key = ?", (collection, repr(key))
+            ).fetchone()
+        return row[0] if row else None
+
+    def remove(self, seqs):
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM journal WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    # Snapshots
+    def save_snapshot(self, name, items):
+        payload = bson.encode({'items': items})
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots (name, payload, saved_at) VALUES (?, ?, ?)",
+                (name, payload, time.time())
+            )
+
+    def load_snapshot(self, name):
+        """Items saved under name, or None if there is no snapshot"""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM snapshots WHERE name = ?", (name,)).fetchone()
+        return bson.decode(row[0])['items'] if row else None
+
+
+class JournalSyncWorker:
+    """
+    Drop-in replacement for EventWriter that journals to a LocalStore.
+
+    enqueue() commits the event to SQLite and returns. A background thread
+    replays the journal with one unordered bulk_write per collection,
+    followed by the events' follow-up operations; on_written(success) is
+    called from that thread once the event is stored in MongoDB (or was
+    dropped as a permanent write error). Callbacks live in memory only, so
+    events left over from an earlier session replay silently. While MongoDB is
+    unreachable it retries with exponential backoff, calling `reconnect()`
+    (if given) before each attempt and `on_online()` once it is reachable again.
+    """
+
+    def __init__(self, store, get_db, reconnect=None, on_online=None, max_batch=200,
+                 sync_interval=0.5, retry_backoff=0.5, max_backoff=30.0):
+        self.store = store
+        self.get_db = get_db
+        self.reconnect = reconnect
+        self.on_online = on_online
+        self.max_batch = max_batch
+        self.sync_interval = sync_interval
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+
+        self.online = True
+        self._failures = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        self._thread = None
+        self._callbacks = {}  # journal seq -> on_written callbacks
+
+        self.appended = 0
+        self.coalesced = 0
+        self.synced = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.retries = 0
+        self.append_latencies = deque(maxlen=200)  # seconds per journal commit
+        self.sync_latencies = deque(maxlen=200)  # seconds per replayed batch
+
+    def enqueue(self, collection, operation, key, on_written=None, followups=None):
+        if self._closing:
+            raise RuntimeError("Journal sync worker is closed")
+        with self._condition:
+            start = time.perf_counter()
+            appended = self.store.append(collection, operation, key, followups)
+            self.append_latencies.append(time.perf_counter() - start)
+            if appended:
+                self.appended += 1
+            else:
+                self.coalesced += 1
+            # Registered under the same lock _replay removes events with, so a
+            # callback joining an event (new or coalesced) cannot miss its replay
+            if on_written:
+                self._callbacks.setdefault(self.store.seq(collection, key), []).append(on_written)
+            self._ensure_thread()
+            self._condition.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Wait until the journal has been replayed; returns False on timeout (events stay journaled)"""
+        if not self.online:
+            return self.store.depth() == 0
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._ensure_thread()
+            self._condition.notify_all()
+        with self._condition:
+            while self.store.depth():
+                if time.monotonic() >= deadline:
+                    return False
+                self._condition.wait(min(0.05, max(0.0, deadline - time.monotonic())))
+        return True
+
+    def close(self, timeout=10.0):
+        drained = self.flush(timeout)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        remaining = self.store.depth()
+        if remaining:
+            logger.warning(f"{remaining} session events remain journaled and will sync on next start")
+        logger.info(f"Journal sync worker closed, stats: {self.stats()}")
+        return drained
+
+    def stats(self):
+        latencies = sorted(self.append_latencies)
+        syncs = sorted(self.sync_latencies)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else None
+
+        return {
+            'online': self.online,
+            'queue_depth': self.store.depth(),
+            'appended': self.appended,
+            'coalesced': self.coalesced,
+            'written': self.synced,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'retries': self.retries,
+            'append_ms_p50': percentile(latencies, 0.5),
+            'append_ms_p95': percentile(latencies, 0.95),
+            'flush_ms_p50': percentile(syncs, 0.5),
+            'flush_ms_p95': percentile(syncs, 0.95)
+        }
+
+    def start(self):
+        """Start replaying whatever an earlier session left in the journal"""
+        with self._condition:
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name='journal-sync')
+            self._thread.start()
+
+    def _backoff(self):
+        return min(self.max_backoff, self.retry_backoff * (2 ** max(0, self._failures - 1)))
+
+    def _run(self):
+        while not self._closing:
+            if not self.online and self.reconnect is not None:
+                if not self.reconnect():
+                    self._failed_attempt("reconnect failed")
+                    continue
+                self._came_online()
+            events = self.store.pending(self.max_batch)
+            if not events:
+                with self._condition:
+                    if not self._closing:
+                        self._condition.wait(self.sync_interval)
+                continue
+            try:
+                self._replay(events)
+            except PyMongoError as e:
+                self._failed_attempt(str(e))
+                continue
+            self._came_online()
+            with self._condition:
+                self._condition.notify_all()
+
+    def _came_online(self):
+        self._failures = 0
+        if not self.online:
+            self.online = True
+            logger.info("MongoDB reachable again, replaying journaled session events")
+            if self.on_online:
+                self.on_online()
+
+    def _failed_attempt(self, error):
+        self._failures += 1
+        self.retries += 1
+        if self.online:
+            logger.warning(f"MongoDB unreachable, journaling session events locally: {error}")
+        self.online = False
+        delay = self._backoff()
+        with self._condition:
+            if not self._closing:
+                self._condition.wait(delay)
+
+    def _replay(self, events):
+        db = self.get_db()
+        if db is None:
+            raise PyMongoError("no database connection")
+        start = time.perf_counter()
+        by_collection = OrderedDict()
+        for event in events:
+            by_collection.setdefault(event[1], []).append(event)
+
+        done, failed, followups = [], set(), OrderedDict()
+        for collection, items in by_collection.items():
+            skipped, dropped = self._bulk_write(db, collection, [item[2] for item in items])
+            for index, (seq, _, _, item_followups, _) in enumerate(items):
+                done.append(seq)
+                if index in dropped:
+                    failed.add(seq)
+                # A duplicate was stored by an earlier replay whose follow-ups may have
+                # been applied too; only the first write of an event carries them
+                if index in skipped:
+                    continue
+                for name, operation in item_followups:
+                    followups.setdefault(name, []).append(operation)
+
+        for collection, operations in followups.items():
+            self._bulk_write(db, collection, operations)
+        # Only forget events once they and their follow-ups are stored; flush()
+        # waits on the same lock, so it returns after the callbacks have run
+        with self._condition:
+            self.store.remove(done)
+            for seq in done:
+                for callback in self._callbacks.pop(seq, []):
+                    try:
+                        callback(seq not in failed)
+                    except Exception as e:
+                        logger.error(f"Error in event write callback: {str(e)}")
+        self.sync_latencies.append(time.perf_counter() - start)
+
+    def _bulk_write(self, db, collection, operations):
+        """
+        One unordered bulk write; network errors propagate, permanent errors
+        are dropped. Returns the indexes of operations that were not written
+        by this call (failed or already stored) and, separately, those that failed.
+        """
+        # Time-series collections accept a repeated _id, so look for events an earlier replay stored
+        stored = stored_inserts(db[collection], operations)
+        self.duplicates += len(stored)
+        remaining = [i for i in range(len(operations)) if i not in stored]
+        if not remaining:
+            return stored, set()
+        try:
+            db[collection].bulk_write([operations[i] for i in remaining], ordered=False)
+            self.synced += len(remaining)
+            return stored, set()
+        except BulkWriteError as e:
+            failed, duplicates = set(), set()
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') == DUPLICATE_KEY:
+                    duplicates.add(remaining[error['index']])
+                else:
+                    failed.add(remaining[error['index']])
+                    logger.error(f"Dropping journaled {collection} event: {error.get('errmsg')}")
+            self.duplicates += len(duplicates)
+            self.failed += len(failed)
+            self.synced += len(remaining) - len(failed)
+            return stored | failed | duplicates, failed
@@ -0,0 +1,1270 @@
+"""
+In-memory stand-in for the subset of the pymongo API the database layer
+uses, for tests and deterministic benchmarks (see src/database/backends.py).
+
+Documents live in one dict per collection keyed by _id, in insertion
+order. create_index() builds real secondary indexes: a dict per key
+prefix mapping field values to _ids, so equality (and $in) lookups on an
+index's leading fields touch only the matching documents, and unique
+indexes raise DuplicateKeyError like the server. Everything else follows
+the server's semantics for the operators the app uses: query operators,
+update operators with upserts, projections, sorts, bulk writes with
+ordered/unordered error handling, and the aggregation stages and
+expressions in src/database (an unsupported operator raises
+NotImplementedError rather than silently differing).
+
+Collections created with `timeseries` options report them from options()
+and enforce the server's (MongoDB 7.0) write restrictions on time-series
+collections: multi-document updates only, no upserts, no renames. Their
+_id is not unique either: each document is kept under a record id of its
+own, so a repeated _id is stored again, as on the server.
+
+All operations take one lock per database. Sessions and transactions are
+accepted but not isolated.
+"""
+import bisect
+import itertools
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+# The server whose semantics the store follows
+SERVER_VERSION = '7.0.0'
+DUPLICATE_KEY = 11000
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_NOT_FOUND = 27
+NAMESPACE_EXISTS = 48
+INVALID_OPTIONS = 72
+MISSING = object()
+
+
+def _copy(value):
+    """Deep copy of the containers in a document; scalars (bytes, datetimes, ObjectIds) are immutable"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _freeze(value):
+    """Hashable form of a value, for index keys and $group / $addToSet identity"""
+    if isinstance(value, dict):
+        return ('__dict__', tuple((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ('__list__', tuple(_freeze(v) for v in value))
+    if isinstance(value, bool):
+        return ('__bool__', value)
+    return value
+
+
+def _get(doc, path):
+    """Value at a dotted path, or MISSING"""
+    value = doc
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+        elif isinstance(value, list) and part.isdigit():
+            index = int(part)
+            value = value[index] if index < len(value) else MISSING
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def _set(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+# BSON comparison order of types
+def _type_rank(value):
+    if value is MISSING or value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, (bytes, bytearray)):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 1:
+        return (rank, 0)
+    if rank in (4, 5):
+        return (rank, repr(_freeze(value)))
+    return (rank, value)
+
+
+def _compare(a, b):
+    """-1 / 0 / 1 in BSON order"""
+    ka, kb = _sort_key(a), _sort_key(b)
+    return (ka > kb) - (ka < kb)
+
+
+def _sort(docs, spec):
+    """Stable in-place sort of documents by [(field, direction)]"""
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction < 0)
+    return docs
+
+
+def _sort_spec(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+# Query matching
+def _equals(value, expected):
+    if isinstance(value, list) and not isinstance(expected, list):
+        return any(_equals(v, expected) for v in value)
+    if value is MISSING:
+        return expected is None
+    if isinstance(value, list) and isinstance(expected, list):
+        return _freeze(value) == _freeze(expected) or any(_freeze(v) == _freeze(expected) for v in value)
+    if isinstance(value, bool) or isinstance(expected, bool):
+        return type(value) is type(expected) and value == expected
+    return _type_rank(value) == _type_rank(expected) and value == expected
+
+
+def _comparable(value, other, test):
+    values = value if isinstance(value, list) else [value]
+    return any(
+        v is not MISSING and _type_rank(v) == _type_rank(other) and test(_compare(v, other))
+        for v in values
+    )
+
+
+class _Values(list):
+    """An $in / $nin operand with a hash set for scalar membership tests"""
+
+    def __init__(self, values):
+        super().__init__(values)
+        if any(isinstance(v, (dict, list)) for v in values):
+            self.lookup = None
+        else:
+            self.lookup = {_freeze(v) for v in values}
+
+    def contains(self, value):
+        if self.lookup is None or isinstance(value, list):
+            return any(_equals(value, candidate) for candidate in self)
+        return _freeze(None if value is MISSING else value) in self.lookup
+
+
+def _prepare(query):
+    """Copy of a filter whose $in / $nin lists are _Values, so matching many documents stays O(1) per test"""
+    if isinstance(query, list):
+        return [_prepare(q) for q in query]
+    if not isinstance(query, dict):
+        return query
+    prepared = {}
+    for key, value in query.items():
+        if key in ('$in', '$nin') and isinstance(value, list):
+            prepared[key] = _Values(value)
+        else:
+            prepared[key] = _prepare(value) if isinstance(value, (dict, list)) and key != '$eq' else value
+    return prepared
+
+
+def _match_operators(value, conditions):
+    for operator, operand in conditions.items():
+        if operator == '$eq':
+            ok = _equals(value, operand)
+        elif operator == '$ne':
+            ok = not _equals(value, operand)
+        elif operator == '$gt':
+            ok = _comparable(value, operand, lambda c: c > 0)
+        elif operator == '$gte':
+            ok = _comparable(value, operand, lambda c: c >= 0)
+        elif operator == '$lt':
+            ok = _comparable(value, operand, lambda c: c < 0)
+        elif operator == '$lte':
+            ok = _comparable(value, operand, lambda c: c <= 0)
+        elif operator == '$in':
+            ok = (operand if isinstance(operand, _Values) else _Values(operand)).contains(value)
+        elif operator == '$nin':
+            ok = not (operand if isinstance(operand, _Values) else _Values(operand)).contains(value)
+        elif operator == '$exists':
+            ok = (value is not MISSING) == bool(operand)
+        elif operator == '$size':
+            ok = isinstance(value, list) and len(value) == operand
+        elif operator == '$not':
+            ok = not _match_operators(value, operand)
+        elif operator == '$elemMatch':
+            ok = isinstance(value, list) and any(
+                _matches(v, operand) if isinstance(v, dict) else _match_operators(v, operand) for v in value
+            )
+        else:
+            raise NotImplementedError(f"Query operator {operator} is not supported in memory")
+        if not ok:
+            return False
+    return True
+
+
+def _matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            ok = all(_matches(doc, q) for q in condition)
+        elif key == '$or':
+            ok = any(_matches(doc, q) for q in condition)
+        elif key == '$nor':
+            ok = not any(_matches(doc, q) for q in condition)
+        elif key.startswith('$'):
+            raise NotImplementedError(f"Query operator {key} is not supported in memory")
+        elif isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            ok = _match_operators(_get(doc, key), condition)
+        else:
+            ok = _equals(_get(doc, key), condition)
+        if not ok:
+            return False
+    return True
+
+
+def _equality_values(condition):
+    """The values a filter condition pins a field to, or None if it is not an equality / $in"""
+    if isinstance(condition, dict):
+        if condition and all(k.startswith('$') for k in condition):
+            if '$eq' in condition:
+                return [condition['$eq']]
+            if '$in' in condition and not any(isinstance(v, (dict, list)) for v in condition['$in']):
+                return list(condition['$in'])
+            return None
+        return None
+    if isinstance(condition, list):
+        return None
+    return [condition]
+
+
+# Updates
+def _apply_update(doc, update, inserting=False):
+    for operator, fields in update.items():
+        if operator == '$setOnInsert':
+            if inserting:
+                for path, value in fields.items():
+                    _set(doc, path, _copy(value))
+        elif operator == '$set':
+            for path, value in fields.items():
+                _set(doc, path, _copy(value))
+        elif operator == '$unset':
+            for path in fields:
+                _unset(doc, path)
+        elif operator == '$inc':
+            for path, amount in fields.items():
+                current = _get(doc, path)
+                _set(doc, path, (0 if current is MISSING else current) + amount)
+        elif operator in ('$max', '$min'):
+            for path, value in fields.items():
+                current = _get(doc, path)
+                if current is MISSING or (_compare(value, current) > 0) == (operator == '$max') \
+                        and _compare(value, current) != 0:
+                    _set(doc, path, _copy(value))
+        elif operator in ('$addToSet', '$push'):
+            for path, value in fields.items():
+                current = _get(doc, path)
+                if current is MISSING:
+                    current = []
+                    _set(doc, path, current)
+                if not isinstance(current, list):
+                    raise OperationFailure(f"Cannot apply {operator} to non-array field {path}", code=2)
+                values = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                for item in values:
+                    if operator == '$push' or not any(_freeze(item) == _freeze(v) for v in current):
+                        current.append(_copy(item))
+        elif operator == '$pull':
+            for path, condition in fields.items():
+                current = _get(doc, path)
+                if isinstance(current, list):
+                    if isinstance(condition, dict):
+                        kept = [v for v in current if not (
+                            _matches(v, condition) if isinstance(v, dict) else _match_operators(v, condition))]
+                    else:
+                        kept = [v for v in current if not _equals(v, condition)]
+                    _set(doc, path, kept)
+        elif operator == '$currentDate':
+            for path in fields:
+                _set(doc, path, datetime.utcnow())
+        else:
+            raise NotImplementedError(f"Update operator {operator} is not supported in memory")
+
+
+def _upsert_document(query):
+    """The document an upsert starts from: the filter's equality fields"""
+    doc = {}
+    for key, condition in (query or {}).items():
+        if key.startswith('$'):
+            continue
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            if '$eq' in condition:
+                _set(doc, key, _copy(condition['$eq']))
+        else:
+            _set(doc, key, _copy(condition))
+    return doc
+
+
+def _project(doc, projection):
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    include_id = bool(projection.get('_id', 1))
+    if any(fields.values()):
+        result = {}
+        if include_id and '_id' in doc:
+            result['_id'] = doc['_id']
+        for path, flag in fields.items():
+            if not flag:
+                continue
+            value = _get(doc, path)
+            if value is not MISSING:
+                _set(result, path, _copy(value))
+        return result
+    result = _copy(doc)
+    for path in fields:
+        _unset(result, path)
+    if not include_id:
+        result.pop('_id', None)
+    return result
+
+
+# Aggregation expressions
+def _evaluate(expression, doc):
+    if isinstance(expression, str):
+        if expression == '$$ROOT':
+            return doc
+        if expression.startswith('$'):
+            return _get(doc, expression[1:])
+        return expression
+    if isinstance(expression, list):
+        return [_evaluate(e, doc) for e in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1:
+            (operator, args), = expression.items()
+            if operator.startswith('$'):
+                return _operator(operator, args, doc)
+        return {k: _evaluate(v, doc) for k, v in expression.items()}
+    return expression
+
+
+def _value(value):
+    return None if value is MISSING else value
+
+
+def _operator(operator, args, doc):
+    if operator == '$literal':
+        return args
+    if operator == '$cond':
+        if isinstance(args, dict):
+            args = [args['if'], args['then'], args['else']]
+        return _evaluate(args[1] if _truthy(_evaluate(args[0], doc)) else args[2], doc)
+    if operator == '$dateTrunc':
+        return _date_trunc(_evaluate(args['date'], doc), args['unit'], args.get('startOfWeek', 'sunday'))
+    if operator == '$ifNull':
+        for arg in args:
+            value = _evaluate(arg, doc)
+            if value is not MISSING and value is not None:
+                return value
+        return None
+    values = [_value(_evaluate(arg, doc)) for arg in (args if isinstance(args, list) else [args])]
+    if operator in ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte'):
+        c = _compare(values[0], values[1])
+        return {'$eq': c == 0, '$ne': c != 0, '$gt': c > 0, '$gte': c >= 0, '$lt': c < 0, '$lte': c <= 0}[operator]
+    if operator == '$and':
+        return all(_truthy(v) for v in values)
+    if operator == '$or':
+        return any(_truthy(v) for v in values)
+    if operator == '$not':
+        return not _truthy(values[0])
+    if operator == '$in':
+        return any(_compare(values[0], v) == 0 for v in values[1])
+    if operator == '$add':
+        return sum(values) if None not in values else None
+    if operator == '$subtract':
+        if None in values:
+            return None
+        if isinstance(values[0], datetime) and isinstance(values[1], datetime):
+            return int((values[0] - values[1]).total_seconds() * 1000)
+        return values[0] - values[1]
+    if operator == '$multiply':
+        if None in values:
+            return None
+        result = 1
+        for v in values:
+            result *= v
+        return result
+    if operator == '$divide':
+        return None if None in values else values[0] / values[1]
+    if operator == '$size':
+        return len(values[0])
+    if operator in ('$sum', '$max', '$min', '$avg'):
+        items = values[0] if len(values) == 1 and isinstance(values[0], list) else values
+        numbers = [v for v in items if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if operator == '$sum':
+            return sum(numbers)
+        if operator == '$avg':
+            return sum(numbers) / len(numbers) if numbers else None
+        present = [v for v in items if v is not None]
+        if not present:
+            return None
+        key = lambda v: _sort_key(v)
+        return max(present, key=key) if operator == '$max' else min(present, key=key)
+    if operator == '$toString':
+        return None if values[0] is None else str(values[0])
+    raise NotImplementedError(f"Aggregation operator {operator} is not supported in memory")
+
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+def _date_trunc(value, unit, start_of_week):
+    if value is MISSING or value is None:
+        return None
+    if unit == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'day':
+        return day
+    if unit == 'week':
+        return day - timedelta(days=(day.weekday() - WEEKDAYS.index(start_of_week[:3].lower())) % 7)
+    if unit == 'month':
+        return day.replace(day=1)
+    raise NotImplementedError(f"$dateTrunc unit {unit} is not supported in memory")
+
+
+def _truthy(value):
+    return value not in (None, False, 0, MISSING)
+
+
+class _Accumulator:
+    def __init__(self, operator, expression):
+        self.operator = operator
+        self.expression = expression
+        self.values = []
+        self.seen = set()
+        self.total = 0
+        self.count = 0
+        self.result = MISSING
+
+    def add(self, doc):
+        value = _evaluate(self.expression, doc)
+        op = self.operator
+        if op == '$sum':
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.total += value
+        elif op == '$avg':
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.total += value
+                self.count += 1
+        elif op in ('$max', '$min'):
+            if value is not MISSING and value is not None:
+                if self.result is MISSING or (_compare(value, self.result) > 0) == (op == '$max') \
+                        and _compare(value, self.result) != 0:
+                    self.result = value
+        elif op == '$first':
+            if self.result is MISSING:
+                self.result = _value(value)
+        elif op == '$last':
+            self.result = _value(value)
+        elif op == '$push':
+            if value is not MISSING:
+                self.values.append(value)
+        elif op == '$addToSet':
+            if value is not MISSING and _freeze(value) not in self.seen:
+                self.seen.add(_freeze(value))
+                self.values.append(value)
+        elif op == '$count':
+            self.total += 1
+        else:
+            raise NotImplementedError(f"Accumulator {op} is not supported in memory")
+
+    def value(self):
+        if self.operator in ('$sum', '$count'):
+            return self.total
+        if self.operator == '$avg':
+            return self.total / self.count if self.count else None
+        if self.operator in ('$push', '$addToSet'):
+            return self.values
+        return _value(self.result)
+
+
+def _group(docs, spec):
+    groups = OrderedDict()
+    for doc in docs:
+        key = _value(_evaluate(spec['_id'], doc))
+        frozen = _freeze(key)
+        group = groups.get(frozen)
+        if group is None:
+            group = groups[frozen] = (key, {
+                field: _Accumulator(*next(iter(accumulator.items())))
+                for field, accumulator in spec.items() if field != '_id'
+            })
+        for accumulator in group[1].values():
+            accumulator.add(doc)
+    return [
+        dict([('_id', key)] + [(field, accumulator.value()) for field, accumulator in accumulators.items()])
+        for key, accumulators in groups.values()
+    ]
+
+
+def _project_stage(doc, spec):
+    inclusions = {k: v for k, v in spec.items() if v in (0, 1, True, False) and not isinstance(v, dict)}
+    expressions = {k: v for k, v in spec.items() if k not in inclusions}
+    if inclusions and not any(v for k, v in inclusions.items() if k != '_id') and not expressions:
+        return _project(doc, inclusions)
+    result = {}
+    if spec.get('_id', 1) and '_id' in doc and '_id' not in expressions:
+        result['_id'] = doc['_id']
+    for path, flag in inclusions.items():
+        if path != '_id' and flag:
+            value = _get(doc, path)
+            if value is not MISSING:
+                _set(result, path, _copy(value))
+    for path, expression in expressions.items():
+        value = _evaluate(expression, doc)
+        if value is not MISSING:
+            _set(result, path, value)
+    return result
+
+
+def _unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    path = spec['path'][1:]
+    keep_empty = spec.get('preserveNullAndEmptyArrays', False)
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                out = _copy(doc)
+                _set(out, path, item)
+                yield out
+        elif isinstance(value, list) or value is MISSING or value is None:
+            if keep_empty:
+                out = _copy(doc)
+                if isinstance(value, list):
+                    _unset(out, path)
+                yield out
+        else:
+            yield doc
+
+
+def _run_pipeline(docs, pipeline):
+    docs = list(docs)
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == '$match':
+            spec = _prepare(spec)
+            docs = [doc for doc in docs if _matches(doc, spec)]
+        elif name == '$group':
+            docs = _group(docs, spec)
+        elif name == '$sort':
+            docs = _sort(docs, list(spec.items()))
+        elif name == '$limit':
+            docs = docs[:spec]
+        elif name == '$skip':
+            docs = docs[spec:]
+        elif name == '$project':
+            docs = [_project_stage(doc, spec) for doc in docs]
+        elif name in ('$addFields', '$set'):
+            out = []
+            for doc in docs:
+                doc = _copy(doc)
+                for path, expression in spec.items():
+                    _set(doc, path, _value(_evaluate(expression, doc)))
+                out.append(doc)
+            docs = out
+        elif name == '$unset':
+            fields = [spec] if isinstance(spec, str) else spec
+            docs = [_project(doc, {field: 0 for field in fields}) for doc in docs]
+        elif name == '$unwind':
+            docs = list(_unwind(docs, spec))
+        elif name == '$count':
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == '$replaceRoot':
+            docs = [_evaluate(spec['newRoot'], doc) for doc in docs]
+        elif name == '$facet':
+            docs = [{field: _run_pipeline(docs, sub) for field, sub in spec.items()}]
+        else:
+            raise NotImplementedError(f"Aggregation stage {name} is not supported in memory")
+    return docs
+
+
+class _Index:
+    """
+    Index over `keys`. For each key prefix a dict maps field values to a set
+    of record ids (equality and $in), and for each prefix a sorted list of
+    the next field's values serves a range on that field. A document's record
+    id is its _id, except in time-series collections.
+    """
+
+    def __init__(self, name, keys, unique=False):
+        self.name = name
+        self.keys = keys
+        self.fields = [field for field, _ in keys]
+        self.unique = unique
+        self.prefixes = [dict() for _ in self.fields]
+        # ranges[k]: key prefix of length k -> sorted [(sort key of field k, tiebreak, record id)]
+        self.ranges = [dict() for _ in self.fields]
+        self._tiebreak = {}
+        self._counter = itertools.count()
+        # Array values would need one entry per element; such indexes are not used for lookups
+        self.multikey = False
+
+    def key(self, doc):
+        return tuple(_freeze(_value(_get(doc, field))) for field in self.fields)
+
+    def check(self, doc, ignore=MISSING):
+        if self.unique:
+            existing = self.prefixes[-1].get(self.key(doc), ())
+            if any(rid != ignore for rid in existing):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error index: {self.name} dup key: {self.key(doc)}",
+                    DUPLICATE_KEY, {'keyPattern': dict(self.keys)}
+                )
+
+    def add(self, doc, rid):
+        if any(isinstance(_get(doc, field), list) for field in self.fields):
+            self.multikey = True
+        key = self.key(doc)
+        for length, prefix in enumerate(self.prefixes, 1):
+            prefix.setdefault(key[:length], set()).add(rid)
+        tiebreak = self._tiebreak[rid] = next(self._counter)
+        for length, ranges in enumerate(self.ranges):
+            entry = (_sort_key(_value(_get(doc, self.fields[length]))), tiebreak, rid)
+            bisect.insort(ranges.setdefault(key[:length], []), entry)
+
+    def remove(self, doc, rid):
+        key = self.key(doc)
+        for length, prefix in enumerate(self.prefixes, 1):
+            ids = prefix.get(key[:length])
+            if ids is not None:
+                ids.discard(rid)
+                if not ids:
+                    del prefix[key[:length]]
+        tiebreak = self._tiebreak.pop(rid, None)
+        for length, ranges in enumerate(self.ranges):
+            entries = ranges.get(key[:length])
+            if entries is None or tiebreak is None:
+                continue
+            entry = (_sort_key(_value(_get(doc, self.fields[length]))), tiebreak, rid)
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position][1] == tiebreak:
+                del entries[position]
+            if not entries:
+                del ranges[key[:length]]
+
+    def lookup(self, query):
+        """(number of leading fields used, candidate record ids) for a filter"""
+        if self.multikey:
+            return 0, None
+        values = []
+        for field in self.fields:
+            pinned = _equality_values(query.get(field)) if field in query else None
+            if pinned is None:
+                break
+            values.append([_freeze(v) for v in pinned])
+        bounds = None
+        if len(values) < len(self.fields):
+            bounds = _range_bounds(query.get(self.fields[len(values)]))
+        if bounds is not None:
+            ranges = self.ranges[len(values)]
+            ids = set()
+            for key in itertools.product(*values):
+                entries = ranges.get(key, [])
+                lo = bisect.bisect_left(entries, bounds[0]) if bounds[0] is not None else 0
+                hi = bisect.bisect_left(entries, bounds[1]) if bounds[1] is not None else len(entries)
+                ids.update(entry[2] for entry in entries[lo:hi])
+            return len(values) + 1, ids
+        if not values:
+            return 0, None
+        prefix = self.prefixes[len(values) - 1]
+        ids = set()
+        for key in itertools.product(*values):
+            ids.update(prefix.get(key, ()))
+        return len(values), ids
+
+
+def _range_bounds(condition):
+    """[lo, hi) bounds in index entry order for a $gt/$gte/$lt/$lte condition, or None"""
+    if not isinstance(condition, dict) or not condition or \
+            not set(condition) <= {'$gt', '$gte', '$lt', '$lte'}:
+        return None
+    ranks = {_type_rank(v) for v in condition.values()}
+    if len(ranks) != 1 or ranks & {1, 4, 5}:
+        return None
+    rank = ranks.pop()
+    # A range only matches values of the same type, as on the server
+    lo, hi = ((rank,),), ((rank + 1,),)
+    for operator, value in condition.items():
+        key = _sort_key(value)
+        if operator == '$gte':
+            lo = max(lo, (key,))
+        elif operator == '$gt':
+            lo = max(lo, (key, float('inf')))
+        elif operator == '$lt':
+            hi = min(hi, (key,))
+        else:
+            hi = min(hi, (key, float('inf')))
+    return lo, hi
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection=None, sort=None, skip=0, limit=0):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = _sort_spec(sort) if sort else None
+        self._skip = skip
+        self._limit = limit
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def close(self):
+        self._results = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            self._results = iter(self._collection._query(
+                self._query, self._projection, self._sort, self._skip, self._limit
+            ))
+        return next(self._results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        # record id -> document; the record id is the _id outside time-series collections
+        self._docs = OrderedDict()
+        self._order = {}
+        # id() of a stored time-series document -> its record id
+        self._records = {}
+        self._counter = itertools.count()
+        self._indexes = OrderedDict()
+        self._lock = database._lock
+
+    def with_options(self, **kwargs):
+        return self
+
+    # Indexes
+    def create_index(self, keys, name=None, unique=False, **kwargs):
+        keys = _sort_spec(keys, 1) if isinstance(keys, str) else [tuple(k) for k in keys]
+        name = name or '_'.join(f"{field}_{direction}" for field, direction in keys)
+        with self._lock:
+            for existing in self._indexes.values():
+                if existing.name == name and (existing.keys != keys or existing.unique != bool(unique)):
+                    raise OperationFailure(f"Index {name} already exists with different options",
+                                           INDEX_OPTIONS_CONFLICT)
+                if existing.keys == keys and existing.name != name:
+                    raise OperationFailure(f"Index with keys {keys} already exists as {existing.name}",
+                                           INDEX_OPTIONS_CONFLICT)
+            if name in self._indexes:
+                return name
+            index = _Index(name, keys, bool(unique))
+            for rid, doc in self._docs.items():
+                index.check(doc)
+                index.add(doc, rid)
+            self._indexes[name] = index
+            self.database._touch(self.name)
+            return name
+
+    def drop_index(self, name, **kwargs):
+        with self._lock:
+            if name not in self._indexes:
+                raise OperationFailure(f"index not found with name [{name}]", INDEX_NOT_FOUND)
+            del self._indexes[name]
+
+    def index_information(self):
+        info = {'_id_': {'key': [('_id', 1)]}}
+        for index in self._indexes.values():
+            info[index.name] = {'key': list(index.keys), 'unique': index.unique}
+        return info
+
+    def list_indexes(self):
+        return iter([{'name': name, **spec} for name, spec in self.index_information().items()])
+
+    def drop(self, **kwargs):
+        self.database.drop_collection(self.name)
+
+    def options(self):
+        return dict(self.database._options.get(self.name, {}))
+
+    def rename(self, new_name, **kwargs):
+        self.database._rename(self.name, new_name)
+
+    # Reads
+    def _candidates(self, query):
+        """Documents that can match a filter, narrowed by _id or the best index"""
+        if '_id' in query and not self._series():
+            ids = _equality_values(query['_id'])
+            if ids is not None:
+                return [self._docs[_id] for _id in dict.fromkeys(ids) if _id in self._docs]
+        best, best_ids = 0, None
+        for index in self._indexes.values():
+            used, ids = index.lookup(query)
+            if used > best:
+                best, best_ids = used, ids
+        if best_ids is None:
+            return list(self._docs.values())
+        return [self._docs[_id] for _id in sorted(best_ids, key=self._order.__getitem__)]
+
+    def _matching(self, query):
+        query = _prepare(query or {})
+        return [doc for doc in self._candidates(query) if _matches(doc, query)]
+
+    def _query(self, query, projection=None, sort=None, skip=0, limit=0):
+        with self._lock:
+            docs = self._matching(query)
+            if sort:
+                docs = _sort(docs, sort)
+            if skip:
+                docs = docs[skip:]
+            if limit:
+                docs = docs[:abs(limit)]
+            return [_project(doc, projection) for doc in docs]
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, **kwargs):
+        return MemoryCursor(self, filter, projection, sort, skip, limit)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        return next(iter(self._query(filter, projection, _sort_spec(sort) if sort else None, limit=1)), None)
+
+    def count_documents(self, filter, skip=0, limit=0, **kwargs):
+        with self._lock:
+            count = len(self._matching(filter)) - skip
+            return max(0, min(count, limit) if limit else count)
+
+    def estimated_document_count(self, **kwargs):
+        with self._lock:
+            return len(self._docs)
+
+    def distinct(self, key, filter=None, **kwargs):
+        with self._lock:
+            values, seen = [], set()
+            for doc in self._matching(filter):
+                value = _get(doc, key)
+                for v in (value if isinstance(value, list) else [value]):
+                    if v is not MISSING and _freeze(v) not in seen:
+                        seen.add(_freeze(v))
+                        values.append(_copy(v))
+            return values
+
+    def aggregate(self, pipeline, **kwargs):
+        with self._lock:
+            pipeline = list(pipeline)
+            # A leading $match is served by an index, as on the server
+            if pipeline and '$match' in pipeline[0]:
+                docs = self._matching(pipeline.pop(0)['$match'])
+            else:
+                docs = list(self._docs.values())
+            return iter([_copy(doc) for doc in _run_pipeline(docs, pipeline)])
+
+    # Writes (callers hold the lock)
+    def _series(self):
+        return 'timeseries' in self.database._options.get(self.name, {})
+
+    def _rid(self, doc):
+        """Record id of a stored document"""
+        return self._records[id(doc)] if self._series() else doc['_id']
+
+    def _insert(self, doc):
+        doc = _copy(doc)
+        if '_id' not in doc:
+            doc['_id'] = ObjectId()
+        if self._series():
+            rid = ('record', next(self._counter))
+            self._records[id(doc)] = rid
+        elif doc['_id'] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: _id_ dup key: {doc['_id']}",
+                                    DUPLICATE_KEY, {'keyPattern': {'_id': 1}})
+        else:
+            rid = doc['_id']
+        for index in self._indexes.values():
+            index.check(doc)
+        self._docs[rid] = doc
+        self._order[rid] = next(self._counter)
+        for index in self._indexes.values():
+            index.add(doc, rid)
+        self.database._touch(self.name)
+        return doc['_id']
+
+    def _replace(self, old, new):
+        new['_id'] = old['_id']
+        rid = self._rid(old)
+        for index in self._indexes.values():
+            index.check(new, ignore=rid)
+        for index in self._indexes.values():
+            index.remove(old, rid)
+        self._docs[rid] = new
+        if self._series():
+            del self._records[id(old)]
+            self._records[id(new)] = rid
+        for index in self._indexes.values():
+            index.add(new, rid)
+
+    def _delete(self, doc):
+        rid = self._rid(doc)
+        for index in self._indexes.values():
+            index.remove(doc, rid)
+        del self._docs[rid]
+        del self._order[rid]
+        self._records.pop(id(doc), None)
+
+    def _update(self, query, update, upsert=False, multi=False, replace=False):
+        """Returns (matched, modified, upserted_id)"""
+        if not replace and (not update or not all(k.startswith('$') for k in update)):
+            raise ValueError("update only works with $ operators")
+        if replace and any(k.startswith('$') for k in update):
+            raise ValueError("replacement can not include $ operators")
+        if 'timeseries' in self.options() and (upsert or not multi):
+            raise OperationFailure("Time-series updates must be multi-document and cannot upsert", INVALID_OPTIONS)
+        docs = self._matching(query)
+        if not multi:
+            docs = docs[:1]
+        modified = 0
+        for doc in docs:
+            if replace:
+                new = _copy(update)
+            else:
+                new = _copy(doc)
+                _apply_update(new, update)
+            if new.get('_id', doc['_id']) != doc['_id']:
+                raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+            if new != doc:
+                self._replace(doc, new)
+                modified += 1
+        if docs or not upsert:
+            return len(docs), modified, None
+        new = _upsert_document(query)
+        if replace:
+            new = dict(_copy(update), **({'_id': new['_id']} if '_id' in new else {}))
+        else:
+            _apply_update(new, update, inserting=True)
+        return 0, 0, self._insert(new)
+
+    def _delete_matching(self, query, multi):
+        docs = self._matching(query)
+        if not multi:
+            docs = docs[:1]
+        for doc in docs:
+            self._delete(doc)
+        return len(docs)
+
+    # Writes
+    def insert_one(self, document, **kwargs):
+        with self._lock:
+            inserted_id = self._insert(document)
+        document.setdefault('_id', inserted_id)
+        return InsertOneResult(inserted_id, True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        documents = list(documents)
+        for document in documents:
+            document.setdefault('_id', ObjectId())
+        self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return InsertManyResult([document['_id'] for document in documents], True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(filter, update, upsert)
+        return UpdateResult(self._raw(matched, modified, upserted), True)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(filter, update, upsert, multi=True)
+        return UpdateResult(self._raw(matched, modified, upserted), True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(filter, replacement, upsert, replace=True)
+        return UpdateResult(self._raw(matched, modified, upserted), True)
+
+    @staticmethod
+    def _raw(matched, modified, upserted):
+        raw = {'n': matched or (1 if upserted is not None else 0), 'nModified': modified,
+               'updatedExisting': bool(matched)}
+        if upserted is not None:
+            raw['upserted'] = upserted
+        return raw
+
+    def delete_one(self, filter, **kwargs):
+        with self._lock:
+            return DeleteResult({'n': self._delete_matching(filter, False)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self._lock:
+            return DeleteResult({'n': self._delete_matching(filter, True)}, True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._lock:
+            docs = self._matching(filter)
+            if sort:
+                docs = _sort(docs, _sort_spec(sort))
+            before = _copy(docs[0]) if docs else None
+            if before is not None:
+                self._update({'_id': before['_id']}, update)
+                after = self._docs[before['_id']]
+            elif upsert:
+                _, _, upserted = self._update(filter, update, upsert=True)
+                after = self._docs[upserted]
+            else:
+                return None
+            doc = after if return_document == ReturnDocument.AFTER else before
+            return _project(doc, projection) if doc is not None else None
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self._lock:
+            docs = self._matching(filter)
+            if sort:
+                docs = _sort(docs, _sort_spec(sort))
+            if not docs:
+                return None
+            self._delete(docs[0])
+            return _project(docs[0], projection)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        counts = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        errors = []
+        with self._lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        request._doc.setdefault('_id', ObjectId())
+                        self._insert(request._doc)
+                        counts['nInserted'] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted = self._update(
+                            request._filter, request._doc, bool(request._upsert),
+                            multi=isinstance(request, UpdateMany), replace=isinstance(request, ReplaceOne)
+                        )
+                        counts['nMatched'] += matched
+                        counts['nModified'] += modified
+                        if upserted is not None:
+                            counts['nUpserted'] += 1
+                            counts['upserted'].append({'index': index, '_id': upserted})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        counts['nRemoved'] += self._delete_matching(request._filter, isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f"{request!r} is not a valid request")
+                except OperationFailure as e:
+                    errors.append({'index': index, 'code': e.code, 'errmsg': str(e), 'op': request})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError(dict(counts, writeErrors=errors, writeConcernErrors=[]))
+        return BulkWriteResult(counts, True)
+
+    def _stats(self):
+        size = sum(len(bson.encode(doc)) for doc in self._docs.values())
+        return {
+            'ns': self.full_name, 'count': len(self._docs), 'size': size, 'storageSize': size,
+            'avgObjSize': size // len(self._docs) if self._docs else 0,
+            'nindexes': len(self._indexes) + 1, 'totalIndexSize': 0, 'ok': 1.0
+        }
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._lock = threading.RLock()
+        self._collections = {}
+        self._created = set()
+        self._options = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = MemoryCollection(self, name)
+            return collection
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _touch(self, name):
+        self._created.add(name)
+
+    def list_collection_names(self, **kwargs):
+        with self._lock:
+            return sorted(self._created)
+
+    def create_collection(self, name, **kwargs):
+        with self._lock:
+            if name in self._created:
+                raise CollectionInvalid(f"collection {name} already exists")
+            self._created.add(name)
+            if kwargs.get('timeseries'):
+                self._options[name] = {'timeseries': dict(kwargs['timeseries'])}
+            return self[name]
+
+    def drop_collection(self, name, **kwargs):
+        with self._lock:
+            self._collections.pop(name, None)
+            self._created.discard(name)
+            self._options.pop(name, None)
+
+    def _rename(self, name, new_name):
+        with self._lock:
+            if 'timeseries' in self._options.get(name, {}):
+                raise OperationFailure(f"Cannot rename time-series collection {name}", INVALID_OPTIONS)
+            if new_name in self._created:
+                raise OperationFailure(f"Target namespace {new_name} exists", NAMESPACE_EXISTS)
+            collection = self[name]
+            self._collections.pop(name)
+            self._created.discard(name)
+            collection.name = new_name
+            collection.full_name = f"{self.name}.{new_name}"
+            self._collections[new_name] = collection
+            self._created.add(new_name)
+
+    def command(self, command, value=1, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ('ping', 'serverStatus'):
+            return {'ok': 1.0}
+        if name == 'buildInfo':
+            return {'version': SERVER_VERSION, 'ok': 1.0}
+        if name == 'getParameter':
+            return {'featureCompatibilityVersion': {'version': SERVER_VERSION.rpartition('.')[0]}, 'ok': 1.0}
+        if name in ('hello', 'isMaster', 'ismaster'):
+            return {'ok': 1.0, 'isWritablePrimary': True, 'ismaster': True}
+        if name == 'collStats':
+            with self._lock:
+                return self[value]._stats()
+        if name == 'dbStats':
+            with self._lock:
+                stats = [self[c]._stats() for c in self._created]
+            return {'db': self.name, 'collections': len(stats), 'objects': sum(s['count'] for s in stats),
+                    'dataSize': sum(s['size'] for s in stats), 'storageSize': sum(s['size'] for s in stats),
+                    'indexSize': 0, 'ok': 1.0}
+        raise NotImplementedError(f"Command {name} is not supported in memory")
+
+
+class MemorySession:
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end_session()
+
+    def start_transaction(self, **kwargs):
+        return self
+
+    def commit_transaction(self):
+        pass
+
+    def abort_transaction(self):
+        pass
+
+    def with_transaction(self, callback, **kwargs):
+        return callback(self)
+
+    def end_session(self):
+        pass
+
+
+class MemoryClient:
+    def __init__(self, *args, **kwargs):
+        self._databases = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            database = self._databases.get(name)
+            if database is None:
+                database = self._databases[name] = MemoryDatabase(self, name)
+            return database
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name, **kwargs):
+        return self[name]
+
+    def list_database_names(self):
+        return sorted(self._databases)
+
+    def drop_database(self, name):
+        with self._lock:
+            self._databases.pop(getattr(name, 'name', name), None)
+
+    def start_session(self, **kwargs):
+        return MemorySession(self)
+
+    def close(self):
+        pass
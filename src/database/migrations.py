@@ -0,0 +1,97 @@
+"""
+Schema version and one-off migrations.
+
+A single `meta` document ({_id: 'schema', version}) records the schema
+version the database was last migrated to. At startup ensure_schema()
+reads it once; when it matches SCHEMA_VERSION no DDL is issued at all.
+Otherwise the migrations newer than the stored version run in order and
+the version is advanced after each one.
+
+Every migration is idempotent, so two app instances starting against an
+old schema at the same time only repeat work; the one that copies data
+(v5) holds a lease instead, and the second instance waits until the first
+has finished copying. Migrations run inside DatabaseManager's constructor,
+so the app starts once they are done. To change collections or indexes,
+append a migration and bump SCHEMA_VERSION.
+"""
+import time
+from datetime import datetime
+
+from src.database.event_series import SERIES_COLLECTIONS, migrate_collection
+from src.database.indexes import apply_indexes
+from src.utils.logger import logger
+
+SCHEMA_KEY = {'_id': 'schema'}
+
+
+def create_collections(db_manager):
+    db_manager.verify_collections()
+
+
+def create_indexes(db_manager):
+    apply_indexes(db_manager.db)
+
+
+def backfill_course_stats(db_manager):
+    """Build course_student_stats from the raw events if it has never been built"""
+    if db_manager.db.course_student_stats.estimated_document_count() == 0:
+        for course in db_manager.db.courses.find({}, {'_id': 1}):
+            db_manager.course_stats.rebuild(course['_id'])
+
+
+def seed_student_counters(db_manager):
+    db_manager.seed_student_counters()
+
+
+def store_events_as_time_series(db_manager):
+    """Move hand_raises and questions into time-series collections, then index them"""
+    for name in SERIES_COLLECTIONS:
+        migrate_collection(db_manager.db, name)
+    apply_indexes(db_manager.db)
+
+
+# (version, description, migration(db_manager))
+MIGRATIONS = [
+    (1, "create required collections", create_collections),
+    (2, "apply the index catalogue", create_indexes),
+    (3, "backfill per-student engagement counters", backfill_course_stats),
+    (4, "seed student_id counters", seed_student_counters),
+    (5, "store hand raises and questions as time-series collections", store_events_as_time_series),
+    (6, "index daily engagement rollups", create_indexes),
+    (7, "index cascade delete jobs", create_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def stored_version(db):
+    doc = db.meta.find_one(SCHEMA_KEY, {'version': 1})
+    return doc.get('version', 0) if doc else 0
+
+
+def ensure_schema(db_manager, force=False):
+    """
+    Bring the database up to SCHEMA_VERSION. Returns the list of versions
+    applied; empty when the stored version already matched (one read).
+    """
+    db = db_manager.db
+    current = 0 if force else stored_version(db)
+    if current >= SCHEMA_VERSION:
+        if current > SCHEMA_VERSION:
+            logger.warning(f"Database schema v{current} is newer than this build (v{SCHEMA_VERSION})")
+        return []
+
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        start = time.perf_counter()
+        migration(db_manager)
+        db.meta.update_one(
+            SCHEMA_KEY,
+            {'$max': {'version': version}, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        applied.append(version)
+        logger.info(f"Migrated schema to v{version} ({description}) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return applied
@@ -0,0 +1,179 @@
+"""
+Student photos, kept out of the `students` documents.
+
+Each student has one `student_photos` document holding a square JPEG crop
+of the registered face and a small pre-encoded thumbnail, so roster queries
+never carry image bytes and the details dialog can show the thumbnail
+without decoding the full image.
+
+Students registered before this store existed carry an inline `photo`
+field; move them over once with:
+
+    python -m src.database.photo_store --migrate
+"""
+import argparse
+from datetime import datetime
+
+import cv2
+import numpy as np
+from pymongo import UpdateOne
+
+from src.utils.logger import logger
+
+CROP_SIZE = 256
+THUMBNAIL_SIZE = 72
+CROP_MARGIN = 0.4  # fraction of the face box added on each side
+
+
+def face_crop(image, face_location=None, margin=CROP_MARGIN, size=CROP_SIZE):
+    """
+    Square crop of a BGR frame centred on face_location (top, right, bottom, left),
+    resized to size x size. Without a location the centre square of the frame is used.
+    """
+    h, w = image.shape[:2]
+    if face_location is None:
+        side = min(h, w)
+        cx, cy = w // 2, h // 2
+    else:
+        top, right, bottom, left = face_location
+        side = int(max(bottom - top, right - left) * (1 + 2 * margin))
+        cx, cy = (left + right) // 2, (top + bottom) // 2
+    side = max(1, min(side, h, w))
+    x0 = min(max(cx - side // 2, 0), w - side)
+    y0 = min(max(cy - side // 2, 0), h - side)
+    crop = image[y0:y0 + side, x0:x0 + side]
+    interpolation = cv2.INTER_AREA if side > size else cv2.INTER_CUBIC
+    return cv2.resize(crop, (size, size), interpolation=interpolation)
+
+
+def encode_jpeg(image, quality):
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok or buffer is None or len(buffer) == 0:
+        raise ValueError("Failed to encode photo")
+    return buffer.tobytes()
+
+
+def encode_photo(image, face_location=None):
+    """Return (crop_jpeg, thumbnail_jpeg) for a BGR frame"""
+    crop = face_crop(image, face_location)
+    thumbnail = cv2.resize(crop, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(crop, 90), encode_jpeg(thumbnail, 80)
+
+
+class StudentPhotoStore:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.student_photos
+
+    def document(self, course_id, student_id, image, face_location=None):
+        crop, thumbnail = encode_photo(image, face_location)
+        return {
+            'course_id': course_id,
+            'student_id': student_id,
+            'photo': crop,
+            'thumbnail': thumbnail,
+            'size': CROP_SIZE,
+            'created_at': datetime.utcnow()
+        }
+
+    def put(self, doc):
+        """Store a photo document from document(), replacing the student's previous one"""
+        return self.collection.replace_one(
+            {'course_id': doc['course_id'], 'student_id': doc['student_id']}, doc, upsert=True
+        )
+
+    def get_thumbnail(self, course_id, student_id):
+        doc = self.collection.find_one(
+            {'course_id': course_id, 'student_id': student_id}, {'_id': 0, 'thumbnail': 1}
+        )
+        return doc.get('thumbnail') if doc else None
+
+    def get_photo(self, course_id, student_id):
+        doc = self.collection.find_one(
+            {'course_id': course_id, 'student_id': student_id}, {'_id': 0, 'photo': 1}
+        )
+        return doc.get('photo') if doc else None
+
+    def delete(self, course_id, student_id=None):
+        query = {'course_id': course_id}
+        if student_id is not None:
+            query['student_id'] = student_id
+        return self.collection.delete_many(query)
+
+    def migrate_inline_photos(self, locate_face=None, batch_size=50):
+        """
+        Move inline `photo` fields from `students` into this store, then unset them.
+        locate_face(image) -> (top, right, bottom, left) or None picks the crop;
+        without it the centre of the frame is kept. Returns (migrated, failed).
+        """
+        migrated = failed = 0
+        cursor = self.db.students.find(
+            {'photo': {'$exists': True}},
+            {'course_id': 1, 'student_id': 1, 'photo': 1}
+        ).batch_size(batch_size)
+
+        photos, unsets = [], []
+
+        def flush():
+            nonlocal photos, unsets
+            if photos:
+                self.collection.bulk_write(photos, ordered=False)
+                # Only drop inline photos once their copies are stored
+                self.db.students.bulk_write(unsets, ordered=False)
+                photos, unsets = [], []
+
+        for student in cursor:
+            try:
+                image = cv2.imdecode(np.frombuffer(student['photo'], dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    raise ValueError("undecodable JPEG")
+                location = locate_face(image) if locate_face else None
+                doc = self.document(student['course_id'], student['student_id'], image, location)
+            except Exception as e:
+                logger.error(f"Could not migrate photo of student {student.get('student_id')}: {str(e)}")
+                failed += 1
+                continue
+            photos.append(UpdateOne(
+                {'course_id': doc['course_id'], 'student_id': doc['student_id']},
+                {'$setOnInsert': doc},
+                upsert=True
+            ))
+            unsets.append(UpdateOne({'_id': student['_id']}, {'$unset': {'photo': ''}}))
+            migrated += 1
+            if len(photos) >= batch_size:
+                flush()
+        flush()
+        logger.info(f"Migrated {migrated} student photos ({failed} failed)")
+        return migrated, failed
+
+
+def locate_largest_face(image):
+    """Largest face box in a BGR frame, or None"""
+    import face_recognition
+
+    locations = face_recognition.face_locations(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if not locations:
+        return None
+    return max(locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+
+
+def main():
+    from src.database.db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Move inline student photos into student_photos")
+    parser.add_argument('--migrate', action='store_true', help="migrate students that still carry a photo")
+    parser.add_argument('--no-detect', action='store_true', help="crop the frame centre instead of detecting faces")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(allow_offline=False)
+    remaining = db_manager.db.students.count_documents({'photo': {'$exists': True}})
+    print(f"{remaining} students with inline photos")
+    if args.migrate and remaining:
+        locate = None if args.no_detect else locate_largest_face
+        migrated, failed = db_manager.photos.migrate_inline_photos(locate_face=locate)
+        print(f"Migrated {migrated}, failed {failed}")
+    db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
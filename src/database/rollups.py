@@ -0,0 +1,227 @@
+"""
+Daily engagement rollups (`engagement_daily`) and retention of raw events.
+
+One document per course, student and day holds that day's hand raises,
+relevant and irrelevant questions and attendance. The job rolls up whole
+days only. A high-water mark in `meta` ({_id: 'rollup:daily'}) records
+how far it has got. Each run recomputes from `lookback_days` before the
+mark up to the start of today, so events journaled offline and synced
+late are still counted. Every source $sets its own fields, so rolling a
+day up again is idempotent.
+
+With a retention period, raw hand raises and questions older than that
+are deleted once their days are rolled up. Attendance is kept: it is one
+record per student and day, and attendance rates read it. The retention
+horizon is stored next to the high-water mark. Days before it are never
+recomputed, and CourseStats adds their rollups when it rebuilds counters
+from raw events.
+
+Trend queries (weekly_trend) read rollups only. Run the job daily, e.g.
+from cron:
+
+    python -m src.database.rollups [--retention-days 180] [--lookback-days 2]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from src.database.analytics import relevant_flag
+from src.database.event_series import META_FIELD
+from src.utils.logger import logger
+
+STATE_KEY = {'_id': 'rollup:daily'}
+METRICS = ('hand_raises', 'relevant_questions', 'irrelevant_questions', 'present')
+LOOKBACK_DAYS = 2
+WRITE_BATCH = 1000
+
+
+def start_of_day(value):
+    return datetime.combine(value.date() if isinstance(value, datetime) else value, datetime.min.time())
+
+
+def _day(field):
+    return {'$dateTrunc': {'date': field, 'unit': 'day'}}
+
+
+def _range(start, end):
+    condition = {'$lt': end}
+    if start is not None:
+        condition['$gte'] = start
+    return condition
+
+
+class DailyRollups:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.engagement_daily
+
+    def state(self):
+        """{'rolled_through', 'retained_from'}; empty before the first run"""
+        return self.db.meta.find_one(STATE_KEY) or {}
+
+    def sources(self, start, end):
+        """(collection, pipeline) for every raw event source, grouped by course, student and day"""
+        series_key = {
+            'course_id': f'${META_FIELD}.course_id', 'student_id': f'${META_FIELD}.student_id',
+            'day': _day('$timestamp')
+        }
+        return [
+            ('hand_raises', [
+                {'$match': {'timestamp': _range(start, end)}},
+                {'$group': {'_id': series_key, 'hand_raises': {'$sum': 1}}}
+            ]),
+            ('questions', [
+                {'$match': {'timestamp': _range(start, end)}},
+                {'$group': {'_id': series_key, 'relevant_questions': {'$sum': relevant_flag()}, 'total': {'$sum': 1}}},
+                {'$addFields': {'irrelevant_questions': {'$subtract': ['$total', '$relevant_questions']}}},
+                {'$unset': 'total'}
+            ]),
+            ('attendance', [
+                {'$match': {'date': _range(start, end), 'status': 'Present'}},
+                {'$group': {
+                    '_id': {'course_id': '$course_id', 'student_id': '$student_id', 'day': _day('$date')},
+                    'present': {'$max': 1}
+                }}
+            ]),
+        ]
+
+    def roll_up(self, start, end):
+        """Write the rollups of every day in [start, end); start None means from the first event"""
+        written = 0
+        for collection, pipeline in self.sources(start, end):
+            operations = []
+            for row in self.db[collection].aggregate(pipeline, allowDiskUse=True):
+                key = row.pop('_id')
+                operations.append(UpdateOne(key, {'$set': row}, upsert=True))
+                if len(operations) >= WRITE_BATCH:
+                    self.collection.bulk_write(operations, ordered=False)
+                    written += len(operations)
+                    operations = []
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+                written += len(operations)
+        return written
+
+    def run(self, now=None, lookback_days=LOOKBACK_DAYS, retention_days=None):
+        """
+        Roll up every completed day since the high-water mark, then apply
+        retention. Returns {'start', 'end', 'rollups', 'deleted'}
+        """
+        today = start_of_day(now or datetime.now())
+        state = self.state()
+        start = state.get('rolled_through')
+        if start is not None:
+            start = min(start, today) - timedelta(days=lookback_days)
+        retained_from = state.get('retained_from')
+        if retained_from is not None and (start is None or start < retained_from):
+            # Raw events before the horizon are gone; their rollups are final
+            start = retained_from
+
+        written = self.roll_up(start, today)
+        self.db.meta.update_one(STATE_KEY, {'$max': {'rolled_through': today}}, upsert=True)
+
+        deleted = {}
+        if retention_days is not None:
+            deleted = self.apply_retention(today - timedelta(days=retention_days))
+        logger.info(f"Rolled up {written} student-days from {start or 'the first event'} to {today}")
+        return {'start': start, 'end': today, 'rollups': written, 'deleted': deleted}
+
+    def apply_retention(self, horizon):
+        """Delete raw hand raises and questions before `horizon`, which is capped at the high-water mark"""
+        rolled_through = self.state().get('rolled_through')
+        if rolled_through is None:
+            return {}
+        horizon = min(start_of_day(horizon), rolled_through)
+        deleted = {
+            name: self.db[name].delete_many({'timestamp': {'$lt': horizon}}).deleted_count
+            for name in ('hand_raises', 'questions')
+        }
+        self.db.meta.update_one(STATE_KEY, {'$max': {'retained_from': horizon}}, upsert=True)
+        logger.info(f"Deleted raw events before {horizon}: {deleted}")
+        return deleted
+
+    def totals_before(self, course_id, day):
+        """{student_id: summed rollup metrics} for a course's days before `day`"""
+        rows = self.collection.aggregate([
+            {'$match': {'course_id': course_id, 'day': {'$lt': day}}},
+            {'$group': {'_id': '$student_id', **{name: {'$sum': f'${name}'} for name in METRICS}}}
+        ])
+        return {row.pop('_id'): row for row in rows}
+
+    def weekly_trend(self, course_id, weeks=8, student_id=None, now=None):
+        """
+        Weekly totals for the last `weeks` weeks (Monday to Sunday), oldest
+        first, from rollups only: [{'week', 'hand_raises', 'relevant_questions',
+        'irrelevant_questions', 'questions', 'attendance', 'students'}].
+        The current week covers the days rolled up so far.
+        """
+        today = start_of_day(now or datetime.now())
+        this_week = today - timedelta(days=today.weekday())
+        first = this_week - timedelta(weeks=weeks - 1)
+        match = {'course_id': course_id, 'day': {'$gte': first}}
+        if student_id is not None:
+            match['student_id'] = student_id
+        rows = {
+            row['_id']: row for row in self.collection.aggregate([
+                {'$match': match},
+                {'$group': {
+                    '_id': {'$dateTrunc': {'date': '$day', 'unit': 'week', 'startOfWeek': 'monday'}},
+                    **{name: {'$sum': f'${name}'} for name in METRICS},
+                    'students': {'$addToSet': '$student_id'}
+                }}
+            ])
+        }
+        trend = []
+        for i in range(weeks):
+            week = first + timedelta(weeks=i)
+            row = rows.get(week, {})
+            entry = {'week': week, **{name: row.get(name, 0) for name in METRICS}}
+            entry['questions'] = entry['relevant_questions'] + entry['irrelevant_questions']
+            entry['attendance'] = entry.pop('present')
+            entry['students'] = len(row.get('students', []))
+            trend.append(entry)
+        return trend
+
+    @staticmethod
+    def week_over_week(trend, metric, now=None):
+        """
+        Percentage change of `metric` between the last two complete weeks of
+        a weekly_trend(); None without a baseline. The current week is left
+        out, since it only covers the days rolled up so far.
+        """
+        today = start_of_day(now or datetime.now())
+        complete = [week for week in trend if week['week'] + timedelta(weeks=1) <= today]
+        if len(complete) < 2 or not complete[-2][metric]:
+            return None
+        return (complete[-1][metric] - complete[-2][metric]) * 100.0 / complete[-2][metric]
+
+    def delete(self, course_id, student_id=None):
+        query = {'course_id': course_id}
+        if student_id is not None:
+            query['student_id'] = student_id
+        return self.collection.delete_many(query)
+
+
+def main():
+    from src.database.db_manager import DatabaseManager
+    from src.utils.config import load_config
+
+    db_config = load_config().get('database') or {}
+    parser = argparse.ArgumentParser(description="Roll raw engagement events up into daily totals")
+    parser.add_argument('--lookback-days', type=int, default=db_config.get('rollup_lookback_days', LOOKBACK_DAYS),
+                        help="days before the high-water mark to recompute for late events")
+    parser.add_argument('--retention-days', type=int, default=db_config.get('rollup_retention_days'),
+                        help="delete raw hand raises and questions older than this once rolled up")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(allow_offline=False)
+    result = db_manager.rollups.run(lookback_days=args.lookback_days, retention_days=args.retention_days)
+    print(f"Rolled up {result['rollups']} student-days through {result['end']:%Y-%m-%d}")
+    for name, count in result['deleted'].items():
+        print(f"  deleted {count} raw {name.replace('_', ' ')}")
+    db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,452 @@
+"""
+Streaming export and import of course data.
+
+A dump is a directory with one file per collection: courses, students,
+student_photos (face crops and thumbnails), attendance, questions,
+hand_raises and engagement_daily (daily rollups, which hold the history
+of raw events deleted by retention). Files are NDJSON in relaxed Extended
+JSON (`<name>.ndjson`, one document per line) or BSON (`<name>.bson`,
+concatenated documents as written by mongodump). Both are read and
+written one document at a time, so memory stays constant however many
+events a course has. Files of other collections are skipped with a
+warning.
+
+Export reads each collection through a cursor with a fixed batch size.
+Import groups documents into batches bounded by count and bytes and
+writes them with unordered insert_many, one thread per collection.
+Documents keep their _id, so importing a dump twice only reports
+duplicates. The time-series event collections have no unique _id, so
+existing events are looked up per batch. Student IDs are also kept, so
+the course's questions, attendance and hand raises still point at the
+right students. The per-course counters (course_student_stats and the
+student_id counter) are rebuilt after an import, for every course the
+imported documents belong to.
+
+mongo-shell seed scripts (`db.<collection>.insertMany([...])` with
+ObjectId(...) / ISODate(...) literals) can be imported directly, or
+converted to a dump:
+
+    python -m src.database.transfer export --course CS101 --out dumps/cs101 [--format bson]
+    python -m src.database.transfer import dumps/cs101 [--batch-size 2000] [--workers 6]
+    python -m src.database.transfer import-shell src/database/student_questions.json
+"""
+import argparse
+import ast
+import base64
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import bson
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from src.database.attendance_matrix import version_operation
+from src.database.event_series import META_FIELD, SERIES_COLLECTIONS, pack, stored_ids
+from src.utils.logger import logger
+
+DUPLICATE_KEY = 11000
+COLLECTIONS = ['courses', 'students', 'student_photos', 'attendance', 'questions', 'hand_raises', 'engagement_daily']
+FORMATS = {'ndjson': '.ndjson', 'bson': '.bson'}
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+# Import batches: insert_many splits anything above 48 MB into several
+# messages; smaller batches keep several collections writing at once
+BATCH_DOCUMENTS = 1000
+BATCH_BYTES = 8 * 1024 * 1024
+EXPORT_BATCH_SIZE = 1000
+
+
+def course_filter(collection, course_ids=None):
+    if course_ids is None:
+        return {}
+    if collection in SERIES_COLLECTIONS:
+        key = f'{META_FIELD}.course_id'
+    else:
+        key = '_id' if collection == 'courses' else 'course_id'
+    return {key: {'$in': list(course_ids)}}
+
+
+def dump_path(directory, collection):
+    """The dump file of a collection, whichever format it was written in"""
+    for extension in FORMATS.values():
+        path = os.path.join(directory, collection + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+# Reading and writing
+def write_documents(path, documents):
+    """Stream documents to an .ndjson or .bson file; returns (documents, bytes)"""
+    count = size = 0
+    if path.endswith('.bson'):
+        with open(path, 'wb') as f:
+            for document in documents:
+                data = bson.encode(document)
+                f.write(data)
+                count += 1
+                size += len(data)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            for document in documents:
+                line = json_util.dumps(document, json_options=JSON_OPTIONS) + '\n'
+                f.write(line)
+                count += 1
+                size += len(line)
+    return count, size
+
+
+def read_documents(path):
+    """Yield (document, encoded size) from an .ndjson or .bson file, one at a time"""
+    if path.endswith('.bson'):
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(4)
+                if not header:
+                    return
+                length = int.from_bytes(header, 'little')
+                data = header + f.read(length - 4)
+                yield bson.decode(data), length
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json_util.loads(line, json_options=JSON_OPTIONS), len(line)
+
+
+def batches(documents, max_documents=BATCH_DOCUMENTS, max_bytes=BATCH_BYTES):
+    """Group (document, size) pairs into lists bounded by count and total size"""
+    batch, size = [], 0
+    for document, length in documents:
+        if batch and (len(batch) >= max_documents or size + length > max_bytes):
+            yield batch, size
+            batch, size = [], 0
+        batch.append(document)
+        size += length
+    if batch:
+        yield batch, size
+
+
+# Export
+def export_collections(db, directory, course_ids=None, fmt='ndjson', batch_size=EXPORT_BATCH_SIZE):
+    """Write every course collection to `directory`; returns {collection: report}"""
+    os.makedirs(directory, exist_ok=True)
+    reports = {}
+    for collection in COLLECTIONS:
+        start = time.perf_counter()
+        cursor = db[collection].find(course_filter(collection, course_ids)).batch_size(batch_size)
+        documents, size = write_documents(os.path.join(directory, collection + FORMATS[fmt]), cursor)
+        reports[collection] = _report(documents, size, time.perf_counter() - start)
+    return reports
+
+
+# Import
+def document_course_id(collection, document):
+    """The course a dumped document belongs to; events may be packed or not"""
+    if collection == 'courses':
+        return document.get('_id')
+    if collection in SERIES_COLLECTIONS and META_FIELD in document:
+        return document[META_FIELD].get('course_id')
+    return document.get('course_id')
+
+
+def insert_batches(collection, batched, series=False):
+    """
+    Unordered insert_many per batch; existing _ids count as duplicates.
+    Returns a report, with the course_ids the documents belong to.
+    """
+    inserted = duplicates = failed = size = 0
+    course_ids = set()
+    start = time.perf_counter()
+    for batch, batch_size in batched:
+        size += batch_size
+        course_ids.update(document_course_id(collection.name, doc) for doc in batch)
+        if series:
+            batch, skipped = _new_events(collection, batch)
+            duplicates += skipped
+            if not batch:
+                continue
+        try:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            dupes = sum(1 for error in errors if error.get('code') == DUPLICATE_KEY)
+            for error in errors:
+                if error.get('code') != DUPLICATE_KEY:
+                    logger.error(f"Import into {collection.name} failed: {error.get('errmsg')}")
+            inserted += e.details.get('nInserted', 0)
+            duplicates += dupes
+            failed += len(errors) - dupes
+    report = _report(inserted, size, time.perf_counter() - start)
+    report.update(duplicates=duplicates, failed=failed, course_ids=course_ids - {None})
+    return report
+
+
+def _new_events(collection, batch):
+    """
+    Drop events a time-series collection already holds. It has no unique _id
+    to reject them, so look them up through the course index instead.
+    Dumps written before events moved to time-series are packed on the way.
+    """
+    batch = [pack(doc) for doc in batch]
+    stored = stored_ids(collection, batch)
+    # Events without an _id (from shell scripts) get a new one and are always inserted
+    return [doc for doc in batch if doc.get('_id') not in stored], len(stored)
+
+
+def import_collections(db, directory, batch_documents=BATCH_DOCUMENTS, batch_bytes=BATCH_BYTES, workers=len(COLLECTIONS)):
+    """Load every collection file in `directory`, collections in parallel; returns {collection: report}"""
+    paths = {c: dump_path(directory, c) for c in COLLECTIONS}
+    paths = {c: p for c, p in paths.items() if p}
+    extensions = tuple(FORMATS.values())
+    unknown = sorted(os.path.splitext(name)[0] for name in os.listdir(directory)
+                     if name.endswith(extensions) and os.path.splitext(name)[0] not in COLLECTIONS)
+    if unknown:
+        logger.warning(f"Skipping {', '.join(unknown)} in {directory}: only {', '.join(COLLECTIONS)} are imported")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            collection: pool.submit(
+                insert_batches, db[collection], batches(read_documents(path), batch_documents, batch_bytes),
+                collection in SERIES_COLLECTIONS
+            )
+            for collection, path in paths.items()
+        }
+        return {collection: future.result() for collection, future in futures.items()}
+
+
+def imported_course_ids(reports):
+    """Every course the documents of an import_collections() run belong to"""
+    return sorted({course_id for report in reports.values() for course_id in report['course_ids']}, key=str)
+
+
+def refresh_course_counters(db_manager, course_ids):
+    """Rebuild the derived per-course counters after an import"""
+    for course_id in course_ids:
+        db_manager.course_stats.rebuild(course_id)
+        db_manager.db.counters.bulk_write([version_operation(course_id)])
+    db_manager.seed_student_counters()
+
+
+def _report(documents, size, seconds):
+    return {
+        'documents': documents,
+        'bytes': size,
+        'seconds': seconds,
+        'docs_per_second': documents / seconds if seconds > 0 else 0.0,
+        'mb_per_second': size / seconds / 1e6 if seconds > 0 else 0.0,
+    }
+
+
+# mongo-shell scripts
+SHELL_STATEMENT = re.compile(
+    r"db(?:\.(?P<name>[A-Za-z_][\w]*)|\.getCollection\(\s*['\"](?P<quoted>[^'\"]+)['\"]\s*\))"
+    r"\.(?P<method>insertMany|insertOne|insert)\s*\("
+)
+SHELL_LITERAL = re.compile(r"(?:new\s+)?(ObjectId|ISODate|Date|NumberLong|NumberInt|NumberDecimal|BinData)\s*\(")
+
+
+def _skip_string(text, i):
+    """Index just past the string literal starting at text[i]"""
+    quote = text[i]
+    i += 1
+    while text[i] != quote:
+        i += 2 if text[i] == '\\' else 1
+    return i + 1
+
+
+def _closing(text, i):
+    """Index of the bracket closing the one at text[i]"""
+    depth = 0
+    while i < len(text):
+        char = text[i]
+        if char in '\'"':
+            i = _skip_string(text, i)
+            continue
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError("Unbalanced brackets in shell script")
+
+
+def _shell_string(text):
+    """JSON string for a single- or double-quoted shell string"""
+    return json.dumps(ast.literal_eval(text))
+
+
+def _literal(name, args):
+    values = [json.loads(_shell_to_json(arg)) for arg in args]
+    if name == 'ObjectId':
+        return {'$oid': values[0]}
+    if name in ('ISODate', 'Date'):
+        if not values:
+            when = datetime.now(timezone.utc)
+        elif isinstance(values[0], (int, float)):
+            return {'$date': {'$numberLong': str(int(values[0]))}}
+        else:
+            when = datetime.fromisoformat(values[0].replace('Z', '+00:00'))
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+        return {'$date': {'$numberLong': str(int(when.timestamp() * 1000))}}
+    if name == 'NumberLong':
+        return {'$numberLong': str(int(values[0]))}
+    if name == 'NumberInt':
+        return int(values[0])
+    if name == 'NumberDecimal':
+        return {'$numberDecimal': str(values[0])}
+    subtype, data = values
+    base64.b64decode(data)
+    return {'$binary': {'base64': data, 'subType': format(int(subtype), '02x')}}
+
+
+def _split_arguments(text):
+    args, depth, start, i = [], 0, 0, 0
+    while i < len(text):
+        char = text[i]
+        if char in '\'"':
+            i = _skip_string(text, i)
+            continue
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    if text[start:].strip():
+        args.append(text[start:].strip())
+    return args
+
+
+def _shell_to_json(text):
+    """Translate a shell (JavaScript) expression into Extended JSON text"""
+    out, i = [], 0
+    while i < len(text):
+        char = text[i]
+        if char in '\'"':
+            end = _skip_string(text, i)
+            out.append(_shell_string(text[i:end]))
+            i = end
+            continue
+        if text.startswith('//', i):
+            i = text.find('\n', i) if text.find('\n', i) != -1 else len(text)
+            continue
+        if text.startswith('/*', i):
+            i = text.index('*/', i) + 2
+            continue
+        literal = SHELL_LITERAL.match(text, i)
+        if literal and (i == 0 or not (text[i - 1].isalnum() or text[i - 1] in '_$')):
+            open_at = literal.end() - 1
+            close_at = _closing(text, open_at)
+            out.append(json.dumps(_literal(literal.group(1), _split_arguments(text[open_at + 1:close_at]))))
+            i = close_at + 1
+            continue
+        identifier = re.match(r"[A-Za-z_$][\w$]*", text[i:])
+        if identifier and (i == 0 or not (text[i - 1].isalnum() or text[i - 1] in '_$')):
+            word = identifier.group(0)
+            after = text[i + len(word):].lstrip()
+            if after.startswith(':'):
+                out.append(json.dumps(word))
+            else:
+                out.append(word)
+            i += len(word)
+            continue
+        out.append(char)
+        i += 1
+    # JavaScript allows trailing commas
+    return re.sub(r",(\s*[\]}])", r"\1", ''.join(out))
+
+
+def shell_script_documents(text):
+    """Yield (collection, document) for every insert statement in a mongo-shell script"""
+    for statement in SHELL_STATEMENT.finditer(text):
+        collection = statement.group('name') or statement.group('quoted')
+        open_at = statement.end() - 1
+        close_at = _closing(text, open_at)
+        args = _split_arguments(text[open_at + 1:close_at])
+        if not args:
+            continue
+        documents = json_util.loads(_shell_to_json(args[0]), json_options=JSON_OPTIONS)
+        for document in documents if isinstance(documents, list) else [documents]:
+            yield collection, document
+
+
+def _print_reports(reports):
+    print(f"{'collection':<16}{'documents':>12}{'MB':>10}{'seconds':>10}{'docs/s':>12}{'MB/s':>8}{'dupes':>8}")
+    for collection, r in reports.items():
+        print(f"{collection:<16}{r['documents']:>12}{r['bytes'] / 1e6:>10.1f}{r['seconds']:>10.2f}"
+              f"{r['docs_per_second']:>12.0f}{r['mb_per_second']:>8.1f}{r.get('duplicates', 0):>8}")
+    documents = sum(r['documents'] for r in reports.values())
+    size = sum(r['bytes'] for r in reports.values())
+    return documents, size
+
+
+def main():
+    from src.database.db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Stream course data to and from NDJSON / BSON dumps")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write courses and their students and events to a directory")
+    export.add_argument('--course', action='append', help="course code (repeatable; default: all courses)")
+    export.add_argument('--out', required=True, help="dump directory")
+    export.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+    export.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE, help="cursor batch size")
+    load = commands.add_parser('import', help="load a dump directory")
+    load.add_argument('directory')
+    load.add_argument('--batch-size', type=int, default=BATCH_DOCUMENTS, help="documents per insert_many")
+    load.add_argument('--batch-mb', type=float, default=BATCH_BYTES / 1024 / 1024, help="MB per insert_many")
+    load.add_argument('--workers', type=int, default=len(COLLECTIONS), help="collections imported in parallel")
+    shell = commands.add_parser('import-shell', help="import the inserts of a mongo-shell script")
+    shell.add_argument('script')
+    shell.add_argument('--out', help="write the documents as an NDJSON dump instead of importing them")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(allow_offline=False)
+    start = time.perf_counter()
+    if args.command == 'export':
+        course_ids = None
+        if args.course:
+            courses = [db_manager.get_course_by_code(code) for code in args.course]
+            missing = [code for code, course in zip(args.course, courses) if course is None]
+            if missing:
+                raise SystemExit(f"Unknown course {', '.join(missing)}")
+            course_ids = [course['_id'] for course in courses]
+        reports = export_collections(db_manager.db, args.out, course_ids, args.format, args.batch_size)
+    else:
+        if args.command == 'import-shell':
+            with open(args.script, 'r', encoding='utf-8') as f:
+                text = f.read()
+            directory = args.out or os.path.splitext(args.script)[0] + '_dump'
+            os.makedirs(directory, exist_ok=True)
+            found = sorted({collection for collection, _ in shell_script_documents(text)})
+            for collection in found:
+                write_documents(os.path.join(directory, collection + '.ndjson'),
+                                (doc for name, doc in shell_script_documents(text) if name == collection))
+            print(f"Converted {', '.join(found) or 'no collections'} to {directory}")
+            if args.out:
+                db_manager.close()
+                return
+            batch_documents, batch_bytes, workers = BATCH_DOCUMENTS, BATCH_BYTES, len(COLLECTIONS)
+        else:
+            directory = args.directory
+            batch_documents, batch_bytes, workers = args.batch_size, int(args.batch_mb * 1024 * 1024), args.workers
+        reports = import_collections(db_manager.db, directory, batch_documents, batch_bytes, workers)
+        refresh_course_counters(db_manager, imported_course_ids(reports))
+
+    elapsed = time.perf_counter() - start
+    documents, size = _print_reports(reports)
+    print(f"\n{documents} documents, {size / 1e6:.1f} MB in {elapsed:.2f} s "
+          f"({documents / elapsed:.0f} docs/s, {size / elapsed / 1e6:.1f} MB/s)")
+    db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,29 @@
+import time
+_PROCESS_START = time.perf_counter()
+
 import sys
+from PyQt5.QtCore import QObject, QEvent
 from PyQt5.QtWidgets import QApplication, QMessageBox
 from ui.main_window import MainWindow
 from database.db_manager import DatabaseManager
 from utils.config import load_config
 from utils.logger import logger
 
+class FirstPaintTimer(QObject):
+    """Logs cold-start time once the main window has painted for the first time"""
+
+    def __init__(self, phases):
+        super().__init__()
+        self.phases = phases
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            total = (time.perf_counter() - _PROCESS_START) * 1000
+            breakdown = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.phases)
+            logger.info(f"Cold start: first paint after {total:.0f} ms ({breakdown})")
+        return False
+
 def main():
     try:
         # IN THIS ORDER: APPLICATION, CONFIGURATION, DATABASE, SHOW MAIN WINDOW
@@ -13,15 +32,33 @@ def main():
         # DATABASE (3) db_manager
         # SHOW MAIN WINDOW (4) window
        
+        phases = [('imports', (time.perf_counter() - _PROCESS_START) * 1000)]
+        
+        def phase(name, start):
+            phases.append((name, (time.perf_counter() - start) * 1000))
+        
+        start = time.perf_counter()
         app = QApplication(sys.argv)
         config = load_config()
-        db_manager = DatabaseManager()
-        db_manager.initialize()
+        phase('app and config', start)
+        
+        # Connects and migrates the schema only if its version is out of date
+        start = time.perf_counter()
+        db_manager = DatabaseManager(config)
+        phase('database', start)
         
         # Create and show main window
+        start = time.perf_counter()
         window = MainWindow(db_manager, config)
+        phase('window', start)
+        first_paint = FirstPaintTimer(phases)
+        window.installEventFilter(first_paint)
         window.show()
-        sys.exit(app.exec_())
+        exit_code = app.exec_()
+        
+        # Write out any queued session events before exiting
+        db_manager.close()
+        sys.exit(exit_code)
         
     except Exception as e:
         logger.error(f"Application failed to start: {str(e)}")
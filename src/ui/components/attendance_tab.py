@@ -98,7 +98,7 @@ class AttendanceTab(QWidget):
                     
     def find_matching_student(self, encoding):
         # Get all students from database
-        students = self.db_manager.db.students.find()
+        students = self.db_manager.db.students.find({}, {'student_id': 1, 'name': 1, 'face_embedding': 1})
         for student in students:
             stored_encoding = np.frombuffer(student['face_embedding'])
             if face_recognition.compare_faces([stored_encoding], encoding)[0]:
@@ -10,16 +10,25 @@ from datetime import datetime
 from .course_dialog import CourseSelectionDialog
 from .student_dialog import StudentDetailsDialog
 from src.utils.logger import logger
+from src.utils.ai_gateway import AIGateway
+from src.utils.transcription import ChunkedTranscriber
+from src.utils.audio_archive import create_audio_archive
+from src.utils.relevance_analyzer import RelevanceAnalyzer
+from src.utils.relevance_cache import RelevanceCache
+from src.utils.topic_classifier import TopicClassifier
+from src.utils.question_batcher import QuestionBatcher
+from src.utils.course_reclassifier import CourseReclassifier
+from src.database.rollups import DailyRollups
 import mediapipe as mp
 import speech_recognition as sr
-from openai import OpenAI
 import threading
 import queue
+from concurrent.futures import Future
 import pyaudio
-import wave
 import time
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.colors import ListedColormap
 import matplotlib.pyplot as plt
 from math import ceil
 import sip
@@ -102,8 +111,29 @@ class MainWindow(QMainWindow):
         self.registration_camera_active = False
         self.captured_photo = None
         
-        # Initialize OpenAI client
-        self.openai_client = OpenAI()
+        # Shared OpenAI client with bounded concurrency
+        self.ai_gateway = AIGateway(self.config)
+        self.openai_client = self.ai_gateway.client
+        self.transcriber = ChunkedTranscriber(self.ai_gateway)
+        # Question audio is kept (16 kHz, compressed) so history can be re-analyzed
+        self.audio_archive = create_audio_archive(self.config, self.db_manager.db)
+        
+        # Relevance analysis: local classifier first, then cached verdicts, then GPT
+        relevance_threshold = self.config.get('app_settings', {}).get('question_relevance_threshold', 0.7)
+        self.relevance_analyzer = RelevanceAnalyzer(
+            self.openai_client,
+            cache=RelevanceCache(self.db_manager),
+            local_classifier=TopicClassifier(self.db_manager, threshold=relevance_threshold),
+            model=self.ai_gateway.chat_model
+        )
+        # Questions transcribed close together share one classification request
+        self.question_batcher = QuestionBatcher(self.relevance_analyzer)
+        # Stored verdicts are redone in the background when a course topic changes;
+        # the local model is skipped since it was trained on the old verdicts
+        self.course_reclassifier = CourseReclassifier(
+            self.db_manager,
+            RelevanceAnalyzer(self.openai_client, cache=self.relevance_analyzer.cache, model=self.ai_gateway.chat_model)
+        )
         
         # Initialize MediaPipe pose detection
         self.mp_pose = mp.solutions.pose
@@ -400,7 +430,7 @@ class MainWindow(QMainWindow):
         search_text = self.search_input.text().lower()
         
         # Get all students
-        students = self.db_manager.get_course_students(self.current_course['_id'])
+        students = self.db_manager.get_course_student_list(self.current_course['_id'])
         
         # Clear existing items
         while self.students_list.count():
@@ -509,7 +539,7 @@ class MainWindow(QMainWindow):
                 item.widget().deleteLater()
         
         # Get students for current course
-        students = self.db_manager.get_course_students(self.current_course['_id'])
+        students = self.db_manager.get_course_student_list(self.current_course['_id'])
         
         # Add student items to list
         for student in students:
@@ -577,25 +607,49 @@ class MainWindow(QMainWindow):
         id_layout.addWidget(id_value)
         layout.addLayout(id_layout)
         
+        # Attendance section: rate, streaks and calendar all come from the course's cached matrix
+        course_id = self.current_course['_id']
+        matrix = self.db_manager.get_attendance_matrix(course_id)
+        row = matrix.index(student['student_id'])
+        if row is not None and len(matrix.dates):
+            current, longest = matrix.streaks()
+            attendance_label = QLabel(
+                f"Attendance: {matrix.rates()[row]:.0f}% "
+                f"({int(matrix.present[row].sum())} of {len(matrix.dates)} sessions)\n"
+                f"Current streak: {current[row]}   Longest streak: {longest[row]}"
+            )
+            layout.addWidget(attendance_label)
+            layout.addWidget(self.create_attendance_calendar(*matrix.calendar(row)))
+        else:
+            layout.addWidget(QLabel("No attendance sessions yet"))
+        
         # Photo section
         photo_label = QLabel()
         photo_label.setMinimumSize(300, 300)
         photo_label.setAlignment(Qt.AlignCenter)
         
-        try:
-            # Load and process photo
-            photo_array = np.frombuffer(student['photo'], dtype=np.uint8)
-            decoded_image = cv2.imdecode(photo_array, cv2.IMREAD_COLOR)
-            if decoded_image is not None:
-                # Convert to RGB without drawing face detection box
-                rgb_image = cv2.cvtColor(decoded_image, cv2.COLOR_BGR2RGB)
-                h, w, ch = rgb_image.shape
-                qt_image = QImage(rgb_image.data, w, h, ch * w, QImage.Format_RGB888)
-                photo_label.setPixmap(QPixmap.fromImage(qt_image).scaled(
-                    300, 300, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        except Exception as e:
-            logger.error(f"Error loading student photo: {str(e)}")
-            photo_label.setText("No Photo Available")
+        def show_photo(data):
+            image = QImage.fromData(data) if data else QImage()
+            if image.isNull():
+                return False
+            photo_label.setPixmap(QPixmap.fromImage(image).scaled(
+                300, 300, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            return True
+        
+        def load_full_photo():
+            photo = self.db_manager.get_student_photo(student['student_id'], course_id)
+            def apply():
+                if sip.isdeleted(photo_label):
+                    return
+                if not show_photo(photo) and not has_thumbnail:
+                    photo_label.setText("No Photo Available")
+            QTimer.singleShot(0, apply)
+        
+        # Show the small thumbnail at once and fetch the full crop in the background
+        has_thumbnail = show_photo(self.db_manager.get_student_thumbnail(student['student_id'], course_id))
+        if not has_thumbnail:
+            photo_label.setText("Loading photo...")
+        threading.Thread(target=load_full_photo, daemon=True).start()
         
         layout.addWidget(photo_label)
         
@@ -746,10 +800,34 @@ class MainWindow(QMainWindow):
                 label.setAlignment(Qt.AlignCenter)
             
             if confirm.exec_() == QMessageBox.Yes:
-                # Remove student
+                # Hide the student now; their records are deleted in chunks in the background
+                course_id = self.current_course['_id']
+                
+                def on_progress(deleted, total):
+                    QTimer.singleShot(0, lambda: self.attendance_status.setText(
+                        f"Deleting {student['name']}'s records: {deleted}/{total}"
+                    ))
+                
+                def on_done(job):
+                    def finish():
+                        if sip.isdeleted(self.attendance_status):
+                            return
+                        if job is None:
+                            self.attendance_status.setText(
+                                f"Deleting {student['name']}'s records stopped; it resumes on the next start"
+                            )
+                            return
+                        self.attendance_status.setText(f"Deleted {student['name']}'s records")
+                        if self.current_course and self.current_course['_id'] == course_id:
+                            self.refresh_analytics()
+                    QTimer.singleShot(0, finish)
+                
                 result = self.db_manager.remove_student(
                     student_id=student['student_id'],
-                    course_id=self.current_course['_id']
+                    course_id=course_id,
+                    background=True,
+                    on_progress=on_progress,
+                    on_done=on_done
                 )
                 
                 if result:
@@ -758,7 +836,7 @@ class MainWindow(QMainWindow):
                         QMessageBox.Information,
                         "Student Removed",
                         f"{student['name']} has been removed",
-                        "All records have been deleted."
+                        "Their records are being deleted in the background."
                     )
                     success.exec_()
                     
@@ -1021,7 +1099,9 @@ class MainWindow(QMainWindow):
                 student_id=student_id,
                 date_param=datetime.now(),  # Changed from 'date' to 'date_param'
                 status='Present',
-                course_id=self.current_course['_id']
+                course_id=self.current_course['_id'],
+                student_name=student_name,
+                background=True  # Queued so the frame loop never waits on Atlas
             )
             
             # Update UI to show attendance recorded
@@ -1045,6 +1125,13 @@ class MainWindow(QMainWindow):
         """Clean up resources when closing the window"""
         self.stop_camera()
         self.stop_registration_camera()
+        self.course_reclassifier.cancel_all()
+        self.question_batcher.stop()
+        self.ai_gateway.shutdown()
+        # The database manager outlives this window when switching courses,
+        # so only drain queued events here
+        if not self.db_manager.flush_events():
+            logger.error(f"Queued events not fully written on close: {self.db_manager.event_stats()}")
         event.accept()
 
     def _setup_engagement_tab(self, tab):
@@ -1110,7 +1197,7 @@ class MainWindow(QMainWindow):
                 self.engagement_list.itemAt(i).widget().deleteLater()
             
             # Get students in current course
-            students = self.db_manager.get_course_students(self.current_course['_id'])
+            students = self.db_manager.get_course_student_list(self.current_course['_id'])
             
             # Create a mapping of student IDs to names
             student_names = {str(student['student_id']): student['name'] for student in students}
@@ -1321,22 +1408,13 @@ class MainWindow(QMainWindow):
         students_layout.setSpacing(40)
         students_layout.setAlignment(Qt.AlignCenter)
 
-        # Get student data and create sections
-        questions = self.db_manager.get_course_questions(self.current_course['_id'])
-        student_questions = {}
-        for q in questions:
-            student_id = q['student_id']
-            if student_id not in student_questions:
-                student_questions[student_id] = {'relevant': 0, 'irrelevant': 0}
-            if q.get('is_relevant', True):
-                student_questions[student_id]['relevant'] += 1
-            else:
-                student_questions[student_id]['irrelevant'] += 1
+        # Per-student counts, top students and hand raises are aggregated server-side
+        analytics = self.db_manager.get_course_analytics(self.current_course['_id'], top_k=3)
 
         # Create sections
         relevant_section = self._create_student_section(
             "Most Relevant Questions",
-            sorted(student_questions.items(), key=lambda x: x[1]['relevant'], reverse=True)[:3],
+            analytics['top_relevant'],
             colors,
             metric='relevant'
         )
@@ -1344,7 +1422,7 @@ class MainWindow(QMainWindow):
 
         irrelevant_section = self._create_student_section(
             "Most Irrelevant Questions",
-            sorted(student_questions.items(), key=lambda x: x[1]['irrelevant'], reverse=True)[:3],
+            analytics['top_irrelevant'],
             colors,
             metric='irrelevant'
         )
@@ -1366,7 +1444,7 @@ class MainWindow(QMainWindow):
 
         # Get attendance data
         today = datetime.now().date()
-        students = self.db_manager.get_course_students(self.current_course['_id'])
+        students = self.db_manager.get_course_student_list(self.current_course['_id'])
         attendance_records = self.db_manager.get_attendance_records(
             course_id=self.current_course['_id'],
             date_param=today
@@ -1445,9 +1523,8 @@ class MainWindow(QMainWindow):
         pie_title.setAlignment(Qt.AlignCenter)
         pie_layout.addWidget(pie_title)
 
-        total_questions = len(questions)
-        relevant_count = sum(1 for q in questions if q.get('is_relevant', True))
-        irrelevant_count = total_questions - relevant_count
+        relevant_count = analytics['totals']['relevant']
+        irrelevant_count = analytics['totals']['irrelevant']
 
         pie_chart_canvas = self.create_pie_chart(relevant_count, irrelevant_count)
         pie_layout.addWidget(pie_chart_canvas, alignment=Qt.AlignCenter)
@@ -1468,12 +1545,44 @@ class MainWindow(QMainWindow):
         bar_title.setAlignment(Qt.AlignCenter)
         bar_layout.addWidget(bar_title)
 
-        bar_chart_canvas = self.create_hand_raises_chart(students)
+        bar_chart_canvas = self.create_hand_raises_chart(analytics['hand_raises'])
         bar_layout.addWidget(bar_chart_canvas, alignment=Qt.AlignCenter)
         charts_layout.addWidget(bar_chart_container)
 
         main_layout.addWidget(charts_container, alignment=Qt.AlignCenter)
 
+        # 4. Weekly trend, read from the daily rollups
+        trend = self.db_manager.get_course_trends(self.current_course['_id'], weeks=8)
+        trend_title = QLabel("Weekly Trend")
+        trend_title.setStyleSheet(f"""
+            QLabel {{
+                color: {colors['text']};
+                font-size: 24px;
+                font-weight: 600;
+                padding: 20px 0px;
+            }}
+        """)
+        trend_title.setAlignment(Qt.AlignCenter)
+        main_layout.addWidget(trend_title)
+
+        changes = []
+        for metric, label in (('questions', "questions"), ('hand_raises', "hand raises"), ('attendance', "attendance")):
+            change = DailyRollups.week_over_week(trend, metric)
+            if change is not None:
+                changes.append(f"{label} {change:+.0f}%")
+        trend_summary = QLabel(
+            "Last full week vs the week before: " + ", ".join(changes) if changes
+            else "Not enough history for a comparison yet"
+        )
+        trend_summary.setStyleSheet(f"""
+            color: {colors['secondary_text']};
+            font-size: 14px;
+            padding-bottom: 10px;
+        """)
+        trend_summary.setAlignment(Qt.AlignCenter)
+        main_layout.addWidget(trend_summary)
+        main_layout.addWidget(self.create_weekly_trend_chart(trend), alignment=Qt.AlignCenter)
+
         # Set the main container as the scroll area's widget
         scroll_area.setWidget(main_container)
         
@@ -1522,10 +1631,8 @@ class MainWindow(QMainWindow):
         
         # Add students with larger text
         for student_id, counts in students:
-            # Get student name from database
-            student = self.db_manager.get_student_by_id(student_id)
-            if student:
-                student_name = student.get('name', 'Unknown Student')
+            student_name = counts['name']
+            if student_name:
                 count = counts[metric]  # Get the relevant or irrelevant count
                 
                 student_widget = QWidget()
@@ -1568,7 +1675,7 @@ class MainWindow(QMainWindow):
         layout.setAlignment(Qt.AlignCenter)  # Center the entire list
         
         # Get attendance data
-        students = self.db_manager.get_course_students(self.current_course['_id'])
+        students = self.db_manager.get_course_student_list(self.current_course['_id'])
         
         for student in students:
             student_row = QWidget()
@@ -1873,7 +1980,8 @@ class MainWindow(QMainWindow):
                 raise ValueError("Please capture a photo first")
             
             # Get face encoding
-            face_encoding = face_recognition.face_encodings(self.captured_photo)
+            face_locations = face_recognition.face_locations(self.captured_photo)
+            face_encoding = face_recognition.face_encodings(self.captured_photo, face_locations)
             if not face_encoding:
                 raise ValueError("No face detected in photo. Please try again.")
             
@@ -1882,7 +1990,8 @@ class MainWindow(QMainWindow):
                 name=name,
                 face_embedding=face_encoding[0],
                 course_id=self.current_course['_id'],
-                photo_data=self.captured_photo
+                photo_data=self.captured_photo,
+                face_location=face_locations[0]
             )
             
             if result:
@@ -2139,71 +2248,57 @@ class MainWindow(QMainWindow):
                 logger.error("Invalid student ID")
                 raise Exception("Invalid student ID")
             
-            # Save frames to a temporary WAV file
-            temp_wav = "temp_question.wav"
-            wf = wave.open(temp_wav, 'wb')
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(44100)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-            
             logger.info("Sending audio to OpenAI for transcription...")
             
-            # Open the file and send to OpenAI
-            with open(temp_wav, 'rb') as audio_file:
-                transcript = self.openai_client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-1"
-                )
+            course = self.current_course
             
-            logger.info(f"Transcribed text: {transcript.text}")
+            def on_first_segment(partial_text):
+                # Start relevance analysis on the leading segment while the rest transcribes
+                provisional = self.relevance_analyzer.preview(course, partial_text)
+                if provisional is not None:
+                    relevance_display = "Relevant" if provisional else "Not relevant"
+                    QTimer.singleShot(0, lambda: self.attendance_status.setText(
+                        f"Question from {name}: {relevance_display} (provisional)"
+                    ))
             
-            # Delete temporary file
-            import os
-            os.remove(temp_wav)
+            question_text = self.transcriber.transcribe_frames(
+                frames, rate=44100, on_first_segment=on_first_segment
+            )
             
-            logger.info("Analyzing question relevance...")
+            logger.info(f"Transcribed text: {question_text}")
             
-            # Get class topic from course description or name
-            class_topic = (
-                self.current_course.get('description', '') or 
-                self.current_course['course_name']
-            )
+            logger.info("Queueing question for relevance analysis...")
             
-            # Analyze question relevance using GPT
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                temperature=0,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are analyzing a student's question for relevance to a specific class topic. "
-                            "You must determine whether the question is relevant to the class topic or not. "
-                            "Answer either 'Relevant' or 'Irrelevant'. Then provide a brief explanation."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f"The class topic is: {class_topic}\n"
-                            f"Question: {transcript.text}\n\n"
-                            "Is this question relevant or irrelevant to the class topic? "
-                            "Respond strictly with one of the words 'Relevant' or 'Irrelevant' followed by a one-sentence justification."
-                        )
-                    }
-                ]
-            )
+            # Resolved with the archived audio reference once this thread has uploaded it
+            archived = Future()
+            
+            def on_classified(is_relevant, reason, source):
+                # Log the question with the reason and student info once its audio is stored
+                archived.add_done_callback(lambda f: self.log_question(
+                    student_id, name, question_text, is_relevant, reason,
+                    relevance_source=source, audio=f.result()
+                ))
+            
+            def on_error(e):
+                QTimer.singleShot(0, lambda: self.show_error_message(str(e)))
+            
+            def on_verdict(is_relevant):
+                # Show the verdict right away; the reason follows with the logged question
+                relevance_display = "Relevant" if is_relevant else "Not relevant"
+                QTimer.singleShot(0, lambda: self.attendance_status.setText(
+                    f"Question from {name}: {relevance_display}"
+                ))
             
-            response_text = response.choices[0].message.content
-            # Split into relevance and reason
-            relevance_word, *reason_parts = response_text.split(' ', 1)
-            is_relevant = relevance_word.lower().startswith('relevant')
-            reason = reason_parts[0] if reason_parts else ""
+            self.question_batcher.submit(
+                course, question_text, on_classified, on_error, on_verdict
+            )
             
-            # Log the question with the reason and student info
-            self.log_question(student_id, name, transcript.text, is_relevant, reason)
+            # Archive off the verdict path; the batcher is already classifying the question
+            try:
+                archived.set_result(self.audio_archive.archive_frames(frames, rate=44100))
+            except Exception as e:
+                logger.error(f"Error archiving question audio: {str(e)}")
+                archived.set_result(None)
             
         except Exception as e:
             logger.error(f"Error processing question: {str(e)}")
@@ -2227,7 +2322,8 @@ class MainWindow(QMainWindow):
         try:
             self.db_manager.log_hand_raise(
                 student_id=student_id,
-                course_id=self.current_course['_id']
+                course_id=self.current_course['_id'],
+                background=True
             )
             
             # Show notification
@@ -2243,53 +2339,58 @@ class MainWindow(QMainWindow):
         except Exception as e:
             logger.error(f"Error logging hand raise for {name}: {str(e)}")
 
-    def log_question(self, student_id, name, question_text, is_relevant, reason=""):
+    def log_question(self, student_id, name, question_text, is_relevant, reason="", relevance_source="llm",
+                     audio=None):
         """Log a question to the database"""
         try:
             logger.info(f"Attempting to log question for student {student_id} ({name})")
             
-            result = self.db_manager.log_question(
+            def show_notification():
+                relevance_display = "Relevant" if is_relevant else "Not relevant"
+                msg = self.create_styled_message_box(
+                    QMessageBox.Information,
+                    "Question Recorded",
+                    f"Question from {name} recorded",
+                    f"Question: {question_text}\nRelevance: {relevance_display}"
+                )
+                QTimer.singleShot(3000, msg.accept)
+                msg.show()
+                
+                # Update UI components
+                self.update_engagement_list()
+                
+                # Force analytics tab refresh
+                analytics_tab = self.findChild(QWidget, 'analytics_tab')
+                if analytics_tab:
+                    # Clear existing widgets
+                    for i in reversed(range(analytics_tab.layout().count())): 
+                        widget = analytics_tab.layout().itemAt(i).widget()
+                        if widget:
+                            widget.deleteLater()
+                    # Reinitialize analytics tab
+                    self._setup_analytics_tab(analytics_tab)
+            
+            def on_written(success):
+                # Refresh views only once the write-behind queue has stored the question
+                if success:
+                    logger.info(f"Question successfully logged with ID: {question_id}")
+                    QTimer.singleShot(0, show_notification)
+                else:
+                    logger.error("Failed to get confirmation of question logging")
+                    QTimer.singleShot(0, lambda: self.show_error_message("Question logging failed"))
+            
+            question_id = self.db_manager.log_question(
                 student_id=student_id,
                 course_id=self.current_course['_id'],
                 question_text=question_text,
                 is_relevant=is_relevant,
-                reason=reason
+                reason=reason,
+                relevance_source=relevance_source,
+                audio=audio,
+                background=True,
+                on_written=on_written
             )
             
-            if result and result.inserted_id:
-                logger.info(f"Question successfully logged with ID: {result.inserted_id}")
-                
-                def show_notification():
-                    relevance_display = "Relevant" if is_relevant else "Not relevant"
-                    msg = self.create_styled_message_box(
-                        QMessageBox.Information,
-                        "Question Recorded",
-                        f"Question from {name} recorded",
-                        f"Question: {question_text}\nRelevance: {relevance_display}"
-                    )
-                    QTimer.singleShot(3000, msg.accept)
-                    msg.show()
-                    
-                    # Update UI components
-                    self.update_engagement_list()
-                    
-                    # Force analytics tab refresh
-                    analytics_tab = self.findChild(QWidget, 'analytics_tab')
-                    if analytics_tab:
-                        # Clear existing widgets
-                        for i in reversed(range(analytics_tab.layout().count())): 
-                            widget = analytics_tab.layout().itemAt(i).widget()
-                            if widget:
-                                widget.deleteLater()
-                        # Reinitialize analytics tab
-                        self._setup_analytics_tab(analytics_tab)
-                
-                QTimer.singleShot(0, show_notification)
-                
-            else:
-                logger.error("Failed to get confirmation of question logging")
-                raise Exception("Question logging failed")
-            
         except Exception as e:
             logger.error(f"Error logging question for {name}: {str(e)}")
             # Show error on main thread
@@ -2766,8 +2867,8 @@ class MainWindow(QMainWindow):
         dialog.exec_()
 
     def edit_course(self):
-        """Handle course name editing in CourseDetailsDialog"""
-        logger.info("Edit button clicked in CourseDetailsDialog")
+        """Edit the current course's name, code and description"""
+        logger.info("Editing current course")
         
         # Create edit dialog
         edit_dialog = QDialog(self)
@@ -2819,19 +2920,26 @@ class MainWindow(QMainWindow):
         
         # Course name input
         name_label = QLabel("Course Name:")
-        name_input = QLineEdit(self.course['course_name'])
-        logger.info(f"Current course name: {self.course['course_name']}")
+        name_input = QLineEdit(self.current_course['course_name'])
+        logger.info(f"Current course name: {self.current_course['course_name']}")
         
         # Course code input
         code_label = QLabel("Course Code:")
-        code_input = QLineEdit(self.course['course_code'])
-        logger.info(f"Current course code: {self.course['course_code']}")
+        code_input = QLineEdit(self.current_course['course_code'])
+        logger.info(f"Current course code: {self.current_course['course_code']}")
+        
+        # Course description input (the topic questions are judged against)
+        description_label = QLabel("Course Description:")
+        description_input = QLineEdit(self.current_course.get('description', ''))
+        description_input.setPlaceholderText("Topics covered in this course")
         
         # Add inputs to layout
         layout.addWidget(name_label)
         layout.addWidget(name_input)
         layout.addWidget(code_label)
         layout.addWidget(code_input)
+        layout.addWidget(description_label)
+        layout.addWidget(description_input)
         
         # Buttons
         button_layout = QHBoxLayout()
@@ -2848,30 +2956,38 @@ class MainWindow(QMainWindow):
             logger.info("Save button clicked")
             new_name = name_input.text().strip()
             new_code = code_input.text().strip()
+            new_description = description_input.text().strip()
             logger.info(f"New name: {new_name}, New code: {new_code}")
             
             if new_name and new_code:
                 try:
                     logger.info("Attempting to update course in database")
                     # Update in database with correct parameter names
+                    old_topic = RelevanceAnalyzer.get_class_topic(self.current_course)
                     self.db_manager.update_course(
-                        course_id=self.course['_id'],
+                        course_id=self.current_course['_id'],
                         course_name=new_name,  # Changed from new_name
-                        course_code=new_code   # Changed from new_code
+                        course_code=new_code,  # Changed from new_code
+                        description=new_description
                     )
                     
                     # Update local course data
-                    self.course['course_name'] = new_name
-                    self.course['course_code'] = new_code
+                    self.current_course['course_name'] = new_name
+                    self.current_course['course_code'] = new_code
+                    self.current_course['description'] = new_description
                     logger.info("Course data updated locally")
                     
+                    # Stored verdicts were made against the old topic
+                    if RelevanceAnalyzer.get_class_topic(self.current_course) != old_topic:
+                        self.reclassify_course_questions(self.current_course)
+                    
                     # Update parent window's course display
-                    self.parent().update_course_display()
+                    self.update_course_display()
                     logger.info("Parent window display updated")
                     
                     # Update dialog title
                     for widget in self.findChildren(QLabel):
-                        if widget.text().startswith(f"{self.course['course_name']} {self.course['course_code']}"):
+                        if widget.text().startswith(f"{self.current_course['course_name']} {self.current_course['course_code']}"):
                             widget.setText(f"{new_name} {new_code}")
                             break
                     logger.info("Dialog title updated")
@@ -2885,7 +3001,6 @@ class MainWindow(QMainWindow):
                     msg.exec_()
                     
                     edit_dialog.accept()
-                    self.accept()  # Close both dialogs
                     
                 except Exception as e:
                     logger.error(f"Error updating course: {str(e)}")
@@ -2910,6 +3025,30 @@ class MainWindow(QMainWindow):
         logger.info("Showing edit dialog")
         edit_dialog.exec_()
 
+    def reclassify_course_questions(self, course):
+        """Re-run relevance classification of a course's questions in the background"""
+        course_id = course['_id']
+        self.relevance_analyzer.local_classifier.invalidate(course_id)
+        self.attendance_status.setText("Reclassifying questions for the new course topic...")
+        
+        def on_progress(done, total):
+            QTimer.singleShot(0, lambda: self.attendance_status.setText(
+                f"Reclassifying questions: {done}/{total}"
+            ))
+        
+        def on_done(done, total, cancelled):
+            def finish():
+                # Rebuild the local model from the new verdicts
+                self.relevance_analyzer.local_classifier.invalidate(course_id)
+                if cancelled:
+                    return
+                self.attendance_status.setText(f"Reclassified {done} of {total} questions")
+                if self.current_course and self.current_course['_id'] == course_id:
+                    self.refresh_analytics()
+            QTimer.singleShot(0, finish)
+        
+        self.course_reclassifier.start(course, on_progress, on_done)
+
     def update_course_display(self):
         """Update the course display after editing"""
         course_name = self.current_course['course_name'].strip().upper()
@@ -2938,8 +3077,8 @@ class MainWindow(QMainWindow):
         )
         # ... rest of the method ...
 
-    def create_hand_raises_chart(self, students):
-        """Create a horizontal bar chart showing hand raises per student"""
+    def create_hand_raises_chart(self, hand_raises):
+        """Create a horizontal bar chart from (name, hand raises) pairs"""
         # Create figure with larger width for labels
         fig = Figure(figsize=(10, 8))
         fig.patch.set_facecolor('#323232')
@@ -2948,18 +3087,11 @@ class MainWindow(QMainWindow):
         ax = fig.add_subplot(111)
         ax.set_facecolor('#323232')
         
-        # Get hand raises data from database and sort it
-        student_data = []
-        for student in students:
-            hand_raises = self.db_manager.get_student_hand_raises(
-                student['student_id'],
-                self.current_course['_id']
-            )
-            if hand_raises > 0:
-                student_data.append((student['name'], hand_raises))
-        
-        # Sort by number of hand raises (descending)
-        student_data.sort(key=lambda x: x[1], reverse=True)
+        # Only students who raised hands, most first
+        student_data = sorted(
+            ((name, count) for name, count in hand_raises if count > 0),
+            key=lambda x: x[1], reverse=True
+        )
         names = [data[0] for data in student_data]
         hand_raises = [data[1] for data in student_data]
         
@@ -3019,6 +3151,82 @@ class MainWindow(QMainWindow):
         
         return canvas
 
+    def create_attendance_calendar(self, weeks, grid):
+        """Heatmap of one student's sessions: a column per week, a row per weekday"""
+        colors = self.base_styles['dark']
+        fig = Figure(figsize=(4, 1.6))
+        fig.patch.set_facecolor('#323232')
+        ax = fig.add_subplot(111)
+        ax.set_facecolor('#323232')
+        
+        canvas = FigureCanvas(fig)
+        canvas.setFixedSize(400, 160)
+        
+        try:
+            # -1 no session, 0 absent, 1 present
+            cmap = ListedColormap(['#3a3a3c', colors['error'], colors['success']])
+            ax.imshow(grid.T, cmap=cmap, vmin=-1, vmax=1, aspect='equal')
+            ax.set_yticks([0, 2, 4])
+            ax.set_yticklabels(['Mon', 'Wed', 'Fri'], color='white', fontsize=8)
+            # Label the first week of each month
+            months = weeks.astype('datetime64[M]')
+            first = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+            ax.set_xticks(first)
+            ax.set_xticklabels([weeks[i].item().strftime('%b') for i in first], color='white', fontsize=8)
+            ax.tick_params(length=0)
+            for spine in ax.spines.values():
+                spine.set_visible(False)
+            fig.tight_layout()
+            
+        except Exception as e:
+            logger.error(f"Error creating attendance calendar: {e}")
+            ax.axis('off')
+        
+        return canvas
+
+    def create_weekly_trend_chart(self, trend):
+        """Line chart of weekly questions, hand raises and attendance"""
+        fig = Figure(figsize=(10, 4))
+        fig.patch.set_facecolor('#323232')
+        ax = fig.add_subplot(111)
+        ax.set_facecolor('#323232')
+        
+        canvas = FigureCanvas(fig)
+        canvas.setFixedSize(1000, 350)
+        
+        try:
+            if any(week['questions'] or week['hand_raises'] or week['attendance'] for week in trend):
+                labels = [week['week'].strftime('%d %b') for week in trend]
+                x = np.arange(len(trend))
+                for metric, label, color in (('questions', 'Questions', '#0a84ff'),
+                                             ('hand_raises', 'Hand raises', '#30d158'),
+                                             ('attendance', 'Attendance (student-days)', '#ff9f0a')):
+                    ax.plot(x, [week[metric] for week in trend], marker='o', color=color, label=label)
+                ax.set_xticks(x)
+                ax.set_xticklabels(labels, color='white', fontsize=10)
+                ax.tick_params(axis='y', colors='white')
+                for spine in ax.spines.values():
+                    spine.set_visible(False)
+                ax.grid(True, axis='y', color='#4a4a4a')
+                ax.legend(facecolor='#323232', edgecolor='#323232', labelcolor='white', fontsize=10)
+            else:
+                # Nothing in the app runs the rollup job
+                ax.text(0.5, 0.5, 'No rolled-up history yet.\n'
+                        'Schedule "python -m src.database.rollups" to run daily, e.g. from cron.',
+                        horizontalalignment='center',
+                        verticalalignment='center',
+                        color='white',
+                        fontsize=14,
+                        transform=ax.transAxes)
+                ax.axis('off')
+            fig.tight_layout()
+            
+        except Exception as e:
+            logger.error(f"Error creating weekly trend chart: {e}")
+            ax.axis('off')
+        
+        return canvas
+
     def exit_to_menu(self):
         """
         Closes this window and shows the course selection again,
@@ -3185,17 +3393,16 @@ class CourseDetailsDialog(QDialog):
         layout.addWidget(title)
         
         # Get course statistics
-        students = self.db_manager.get_course_students(self.course['_id'])  # Use self.course instead of self.current_course
-        logger.info(f"Retrieved {len(students)} students for course {self.course['_id']}")  # Fixed here too
-        questions = self.db_manager.get_course_questions(self.course['_id'])
+        totals = self.db_manager.get_course_analytics(self.course['_id'])['totals']
+        logger.info(f"Retrieved {totals['students']} students for course {self.course['_id']}")
         
         # Calculate engagement ratio
-        relevant_count = sum(1 for q in questions if q.get('is_relevant', True))
-        irrelevant_count = len(questions) - relevant_count
-        ratio = f"{relevant_count}:{irrelevant_count}" if len(questions) > 0 else "No questions yet"
+        relevant_count = totals['relevant']
+        irrelevant_count = totals['irrelevant']
+        ratio = f"{relevant_count}:{irrelevant_count}" if totals['questions'] > 0 else "No questions yet"
         
         # Student Count
-        student_count = QLabel(f"Number of Students: {len(students)}")
+        student_count = QLabel(f"Number of Students: {totals['students']}")
         student_count.setStyleSheet("padding: 5px 0;")
         layout.addWidget(student_count)
         
@@ -3284,11 +3491,18 @@ class CourseDetailsDialog(QDialog):
         code_input = QLineEdit(self.course['course_code'])
         logger.info(f"Current course code: {self.course['course_code']}")
         
+        # Course description input (the topic questions are judged against)
+        description_label = QLabel("Course Description:")
+        description_input = QLineEdit(self.course.get('description', ''))
+        description_input.setPlaceholderText("Topics covered in this course")
+        
         # Add inputs to layout
         layout.addWidget(name_label)
         layout.addWidget(name_input)
         layout.addWidget(code_label)
         layout.addWidget(code_input)
+        layout.addWidget(description_label)
+        layout.addWidget(description_input)
         
         # Buttons
         button_layout = QHBoxLayout()
@@ -3305,23 +3519,31 @@ class CourseDetailsDialog(QDialog):
             logger.info("Save button clicked")
             new_name = name_input.text().strip()
             new_code = code_input.text().strip()
+            new_description = description_input.text().strip()
             logger.info(f"New name: {new_name}, New code: {new_code}")
             
             if new_name and new_code:
                 try:
                     logger.info("Attempting to update course in database")
                     # Update in database with correct parameter names
+                    old_topic = RelevanceAnalyzer.get_class_topic(self.course)
                     self.db_manager.update_course(
                         course_id=self.course['_id'],
                         course_name=new_name,  # Changed from new_name
-                        course_code=new_code   # Changed from new_code
+                        course_code=new_code,  # Changed from new_code
+                        description=new_description
                     )
                     
                     # Update local course data
                     self.course['course_name'] = new_name
                     self.course['course_code'] = new_code
+                    self.course['description'] = new_description
                     logger.info("Course data updated locally")
                     
+                    # Stored verdicts were made against the old topic
+                    if RelevanceAnalyzer.get_class_topic(self.course) != old_topic:
+                        self.parent_window.reclassify_course_questions(self.course)
+                    
                     # Update parent window's course display
                     self.parent_window.update_course_display()
                     logger.info("Parent window display updated")
@@ -3367,8 +3589,8 @@ class CourseDetailsDialog(QDialog):
         logger.info("Showing edit dialog")
         edit_dialog.exec_()
 
-    def create_hand_raises_chart(self, students):
-        """Create a bar chart showing hand raises per student"""
+    def create_hand_raises_chart(self, hand_raises):
+        """Create a bar chart from (name, hand raises) pairs"""
         # Create figure with matching background
         fig = Figure(figsize=(8, 8))
         fig.patch.set_facecolor('#323232')
@@ -3377,18 +3599,9 @@ class CourseDetailsDialog(QDialog):
         ax = fig.add_subplot(111)
         ax.set_facecolor('#323232')
         
-        # Get hand raises data from database
-        student_hand_raises = []
-        names = []
-        
-        for student in students:
-            hand_raises = self.db_manager.get_student_hand_raises(
-                student['student_id'],
-                self.current_course['_id']
-            )
-            if hand_raises > 0:  # Only show students who raised hands
-                student_hand_raises.append(hand_raises)
-                names.append(student['name'])
+        # Only show students who raised hands
+        student_hand_raises = [count for _, count in hand_raises if count > 0]
+        names = [name for name, count in hand_raises if count > 0]
         
         try:
             if student_hand_raises:
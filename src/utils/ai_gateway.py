@@ -0,0 +1,46 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from src.utils.asr import create_asr_backend
+from src.utils.logger import logger
+
+
+class AIGateway:
+    """
+    Shared entry point for OpenAI calls.
+
+    Holds a single client (and its HTTP connection pool) for the whole app and
+    bounds how many requests run concurrently, so parallel work such as
+    chunked transcription cannot flood the API.
+    """
+
+    def __init__(self, config=None, client=None, asr_backend=None, max_concurrency=4):
+        api_config = (config or {}).get('api', {})
+        self.client = client or OpenAI()
+        self.chat_model = api_config.get('openai_model', 'gpt-4o-mini')
+        self.asr = asr_backend or create_asr_backend(config, self.client)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ai-gateway')
+        self._lock = threading.Lock()
+        self.transcription_calls = 0
+        self.transcription_seconds = 0.0
+
+    def transcribe(self, audio_file):
+        """Transcribe an open audio file (or named BytesIO) and return its text"""
+        start = time.perf_counter()
+        text = self.asr.transcribe(audio_file)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.transcription_calls += 1
+            self.transcription_seconds += elapsed
+        logger.info(f"Transcribed {getattr(audio_file, 'name', 'audio')} with {self.asr.name} in {elapsed:.2f}s")
+        return text
+
+    def submit_transcription(self, audio_file):
+        """Transcribe in the gateway's worker pool; returns a Future of the text"""
+        return self._executor.submit(self.transcribe, audio_file)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,76 @@
+import os
+import json
+import urllib.error
+import urllib.request
+
+from src.utils.logger import logger
+
+
+class ASRBackend:
+    """Speech-to-text backend interface"""
+
+    name = 'base'
+
+    def transcribe(self, audio_file):
+        """Return the transcript of an open audio file or named BytesIO"""
+        raise NotImplementedError
+
+
+class OpenAIASRBackend(ASRBackend):
+    """Transcription through the OpenAI audio API (Whisper)"""
+
+    name = 'openai'
+
+    def __init__(self, client, model="whisper-1"):
+        self.client = client
+        self.model = model
+
+    def transcribe(self, audio_file):
+        transcript = self.client.audio.transcriptions.create(
+            file=audio_file,
+            model=self.model
+        )
+        return transcript.text
+
+
+class LocalASRBackend(ASRBackend):
+    """
+    Transcription through a local HTTP server.
+
+    The audio is POSTed as a raw WAV body and the server answers with
+    {"text": "..."}. src.utils.asr_standin provides a stand-in server that
+    serves canned transcripts for offline development and benchmarking.
+    """
+
+    name = 'local'
+
+    def __init__(self, url="http://127.0.0.1:8765/transcribe", timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def transcribe(self, audio_file):
+        request = urllib.request.Request(
+            self.url,
+            data=audio_file.read(),
+            headers={'Content-Type': 'audio/wav'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))['text']
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Local ASR server returned {e.code}: {e.read().decode('utf-8', 'replace')}")
+
+
+def create_asr_backend(config, client):
+    """Build the ASR backend selected by config (api.asr_backend) or AIFRED_ASR_BACKEND"""
+    api_config = (config or {}).get('api', {})
+    backend = os.getenv('AIFRED_ASR_BACKEND', api_config.get('asr_backend', 'openai'))
+
+    if backend == 'local':
+        url = os.getenv('AIFRED_ASR_URL', api_config.get('asr_url', 'http://127.0.0.1:8765/transcribe'))
+        logger.info(f"Using local ASR backend at {url}")
+        return LocalASRBackend(url)
+    if backend != 'openai':
+        raise ValueError(f"Unknown ASR backend: {backend}")
+    return OpenAIASRBackend(client, api_config.get('whisper_model', 'whisper-1'))
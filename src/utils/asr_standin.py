@@ -0,0 +1,174 @@
+"""
+Local HTTP stand-in for the speech and relevance services.
+
+Serves canned transcripts on POST /transcribe (the LocalASRBackend protocol)
+and OpenAI-compatible /v1/chat/completions answers, so the question pipeline
+can run and be benchmarked without network access. Latency and failures are
+injected to mimic the real services.
+
+    python -m src.utils.asr_standin --port 8765 --latency-ms 400 --jitter-ms 150 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# (transcript, is relevant to a data science course)
+CANNED_QUESTIONS = [
+    ("What is the difference between supervised and unsupervised learning?", True),
+    ("How do we choose the number of clusters in k-means?", True),
+    ("Can you explain what overfitting means?", True),
+    ("Why do we split the data into training and test sets?", True),
+    ("How does gradient descent find the minimum?", True),
+    ("What does the p-value tell us in a regression?", True),
+    ("Is the cafeteria open after this class?", False),
+    ("Did anyone watch the game last night?", False),
+    ("When is the parking permit deadline?", False),
+    ("What is the capital of France?", False),
+]
+LABELS = {text: relevant for text, relevant in CANNED_QUESTIONS}
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=300, jitter_ms=100, chat_latency_ms=250, error_rate=0.0, seed=None):
+        super().__init__(address, StandInHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self, mean_ms):
+        with self._lock:
+            jitter = self.random.gauss(0, self.jitter_ms) if self.jitter_ms else 0
+        time.sleep(max(0.0, mean_ms + jitter) / 1000)
+
+    def should_fail(self):
+        with self._lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def pick_transcript(self, audio):
+        # Same audio always maps to the same transcript
+        return CANNED_QUESTIONS[zlib.crc32(audio) % len(CANNED_QUESTIONS)][0]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.rstrip('/') == '/transcribe':
+            self.server.delay(self.server.latency_ms)
+            if self.server.should_fail():
+                return self._send_json(503, {'error': 'injected failure'})
+            return self._send_json(200, {'text': self.server.pick_transcript(body)})
+
+        if self.path.rstrip('/').endswith('/chat/completions'):
+            self.server.delay(self.server.chat_latency_ms)
+            if self.server.should_fail():
+                return self._send_json(503, {'error': {'message': 'injected failure'}})
+            request = json.loads(body or b'{}')
+            return self._complete_chat(request)
+
+        self._send_json(404, {'error': f'unknown path {self.path}'})
+
+    def _complete_chat(self, request):
+        prompt = request.get('messages', [{}])[-1].get('content', '')
+        schema = request.get('response_format', {}).get('json_schema', {}).get('name')
+        if schema == 'relevance_verdicts':
+            questions = re.findall(r'^(\d+): (.*)$', prompt, re.MULTILINE)
+            content = {'results': [
+                {'id': int(i), **self._verdict(text)} for i, text in questions
+            ]}
+        else:
+            match = re.search(r'^Question: (.*)$', prompt, re.MULTILINE)
+            content = self._verdict(match.group(1) if match else '')
+        content = json.dumps(content)
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get('model', 'stand-in')
+        if not request.get('stream'):
+            return self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': content}}]
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for start in range(0, len(content), 8):
+            chunk = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': None, 'delta': {'content': content[start:start + 8]}}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    @staticmethod
+    def _verdict(question):
+        relevant = LABELS.get(question.strip(), True)
+        return {'verdict': 'Relevant' if relevant else 'Irrelevant', 'reason': 'Canned stand-in verdict.'}
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_standin(host='127.0.0.1', port=0, **options):
+    """Start a stand-in server on a background thread and return it"""
+    server = StandInServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True, name='asr-standin').start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local speech/relevance stand-in server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=300, help="mean transcription latency")
+    parser.add_argument('--jitter-ms', type=float, default=100, help="standard deviation of injected latency")
+    parser.add_argument('--chat-latency-ms', type=float, default=250, help="mean chat completion latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = StandInServer(
+        (args.host, args.port), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        chat_latency_ms=args.chat_latency_ms, error_rate=args.error_rate, seed=args.seed
+    )
+    print(f"Stand-in serving on {server.url} (POST /transcribe, /v1/chat/completions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import hashlib
+import io
+import os
+import wave
+
+import numpy as np
+
+from src.utils.logger import logger
+
+try:
+    import soundfile
+except ImportError:  # FLAC compression is optional
+    soundfile = None
+
+ARCHIVE_RATE = 16000
+
+
+def resample(samples, rate, target_rate=ARCHIVE_RATE):
+    """Band-limited resampling of int16 mono samples through the FFT"""
+    if rate == target_rate or len(samples) == 0:
+        return samples.astype(np.int16)
+    target_length = max(1, int(round(len(samples) * target_rate / rate)))
+    spectrum = np.fft.rfft(samples.astype(np.float64))
+    resampled = np.fft.irfft(spectrum[:target_length // 2 + 1], target_length) * (target_length / len(samples))
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def encode_clip(samples, rate):
+    """Encode int16 mono samples as FLAC when soundfile is installed, otherwise WAV"""
+    buffer = io.BytesIO()
+    if soundfile is not None:
+        soundfile.write(buffer, samples, rate, format='FLAC', subtype='PCM_16')
+        return buffer.getvalue(), 'flac'
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue(), 'wav'
+
+
+def decode_clip(data, audio_format):
+    """Return (int16 samples, rate) for an archived clip"""
+    if audio_format == 'wav':
+        with wave.open(io.BytesIO(data), 'rb') as wf:
+            return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16), wf.getframerate()
+    if soundfile is None:
+        raise RuntimeError(f"soundfile is required to decode {audio_format} audio")
+    samples, rate = soundfile.read(io.BytesIO(data), dtype='int16')
+    return samples, rate
+
+
+class LocalAudioStore:
+    """Content-addressed clip store on disk: <root>/<key[:2]>/<key>"""
+
+    name = 'local'
+
+    def __init__(self, root="recordings/archive"):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, key, data, content_type):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, key):
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+
+class GridFSAudioStore:
+    """Clip store in GridFS, using the content hash as the file _id"""
+
+    name = 'gridfs'
+
+    def __init__(self, db, collection='question_audio'):
+        import gridfs
+        self.fs = gridfs.GridFS(db, collection=collection)
+
+    def put(self, key, data, content_type):
+        if not self.fs.exists(key):
+            self.fs.put(data, _id=key, content_type=content_type)
+
+    def get(self, key):
+        return self.fs.get(key).read()
+
+
+class AudioArchive:
+    """
+    Keeps question audio for later re-analysis.
+
+    Clips are downsampled to 16 kHz mono, compressed to FLAC where available
+    and stored under the SHA-256 of the encoded bytes, so identical clips are
+    stored once. archive_frames returns the reference that is saved on the
+    question document.
+    """
+
+    def __init__(self, store, rate=ARCHIVE_RATE):
+        self.store = store
+        self.rate = rate
+
+    def archive_frames(self, frames, rate=44100):
+        samples = resample(np.frombuffer(b''.join(frames), dtype=np.int16), rate, self.rate)
+        data, audio_format = encode_clip(samples, self.rate)
+        key = hashlib.sha256(data).hexdigest()
+        self.store.put(key, data, f"audio/{audio_format}")
+        logger.info(f"Archived {len(samples) / self.rate:.1f}s question audio as {audio_format} ({len(data)} bytes)")
+        return {
+            'key': key,
+            'store': self.store.name,
+            'format': audio_format,
+            'sample_rate': self.rate,
+            'duration': round(len(samples) / self.rate, 2),
+            'bytes': len(data)
+        }
+
+    def load_samples(self, audio_ref):
+        """Return (int16 samples, rate) for a question's audio reference"""
+        return decode_clip(self.store.get(audio_ref['key']), audio_ref['format'])
+
+
+def create_audio_archive(config, db=None):
+    """Build the archive selected by app_settings.audio_archive ('local' or 'gridfs')"""
+    settings = (config or {}).get('app_settings', {})
+    store = settings.get('audio_archive', 'local')
+    if store == 'gridfs':
+        if db is None:
+            raise ValueError("GridFS audio archive needs a database")
+        return AudioArchive(GridFSAudioStore(db))
+    if store != 'local':
+        raise ValueError(f"Unknown audio archive store: {store}")
+    return AudioArchive(LocalAudioStore(settings.get('audio_archive_path', 'recordings/archive')))
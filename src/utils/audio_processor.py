@@ -1,12 +1,16 @@
 import pyaudio
 import wave
-import openai
 import numpy as np
 from datetime import datetime
 import os
+from src.utils.ai_gateway import AIGateway
+from src.utils.config import load_config
+from src.utils.logger import logger
+from src.utils.relevance_analyzer import RelevanceAnalyzer
 
 class AudioProcessor:
-    def __init__(self):
+    def __init__(self, gateway=None):
+        self.gateway = gateway
         self.audio = pyaudio.PyAudio()
         self.stream = None
         self.frames = []
@@ -50,26 +54,18 @@ class AudioProcessor:
             return filename
         return None
 
-    # OPEN AI API IMPLEMENTATION (WE ARE USING WHISPER)
-    def analyze_question(self, audio_file):
+    # SPEECH TO TEXT GOES THROUGH THE CONFIGURED ASR BACKEND (WHISPER BY DEFAULT)
+    def analyze_question(self, audio_file, course=None):
         try:
-            client = openai.OpenAI()
+            if self.gateway is None:
+                self.gateway = AIGateway(load_config())
 
             with open(audio_file, "rb") as audio:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio
-                )
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an educational assistant analyzing student questions."},
-                    {"role": "user", "content": f"Is this question relevant to the class? Question: {transcript.text}"}
-                ]
-            )
-            
-            is_relevant = "yes" in response.choices[0].message.content.lower()
-            return transcript.text, is_relevant
+                question_text = self.gateway.transcribe(audio)
+
+            analyzer = RelevanceAnalyzer(self.gateway.client, model=self.gateway.chat_model, stream=False)
+            is_relevant, _, _ = analyzer.analyze(course or {'_id': None, 'course_name': 'the class'}, question_text)
+            return question_text, is_relevant
             
         except Exception as e:
             logger.error(f"Error analyzing question: {str(e)}")
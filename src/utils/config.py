@@ -13,7 +13,27 @@ def load_config():
         "app_settings": {
             "hand_raise_threshold": 0.3,
             "face_recognition_tolerance": 0.6,
-            "question_relevance_threshold": 0.7
+            "question_relevance_threshold": 0.7,
+            "audio_archive": "local",
+            "audio_archive_path": "recordings/archive",
+            "local_store_path": "data/local_store.db"
+        },
+        "database": {
+            "backend": "atlas",
+            "local_uri": "mongodb://localhost:27017",
+            "options": {},
+            "local_options": {},
+            "measure_command_bytes": False,
+            "analytics_read_preference": "secondaryPreferred",
+            "rollup_lookback_days": 2,
+            "rollup_retention_days": None,
+            "delete_chunk_size": 500
+        },
+        "api": {
+            "openai_model": "gpt-4o-mini",
+            "whisper_model": "whisper-1",
+            "asr_backend": "openai",
+            "asr_url": "http://127.0.0.1:8765/transcribe"
         }
     }
     
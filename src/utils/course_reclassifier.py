@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.logger import logger
+
+
+class CourseReclassifier:
+    """
+    Re-runs relevance classification for a course's stored questions after its topic changes.
+
+    Questions are streamed from a cursor and classified in micro-batches of
+    `batch_size` through RelevanceAnalyzer.analyze_batch (so cached verdicts
+    for the new topic are reused), with at most `max_concurrency` batches in
+    flight. Verdicts are written back with one bulk write per batch. Each
+    course has at most one job; starting a new one cancels the previous.
+    """
+
+    def __init__(self, db_manager, analyzer, batch_size=8, max_concurrency=3):
+        self.db_manager = db_manager
+        self.analyzer = analyzer
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, course, on_progress=None, on_done=None):
+        """
+        Reclassify a course's questions on a background thread.
+        on_progress(done, total) is called after every batch and
+        on_done(done, total, cancelled) once the job ends.
+        """
+        cancel = threading.Event()
+        with self._lock:
+            previous = self._jobs.get(course['_id'])
+            if previous is not None:
+                previous.set()
+            self._jobs[course['_id']] = cancel
+
+        thread = threading.Thread(
+            target=self._run, args=(dict(course), cancel, on_progress, on_done), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def cancel_all(self):
+        with self._lock:
+            for cancel in self._jobs.values():
+                cancel.set()
+            self._jobs.clear()
+
+    def is_running(self, course_id):
+        with self._lock:
+            return course_id in self._jobs
+
+    def _run(self, course, cancel, on_progress, on_done):
+        total = self.db_manager.count_course_questions(course['_id'])
+        done = 0
+        start = time.perf_counter()
+        progress_lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.max_concurrency)
+        logger.info(f"Reclassifying {total} questions for course {course['_id']}")
+
+        def classify(batch):
+            nonlocal done
+            try:
+                if cancel.is_set():
+                    return
+                results = self.analyzer.analyze_batch(course, [q.get('question_text', '') for q in batch])
+                # Questions whose LLM call failed keep their stored verdict
+                self.db_manager.update_question_verdicts([
+                    (question, *result) for question, result in zip(batch, results)
+                    if not isinstance(result, Exception)
+                ])
+                with progress_lock:
+                    done += len(batch)
+                    current = done
+                if on_progress:
+                    on_progress(current, total)
+            except Exception as e:
+                logger.error(f"Error reclassifying question batch: {str(e)}")
+            finally:
+                slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='reclassify') as pool:
+                batch = []
+                for question in self.db_manager.iter_course_questions(course['_id']):
+                    if cancel.is_set():
+                        break
+                    batch.append(question)
+                    if len(batch) == self.batch_size:
+                        slots.acquire()
+                        pool.submit(classify, batch)
+                        batch = []
+                if batch and not cancel.is_set():
+                    slots.acquire()
+                    pool.submit(classify, batch)
+        except Exception as e:
+            logger.error(f"Error reclassifying course {course['_id']}: {str(e)}")
+        finally:
+            with self._lock:
+                if self._jobs.get(course['_id']) is cancel:
+                    del self._jobs[course['_id']]
+
+        logger.info(
+            f"Reclassified {done}/{total} questions for course {course['_id']} in "
+            f"{time.perf_counter() - start:.1f}s{' (cancelled)' if cancel.is_set() else ''}"
+        )
+        if on_done:
+            on_done(done, total, cancel.is_set())
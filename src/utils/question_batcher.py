@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+
+from src.utils.logger import logger
+
+
+class QuestionBatcher:
+    """
+    Collects transcribed questions for a short window and classifies them together.
+
+    Questions that finish transcription within `window_seconds` of the first
+    pending one (or until `max_items` are waiting) are classified with a single
+    batched request through RelevanceAnalyzer.analyze_batch. Each submitter's
+    callback is then invoked with (is_relevant, reason, source); an optional
+    on_verdict(is_relevant) callback fires as soon as the verdict has streamed in.
+    """
+
+    def __init__(self, analyzer, window_seconds=1.5, max_items=8):
+        self.analyzer = analyzer
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, course, question_text, on_result, on_error=None, on_verdict=None):
+        """Queue a question for classification"""
+        self._queue.put((course, question_text, on_result, on_error, on_verdict))
+
+    def stop(self):
+        """Stop the worker after classifying everything queued before this call"""
+        self._queue.put(None)
+        self._thread.join(timeout=self.window_seconds + 30)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Classify this batch, then stop
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch):
+        # Only questions from the same course can share a prompt
+        by_course = {}
+        for item in batch:
+            by_course.setdefault(item[0]['_id'], []).append(item)
+
+        for items in by_course.values():
+            course = items[0][0]
+            logger.info(f"Classifying batch of {len(items)} question(s)")
+            try:
+                results = self.analyzer.analyze_batch(
+                    course,
+                    [item[1] for item in items],
+                    [item[4] for item in items]
+                )
+            except Exception as e:
+                logger.error(f"Error classifying question batch: {str(e)}")
+                for _, _, _, on_error, _ in items:
+                    if on_error:
+                        on_error(e)
+                continue
+
+            for (_, _, on_result, on_error, _), result in zip(items, results):
+                if isinstance(result, Exception):
+                    # Only this question failed; the rest of the batch is still logged
+                    if on_error:
+                        on_error(result)
+                    continue
+                try:
+                    on_result(*result)
+                except Exception as e:
+                    logger.error(f"Error handling classified question: {str(e)}")
+                    if on_error:
+                        on_error(e)
@@ -0,0 +1,198 @@
+"""
+Background re-analysis of archived question audio.
+
+Re-transcribes and reclassifies questions after a model or prompt change:
+
+    python -m src.utils.reanalysis --job whisper-large-2026 --course CS101
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.logger import logger
+
+
+class ReanalysisJob:
+    """
+    Re-transcribes archived question audio and reclassifies the transcripts.
+
+    Questions are processed in _id order in batches of `batch_size`; up to
+    `max_concurrency` clips of a batch are transcribed at once and each
+    course's transcripts are classified with one batched request. After every
+    batch the last processed _id is checkpointed under `job_id`, so a stopped
+    or crashed job resumes where it left off.
+    """
+
+    def __init__(self, db_manager, archive, transcriber, analyzer, job_id='reanalysis', course_id=None,
+                 batch_size=16, max_concurrency=4):
+        self.db_manager = db_manager
+        self.archive = archive
+        self.transcriber = transcriber
+        self.analyzer = analyzer
+        self.job_id = job_id
+        self.course_id = course_id
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, on_progress=None, restart=False):
+        """Run the job on a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(on_progress, restart), daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, wait=True):
+        """Stop after the current batch; progress is kept for resuming"""
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def run(self, on_progress=None, restart=False):
+        """Process all remaining questions and return the final progress"""
+        progress = None if restart else self.db_manager.get_reanalysis_progress(self.job_id)
+        if progress and progress.get('status') == 'completed':
+            logger.info(f"Re-analysis job {self.job_id} already completed")
+            return progress
+        progress = progress or {'last_id': None, 'processed': 0, 'failed': 0, 'failed_ids': []}
+        progress.update({'status': 'running', 'model': self.analyzer.model, 'course_id': self.course_id})
+        progress.pop('_id', None)
+        courses = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='reanalysis') as pool:
+            while not self._stop.is_set():
+                batch = self.db_manager.get_questions_for_reanalysis(
+                    progress['last_id'], self.batch_size, self.course_id
+                )
+                if not batch:
+                    progress['status'] = 'completed'
+                    break
+
+                start = time.perf_counter()
+                results, failed = self._process_batch(batch, pool, courses)
+                self.db_manager.save_question_reanalysis(results)
+
+                progress['last_id'] = batch[-1]['_id']
+                progress['processed'] += len(results)
+                progress['failed'] += len(failed)
+                progress['failed_ids'] = progress['failed_ids'] + failed
+                self.db_manager.save_reanalysis_progress(self.job_id, progress)
+                logger.info(
+                    f"Re-analysis {self.job_id}: {len(results)}/{len(batch)} questions in "
+                    f"{time.perf_counter() - start:.1f}s, {progress['processed']} done, {progress['failed']} failed"
+                )
+                if on_progress:
+                    on_progress(dict(progress))
+            else:
+                progress['status'] = 'stopped'
+
+        self.db_manager.save_reanalysis_progress(self.job_id, progress)
+        return progress
+
+    def _transcribe(self, question):
+        samples, rate = self.archive.load_samples(question['audio'])
+        return self.transcriber.transcribe_frames([samples.tobytes()], rate=rate)
+
+    def _process_batch(self, batch, pool, courses):
+        futures = [pool.submit(self._transcribe, question) for question in batch]
+        transcribed = {}
+        failed = []
+        for question, future in zip(batch, futures):
+            try:
+                transcribed[question['_id']] = future.result()
+            except Exception as e:
+                logger.error(f"Re-transcription failed for question {question['_id']}: {str(e)}")
+                failed.append(question['_id'])
+
+        by_course = {}
+        for question in batch:
+            if question['_id'] in transcribed:
+                by_course.setdefault(question['course_id'], []).append(question)
+
+        results = []
+        for course_id, questions in by_course.items():
+            if course_id not in courses:
+                courses[course_id] = self.db_manager.get_course(course_id)
+            course = courses[course_id]
+            if course is None:
+                failed.extend(question['_id'] for question in questions)
+                continue
+            texts = [transcribed[question['_id']] for question in questions]
+            try:
+                verdicts = self.analyzer.analyze_batch(course, texts)
+            except Exception as e:
+                logger.error(f"Reclassification failed for course {course_id}: {str(e)}")
+                failed.extend(question['_id'] for question in questions)
+                continue
+            for question, text, verdict in zip(questions, texts, verdicts):
+                if isinstance(verdict, Exception):
+                    failed.append(question['_id'])
+                    continue
+                is_relevant, reason, source = verdict
+                results.append({
+                    '_id': question['_id'],
+                    'course_id': course_id,
+                    'student_id': question.get('student_id'),
+                    'question_text': text,
+                    'is_relevant': is_relevant,
+                    'reason': reason,
+                    'relevance_source': source,
+                    'previous': {
+                        'question_text': question.get('question_text'),
+                        'is_relevant': question.get('is_relevant'),
+                        'reason': question.get('reason')
+                    }
+                })
+        return results, failed
+
+
+def main():
+    from src.database.db_manager import DatabaseManager
+    from src.utils.ai_gateway import AIGateway
+    from src.utils.audio_archive import create_audio_archive
+    from src.utils.config import load_config
+    from src.utils.relevance_analyzer import RelevanceAnalyzer
+    from src.utils.transcription import ChunkedTranscriber
+
+    parser = argparse.ArgumentParser(description="Re-transcribe and reclassify archived questions")
+    parser.add_argument('--job', default='reanalysis', help="job id used to checkpoint and resume progress")
+    parser.add_argument('--course', help="course code to limit the job to")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--restart', action='store_true', help="ignore saved progress")
+    args = parser.parse_args()
+
+    config = load_config()
+    db_manager = DatabaseManager(allow_offline=False)
+    course_id = None
+    if args.course:
+        course = db_manager.get_course_by_code(args.course)
+        if course is None:
+            raise SystemExit(f"Unknown course {args.course}")
+        course_id = course['_id']
+
+    gateway = AIGateway(config, max_concurrency=args.concurrency)
+    job = ReanalysisJob(
+        db_manager,
+        create_audio_archive(config, db_manager.db),
+        ChunkedTranscriber(gateway),
+        RelevanceAnalyzer(gateway.client, model=gateway.chat_model),
+        job_id=args.job,
+        course_id=course_id,
+        batch_size=args.batch_size,
+        max_concurrency=args.concurrency
+    )
+    try:
+        progress = job.run(on_progress=lambda p: print(f"{p['processed']} reanalyzed, {p['failed']} failed"))
+    except KeyboardInterrupt:
+        progress = db_manager.get_reanalysis_progress(args.job)
+    finally:
+        gateway.shutdown()
+    print(f"Job {args.job}: {progress.get('status')}, {progress.get('processed')} reanalyzed, "
+          f"{progress.get('failed')} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+import json
+import re
+import time
+from collections import deque
+
+from src.utils.logger import logger
+
+SYSTEM_PROMPT = (
+    "You are analyzing a student's question for relevance to a specific class topic. "
+    "You must determine whether the question is relevant to the class topic or not. "
+    "Give the verdict first, then a reason of at most 15 words."
+)
+
+VERDICT_PROPERTIES = {
+    "verdict": {"type": "string", "enum": ["Relevant", "Irrelevant"]},
+    "reason": {"type": "string"}
+}
+
+VERDICT_SCHEMA = {
+    "name": "relevance_verdict",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": VERDICT_PROPERTIES,
+        "required": ["verdict", "reason"],
+        "additionalProperties": False
+    }
+}
+
+BATCH_SCHEMA = {
+    "name": "relevance_verdicts",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "integer"}, **VERDICT_PROPERTIES},
+                    "required": ["id", "verdict", "reason"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["results"],
+        "additionalProperties": False
+    }
+}
+
+# "Relevant" and "Irrelevant" differ in their first letter, so the verdict is
+# known as soon as the first character of its value has been streamed
+SINGLE_VERDICT_PATTERN = re.compile(r'"verdict"\s*:\s*"([RI])')
+BATCH_VERDICT_PATTERN = re.compile(r'"id"\s*:\s*(\d+)\s*,\s*"verdict"\s*:\s*"([RI])')
+
+
+class RelevanceAnalyzer:
+    """Decides whether a transcribed question is relevant to the current course topic"""
+
+    def __init__(self, openai_client, cache=None, local_classifier=None, model="gpt-4o-mini",
+                 max_tokens=60, stream=True):
+        self.openai_client = openai_client
+        self.cache = cache
+        self.local_classifier = local_classifier
+        self.model = model
+        self.max_tokens = max_tokens
+        self.stream = stream
+        # (time_to_verdict, total) in seconds for recent LLM calls
+        self.timings = deque(maxlen=200)
+
+    @staticmethod
+    def get_class_topic(course):
+        """Get class topic from course description or name"""
+        return course.get('description', '') or course['course_name']
+
+    def analyze(self, course, question_text, on_verdict=None):
+        """
+        Return (is_relevant, reason, source) for a question asked in a course.
+        source is 'local', 'cache' or 'llm' depending on what produced the verdict.
+        on_verdict(is_relevant) is called as soon as the verdict is known, before the reason.
+        """
+        result = self.analyze_batch(course, [question_text], [on_verdict])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def analyze_batch(self, course, question_texts, on_verdicts=None):
+        """
+        Classify several questions for the same course with at most one batched
+        LLM request. Returns a list of (is_relevant, reason, source) in input order;
+        a question whose per-item fallback call failed gets the exception instead.
+        """
+        on_verdicts = on_verdicts or [None] * len(question_texts)
+        results = [self.classify_fast(course, text) for text in question_texts]
+        for result, on_verdict in zip(results, on_verdicts):
+            if result is not None and on_verdict:
+                on_verdict(result[0])
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        class_topic = self.get_class_topic(course)
+        verdicts = {}
+        latency = 0.0
+        if len(pending) > 1:
+            start = time.perf_counter()
+            try:
+                verdicts = self._ask_llm_batch(
+                    class_topic,
+                    [question_texts[i] for i in pending],
+                    [on_verdicts[i] for i in pending]
+                )
+            except Exception as e:
+                logger.error(f"Batched relevance request failed, falling back to per-item calls: {str(e)}")
+            latency = (time.perf_counter() - start) / len(pending)
+            logger.info(f"Batched relevance request answered {len(verdicts)}/{len(pending)} questions")
+
+        for position, i in enumerate(pending):
+            if position in verdicts:
+                is_relevant, reason = verdicts[position]
+            else:
+                start = time.perf_counter()
+                try:
+                    is_relevant, reason = self._ask_llm(class_topic, question_texts[i], on_verdicts[i])
+                except Exception as e:
+                    logger.error(f"Relevance request failed for one question: {str(e)}")
+                    results[i] = e
+                    continue
+                latency = time.perf_counter() - start
+            self.record_llm_verdict(course, question_texts[i], is_relevant, reason, latency)
+            results[i] = (is_relevant, reason, 'llm')
+
+        return results
+
+    def preview(self, course, partial_text):
+        """
+        Start relevance analysis early on the leading part of a question.
+
+        Builds the course topic profile and loads cached verdicts so the final
+        classification does not pay for them, and returns a provisional
+        verdict when the local model is already confident, otherwise None.
+        """
+        if self.cache is not None:
+            self.cache.warm(course['_id'], self.get_class_topic(course))
+        if self.local_classifier is None:
+            return None
+        probability = self.local_classifier.score(course, partial_text)
+        if probability is None:
+            return None
+        if probability >= self.local_classifier.threshold:
+            return True
+        if probability <= 1.0 - self.local_classifier.threshold:
+            return False
+        return None
+
+    def classify_fast(self, course, question_text):
+        """Try the local classifier and then the cache; None means the LLM is needed"""
+        if self.local_classifier is not None:
+            try:
+                local = self.local_classifier.classify(course, question_text)
+            except Exception as e:
+                logger.error(f"Local relevance classifier failed: {str(e)}")
+                local = None
+            if local is not None:
+                is_relevant, confidence = local
+                logger.info(f"Classified question locally (confidence {confidence:.2f}), "
+                            f"stats: {self.local_classifier.stats()}")
+                return is_relevant, f"Classified locally against the course topic (confidence {confidence:.0%}).", 'local'
+
+        if self.cache is not None:
+            cached = self.cache.lookup(course['_id'], self.get_class_topic(course), question_text)
+            if cached is not None:
+                logger.info(f"Relevance cache hit, stats: {self.cache.stats()}")
+                return cached[0], cached[1], 'cache'
+
+        return None
+
+    def record_llm_verdict(self, course, question_text, is_relevant, reason, latency):
+        """Feed an LLM verdict back into the cache and the local classifier"""
+        if self.cache is not None:
+            self.cache.store(course['_id'], self.get_class_topic(course), question_text, is_relevant, reason, latency)
+            logger.info(f"Relevance cache miss ({latency:.2f}s), stats: {self.cache.stats()}")
+
+        if self.local_classifier is not None:
+            self.local_classifier.learn(course, question_text, is_relevant)
+
+    def timing_stats(self):
+        """Median time-to-verdict and total latency over recent LLM calls"""
+        if not self.timings:
+            return {'calls': 0, 'median_time_to_verdict': None, 'median_total': None}
+        to_verdict = sorted(t[0] for t in self.timings)
+        total = sorted(t[1] for t in self.timings)
+        return {
+            'calls': len(self.timings),
+            'median_time_to_verdict': to_verdict[len(to_verdict) // 2],
+            'median_total': total[len(total) // 2]
+        }
+
+    def _ask_llm(self, class_topic, question_text, on_verdict=None):
+        """Analyze question relevance using GPT with schema-constrained output"""
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": (
+                    f"The class topic is: {class_topic}\n"
+                    f"Question: {question_text}\n\n"
+                    "Is this question relevant or irrelevant to the class topic?"
+                )
+            }
+        ]
+
+        def on_partial(buffer, state):
+            if 'verdict' in state:
+                return
+            match = SINGLE_VERDICT_PATTERN.search(buffer)
+            if match:
+                state['verdict'] = match.group(1) == 'R'
+                state['time_to_verdict'] = time.perf_counter() - state['start']
+                if on_verdict:
+                    on_verdict(state['verdict'])
+
+        content, state = self._complete_structured(messages, VERDICT_SCHEMA, self.max_tokens, on_partial)
+        self._record_timing(state, 1)
+
+        try:
+            data = json.loads(content)
+            return data['verdict'] == 'Relevant', data.get('reason', '')
+        except (ValueError, KeyError, TypeError):
+            if 'verdict' not in state:
+                raise ValueError(f"Unparseable relevance response: {content!r}")
+            # Output was cut off after the verdict; keep what we have of the reason
+            reason = re.search(r'"reason"\s*:\s*"(.*)', content)
+            return state['verdict'], reason.group(1).rstrip('"} ') if reason else ""
+
+    def _ask_llm_batch(self, class_topic, question_texts, on_verdicts):
+        """Classify several questions in one schema-constrained request"""
+        numbered = "\n".join(f"{i}: {text}" for i, text in enumerate(question_texts))
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": (
+                    f"The class topic is: {class_topic}\n"
+                    f"Questions:\n{numbered}\n\n"
+                    "For every question, by its number as id, decide whether it is relevant "
+                    "or irrelevant to the class topic."
+                )
+            }
+        ]
+
+        def on_partial(buffer, state):
+            seen = state.setdefault('seen', set())
+            for match in BATCH_VERDICT_PATTERN.finditer(buffer):
+                index = int(match.group(1))
+                if index in seen or index >= len(question_texts):
+                    continue
+                seen.add(index)
+                state.setdefault('time_to_verdict', time.perf_counter() - state['start'])
+                if on_verdicts[index]:
+                    on_verdicts[index](match.group(2) == 'R')
+
+        content, state = self._complete_structured(
+            messages, BATCH_SCHEMA, self.max_tokens * len(question_texts), on_partial
+        )
+        self._record_timing(state, len(question_texts))
+        return self.parse_batch_response(content, len(question_texts))
+
+    def _complete_structured(self, messages, schema, max_tokens, on_partial):
+        """Run a json_schema-constrained completion, streaming deltas through on_partial"""
+        state = {'start': time.perf_counter()}
+        response = self.openai_client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            max_tokens=max_tokens,
+            response_format={"type": "json_schema", "json_schema": schema},
+            stream=self.stream,
+            messages=messages
+        )
+
+        if not self.stream:
+            content = response.choices[0].message.content or ""
+            on_partial(content, state)
+        else:
+            parts = []
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_partial("".join(parts), state)
+            content = "".join(parts)
+
+        state['total'] = time.perf_counter() - state['start']
+        return content, state
+
+    def _record_timing(self, state, items):
+        time_to_verdict = state.get('time_to_verdict', state['total'])
+        self.timings.append((time_to_verdict, state['total']))
+        logger.info(
+            f"Relevance call ({self.model}, {items} item(s)): time to verdict "
+            f"{time_to_verdict * 1000:.0f} ms, total {state['total'] * 1000:.0f} ms"
+        )
+
+    @staticmethod
+    def parse_batch_response(content, expected):
+        """Map question index -> (is_relevant, reason), skipping missing or malformed items"""
+        verdicts = {}
+        try:
+            items = json.loads(content).get('results', [])
+        except (ValueError, AttributeError):
+            logger.warning("Batched relevance response was not valid JSON")
+            return verdicts
+
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index = item.get('id')
+            verdict = str(item.get('verdict', '')).strip().lower()
+            if not isinstance(index, int) or not 0 <= index < expected:
+                continue
+            if verdict not in ('relevant', 'irrelevant'):
+                continue
+            verdicts[index] = (verdict == 'relevant', str(item.get('reason', '')))
+        return verdicts
@@ -0,0 +1,217 @@
+import hashlib
+import re
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from src.utils.logger import logger
+
+# Large Mersenne prime used for the universal hash family behind MinHash
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_question(text):
+    """Normalise question text so trivially different phrasings share a key"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def topic_hash(topic):
+    """Stable short hash of a course topic (description or name)"""
+    return hashlib.sha1(normalize_question(topic).encode('utf-8')).hexdigest()[:16]
+
+
+class MinHasher:
+    """MinHash signatures over character shingles of normalised text"""
+
+    def __init__(self, num_perm=128, shingle_size=4, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        """Character shingles of the normalised text"""
+        padded = f" {text} "
+        if len(padded) <= self.shingle_size:
+            return {padded}
+        return {padded[i:i + self.shingle_size] for i in range(len(padded) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        """Compute the MinHash signature for already-normalised text"""
+        hashes = np.array(
+            [zlib.crc32(s.encode('utf-8')) for s in self.shingles(text)],
+            dtype=np.uint64
+        )
+        # (a * x + b) mod p for every permutation/shingle pair, then min per permutation
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+class RelevanceCache:
+    """
+    Cache of relevance verdicts keyed on (course topic hash, normalised question).
+
+    Exact matches are served from an in-memory LRU. Misses fall back to a
+    MinHash similarity scan over the cached questions of the same topic so
+    near-duplicate phrasings reuse an earlier verdict. Every verdict is also
+    persisted through the DatabaseManager so the cache survives restarts.
+    """
+
+    def __init__(self, db_manager=None, capacity=2048, similarity_threshold=0.75, num_perm=128):
+        self.db_manager = db_manager
+        self.capacity = capacity
+        self.similarity_threshold = similarity_threshold
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        self._entries = OrderedDict()  # key -> entry
+        self._topics = {}  # topic_hash -> {'keys': [...], 'matrix': ndarray or None}
+        self._loaded_topics = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(topic_digest, normalized):
+        return hashlib.sha1(f"{topic_digest}:{normalized}".encode('utf-8')).hexdigest()
+
+    def lookup(self, course_id, topic, question_text):
+        """Return a cached (is_relevant, reason) verdict or None on a miss"""
+        normalized = normalize_question(question_text)
+        digest = topic_hash(topic)
+        key = self.make_key(digest, normalized)
+
+        self._ensure_topic_loaded(course_id, digest)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry.get('latency', 0.0)
+                return entry['is_relevant'], entry['reason']
+
+            match = self._find_near_duplicate(digest, self.hasher.signature(normalized))
+            if match is not None:
+                self._entries.move_to_end(match['_id'])
+                self.near_hits += 1
+                self.saved_seconds += match.get('latency', 0.0)
+                logger.info(f"Near-duplicate cache hit: '{normalized}' ~ '{match['question_norm']}'")
+                return match['is_relevant'], match['reason']
+
+            self.misses += 1
+            return None
+
+    def store(self, course_id, topic, question_text, is_relevant, reason, latency=0.0):
+        """Cache a verdict in memory and persist it"""
+        normalized = normalize_question(question_text)
+        digest = topic_hash(topic)
+        entry = {
+            '_id': self.make_key(digest, normalized),
+            'course_id': course_id,
+            'topic_hash': digest,
+            'question_norm': normalized,
+            'is_relevant': is_relevant,
+            'reason': reason,
+            'signature': self.hasher.signature(normalized).tolist(),
+            'latency': latency,
+            'created_at': datetime.utcnow()
+        }
+
+        with self._lock:
+            self._add_entry(entry)
+
+        if self.db_manager is not None:
+            try:
+                self.db_manager.save_relevance_cache_entry(entry)
+            except Exception as e:
+                logger.error(f"Error persisting relevance cache entry: {str(e)}")
+
+    def warm(self, course_id, topic):
+        """Load a topic's persisted verdicts ahead of the first lookup"""
+        self._ensure_topic_loaded(course_id, topic_hash(topic))
+
+    def invalidate_course(self, course_id):
+        """Drop every in-memory entry belonging to a course"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry['course_id'] == course_id]
+            for key in stale:
+                self._remove_entry(key)
+            self._loaded_topics = {
+                loaded for loaded in self._loaded_topics if loaded[0] != course_id
+            }
+
+    def stats(self):
+        """Hit rate and latency saved by the cache so far"""
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            'lookups': lookups,
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            'saved_seconds': self.saved_seconds,
+            'size': len(self._entries)
+        }
+
+    def _ensure_topic_loaded(self, course_id, digest):
+        """Warm the in-memory cache from the persistent store once per topic"""
+        if self.db_manager is None or (course_id, digest) in self._loaded_topics:
+            return
+        try:
+            entries = self.db_manager.get_relevance_cache_entries(course_id, digest, limit=self.capacity)
+        except Exception as e:
+            logger.error(f"Error loading relevance cache: {str(e)}")
+            return
+        with self._lock:
+            for entry in entries:
+                if entry['_id'] not in self._entries:
+                    self._add_entry(entry)
+            self._loaded_topics.add((course_id, digest))
+
+    def _add_entry(self, entry):
+        key = entry['_id']
+        if key in self._entries:
+            self._remove_entry(key)
+        self._entries[key] = entry
+        topic = self._topics.setdefault(entry['topic_hash'], {'keys': [], 'matrix': None})
+        topic['keys'].append(key)
+        topic['matrix'] = None
+
+        while len(self._entries) > self.capacity:
+            oldest = next(iter(self._entries))
+            self._remove_entry(oldest)
+
+    def _remove_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        topic = self._topics.get(entry['topic_hash'])
+        if topic:
+            topic['keys'].remove(key)
+            topic['matrix'] = None
+
+    def _find_near_duplicate(self, digest, signature):
+        topic = self._topics.get(digest)
+        if not topic or not topic['keys']:
+            return None
+        if topic['matrix'] is None:
+            topic['matrix'] = np.array(
+                [self._entries[key]['signature'] for key in topic['keys']],
+                dtype=np.uint32
+            )
+        similarity = (topic['matrix'] == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] >= self.similarity_threshold:
+            return self._entries[topic['keys'][best]]
+        return None
@@ -0,0 +1,194 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from src.utils.logger import logger
+from src.utils.relevance_cache import normalize_question, topic_hash
+
+
+class HashedTfidfVectorizer:
+    """
+    TF-IDF over hashed word unigrams and bigrams.
+
+    Document frequencies are tracked per hash bucket and updated as documents
+    are seen, so the IDF weighting improves as the course accumulates questions.
+    """
+
+    def __init__(self, n_features=2 ** 16):
+        self.n_features = n_features
+        self.doc_freq = np.zeros(n_features, dtype=np.float64)
+        self.num_docs = 0
+
+    def _buckets(self, text):
+        tokens = normalize_question(text).split()
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for term in terms:
+            h = zlib.crc32(term.encode('utf-8'))
+            index = h % self.n_features
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign
+        return counts
+
+    def observe(self, text):
+        """Update document frequencies with a new document"""
+        self.num_docs += 1
+        for index in self._buckets(text):
+            self.doc_freq[index] += 1
+
+    def transform(self, text):
+        """Return (indices, values) of the L2-normalised sparse TF-IDF vector"""
+        counts = self._buckets(text)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        tf = np.sign(tf) * np.log1p(np.abs(tf))
+        idf = np.log((1.0 + self.num_docs) / (1.0 + self.doc_freq[indices])) + 1.0
+        values = tf * idf
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values /= norm
+        return indices, values
+
+
+class CourseTopicModel:
+    """Incrementally trained logistic regression over hashed TF-IDF features"""
+
+    def __init__(self, n_features=2 ** 16, learning_rate=1.0, l2=1e-4):
+        self.vectorizer = HashedTfidfVectorizer(n_features)
+        self.weights = np.zeros(n_features, dtype=np.float64)
+        self.bias = 0.0
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.label_counts = {True: 0, False: 0}
+
+    def predict_proba(self, text):
+        """Probability that the text is relevant to the course"""
+        indices, values = self.vectorizer.transform(text)
+        score = float(values @ self.weights[indices]) + self.bias
+        return float(1.0 / (1.0 + np.exp(-score)))
+
+    def partial_fit(self, text, is_relevant, observe=True):
+        """Single SGD step on one labelled example"""
+        if observe:
+            self.vectorizer.observe(text)
+            self.label_counts[bool(is_relevant)] += 1
+        indices, values = self.vectorizer.transform(text)
+        error = (1.0 if is_relevant else 0.0) - self.predict_proba(text)
+        self.weights[indices] *= (1.0 - self.learning_rate * self.l2)
+        self.weights[indices] += self.learning_rate * error * values
+        self.bias += self.learning_rate * error
+
+    def fit(self, examples, epochs=10, seed=0):
+        """Train on a batch of (text, is_relevant) examples"""
+        for text, is_relevant in examples:
+            self.vectorizer.observe(text)
+            self.label_counts[bool(is_relevant)] += 1
+        rng = np.random.RandomState(seed)
+        for _ in range(epochs):
+            for i in rng.permutation(len(examples)):
+                text, is_relevant = examples[i]
+                self.partial_fit(text, is_relevant, observe=False)
+
+
+class TopicClassifier:
+    """
+    Local fast-path relevance classifier.
+
+    A topic model is built per course from its description (positive examples)
+    and its labelled questions. Questions scored with confidence at or above
+    the relevance threshold are answered locally; the rest are reported as
+    uncertain so the caller can escalate them to the LLM.
+    """
+
+    def __init__(self, db_manager=None, threshold=0.7, min_examples_per_class=5, n_features=2 ** 16):
+        self.db_manager = db_manager
+        self.threshold = max(threshold, 1.0 - threshold)
+        self.min_examples_per_class = min_examples_per_class
+        self.n_features = n_features
+        self._models = {}  # course_id -> (topic_hash, CourseTopicModel)
+        self._lock = threading.Lock()
+
+        self.local_decisions = 0
+        self.escalations = 0
+
+    @staticmethod
+    def description_examples(course):
+        """Split the course name and description into positive training sentences"""
+        text = f"{course.get('course_name', '')}. {course.get('description', '') or ''}"
+        return [(s.strip(), True) for s in re.split(r"[.\n;!?]+", text) if s.strip()]
+
+    def get_model(self, course):
+        """Get (building if needed) the topic model for a course"""
+        digest = topic_hash(course.get('description', '') or course['course_name'])
+        with self._lock:
+            cached = self._models.get(course['_id'])
+            if cached and cached[0] == digest:
+                return cached[1]
+
+        examples = self.description_examples(course)
+        if self.db_manager is not None:
+            for question in self.db_manager.get_labelled_questions(course['_id']):
+                examples.append((question['question_text'], bool(question['is_relevant'])))
+
+        model = CourseTopicModel(self.n_features)
+        model.fit(examples)
+        logger.info(
+            f"Built topic profile for course {course['_id']} from {len(examples)} examples "
+            f"({model.label_counts[True]} relevant, {model.label_counts[False]} irrelevant)"
+        )
+
+        with self._lock:
+            self._models[course['_id']] = (digest, model)
+        return model
+
+    def classify(self, course, question_text):
+        """
+        Return (is_relevant, confidence) when the local model is confident,
+        or None when the question falls in the uncertain band.
+        """
+        model = self.get_model(course)
+        if min(model.label_counts.values()) < self.min_examples_per_class:
+            self.escalations += 1
+            return None
+
+        probability = model.predict_proba(question_text)
+        if probability >= self.threshold:
+            self.local_decisions += 1
+            return True, probability
+        if probability <= 1.0 - self.threshold:
+            self.local_decisions += 1
+            return False, 1.0 - probability
+
+        self.escalations += 1
+        return None
+
+    def score(self, course, text):
+        """Relevance probability for a (possibly partial) question, or None if the model is undertrained"""
+        model = self.get_model(course)
+        if min(model.label_counts.values()) < self.min_examples_per_class:
+            return None
+        return model.predict_proba(text)
+
+    def learn(self, course, question_text, is_relevant):
+        """Incrementally train on a verdict obtained from the LLM"""
+        model = self.get_model(course)
+        with self._lock:
+            model.partial_fit(question_text, is_relevant)
+
+    def invalidate(self, course_id):
+        """Drop a course's model so it is rebuilt from the current labels"""
+        with self._lock:
+            self._models.pop(course_id, None)
+
+    def stats(self):
+        """How many questions were decided locally versus escalated"""
+        total = self.local_decisions + self.escalations
+        return {
+            'local': self.local_decisions,
+            'escalated': self.escalations,
+            'local_rate': self.local_decisions / total if total else 0.0
+        }
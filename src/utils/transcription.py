@@ -0,0 +1,145 @@
+import io
+import wave
+
+import numpy as np
+
+from src.utils.logger import logger
+from src.utils.relevance_cache import normalize_question
+
+
+def detect_pauses(samples, rate, frame_ms=30, min_pause_ms=250):
+    """
+    Energy-based voice activity detection.
+
+    Returns (start, end) sample ranges of pauses at least `min_pause_ms` long.
+    The speech threshold adapts to the clip's own noise floor.
+    """
+    frame = max(1, int(rate * frame_ms / 1000))
+    count = len(samples) // frame
+    if count == 0:
+        return []
+
+    frames = samples[:count * frame].astype(np.float64).reshape(count, frame)
+    energy = np.sqrt((frames ** 2).mean(axis=1))
+    noise_floor = np.percentile(energy, 10)
+    threshold = max(min(noise_floor * 3.0, energy.max() * 0.5), energy.max() * 0.05, 1e-9)
+    silent = energy < threshold
+
+    pauses = []
+    min_frames = max(1, int(min_pause_ms / frame_ms))
+    run_start = None
+    for i, is_silent in enumerate(np.append(silent, False)):
+        if is_silent and run_start is None:
+            run_start = i
+        elif not is_silent and run_start is not None:
+            if i - run_start >= min_frames:
+                pauses.append((run_start * frame, i * frame))
+            run_start = None
+    return pauses
+
+
+def split_at_pauses(samples, rate, target_seconds=4.0, min_seconds=2.0, max_seconds=6.0, overlap_seconds=0.5):
+    """
+    Split a clip into (start, end, overlapped) sample ranges.
+
+    Cuts are placed in the middle of the detected pause closest to
+    `target_seconds` into each segment. When no pause falls between
+    `min_seconds` and `max_seconds`, the clip is cut hard at `max_seconds` and
+    the next segment starts `overlap_seconds` earlier so no word is lost;
+    `overlapped` marks the segments that start that way.
+    """
+    total = len(samples)
+    cut_points = [(start + end) // 2 for start, end in detect_pauses(samples, rate)]
+
+    segments = []
+    start, overlapped = 0, False
+    while total - start > max_seconds * rate:
+        lower, upper = start + int(min_seconds * rate), start + int(max_seconds * rate)
+        candidates = [cut for cut in cut_points if lower <= cut <= upper]
+        if candidates:
+            target = start + int(target_seconds * rate)
+            cut = min(candidates, key=lambda c: abs(c - target))
+            segments.append((start, cut, overlapped))
+            start, overlapped = cut, False
+        else:
+            segments.append((start, upper, overlapped))
+            start, overlapped = upper - int(overlap_seconds * rate), True
+    segments.append((start, total, overlapped))
+    return segments
+
+
+def stitch_transcripts(texts, overlapped, max_overlap_words=8):
+    """
+    Join segment transcripts in order. Where a segment overlaps the previous
+    one, words repeated across the boundary are dropped; at pause cuts a
+    repeat was spoken twice and is kept.
+    """
+    words = []
+    for text, overlaps in zip(texts, overlapped):
+        new_words = text.split()
+        if not new_words:
+            continue
+        limit = min(max_overlap_words, len(words), len(new_words)) if overlaps else 0
+        overlap = 0
+        for size in range(limit, 0, -1):
+            tail = normalize_question(" ".join(words[-size:]))
+            head = normalize_question(" ".join(new_words[:size]))
+            if tail and tail == head:
+                overlap = size
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
+
+
+def encode_wav(samples, rate, name="segment.wav"):
+    """Encode int16 mono samples as an in-memory WAV file the OpenAI SDK can upload"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.astype(np.int16).tobytes())
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+class ChunkedTranscriber:
+    """
+    Transcribes recorded questions through the shared AI gateway.
+
+    Clips longer than `chunk_threshold_seconds` are split at pauses and the
+    segments are transcribed concurrently, then stitched back in order.
+    """
+
+    def __init__(self, gateway, chunk_threshold_seconds=6.0, **split_options):
+        self.gateway = gateway
+        self.chunk_threshold_seconds = chunk_threshold_seconds
+        self.split_options = split_options
+
+    def transcribe_frames(self, frames, rate=44100, on_first_segment=None):
+        """
+        Transcribe raw 16-bit mono PCM frames.
+        For chunked clips, on_first_segment(text) is called as soon as the
+        leading segment is ready.
+        """
+        samples = np.frombuffer(b''.join(frames), dtype=np.int16)
+
+        if len(samples) < self.chunk_threshold_seconds * rate:
+            return self.gateway.transcribe(encode_wav(samples, rate, "question.wav"))
+
+        segments = split_at_pauses(samples, rate, **self.split_options)
+        logger.info(f"Transcribing {len(samples) / rate:.1f}s question in {len(segments)} segments")
+        futures = [
+            self.gateway.submit_transcription(encode_wav(samples[start:end], rate, f"segment_{i}.wav"))
+            for i, (start, end, _) in enumerate(segments)
+        ]
+
+        texts = [futures[0].result()]
+        if on_first_segment:
+            try:
+                on_first_segment(texts[0])
+            except Exception as e:
+                logger.error(f"Error in first segment callback: {str(e)}")
+        texts.extend(future.result() for future in futures[1:])
+        return stitch_transcripts(texts, [overlapped for _, _, overlapped in segments])
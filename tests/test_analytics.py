@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+from src.database.analytics import AnalyticsQueries
+
+class TestAnalyticsQueries(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.roster = {1: 'Ada', 2: 'Grace', 3: 'Alan'}
+        self.analytics = AnalyticsQueries(self.db, lambda course_id: self.roster)
+
+    def test_summary_joins_names_from_roster(self):
+        self.db.questions.aggregate.return_value = iter([{
+            'totals': [{'_id': None, 'questions': 9, 'relevant': 6}],
+            'top_relevant': [{'_id': 2, 'relevant': 4, 'irrelevant': 1}, {'_id': 1, 'relevant': 2, 'irrelevant': 0}],
+            'top_irrelevant': [{'_id': 3, 'relevant': 0, 'irrelevant': 2}]
+        }])
+        self.db.hand_raises.aggregate.return_value = iter([{'_id': 1, 'count': 5}, {'_id': 3, 'count': 2}])
+
+        summary = self.analytics.course_summary('c1', top_k=2)
+
+        self.assertEqual(summary['totals'], {
+            'students': 3, 'questions': 9, 'relevant': 6, 'irrelevant': 3, 'hand_raises': 7
+        })
+        self.assertEqual(summary['top_relevant'][0], (2, {'name': 'Grace', 'relevant': 4, 'irrelevant': 1}))
+        self.assertEqual(summary['top_irrelevant'][0][1]['name'], 'Alan')
+        self.assertEqual(summary['hand_raises'], [('Ada', 5), ('Alan', 2)])
+        self.assertEqual(self.db.questions.aggregate.call_count, 1)
+        self.assertEqual(self.db.hand_raises.aggregate.call_count, 1)
+
+    def test_pipeline_limits_to_registered_students(self):
+        pipeline = self.analytics.question_pipeline('c1', [1, 2, 3], top_k=3)
+        self.assertEqual(pipeline[0], {'$match': {'meta.course_id': 'c1', 'meta.student_id': {'$in': [1, 2, 3]}}})
+        self.assertEqual(set(pipeline[-1]['$facet']), {'totals', 'top_relevant', 'top_irrelevant'})
+        self.assertEqual(pipeline[-1]['$facet']['top_relevant'][-1], {'$limit': 3})
+
+    def test_empty_course_skips_queries(self):
+        self.roster = {}
+        summary = self.analytics.course_summary('c1')
+        self.assertEqual(summary['totals']['questions'], 0)
+        self.db.questions.aggregate.assert_not_called()
+
+    def test_summary_reads_counters_when_available(self):
+        course_stats = MagicMock()
+        course_stats.read.return_value = {
+            1: {'student_id': 1, 'hand_raises': 3, 'relevant_questions': 2, 'irrelevant_questions': 1},
+            2: {'student_id': 2, 'hand_raises': 0, 'relevant_questions': 5, 'irrelevant_questions': 0},
+            99: {'student_id': 99, 'hand_raises': 8, 'relevant_questions': 8, 'irrelevant_questions': 8}
+        }
+        analytics = AnalyticsQueries(self.db, lambda course_id: self.roster, course_stats)
+
+        summary = analytics.course_summary('c1', top_k=2)
+
+        # Student 99 is no longer registered
+        self.assertEqual(summary['totals'], {
+            'students': 3, 'questions': 8, 'relevant': 7, 'irrelevant': 1, 'hand_raises': 3
+        })
+        self.assertEqual([sid for sid, _ in summary['top_relevant']], [2, 1])
+        self.assertEqual(summary['top_irrelevant'], [(1, {'name': 'Ada', 'relevant': 2, 'irrelevant': 1})])
+        self.assertEqual(summary['hand_raises'], [('Ada', 3)])
+        self.db.questions.aggregate.assert_not_called()
@@ -0,0 +1,55 @@
+import io
+import unittest
+from unittest.mock import MagicMock
+from openai import OpenAI
+from src.utils.ai_gateway import AIGateway
+from src.utils.asr import LocalASRBackend, OpenAIASRBackend, create_asr_backend
+from src.utils.asr_standin import CANNED_QUESTIONS, start_standin
+from src.utils.relevance_analyzer import RelevanceAnalyzer
+
+class TestASRBackends(unittest.TestCase):
+    def setUp(self):
+        self.server = start_standin(latency_ms=0, jitter_ms=0, chat_latency_ms=0, seed=1)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_local_backend_returns_canned_transcript(self):
+        backend = LocalASRBackend(f"{self.server.url}/transcribe")
+        first = backend.transcribe(io.BytesIO(b"RIFF audio"))
+        self.assertIn(first, [text for text, _ in CANNED_QUESTIONS])
+        self.assertEqual(backend.transcribe(io.BytesIO(b"RIFF audio")), first)
+
+    def test_injected_errors_raise(self):
+        self.server.error_rate = 1.0
+        backend = LocalASRBackend(f"{self.server.url}/transcribe")
+        with self.assertRaises(RuntimeError):
+            backend.transcribe(io.BytesIO(b"audio"))
+        self.assertEqual(self.server.errors, 1)
+
+    def test_standin_answers_structured_chat(self):
+        client = OpenAI(base_url=f"{self.server.url}/v1", api_key="stand-in", max_retries=0)
+        analyzer = RelevanceAnalyzer(client)
+        course = {'_id': 'c1', 'course_name': 'Data Science'}
+        self.assertFalse(analyzer.analyze(course, "What is the capital of France?")[0])
+        results = analyzer.analyze_batch(course, ["Can you explain what overfitting means?",
+                                                  "Did anyone watch the game last night?"])
+        self.assertEqual([r[0] for r in results], [True, False])
+
+    def test_backend_selection(self):
+        client = MagicMock()
+        backend = create_asr_backend({'api': {'whisper_model': 'whisper-x'}}, client)
+        self.assertIsInstance(backend, OpenAIASRBackend)
+        self.assertEqual(backend.model, 'whisper-x')
+        self.assertIsInstance(create_asr_backend({'api': {'asr_backend': 'local'}}, client), LocalASRBackend)
+        with self.assertRaises(ValueError):
+            create_asr_backend({'api': {'asr_backend': 'nope'}}, client)
+
+    def test_gateway_uses_backend(self):
+        backend = MagicMock()
+        backend.transcribe.return_value = "hello"
+        gateway = AIGateway(client=MagicMock(), asr_backend=backend)
+        self.assertEqual(gateway.submit_transcription(io.BytesIO(b"x")).result(), "hello")
+        self.assertEqual(gateway.transcription_calls, 1)
+        gateway.shutdown()
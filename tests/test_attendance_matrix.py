@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from src.database.attendance_matrix import AttendanceMatrix
+from src.database.backends import MemoryBackend
+from src.database.db_manager import DatabaseManager
+
+MONDAY = datetime(2024, 3, 4)
+
+class TestAttendanceMatrix(unittest.TestCase):
+    def setUp(self):
+        # Sessions on Mon, Wed, Fri, then Mon and Tue of the next week
+        offsets = [0, 2, 4, 7, 8]
+        attended = {1: [1, 1, 0, 1, 1], 2: [0, 0, 0, 0, 0], 3: [1, 1, 1, 1, 1]}
+        sessions = [
+            {'_id': MONDAY + timedelta(days=offset),
+             'present': [s for s, row in attended.items() if row[i]] + [None, 99]}
+            for i, offset in enumerate(offsets)
+        ]
+        self.matrix = AttendanceMatrix.build([3, 1, 2], sessions)
+
+    def test_build_indexes_roster_students_and_sessions(self):
+        self.assertEqual(self.matrix.student_ids.tolist(), [1, 2, 3])
+        self.assertEqual(self.matrix.dates[0], np.datetime64('2024-03-04'))
+        self.assertEqual(self.matrix.present.tolist(), [
+            [True, True, False, True, True], [False] * 5, [True] * 5
+        ])
+        self.assertIsNone(self.matrix.index(99))
+        self.assertFalse(self.matrix.present.flags.writeable)
+
+    def test_rates_streaks_and_calendar(self):
+        np.testing.assert_allclose(self.matrix.rates(), [80.0, 0.0, 100.0])
+        current, longest = self.matrix.streaks()
+        self.assertEqual(current.tolist(), [2, 0, 5])
+        self.assertEqual(longest.tolist(), [2, 0, 5])
+
+        weeks, grid = self.matrix.calendar(self.matrix.index(1))
+        self.assertEqual(weeks.tolist(), [date(2024, 3, 4), date(2024, 3, 11)])
+        self.assertEqual(grid.tolist(), [[1, -1, 1, -1, 0, -1, -1], [1, 1, -1, -1, -1, -1, -1]])
+
+class TestAttendanceMatrixQueries(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = DatabaseManager({}, backend=MemoryBackend())
+        self.course_id = self.db_manager.create_course("Test Course", "TST101").inserted_id
+        self.db_manager.add_students(self.course_id, [
+            {'name': name, 'face_embedding': np.random.rand(128), 'photo_data': np.zeros((96, 96, 3), dtype=np.uint8)}
+            for name in ("Ada", "Alan")
+        ])
+        for day in range(3):
+            self.db_manager.mark_attendance(1, MONDAY + timedelta(days=day), course_id=self.course_id)
+
+    def tearDown(self):
+        self.db_manager.close()
+
+    def test_matrix_is_cached_until_attendance_changes(self):
+        with patch.object(self.db_manager.db.attendance, 'aggregate',
+                          wraps=self.db_manager.db.attendance.aggregate) as aggregate:
+            first = self.db_manager.get_attendance_matrix(self.course_id)
+            self.assertIs(self.db_manager.get_attendance_matrix(self.course_id), first)
+            self.assertEqual(aggregate.call_count, 1)
+
+            self.db_manager.mark_attendance(2, MONDAY, course_id=self.course_id, background=True)
+            self.assertTrue(self.db_manager.flush_events(timeout=2))
+            second = self.db_manager.get_attendance_matrix(self.course_id)
+            self.assertEqual(aggregate.call_count, 2)
+
+        self.assertEqual(first.present.tolist(), [[True, True, True], [False, False, False]])
+        self.assertEqual(second.present.tolist(), [[True, True, True], [True, False, False]])
+        week = self.db_manager.get_attendance_matrix(self.course_id, MONDAY + timedelta(days=1), MONDAY + timedelta(days=1))
+        self.assertEqual(week.dates.tolist(), [date(2024, 3, 5)])
+        rate = self.db_manager.get_student_attendance_rate(2, self.course_id)
+        self.assertAlmostEqual(rate.pop('rate'), 100 / 3)
+        self.assertEqual(rate, {'total_days': 3, 'days_present': 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from src.utils.audio_archive import AudioArchive, LocalAudioStore, resample
+from src.utils.reanalysis import ReanalysisJob
+
+class FakeQuestionStore:
+    def __init__(self, questions):
+        self.questions = {q['_id']: q for q in questions}
+        self.progress = {}
+        self.writes = []
+
+    def get_questions_for_reanalysis(self, after_id=None, limit=32, course_id=None):
+        ids = sorted(i for i in self.questions if after_id is None or i > after_id)
+        return [dict(self.questions[i]) for i in ids[:limit]]
+
+    def save_question_reanalysis(self, results):
+        self.writes.append(results)
+        for result in results:
+            self.questions[result['_id']]['question_text'] = result['question_text']
+
+    def get_reanalysis_progress(self, job_id):
+        return dict(self.progress[job_id]) if job_id in self.progress else None
+
+    def save_reanalysis_progress(self, job_id, progress):
+        self.progress[job_id] = dict(progress)
+
+    def get_course(self, course_id):
+        return {'_id': course_id, 'course_name': 'Data Science'}
+
+class TestAudioArchive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.archive = AudioArchive(LocalAudioStore(self.root))
+        t = np.arange(44100) / 44100
+        self.samples = (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_resample_keeps_duration_and_tone(self):
+        resampled = resample(self.samples, 44100, 16000)
+        self.assertEqual(len(resampled), 16000)
+        peak = np.argmax(np.abs(np.fft.rfft(resampled)))
+        self.assertEqual(peak, 220)
+
+    def test_archive_is_content_addressed(self):
+        ref = self.archive.archive_frames([self.samples.tobytes()], rate=44100)
+        again = self.archive.archive_frames([self.samples.tobytes()], rate=44100)
+        self.assertEqual(ref['key'], again['key'])
+        self.assertEqual(ref['sample_rate'], 16000)
+        self.assertLess(ref['bytes'], self.samples.nbytes)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.root)), 1)
+
+        samples, rate = self.archive.load_samples(ref)
+        self.assertEqual(rate, 16000)
+        self.assertEqual(len(samples), 16000)
+
+    def test_reanalysis_resumes_from_checkpoint(self):
+        ref = self.archive.archive_frames([self.samples.tobytes()], rate=44100)
+        store = FakeQuestionStore([
+            {'_id': i, 'course_id': 'c1', 'question_text': 'old', 'is_relevant': False, 'audio': ref}
+            for i in range(5)
+        ])
+        transcriber = MagicMock()
+        transcriber.transcribe_frames.return_value = "What is regression?"
+        analyzer = MagicMock()
+        analyzer.model = 'test-model'
+        analyzer.analyze_batch.side_effect = lambda course, texts: [(True, 'ML', 'llm')] * len(texts)
+
+        job = ReanalysisJob(store, self.archive, transcriber, analyzer, job_id='j', batch_size=2)
+        job.run(on_progress=lambda progress: job._stop.set())
+        self.assertEqual(store.progress['j']['status'], 'stopped')
+        self.assertEqual(store.progress['j']['last_id'], 1)
+
+        job._stop.clear()
+        progress = job.run()
+        self.assertEqual(progress['status'], 'completed')
+        self.assertEqual(progress['processed'], 5)
+        self.assertEqual([len(batch) for batch in store.writes], [2, 2, 1])
+        self.assertTrue(all(q['question_text'] == "What is regression?" for q in store.questions.values()))
+        self.assertEqual(store.writes[0][0]['previous']['question_text'], 'old')
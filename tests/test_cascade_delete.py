@@ -0,0 +1,118 @@
+import threading
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+from src.database.backends import MemoryBackend
+from src.database.cascade import LIVE, DeleteJobs
+from src.database.db_manager import DatabaseManager
+from src.database.event_series import SERIES_COLLECTIONS, create_series_collection, event_document, event_filter
+from src.database.indexes import apply_indexes
+from src.database.memory_store import MemoryClient
+
+class TestDeleteJobs(unittest.TestCase):
+    def setUp(self):
+        self.db = MemoryClient()['test']
+        for name in SERIES_COLLECTIONS:
+            create_series_collection(self.db, name)
+        apply_indexes(self.db)
+        self.jobs = DeleteJobs(self.db, chunk_size=3)
+        start = datetime(2024, 3, 4)
+        for student_id in (1, 2):
+            self.db.students.insert_one({'course_id': 'c1', 'student_id': student_id, 'name': f"S{student_id}"})
+            self.db.attendance.insert_many([
+                {'course_id': 'c1', 'student_id': student_id, 'date': start + timedelta(days=d), 'status': 'Present'}
+                for d in range(7)
+            ])
+            self.db.questions.insert_many([
+                event_document('c1', student_id, timestamp=start + timedelta(minutes=i), question_text='q')
+                for i in range(5)
+            ])
+
+    def test_deletes_a_student_in_chunks_and_hides_it_at_once(self):
+        result, job = self.jobs.begin('c1', 1)
+        self.assertEqual(result.modified_count, 1)
+        self.assertEqual([s['student_id'] for s in self.db.students.find({'course_id': 'c1', **LIVE})], [2])
+
+        progress = []
+        job = self.jobs.run(job['_id'], lambda deleted, total: progress.append((deleted, total)))
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['deleted'], {'attendance': 7, 'questions': 5, 'students': 1})
+        # 7 attendance records in chunks of 3, then the student's question series, then the student
+        self.assertEqual(progress, [(3, 13), (6, 13), (7, 13), (12, 13), (13, 13)])
+        self.assertIsNone(self.db.students.find_one({'student_id': 1}))
+        self.assertEqual(self.db.attendance.count_documents({'student_id': 1}), 0)
+        self.assertEqual(self.db.attendance.count_documents({'student_id': 2}), 7)
+        self.assertEqual(self.db.questions.count_documents(event_filter('c1', 2)), 5)
+
+    def test_course_job_deletes_event_series_one_student_at_a_time(self):
+        _, job = self.jobs.begin('c1')
+        progress = []
+        job = self.jobs.run(job['_id'], lambda deleted, total: progress.append(deleted))
+        self.assertEqual(job['positions']['questions'], 2)
+        self.assertEqual(job['deleted']['questions'], 10)
+        # 14 attendance records take five chunks of 3, then each student's questions go in one
+        self.assertEqual(progress[5:7], [19, 24])
+        self.assertEqual(self.db.questions.count_documents({}), 0)
+
+    def test_interrupted_job_resumes_from_its_positions(self):
+        _, job = self.jobs.begin('c1', 1)
+        delete_chunk = self.jobs._delete_chunk
+        calls = []
+
+        def crash_after_two(*args):
+            calls.append(args)
+            if len(calls) > 2:
+                raise ConnectionError("connection lost")
+            return delete_chunk(*args)
+
+        self.jobs._delete_chunk = crash_after_two
+        with self.assertRaises(ConnectionError):
+            self.jobs.run(job['_id'])
+        saved = self.db.delete_jobs.find_one({'_id': job['_id']})
+        self.assertEqual((saved['status'], saved['deleted']), ('running', {'attendance': 6}))
+        self.assertEqual([j['_id'] for j in self.jobs.pending()], [job['_id']])
+
+        # A new process picks the job up where it stopped
+        DeleteJobs(self.db, chunk_size=3).resume().join(timeout=5)
+        job = self.db.delete_jobs.find_one({'_id': job['_id']})
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['deleted'], {'attendance': 7, 'questions': 5, 'students': 1})
+        self.assertEqual(self.jobs.pending(), [])
+
+class TestCascadeDeleteCourse(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = DatabaseManager({}, backend=MemoryBackend())
+        self.course_ids = [self.db_manager.create_course(f"Course {i}", f"C{i}").inserted_id for i in range(2)]
+        for course_id in self.course_ids:
+            self.db_manager.add_students(course_id, [
+                {'name': name, 'face_embedding': np.random.rand(128), 'photo_data': np.zeros((96, 96, 3), dtype=np.uint8)}
+                for name in ("Ada", "Alan")
+            ])
+            self.db_manager.mark_attendance(1, datetime.now().date(), course_id=course_id)
+            self.db_manager.log_question(1, course_id, "What is a gradient?", True)
+            self.db_manager.log_hand_raise(2, course_id)
+
+    def tearDown(self):
+        self.db_manager.close()
+
+    def test_background_delete_removes_every_record_of_the_course(self):
+        doomed, kept = self.course_ids
+        done = threading.Event()
+        jobs = []
+        self.db_manager.delete_course(doomed, background=True, on_done=lambda job: (jobs.append(job), done.set()))
+        self.assertEqual([c['_id'] for c in self.db_manager.get_all_courses()], [kept])
+        self.assertIsNone(self.db_manager.get_course(doomed))
+        self.assertTrue(done.wait(5))
+
+        self.assertEqual(jobs[0]['status'], 'completed')
+        db = self.db_manager.db
+        for name in ('students', 'attendance', 'student_photos', 'course_student_stats'):
+            self.assertEqual(db[name].count_documents({'course_id': doomed}), 0, name)
+            self.assertGreater(db[name].count_documents({'course_id': kept}), 0, name)
+        for name in SERIES_COLLECTIONS:
+            self.assertEqual(db[name].count_documents(event_filter(doomed)), 0, name)
+            self.assertEqual(db[name].count_documents(event_filter(kept)), 1, name)
+        self.assertIsNone(db.courses.find_one({'_id': doomed}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from pymongo.read_preferences import ReadPreference
+from src.database import connection
+from src.database.backends import LocalMongoBackend
+from src.database.connection import client_options, analytics_read_preference, ConnectionMetrics
+
+class TestConnectionSettings(unittest.TestCase):
+    def test_env_overrides_config_overrides_defaults(self):
+        config = {'database': {'options': {'maxPoolSize': 50, 'socketTimeoutMS': 1000, 'compressors': 'zlib'}}}
+        env = {'MONGODB_MAX_POOL_SIZE': '8', 'MONGODB_RETRY_WRITES': 'false'}
+        options = client_options(config, environ=env)
+        self.assertEqual(options['maxPoolSize'], 8)
+        self.assertEqual(options['socketTimeoutMS'], 1000)
+        self.assertIs(options['retryWrites'], False)
+        self.assertEqual(options['serverSelectionTimeoutMS'], connection.DEFAULT_OPTIONS['serverSelectionTimeoutMS'])
+        self.assertEqual(options['compressors'], 'zlib')
+
+    def test_local_backend_skips_atlas_options(self):
+        config = {'database': {'options': {'ssl': True}, 'local_options': {'maxPoolSize': 4}}}
+        options = client_options(config, environ={}, key=LocalMongoBackend.options_key)
+        self.assertNotIn('ssl', options)
+        self.assertEqual(options['maxPoolSize'], 4)
+
+    def test_unavailable_compressors_are_dropped(self):
+        with patch.dict(connection.COMPRESSOR_PACKAGES, {'zstd': 'no_such_zstd_module'}):
+            options = client_options({}, environ={'MONGODB_COMPRESSORS': 'zstd,zlib'})
+        self.assertEqual(options['compressors'], 'zlib')
+
+    def test_analytics_read_preference(self):
+        self.assertEqual(analytics_read_preference({}, environ={}), ReadPreference.SECONDARY_PREFERRED)
+        self.assertEqual(
+            analytics_read_preference({}, environ={'MONGODB_ANALYTICS_READ_PREFERENCE': 'nearest'}),
+            ReadPreference.NEAREST
+        )
+        self.assertEqual(analytics_read_preference({'database': {'analytics_read_preference': 'bogus'}}, environ={}),
+                         ReadPreference.PRIMARY)
+
+    def test_metrics_count_checkouts_and_bytes(self):
+        metrics = ConnectionMetrics(measure_bytes=True)
+        metrics.connection_check_out_started(SimpleNamespace())
+        metrics.connection_checked_out(SimpleNamespace(duration=0.004))
+        metrics.started(SimpleNamespace(command={'find': 'students'}))
+        metrics.succeeded(SimpleNamespace(reply={'ok': 1}))
+        stats = metrics.snapshot()
+        self.assertEqual((stats['checkouts'], stats['in_use'], stats['commands']), (1, 1, 1))
+        self.assertAlmostEqual(stats['checkout_wait_ms_max'], 4.0)
+        self.assertGreater(stats['bytes_sent'], 0)
+        self.assertGreater(stats['bytes_received'], 0)
+
+        # Byte counting is off by default
+        metrics = ConnectionMetrics()
+        metrics.started(SimpleNamespace(command={'find': 'students'}))
+        self.assertEqual((metrics.snapshot()['commands'], metrics.snapshot()['bytes_sent']), (1, 0))
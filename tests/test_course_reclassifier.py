@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from src.utils.course_reclassifier import CourseReclassifier
+
+class FakeQuestions:
+    def __init__(self, count):
+        self.questions = [{'_id': i, 'question_text': f"question {i}"} for i in range(count)]
+        self.verdicts = {}
+        self.writes = 0
+
+    def count_course_questions(self, course_id):
+        return len(self.questions)
+
+    def iter_course_questions(self, course_id, batch_size=200):
+        return iter(self.questions)
+
+    def update_question_verdicts(self, verdicts):
+        self.writes += 1
+        for question, is_relevant, reason, source in verdicts:
+            self.verdicts[question['_id']] = is_relevant
+
+class TestCourseReclassifier(unittest.TestCase):
+    def setUp(self):
+        self.course = {'_id': 'c1', 'course_name': 'Data Science', 'description': 'Statistics'}
+        self.db = FakeQuestions(20)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        def analyze_batch(course, texts):
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.02)
+            with self.lock:
+                self.in_flight -= 1
+            return [(int(text.split()[1]) % 2 == 0, 'reason', 'llm') for text in texts]
+
+        self.analyzer = MagicMock()
+        self.analyzer.analyze_batch.side_effect = analyze_batch
+
+    def test_reclassifies_all_questions_in_bounded_batches(self):
+        reclassifier = CourseReclassifier(self.db, self.analyzer, batch_size=3, max_concurrency=2)
+        progress = []
+        finished = threading.Event()
+        outcome = {}
+
+        def on_done(done, total, cancelled):
+            outcome.update(done=done, total=total, cancelled=cancelled)
+            finished.set()
+
+        reclassifier.start(self.course, lambda done, total: progress.append(done), on_done)
+        self.assertTrue(finished.wait(5))
+
+        self.assertEqual(outcome, {'done': 20, 'total': 20, 'cancelled': False})
+        self.assertEqual(self.db.writes, 7)
+        self.assertEqual(sorted(progress)[-1], 20)
+        self.assertLessEqual(self.max_in_flight, 2)
+        self.assertEqual(self.db.verdicts, {i: i % 2 == 0 for i in range(20)})
+        self.assertFalse(reclassifier.is_running('c1'))
+
+    def test_new_edit_cancels_running_job(self):
+        reclassifier = CourseReclassifier(self.db, self.analyzer, batch_size=1, max_concurrency=1)
+        results = []
+        first = reclassifier.start(self.course, on_done=lambda *r: results.append(r))
+        second = reclassifier.start(self.course, on_done=lambda *r: results.append(r))
+        first.join(5)
+        second.join(5)
+        self.assertIn(True, [cancelled for _, _, cancelled in results])
+        self.assertIn((20, 20, False), results)
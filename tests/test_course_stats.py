@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import MagicMock
+from src.database.course_stats import CourseStats
+
+class TestCourseStats(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.meta.find_one.return_value = None  # no rollup retention
+        self.stats = CourseStats(self.db)
+
+    def test_update_operations(self):
+        op = CourseStats.question_operation('c1', 7, is_relevant=False)
+        self.assertEqual(op._filter, {'course_id': 'c1', 'student_id': 7})
+        self.assertEqual(op._doc, {'$inc': {'hand_raises': 0, 'relevant_questions': 0, 'irrelevant_questions': 1}})
+        self.assertTrue(op._upsert)
+
+        op = CourseStats.update_operation('c1', 7, day='2026-01-05')
+        self.assertEqual(op._doc['$addToSet'], {'days': '2026-01-05'})
+
+    def test_compute_from_events(self):
+        self.db.hand_raises.aggregate.return_value = iter([{'_id': 1, 'count': 4}])
+        self.db.questions.aggregate.return_value = iter([{'_id': 1, 'relevant': 2, 'total': 3}, {'_id': 2, 'relevant': 0, 'total': 1}])
+        self.db.attendance.aggregate.return_value = iter([{'_id': 2, 'days': ['d2', 'd1']}])
+
+        stats = self.stats.compute_from_events('c1')
+
+        self.assertEqual(stats[1]['hand_raises'], 4)
+        self.assertEqual((stats[1]['relevant_questions'], stats[1]['irrelevant_questions']), (2, 1))
+        self.assertEqual(stats[2]['irrelevant_questions'], 1)
+        self.assertEqual(stats[2]['days'], ['d1', 'd2'])
+
+    def test_verify_reports_drift(self):
+        self.db.hand_raises.aggregate.return_value = iter([{'_id': 1, 'count': 4}])
+        self.db.questions.aggregate.return_value = iter([])
+        self.db.attendance.aggregate.return_value = iter([])
+        self.db.course_student_stats.find.return_value = [
+            {'student_id': 1, 'hand_raises': 5, 'days': []},
+            {'student_id': 9, 'relevant_questions': 1}
+        ]
+
+        mismatches = self.stats.verify('c1')
+
+        self.assertEqual(sorted(mismatches), [(1, 'hand_raises', 4, 5), (9, 'relevant_questions', 0, 1)])
@@ -1,50 +1,73 @@
 import unittest
 import numpy as np
 from datetime import datetime
+from src.database.backends import MemoryBackend
 from src.database.db_manager import DatabaseManager
 
 class TestDatabaseManager(unittest.TestCase):
     def setUp(self):
-        self.db_manager = DatabaseManager()
-        self.db_manager.initialize()
-        # Clean up any existing test data
-        self.db_manager.db.students.delete_many({})
-        self.db_manager.db.attendance.delete_many({})
-        self.db_manager.db.engagement.delete_many({})
+        # The in-memory backend needs no credentials and starts empty
+        self.db_manager = DatabaseManager({}, backend=MemoryBackend())
+        self.course_id = self.db_manager.create_course("Test Course", "TST101").inserted_id
+        self.photo = np.zeros((120, 120, 3), dtype=np.uint8)
 
     def tearDown(self):
         # Clean up after tests
         if hasattr(self, 'db_manager'):
-            self.db_manager.db.students.delete_many({})
-            self.db_manager.db.attendance.delete_many({})
-            self.db_manager.db.engagement.delete_many({})
-            self.db_manager.client.close()
-        
+            self.db_manager.close()
+
     def test_add_student(self):
         # Create test student
         name = "Test Student"
         face_encoding = np.random.rand(128)  # Simulate face encoding
-        
-        result = self.db_manager.add_student(name, face_encoding)
+
+        result = self.db_manager.add_student(name, face_encoding, self.course_id, self.photo)
         self.assertIsNotNone(result.inserted_id)
-        
+
         # Verify student was added
         student = self.db_manager.get_student(result.inserted_id)
         self.assertEqual(student['name'], name)
-        
+        self.assertEqual(self.db_manager.get_student_name(student['student_id'], self.course_id), name)
+        self.assertIsNotNone(self.db_manager.get_student_thumbnail(student['student_id'], self.course_id))
+
     def test_mark_attendance(self):
         # Add test student first
-        student_id = self.db_manager.add_student("Test Student", np.random.rand(128)).inserted_id
-        
-        # Mark attendance
+        self.db_manager.add_student("Test Student", np.random.rand(128), self.course_id, self.photo)
+
+        # Mark attendance; marking again the same day is a no-op
         date = datetime.now().date()
-        result = self.db_manager.mark_attendance(student_id, date)
-        self.assertIsNotNone(result.inserted_id)
-        
+        result = self.db_manager.mark_attendance(1, date, course_id=self.course_id)
+        self.assertIsNotNone(result.upserted_id)
+        self.assertIsNone(self.db_manager.mark_attendance(1, date, course_id=self.course_id).upserted_id)
+        self.assertEqual(len(self.db_manager.get_attendance_records(self.course_id, date)), 1)
+        self.assertEqual(self.db_manager.get_student_attendance_rate(1, self.course_id)['rate'], 100.0)
+
     def test_log_engagement(self):
         # Add test student first
-        student_id = self.db_manager.add_student("Test Student", np.random.rand(128)).inserted_id
-        
+        self.db_manager.add_student("Test Student", np.random.rand(128), self.course_id, self.photo)
+
         # Log engagement
-        result = self.db_manager.log_engagement(student_id, hand_raises=1, relevant_questions=1)
-        self.assertIsNotNone(result.inserted_id) 
\ No newline at end of file
+        result = self.db_manager.log_engagement(1, hand_raises=1, relevant_questions=1)
+        self.assertIsNotNone(result.inserted_id)
+
+    def test_events_feed_course_analytics(self):
+        self.db_manager.add_students(self.course_id, [
+            {'name': name, 'face_embedding': np.random.rand(128), 'photo_data': self.photo}
+            for name in ("Ada", "Alan", "Grace")
+        ])
+        self.db_manager.log_question(1, self.course_id, "What is a gradient?", True)
+        self.db_manager.log_question(1, self.course_id, "Is lunch soon?", False)
+        self.db_manager.log_question(2, self.course_id, "Why does the loss plateau?", True, background=True)
+        self.db_manager.log_hand_raise(3, self.course_id)
+        self.assertTrue(self.db_manager.flush_events(timeout=2))
+
+        summary = self.db_manager.get_course_analytics(self.course_id)
+        self.assertEqual(summary['totals'], {
+            'students': 3, 'questions': 3, 'relevant': 2, 'irrelevant': 1, 'hand_raises': 1
+        })
+        self.assertEqual([student_id for student_id, _ in summary['top_relevant']], [1, 2])
+        self.assertEqual(summary['hand_raises'], [("Grace", 1)])
+
+        self.db_manager.remove_student(1, self.course_id)
+        self.assertEqual(self.db_manager.get_student_questions(1, self.course_id), [])
+        self.assertEqual(self.db_manager.get_course_analytics(self.course_id)['totals']['questions'], 1)
@@ -0,0 +1,120 @@
+import random
+import threading
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from benchmarks.event_series import queries, seed
+from src.database.backends import MemoryBackend
+from src.database.db_manager import DatabaseManager
+from src.database import event_series
+from src.database.event_series import create_series_collection, event_filter, is_time_series, migrate_collection
+from src.database.memory_store import MemoryClient
+
+class TestEventSeries(unittest.TestCase):
+    def setUp(self):
+        self.db = MemoryClient()['test']
+        start = datetime(2024, 3, 1, 9)
+        self.flat = [
+            {'_id': ObjectId(), 'course_id': 'c1', 'student_id': s, 'timestamp': start + timedelta(minutes=i)}
+            for s in (1, 2) for i in range(5)
+        ]
+        self.db.hand_raises.insert_many(self.flat)
+
+    def test_migration_packs_events_into_a_time_series_collection(self):
+        self.assertEqual(migrate_collection(self.db, 'hand_raises', batch_size=3), 10)
+        self.assertTrue(is_time_series(self.db, 'hand_raises'))
+        self.assertNotIn('hand_raises_legacy', self.db.list_collection_names())
+        self.assertEqual(self.db.hand_raises.count_documents(event_filter('c1', 2)), 5)
+        self.assertEqual(self.db.hand_raises.find_one({'_id': self.flat[0]['_id']})['meta'],
+                         {'course_id': 'c1', 'student_id': 1})
+        # Already migrated: nothing to copy
+        self.assertEqual(migrate_collection(self.db, 'hand_raises'), 0)
+
+    def test_interrupted_migration_resumes_without_copies(self):
+        self.db.hand_raises.rename('hand_raises_legacy')
+        migrate_collection(self.db, 'questions')  # creates nothing to copy
+        self.db.create_collection('hand_raises', timeseries={'timeField': 'timestamp', 'metaField': 'meta'})
+        self.db.hand_raises.insert_many([
+            {'_id': doc['_id'], 'timestamp': doc['timestamp'], 'meta': {'course_id': 'c1', 'student_id': 1}}
+            for doc in self.flat[:4]
+        ])
+        self.db.meta.insert_one({'_id': 'series_migration:hand_raises', 'copied_through': self.flat[2]['_id']})
+
+        self.assertEqual(migrate_collection(self.db, 'hand_raises', batch_size=4), 6)
+        self.assertEqual(self.db.hand_raises.count_documents({}), 10)
+        self.assertIsNone(self.db.meta.find_one({'_id': 'series_migration:hand_raises'}))
+
+    def test_second_instance_waits_for_the_migration_lease(self):
+        lease = {'_id': 'series_migration_lease:hand_raises', 'owner': ObjectId(),
+                 'expires_at': datetime.utcnow() + timedelta(minutes=1)}
+        self.db.meta.insert_one(lease)
+        copied = []
+        with patch.object(event_series, 'LEASE_POLL', 0.01):
+            waiting = threading.Thread(target=lambda: copied.append(migrate_collection(self.db, 'hand_raises')))
+            waiting.start()
+            waiting.join(timeout=0.1)
+            self.assertTrue(waiting.is_alive())
+            self.assertFalse(is_time_series(self.db, 'hand_raises'))
+
+            # The holder crashed: once its lease expires the copy goes ahead
+            self.db.meta.update_one({'_id': lease['_id']}, {'$set': {'expires_at': datetime.utcnow()}})
+            waiting.join(timeout=2)
+        self.assertEqual(copied, [10])
+        self.assertTrue(is_time_series(self.db, 'hand_raises'))
+        self.assertIsNone(self.db.meta.find_one({'_id': lease['_id']}))
+
+    def test_servers_below_7_0_get_a_regular_collection(self):
+        with patch.object(self.db.client.admin, 'command',
+                          return_value={'featureCompatibilityVersion': {'version': '6.0'}, 'ok': 1.0}):
+            create_series_collection(self.db, 'questions')
+        self.assertIn('questions', self.db.list_collection_names())
+        self.assertFalse(is_time_series(self.db, 'questions'))
+
+    def test_time_series_writes_follow_server_restrictions(self):
+        migrate_collection(self.db, 'hand_raises')
+        with self.assertRaises(OperationFailure):
+            self.db.hand_raises.update_one({'_id': self.flat[0]['_id']}, {'$set': {'x': 1}})
+        with self.assertRaises(OperationFailure):
+            self.db.hand_raises.rename('elsewhere')
+        self.assertEqual(self.db.hand_raises.update_many(event_filter('c1', 1), {'$set': {'x': 1}}).modified_count, 5)
+        # _id is not unique in a time-series collection
+        self.db.hand_raises.insert_one(self.db.hand_raises.find_one({'_id': self.flat[0]['_id']}))
+        self.assertEqual(self.db.hand_raises.count_documents({'_id': self.flat[0]['_id']}), 2)
+        self.assertEqual(self.db.hand_raises.delete_many(event_filter('c1', 1)).deleted_count, 6)
+
+    def test_manager_reads_and_updates_time_series_events(self):
+        db_manager = DatabaseManager({}, backend=MemoryBackend())
+        self.addCleanup(db_manager.close)
+        course_id = db_manager.create_course("Test Course", "TST101").inserted_id
+        db_manager.add_students(course_id, [
+            {'name': name, 'face_embedding': np.random.rand(128), 'photo_data': np.zeros((120, 120, 3), np.uint8)}
+            for name in ("Ada", "Alan")
+        ])
+        self.assertTrue(is_time_series(db_manager.db, 'questions'))
+        db_manager.log_question(1, course_id, "What is a gradient?", True)
+        db_manager.log_hand_raise(2, course_id)
+        db_manager.log_hand_raise(2, course_id)
+
+        question = next(db_manager.iter_course_questions(course_id))
+        self.assertEqual((question['course_id'], question['student_id']), (course_id, 1))
+        db_manager.update_question_verdicts([(question, False, "Off topic", 'local')])
+        db_manager.update_student_name(1, course_id, "Ada L.")
+        stored = db_manager.get_student_questions(1, course_id)[0]
+        self.assertEqual((stored['is_relevant'], stored['student_name']), (False, "Ada L."))
+        self.assertEqual(db_manager.get_student_hand_raises(2, course_id), 2)
+        self.assertEqual(db_manager.get_course_analytics(course_id)['totals']['irrelevant'], 1)
+
+    def test_benchmark_layouts_return_the_same_results(self):
+        db = MemoryClient()['bench']
+        counts = seed(db, ['c1', 'c2'], students=5, days=3, per_day=3, rng=random.Random(1))
+        self.assertEqual(db.hand_raises.count_documents({}), counts['hand_raises'])
+        roster = {s: f"Student {s}" for s in range(1, 6)}
+        for name, (before, after) in queries(db, 'c1', 1, roster).items():
+            with self.subTest(query=name):
+                if name == 'student questions':
+                    self.assertEqual([q['_id'] for q in before()], [q['_id'] for q in after()])
+                else:
+                    self.assertEqual(before(), after())
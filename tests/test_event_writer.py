@@ -0,0 +1,141 @@
+import threading
+import unittest
+from datetime import datetime
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+from src.database.event_series import create_series_collection, event_document
+from src.database.event_writer import EventWriter
+from src.database.memory_store import MemoryClient
+
+class FakeCollection:
+    def __init__(self):
+        self.calls = []
+        self.failures = []
+        self.lock = threading.Lock()
+
+    def bulk_write(self, operations, ordered=True):
+        with self.lock:
+            self.calls.append((list(operations), ordered))
+            if self.failures:
+                raise self.failures.pop(0)
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+class TestEventWriter(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDB()
+        self.writer = EventWriter(self.db, max_batch=3, flush_interval=0.05, retry_backoff=0.01)
+
+    def tearDown(self):
+        self.writer.close(timeout=2)
+
+    def test_batches_by_size_and_coalesces(self):
+        for i in range(3):
+            self.writer.enqueue('hand_raises', InsertOne({'_id': i}), key=i)
+        self.writer.enqueue('attendance', UpdateOne({'s': 1}, {'$setOnInsert': {}}, upsert=True), key=('s', 1))
+        self.writer.enqueue('attendance', UpdateOne({'s': 1}, {'$setOnInsert': {}}, upsert=True), key=('s', 1))
+        self.assertTrue(self.writer.flush(timeout=2))
+
+        self.assertEqual([len(ops) for ops, _ in self.db['hand_raises'].calls], [3])
+        self.assertEqual([len(ops) for ops, _ in self.db['attendance'].calls], [1])
+        self.assertFalse(self.db['hand_raises'].calls[0][1])
+        stats = self.writer.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['written'], 4)
+        self.assertEqual(stats['coalesced'], 1)
+        self.assertIsNotNone(stats['flush_ms_p50'])
+
+    def test_retry_treats_duplicates_as_written(self):
+        self.db['questions'].failures = [
+            AutoReconnect("connection reset"),
+            BulkWriteError({'writeErrors': [{'index': 0, 'code': 11000, 'errmsg': 'duplicate key'}]}),
+        ]
+        results = []
+        self.writer.enqueue('questions', InsertOne({'_id': 'q1'}), key='q1', on_written=results.append)
+        self.writer.enqueue('questions', InsertOne({'_id': 'q2'}), key='q2', on_written=results.append)
+        self.assertTrue(self.writer.flush(timeout=2))
+
+        self.assertEqual(results, [True, True])
+        stats = self.writer.stats()
+        self.assertEqual((stats['retries'], stats['duplicates'], stats['failed'], stats['written']), (1, 1, 0, 1))
+
+    def test_retry_skips_events_already_in_a_time_series_collection(self):
+        db = MemoryClient()['test']
+        create_series_collection(db, 'hand_raises')
+        store = db.hand_raises.bulk_write
+
+        def stored_but_reply_lost(operations, ordered=True):
+            db.hand_raises.bulk_write = store
+            store(operations, ordered=ordered)
+            raise AutoReconnect("connection reset")
+
+        db.hand_raises.bulk_write = stored_but_reply_lost
+        writer = EventWriter(db, flush_interval=0.05, retry_backoff=0.01)
+        self.addCleanup(writer.close, timeout=2)
+        increment = UpdateOne({'course_id': 'c1', 'student_id': 1}, {'$inc': {'hand_raises': 1}}, upsert=True)
+        event = event_document('c1', 1, _id='h1', timestamp=datetime(2024, 3, 4, 9))
+        writer.enqueue('hand_raises', InsertOne(event), key='h1', followups=[('course_student_stats', increment)])
+        self.assertTrue(writer.flush(timeout=2))
+
+        self.assertEqual(db.hand_raises.count_documents({}), 1)
+        self.assertEqual(db.course_student_stats.find_one({'student_id': 1})['hand_raises'], 1)
+        self.assertEqual(writer.stats()['duplicates'], 1)
+
+    def test_lost_followup_reply_does_not_count_twice(self):
+        db = MemoryClient()['test']
+        stats = db['course_student_stats']
+        apply = stats.bulk_write
+
+        def applied_but_reply_lost(operations, ordered=True):
+            stats.bulk_write = apply
+            apply(operations, ordered=ordered)
+            raise AutoReconnect("connection reset")
+
+        stats.bulk_write = applied_but_reply_lost
+        writer = EventWriter(db, flush_interval=0.05, retry_backoff=0.01)
+        self.addCleanup(writer.close, timeout=2)
+        results = []
+        increment = UpdateOne({'course_id': 'c1', 'student_id': 1}, {'$inc': {'hand_raises': 1}}, upsert=True)
+        writer.enqueue('hand_raises', InsertOne({'_id': 'h1'}), key='h1', on_written=results.append,
+                       followups=[('course_student_stats', increment)])
+        self.assertTrue(writer.flush(timeout=2))
+
+        self.assertEqual(results, [True])
+        self.assertEqual(stats.find_one({'student_id': 1})['hand_raises'], 1)
+        self.assertEqual(writer.stats()['retries'], 0)
+
+    def test_permanent_errors_are_reported(self):
+        self.db['questions'].failures = [
+            BulkWriteError({'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'validation failed'}]}),
+        ]
+        results = []
+        self.writer.enqueue('questions', InsertOne({'_id': 'a'}), key='a', on_written=results.append)
+        self.writer.enqueue('questions', InsertOne({'_id': 'b'}), key='b', on_written=results.append)
+        self.writer.flush(timeout=2)
+        self.assertEqual(results, [True, False])
+        self.assertEqual(self.writer.stats()['failed'], 1)
+
+    def test_followups_written_after_their_events(self):
+        self.db['questions'].failures = [
+            BulkWriteError({'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'validation failed'}]}),
+        ]
+        for key in ('a', 'b'):
+            self.writer.enqueue(
+                'questions', InsertOne({'_id': key}), key=key,
+                followups=[('course_student_stats', UpdateOne({'s': key}, {'$inc': {'n': 1}}))]
+            )
+        self.assertTrue(self.writer.flush(timeout=2))
+
+        # Only the stored event's counter update is applied
+        ops, _ = self.db['course_student_stats'].calls[0]
+        self.assertEqual([op._filter for op in ops], [{'s': 'a'}])
+
+    def test_close_drains_queue(self):
+        self.writer.enqueue('hand_raises', InsertOne({'_id': 1}), key=1)
+        self.assertTrue(self.writer.close(timeout=2))
+        self.assertEqual(len(self.db['hand_raises'].calls), 1)
+        with self.assertRaises(RuntimeError):
+            self.writer.enqueue('hand_raises', InsertOne({'_id': 2}), key=2)
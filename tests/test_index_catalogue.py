@@ -0,0 +1,126 @@
+import os
+import unittest
+from datetime import date, datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from src.database.analytics import AnalyticsQueries
+from src.database.cascade import DeleteJobs
+from src.database.course_stats import CourseStats
+from src.database.db_manager import DatabaseManager
+from src.database.event_series import SERIES_COLLECTIONS, create_series_collection, event_document
+from src.database.indexes import INDEXES, QUERIES, RETIRED_INDEXES, apply_indexes
+from src.database.photo_store import StudentPhotoStore
+from src.database.rollups import DailyRollups
+
+MONGODB_URI = os.getenv('AIFRED_TEST_MONGODB_URI', 'mongodb://localhost:27017')
+
+def plan_stages(node):
+    """Every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(node, dict):
+        if 'stage' in node:
+            stages.append(node['stage'])
+        for value in node.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(node, list):
+        for value in node:
+            stages.extend(plan_stages(value))
+    return stages
+
+class TestIndexCatalogue(unittest.TestCase):
+    def test_every_query_names_a_method_and_a_catalogued_index(self):
+        owners = {'CourseStats': CourseStats, 'AnalyticsQueries': AnalyticsQueries, 'StudentPhotoStore': StudentPhotoStore,
+                  'DailyRollups': DailyRollups, 'DeleteJobs': DeleteJobs}
+        indexes = {(spec['collection'], spec['name']) for spec in INDEXES}
+        for query in QUERIES:
+            owner, _, method = query['method'].rpartition('.')
+            self.assertTrue(hasattr(owners.get(owner, DatabaseManager), method), query['method'])
+            if query['index'] != '_id_':
+                self.assertIn((query['collection'], query['index']), indexes, query['method'])
+
+    def test_attendance_date_queries_lead_with_course(self):
+        spec = next(s for s in INDEXES if s['name'] == 'attendance_course_date')
+        self.assertEqual(spec['keys'][:2], [('course_id', 1), ('date', 1)])
+        self.assertIn(('attendance', 'date_1_student_id_1'), RETIRED_INDEXES)
+
+class TestQueryPlans(unittest.TestCase):
+    """Runs every catalogued query against a local mongod; skipped when none is reachable"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=500)
+            cls.client.admin.command('ping')
+        except PyMongoError:
+            raise unittest.SkipTest(f"No MongoDB server at {MONGODB_URI}")
+        cls.client.drop_database('aifred_index_test')
+        cls.db = cls.client['aifred_index_test']
+        cls.params = cls.seed(cls.db)
+        apply_indexes(cls.db)
+        apply_indexes(cls.db)  # idempotent
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database('aifred_index_test')
+        cls.client.close()
+
+    @staticmethod
+    def seed(db, courses=5, students=40, days=10):
+        course_ids = [ObjectId() for _ in range(courses)]
+        start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=days)
+        for name in SERIES_COLLECTIONS:
+            create_series_collection(db, name)
+        db.courses.insert_many([
+            {'_id': cid, 'course_code': f"C{i}", 'course_name': f"Course {i}"} for i, cid in enumerate(course_ids)
+        ])
+        for cid in course_ids:
+            db.students.insert_many([{'course_id': cid, 'student_id': s, 'name': f"S{s}"} for s in range(1, students + 1)])
+            db.attendance.insert_many([
+                {'course_id': cid, 'student_id': s, 'date': start + timedelta(days=d), 'status': 'Present'}
+                for s in range(1, students + 1) for d in range(days)
+            ])
+            db.questions.insert_many([
+                event_document(cid, s, timestamp=start + timedelta(minutes=i), is_relevant=i % 3 > 0,
+                               relevance_source='llm', question_text='q')
+                for s in range(1, students + 1) for i in range(5)
+            ])
+            db.hand_raises.insert_many([
+                event_document(cid, s, timestamp=start + timedelta(minutes=i))
+                for s in range(1, students + 1) for i in range(3)
+            ])
+            db.relevance_cache.insert_many([
+                {'course_id': cid, 'topic_hash': f"t{i % 4}", 'created_at': start} for i in range(40)
+            ])
+            db.course_student_stats.insert_many([{'course_id': cid, 'student_id': s} for s in range(1, students + 1)])
+            db.student_photos.insert_many([{'course_id': cid, 'student_id': s} for s in range(1, students + 1)])
+            db.engagement_daily.insert_many([
+                {'course_id': cid, 'student_id': s, 'day': start + timedelta(days=d), 'hand_raises': 1}
+                for s in range(1, students + 1) for d in range(days)
+            ])
+        db.engagement.insert_many([{'student_id': s} for s in range(1, students + 1)])
+        db.counters.insert_one({'_id': f"student_id:{course_ids[0]}", 'seq': students})
+        db.delete_jobs.insert_many([
+            {'_id': f"student:{cid}:1", 'status': 'completed', 'created_at': start} for cid in course_ids
+        ])
+        return {
+            'course_id': course_ids[0], 'student_id': 7, 'date': (start + timedelta(days=3)).date(),
+            'course_code': 'C0', 'topic_hash': 't1', 'after_id': ObjectId.from_datetime(start)
+        }
+
+    def test_no_query_scans_a_collection(self):
+        report = []
+        for query in QUERIES:
+            command = {'find': query['collection'], 'filter': query['filter'](self.params)}
+            if query.get('sort'):
+                command['sort'] = dict(query['sort'])
+            explain = self.db.command('explain', command, verbosity='executionStats')
+            stats = explain.get('executionStats', {})
+            report.append((query['method'], query['collection'], stats.get('totalKeysExamined'),
+                           stats.get('totalDocsExamined'), stats.get('nReturned')))
+            with self.subTest(query=query['method']):
+                self.assertNotIn('COLLSCAN', plan_stages(explain.get('queryPlanner', {})))
+
+        print(f"\n{'query':<40}{'collection':<22}{'keys':>8}{'docs':>8}{'returned':>10}")
+        for row in report:
+            print(f"{row[0]:<40}{row[1]:<22}{row[2]!s:>8}{row[3]!s:>8}{row[4]!s:>10}")
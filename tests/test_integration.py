@@ -20,7 +20,7 @@ class TestIntegration(unittest.TestCase):
         
         # 2. Mark attendance
         attendance_result = self.db_manager.mark_attendance(student_id, datetime.now().date())
-        self.assertIsNotNone(attendance_result.inserted_id)
+        self.assertIsNotNone(attendance_result.upserted_id)
         
         # 3. Log hand raise
         engagement_result = self.db_manager.log_engagement(student_id, hand_raises=1)
@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+from src.database.db_manager import DatabaseManager
+from src.database.event_series import create_series_collection, event_document
+from src.database.local_store import JournalSyncWorker, LocalStore
+from src.database.memory_store import MemoryClient
+
+class FakeCollection:
+    def __init__(self):
+        self.calls = []
+        self.failures = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.calls.append(list(operations))
+        if self.failures:
+            raise self.failures.pop(0)
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+class TestLocalStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'local.db')
+        self.store = LocalStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_journal_survives_reopen_and_coalesces(self):
+        question = {'_id': ObjectId(), 'timestamp': datetime(2024, 3, 1, 9, 30)}
+        stats = UpdateOne({'course_id': 'c1', 'student_id': 7}, {'$inc': {'questions': 1}}, upsert=True)
+        self.assertTrue(self.store.append('questions', InsertOne(question), question['_id'], [('course_student_stats', stats)]))
+        self.assertFalse(self.store.append('questions', InsertOne(question), question['_id']))
+        self.store.close()
+
+        self.store = LocalStore(self.path)
+        (seq, collection, operation, followups, _), = self.store.pending()
+        self.assertEqual(collection, 'questions')
+        self.assertEqual(operation._doc, question)
+        self.assertEqual(followups[0][1]._filter, {'course_id': 'c1', 'student_id': 7})
+        self.assertTrue(followups[0][1]._upsert)
+        self.store.remove([seq])
+        self.assertEqual(self.store.depth(), 0)
+
+    def test_snapshots(self):
+        self.assertIsNone(self.store.load_snapshot('roster:c1'))
+        self.store.save_snapshot('roster:c1', [[1, 'Ada'], [2, 'Alan']])
+        self.store.save_snapshot('roster:c1', [[1, 'Ada']])
+        self.assertEqual(self.store.load_snapshot('roster:c1'), [[1, 'Ada']])
+
+class TestJournalSyncWorker(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = LocalStore(os.path.join(self.directory, 'local.db'))
+        self.db = FakeDB()
+
+    def tearDown(self):
+        self.worker.close(timeout=2)
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_replays_events_then_followups(self):
+        self.worker = JournalSyncWorker(self.store, lambda: self.db, sync_interval=0.05)
+        results = []
+        for i in range(3):
+            stats = UpdateOne({'student_id': i}, {'$inc': {'hand_raises': 1}}, upsert=True)
+            self.worker.enqueue('hand_raises', InsertOne({'_id': i}), key=i, on_written=results.append,
+                                followups=[('course_student_stats', stats)])
+        self.assertTrue(self.worker.flush(timeout=2))
+        self.assertEqual(results, [True, True, True])
+
+        self.assertEqual(sum(len(ops) for ops in self.db['hand_raises'].calls), 3)
+        self.assertEqual(sum(len(ops) for ops in self.db['course_student_stats'].calls), 3)
+        self.assertEqual(self.worker.stats()['queue_depth'], 0)
+
+    def test_keeps_journal_while_offline_and_syncs_on_reconnect(self):
+        reachable = threading.Event()
+        online = []
+        self.db['questions'].failures = [AutoReconnect("connection reset")]
+        self.worker = JournalSyncWorker(
+            self.store, lambda: self.db, reconnect=reachable.is_set, on_online=lambda: online.append(True),
+            sync_interval=0.05, retry_backoff=0.01, max_backoff=0.02
+        )
+        results = []
+        self.worker.enqueue('questions', InsertOne({'_id': 'q1'}), key='q1', on_written=results.append)
+        for _ in range(100):
+            if not self.worker.online:
+                break
+            threading.Event().wait(0.01)
+        self.assertFalse(self.worker.online)
+        self.assertFalse(self.worker.flush(timeout=0.1))
+        self.assertEqual(self.store.depth(), 1)
+        # Journaled locally is not stored: nothing is reported until the replay
+        self.assertEqual(results, [])
+
+        reachable.set()
+        for _ in range(200):
+            if self.worker.online and self.store.depth() == 0:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.store.depth(), 0)
+        self.assertEqual(online, [True])
+        self.assertTrue(self.worker.flush(timeout=2))
+        self.assertEqual(results, [True])
+        self.assertGreaterEqual(self.worker.stats()['retries'], 1)
+
+    def test_reports_dropped_events_as_failed(self):
+        questions = self.db['questions']
+
+        def reject_q2(operations, ordered=True):
+            questions.calls.append(list(operations))
+            errors = [{'index': i, 'code': 121, 'errmsg': 'Document failed validation'}
+                      for i, op in enumerate(operations) if op._doc['_id'] == 'q2']
+            if errors:
+                raise BulkWriteError({'writeErrors': errors})
+
+        questions.bulk_write = reject_q2
+        self.worker = JournalSyncWorker(self.store, lambda: self.db, sync_interval=0.05)
+        results = {}
+        for key in ('q1', 'q2'):
+            self.worker.enqueue('questions', InsertOne({'_id': key}), key=key,
+                                on_written=lambda ok, key=key: results.__setitem__(key, ok))
+        self.assertTrue(self.worker.flush(timeout=2))
+        self.assertEqual(results, {'q1': True, 'q2': False})
+
+    def test_lost_followup_reply_does_not_count_twice(self):
+        db = MemoryClient()['test']
+        stats = db['course_student_stats']
+        apply = stats.bulk_write
+
+        def applied_but_reply_lost(operations, ordered=True):
+            stats.bulk_write = apply
+            apply(operations, ordered=ordered)
+            raise AutoReconnect("connection reset")
+
+        stats.bulk_write = applied_but_reply_lost
+        self.worker = JournalSyncWorker(self.store, lambda: db, sync_interval=0.05, retry_backoff=0.01)
+        increment = UpdateOne({'course_id': 'c1', 'student_id': 1}, {'$inc': {'hand_raises': 1}}, upsert=True)
+        self.worker.enqueue('hand_raises', InsertOne({'_id': 'h1'}), key='h1',
+                            followups=[('course_student_stats', increment)])
+        self.assertTrue(self.worker.flush(timeout=2))
+
+        self.assertEqual(self.worker.stats()['duplicates'], 1)
+        self.assertEqual(db.hand_raises.count_documents({}), 1)
+        self.assertEqual(stats.find_one({'student_id': 1})['hand_raises'], 1)
+
+    def test_replaying_an_event_twice_stores_it_once(self):
+        db = MemoryClient()['test']
+        create_series_collection(db, 'hand_raises')
+        self.worker = JournalSyncWorker(self.store, lambda: db, sync_interval=0.05)
+        event = event_document('c1', 1, _id='h1', timestamp=datetime(2024, 3, 4, 9))
+        for _ in range(2):
+            increment = UpdateOne({'course_id': 'c1', 'student_id': 1}, {'$inc': {'hand_raises': 1}}, upsert=True)
+            self.worker.enqueue('hand_raises', InsertOne(dict(event)), key='h1',
+                                followups=[('course_student_stats', increment)])
+            self.assertTrue(self.worker.flush(timeout=2))
+
+        self.assertEqual(db.hand_raises.count_documents({}), 1)
+        self.assertEqual(db.course_student_stats.find_one({'student_id': 1})['hand_raises'], 1)
+        self.assertEqual(self.worker.stats()['duplicates'], 1)
+
+class TestOfflineRoster(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager.__new__(DatabaseManager)
+        self.db_manager.db = MagicMock()
+        self.db_manager._rosters = {}
+        self.db_manager._roster_lock = threading.Lock()
+        self.db_manager.local = LocalStore(os.path.join(self.directory, 'local.db'))
+        self.db_manager.event_writer = MagicMock(online=True)
+
+    def tearDown(self):
+        self.db_manager.local.close()
+        shutil.rmtree(self.directory)
+
+    def test_roster_falls_back_to_snapshot(self):
+        self.db_manager.db.students.find.return_value = [{'student_id': 1, 'name': 'Ada'}]
+        self.assertEqual(self.db_manager.get_course_roster('c1'), {1: 'Ada'})
+
+        self.db_manager._rosters.clear()
+        self.db_manager.event_writer.online = False
+        self.db_manager.db.students.find.side_effect = AutoReconnect("unreachable")
+        self.assertEqual(self.db_manager.get_student_name(1, 'c1'), 'Ada')
+        self.assertEqual(self.db_manager.get_course_roster('c2'), {})
+        self.assertNotIn('c2', self.db_manager._rosters)
@@ -0,0 +1,111 @@
+import inspect
+import unittest
+from datetime import datetime
+from pymongo import DeleteMany, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from benchmarks.storage_backends import METHODS, NOT_BENCHMARKED, run
+from src.database.backends import MemoryBackend, create_storage_backend
+from src.database.db_manager import DatabaseManager
+from src.database.indexes import apply_indexes
+from src.database.memory_store import MemoryClient
+
+class TestMemoryStore(unittest.TestCase):
+    def setUp(self):
+        self.db = MemoryClient()['test']
+        apply_indexes(self.db)
+        self.db.attendance.insert_many([
+            {'course_id': 'c1', 'student_id': s, 'date': datetime(2024, 3, d), 'status': 'Present'}
+            for s in range(1, 4) for d in range(1, 4)
+        ])
+
+    def test_queries_use_operators_projection_and_sort(self):
+        rows = list(self.db.attendance.find(
+            {'course_id': 'c1', 'student_id': {'$in': [1, 3]}, 'date': {'$gte': datetime(2024, 3, 2)}},
+            {'_id': 0, 'student_id': 1, 'date': 1}
+        ).sort([('date', -1), ('student_id', 1)]).limit(3))
+        self.assertEqual(rows, [
+            {'student_id': 1, 'date': datetime(2024, 3, 3)},
+            {'student_id': 3, 'date': datetime(2024, 3, 3)},
+            {'student_id': 1, 'date': datetime(2024, 3, 2)},
+        ])
+        self.assertEqual(self.db.attendance.count_documents({'status': {'$ne': 'Absent'}, 'note': {'$exists': False}}), 9)
+        self.assertIsNone(self.db.attendance.find_one({'course_id': 'c2'}))
+
+        self.db.attendance.delete_one({'course_id': 'c1', 'student_id': 2, 'date': datetime(2024, 3, 2)})
+        in_range = {'course_id': 'c1', 'date': {'$gt': datetime(2024, 3, 1), '$lt': datetime(2024, 3, 3)}}
+        self.assertEqual(sorted(r['student_id'] for r in self.db.attendance.find(in_range)), [1, 3])
+
+    def test_unique_indexes_and_upserts(self):
+        with self.assertRaises(DuplicateKeyError):
+            self.db.attendance.insert_one({'course_id': 'c1', 'student_id': 1, 'date': datetime(2024, 3, 1)})
+        key = {'course_id': 'c1', 'student_id': 1, 'date': datetime(2024, 3, 9)}
+        first = self.db.attendance.update_one(key, {'$setOnInsert': {'status': 'Present'}}, upsert=True)
+        again = self.db.attendance.update_one(key, {'$setOnInsert': {'status': 'Late'}}, upsert=True)
+        self.assertIsNotNone(first.upserted_id)
+        self.assertEqual((again.matched_count, again.modified_count, again.upserted_id), (1, 0, None))
+        self.assertEqual(self.db.attendance.find_one(key)['status'], 'Present')
+
+        counter = self.db.counters.find_one_and_update(
+            {'_id': 'student_id:c1'}, {'$inc': {'seq': 5}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self.assertEqual(counter['seq'], 5)
+        with self.assertRaises(OperationFailure) as raised:
+            self.db.attendance.drop_index('missing')
+        self.assertEqual(raised.exception.code, 27)
+
+    def test_bulk_write_reports_errors_by_index(self):
+        with self.assertRaises(BulkWriteError) as raised:
+            self.db.hand_raises.bulk_write([
+                InsertOne({'_id': 'h1'}), InsertOne({'_id': 'h1'}), InsertOne({'_id': 'h2'})
+            ], ordered=False)
+        details = raised.exception.details
+        self.assertEqual([(e['index'], e['code']) for e in details['writeErrors']], [(1, 11000)])
+        self.assertEqual(details['nInserted'], 2)
+
+        result = self.db.stats.bulk_write([
+            UpdateOne({'course_id': 'c1', 'student_id': 1}, {'$inc': {'hand_raises': 1}, '$addToSet': {'days': 1}}, upsert=True),
+            UpdateOne({'course_id': 'c1', 'student_id': 1}, {'$inc': {'hand_raises': 1}, '$addToSet': {'days': 1}}, upsert=True),
+            DeleteMany({'course_id': 'c2'}),
+        ])
+        self.assertEqual((result.upserted_count, result.modified_count), (1, 1))
+        self.assertEqual(self.db.stats.find_one({}, {'_id': 0}),
+                         {'course_id': 'c1', 'student_id': 1, 'hand_raises': 2, 'days': [1]})
+
+    def test_aggregation_group_facet_and_expressions(self):
+        self.db.questions.insert_many([
+            {'course_id': 'c1', 'student_id': s, 'is_relevant': r}
+            for s, r in [(1, True), (1, False), (2, True), (2, None), (3, False)]
+        ])
+        relevant = {'$cond': [{'$eq': ['$is_relevant', False]}, 0, 1]}
+        facets = next(self.db.questions.aggregate([
+            {'$match': {'course_id': 'c1'}},
+            {'$facet': {
+                'totals': [{'$group': {'_id': None, 'questions': {'$sum': 1}, 'relevant': {'$sum': relevant}}}],
+                'top': [
+                    {'$group': {'_id': '$student_id', 'relevant': {'$sum': relevant}, 'total': {'$sum': 1}}},
+                    {'$project': {'relevant': 1, 'irrelevant': {'$subtract': ['$total', '$relevant']}}},
+                    {'$sort': {'relevant': -1, '_id': 1}},
+                    {'$limit': 2}
+                ]
+            }}
+        ]))
+        self.assertEqual(facets['totals'], [{'_id': None, 'questions': 5, 'relevant': 3}])
+        self.assertEqual(facets['top'], [{'_id': 2, 'relevant': 2, 'irrelevant': 0},
+                                         {'_id': 1, 'relevant': 1, 'irrelevant': 1}])
+
+class TestStorageBackends(unittest.TestCase):
+    def test_backend_is_selected_by_config(self):
+        self.assertEqual(create_storage_backend({'database': {'backend': 'memory'}}).name, 'memory')
+        with self.assertRaises(ValueError):
+            create_storage_backend({'database': {'backend': 'sqlite'}})
+
+    def test_benchmark_covers_every_public_method(self):
+        public = {
+            name for name, member in inspect.getmembers(DatabaseManager, inspect.isfunction)
+            if not name.startswith('_')
+        }
+        self.assertEqual(public - NOT_BENCHMARKED, set(METHODS))
+
+    def test_every_method_runs_in_memory(self):
+        timings = run(MemoryBackend('smoke'), students=5, repeat=1)
+        self.assertEqual(set(timings), set(METHODS))
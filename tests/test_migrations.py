@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from src.database import migrations
+from src.database.migrations import ensure_schema, SCHEMA_VERSION
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = MagicMock()
+        self.db = self.db_manager.db
+        self.calls = []
+        self.migrations = [
+            (version, description, lambda dm, v=version: self.calls.append(v))
+            for version, description, _ in migrations.MIGRATIONS
+        ]
+
+    def run_schema(self, **kwargs):
+        with patch.object(migrations, 'MIGRATIONS', self.migrations):
+            return ensure_schema(self.db_manager, **kwargs)
+
+    def test_current_schema_skips_all_ddl_in_one_read(self):
+        self.db.meta.find_one.return_value = {'_id': 'schema', 'version': SCHEMA_VERSION}
+        self.assertEqual(self.run_schema(), [])
+        self.assertEqual(self.calls, [])
+        self.db.meta.update_one.assert_not_called()
+        self.assertEqual(self.db.method_calls, [unittest.mock.call.meta.find_one({'_id': 'schema'}, {'version': 1})])
+
+    def test_runs_only_newer_migrations_and_records_each(self):
+        self.db.meta.find_one.return_value = {'_id': 'schema', 'version': 2}
+        self.assertEqual(self.run_schema(), list(range(3, SCHEMA_VERSION + 1)))
+        self.assertEqual(self.calls, list(range(3, SCHEMA_VERSION + 1)))
+        last = self.db.meta.update_one.call_args[0]
+        self.assertEqual(last[1]['$max'], {'version': SCHEMA_VERSION})
+
+    def test_fresh_database_and_force_run_everything(self):
+        self.db.meta.find_one.return_value = None
+        self.assertEqual(len(self.run_schema()), len(migrations.MIGRATIONS))
+        self.calls.clear()
+        self.db.meta.find_one.return_value = {'version': SCHEMA_VERSION}
+        self.assertEqual(len(self.run_schema(force=True)), len(migrations.MIGRATIONS))
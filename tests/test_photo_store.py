@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import MagicMock
+import cv2
+import numpy as np
+from src.database.photo_store import (StudentPhotoStore, face_crop, encode_photo,
+                                      CROP_SIZE, THUMBNAIL_SIZE)
+
+class TestPhotoStore(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.frame[100:300, 250:400] = 255  # the "face"
+
+    def test_crop_is_square_and_centred_on_face(self):
+        crop = face_crop(self.frame, (100, 400, 300, 250))
+        self.assertEqual(crop.shape, (CROP_SIZE, CROP_SIZE, 3))
+        self.assertEqual(crop[CROP_SIZE // 2, CROP_SIZE // 2].tolist(), [255, 255, 255])
+
+        # A face at the edge keeps the crop inside the frame
+        self.assertEqual(face_crop(self.frame, (0, 640, 100, 540)).shape, (CROP_SIZE, CROP_SIZE, 3))
+
+    def test_thumbnail_is_smaller_than_crop(self):
+        crop, thumbnail = encode_photo(self.frame, (100, 400, 300, 250))
+        decoded = cv2.imdecode(np.frombuffer(thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(decoded.shape[:2], (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.assertLess(len(thumbnail), len(crop))
+
+    def test_migration_moves_inline_photos(self):
+        db = MagicMock()
+        _, jpeg = cv2.imencode('.jpg', self.frame)
+        db.students.find.return_value.batch_size.return_value = iter([
+            {'_id': 'a', 'course_id': 'c1', 'student_id': 1, 'photo': jpeg.tobytes()},
+            {'_id': 'b', 'course_id': 'c1', 'student_id': 2, 'photo': b'not a jpeg'},
+        ])
+        store = StudentPhotoStore(db)
+
+        self.assertEqual(store.migrate_inline_photos(), (1, 1))
+
+        photos = db.student_photos.bulk_write.call_args[0][0]
+        self.assertEqual([op._filter for op in photos], [{'course_id': 'c1', 'student_id': 1}])
+        unsets = db.students.bulk_write.call_args[0][0]
+        self.assertEqual([(op._filter, op._doc) for op in unsets], [({'_id': 'a'}, {'$unset': {'photo': ''}})])
@@ -0,0 +1,101 @@
+import json
+import threading
+import unittest
+from unittest.mock import MagicMock
+from src.utils.question_batcher import QuestionBatcher
+from src.utils.relevance_analyzer import RelevanceAnalyzer
+
+def chat_response(content):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    return response
+
+class TestQuestionBatcher(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.analyzer = RelevanceAnalyzer(self.client, stream=False)
+        self.course = {'_id': 'c1', 'course_name': 'Data Science', 'description': 'Machine learning'}
+
+    def test_parse_batch_response_skips_malformed_items(self):
+        content = json.dumps({'results': [
+            {'id': 0, 'verdict': 'Relevant', 'reason': 'On topic'},
+            {'id': 1, 'verdict': 'Maybe'},
+            {'id': 7, 'verdict': 'Irrelevant'},
+            'garbage',
+            {'id': 2, 'verdict': 'irrelevant', 'reason': 'Off topic'},
+        ]})
+        verdicts = RelevanceAnalyzer.parse_batch_response(content, 3)
+        self.assertEqual(verdicts, {0: (True, 'On topic'), 2: (False, 'Off topic')})
+        self.assertEqual(RelevanceAnalyzer.parse_batch_response("not json", 3), {})
+
+    def test_batch_falls_back_per_item_for_missing_results(self):
+        self.client.chat.completions.create.side_effect = [
+            chat_response(json.dumps({'results': [{'id': 0, 'verdict': 'Relevant', 'reason': 'ML'}]})),
+            chat_response(json.dumps({'verdict': 'Irrelevant', 'reason': 'Geography is not covered.'})),
+        ]
+        results = self.analyzer.analyze_batch(self.course, ["What is a decision tree?", "What is the capital of France?"])
+
+        self.assertEqual(results[0], (True, 'ML', 'llm'))
+        self.assertEqual(results[1], (False, 'Geography is not covered.', 'llm'))
+        self.assertEqual(self.client.chat.completions.create.call_count, 2)
+
+    def test_failed_fallback_only_fails_its_own_question(self):
+        self.client.chat.completions.create.side_effect = [
+            chat_response(json.dumps({'results': [{'id': 0, 'verdict': 'Relevant', 'reason': 'ML'}]})),
+            ConnectionError("connection reset"),
+        ]
+        batcher = QuestionBatcher(self.analyzer, window_seconds=0.5, max_items=2)
+        results, errors = [], []
+        batcher.submit(self.course, "What is a decision tree?", lambda *r: results.append(r), errors.append)
+        batcher.submit(self.course, "What is the capital of France?", lambda *r: results.append(r), errors.append)
+        batcher.stop()
+
+        self.assertEqual(results, [(True, 'ML', 'llm')])
+        self.assertEqual([type(e) for e in errors], [ConnectionError])
+
+    def test_batcher_groups_questions_into_one_request(self):
+        self.client.chat.completions.create.return_value = chat_response(json.dumps({'results': [
+            {'id': 0, 'verdict': 'Relevant', 'reason': 'a'},
+            {'id': 1, 'verdict': 'Irrelevant', 'reason': 'b'},
+        ]}))
+        batcher = QuestionBatcher(self.analyzer, window_seconds=0.5, max_items=2)
+        results = []
+        done = threading.Event()
+
+        def on_result(*result):
+            results.append(result)
+            if len(results) == 2:
+                done.set()
+
+        batcher.submit(self.course, "What is regression?", on_result)
+        batcher.submit(self.course, "Who won the game?", on_result)
+        self.assertTrue(done.wait(5))
+        batcher.stop()
+
+        self.assertEqual(results, [(True, 'a', 'llm'), (False, 'b', 'llm')])
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+
+    def test_stop_classifies_everything_queued_behind_a_busy_batch(self):
+        started, release = threading.Event(), threading.Event()
+
+        def analyze_batch(course, questions, on_verdicts=None):
+            started.set()
+            release.wait(5)
+            return [(True, question, 'llm') for question in questions]
+
+        analyzer = MagicMock()
+        analyzer.analyze_batch.side_effect = analyze_batch
+        batcher = QuestionBatcher(analyzer, window_seconds=0.05, max_items=2)
+        results = []
+        batcher.submit(self.course, "q1", lambda *result: results.append(result[1]))
+        self.assertTrue(started.wait(5))
+        # Queued while the first batch is in flight; the second fills a whole batch
+        for question in ("q2", "q3", "q4"):
+            batcher.submit(self.course, question, lambda *result: results.append(result[1]))
+        stopper = threading.Thread(target=batcher.stop)
+        stopper.start()
+        release.set()
+        stopper.join(5)
+
+        self.assertEqual(results, ["q1", "q2", "q3", "q4"])
+        self.assertEqual(analyzer.analyze_batch.call_count, 3)
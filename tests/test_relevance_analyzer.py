@@ -0,0 +1,60 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+from src.utils.relevance_analyzer import RelevanceAnalyzer
+
+def stream_chunks(content, size=3):
+    chunks = []
+    for i in range(0, len(content), size):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = content[i:i + size]
+        chunks.append(chunk)
+    return iter(chunks)
+
+class TestRelevanceAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.analyzer = RelevanceAnalyzer(self.client, model="gpt-4o-mini", max_tokens=40)
+        self.course = {'_id': 'c1', 'course_name': 'Data Science', 'description': ''}
+
+    def test_request_is_schema_constrained(self):
+        self.client.chat.completions.create.return_value = stream_chunks(
+            json.dumps({'verdict': 'Relevant', 'reason': 'Core ML concept.'})
+        )
+        result = self.analyzer.analyze(self.course, "What is overfitting?")
+
+        self.assertEqual(result, (True, 'Core ML concept.', 'llm'))
+        kwargs = self.client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['model'], "gpt-4o-mini")
+        self.assertEqual(kwargs['max_tokens'], 40)
+        self.assertTrue(kwargs['stream'])
+        self.assertEqual(kwargs['response_format']['type'], 'json_schema')
+
+    def test_verdict_committed_before_reason(self):
+        content = json.dumps({'verdict': 'Irrelevant', 'reason': 'Geography is not part of the course.'})
+        seen_at = []
+        chunks = list(stream_chunks(content))
+        consumed = []
+
+        def tracking_stream():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        self.client.chat.completions.create.return_value = tracking_stream()
+        result = self.analyzer.analyze(
+            self.course, "What is the capital of France?",
+            on_verdict=lambda verdict: seen_at.append((verdict, len(consumed)))
+        )
+
+        self.assertEqual(result[0], False)
+        self.assertEqual(len(seen_at), 1)
+        self.assertFalse(seen_at[0][0])
+        self.assertLess(seen_at[0][1], len(chunks))
+        self.assertEqual(self.analyzer.timing_stats()['calls'], 1)
+
+    def test_truncated_reason_keeps_verdict(self):
+        self.client.chat.completions.create.return_value = stream_chunks('{"verdict": "Relevant", "reason": "Covers regres')
+        is_relevant, reason, _ = self.analyzer.analyze(self.course, "How does regression work?")
+        self.assertTrue(is_relevant)
+        self.assertEqual(reason, "Covers regres")
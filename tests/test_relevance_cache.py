@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import MagicMock
+from src.utils.relevance_cache import RelevanceCache, normalize_question, topic_hash
+
+class TestRelevanceCache(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = MagicMock()
+        self.db_manager.get_relevance_cache_entries.return_value = []
+        self.cache = RelevanceCache(self.db_manager, capacity=3)
+        self.topic = "Data Science"
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question("  What IS  k-means?? "), "what is k means")
+
+    def test_exact_hit(self):
+        self.assertIsNone(self.cache.lookup('c1', self.topic, "What is gradient descent?"))
+        self.cache.store('c1', self.topic, "What is gradient descent?", True, "Core topic", latency=1.5)
+
+        self.assertEqual(self.cache.lookup('c1', self.topic, "what is gradient descent"), (True, "Core topic"))
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['saved_seconds'], 1.5)
+        self.db_manager.save_relevance_cache_entry.assert_called_once()
+
+    def test_near_duplicate_hit(self):
+        self.cache.store('c1', self.topic, "How do you handle missing data in a dataset?", True, "Preprocessing")
+
+        result = self.cache.lookup('c1', self.topic, "How do you handle missing data in the dataset?")
+        self.assertEqual(result, (True, "Preprocessing"))
+        self.assertEqual(self.cache.stats()['near_hits'], 1)
+        self.assertIsNone(self.cache.lookup('c1', self.topic, "What is the capital of France?"))
+
+    def test_topic_change_misses(self):
+        self.cache.store('c1', self.topic, "What is a p-value?", True, "Statistics")
+        self.assertIsNone(self.cache.lookup('c1', "Medieval History", "What is a p-value?"))
+
+    def test_lru_eviction(self):
+        for i in range(4):
+            self.cache.store('c1', self.topic, f"question number {i} about regression", True, "")
+        self.assertEqual(self.cache.stats()['size'], 3)
+
+    def test_invalidate_course(self):
+        self.cache.store('c1', self.topic, "What is a p-value?", True, "Statistics")
+        self.cache.invalidate_course('c1')
+        self.assertIsNone(self.cache.lookup('c1', self.topic, "What is a p-value?"))
+
+    def test_warms_from_persistent_store(self):
+        source = RelevanceCache()
+        source.store('c1', self.topic, "Explain overfitting", True, "Model evaluation")
+        self.db_manager.get_relevance_cache_entries.return_value = list(source._entries.values())
+
+        self.assertEqual(self.cache.lookup('c1', self.topic, "Explain overfitting"), (True, "Model evaluation"))
+        self.db_manager.get_relevance_cache_entries.assert_called_once_with('c1', topic_hash(self.topic), limit=3)
@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime, timedelta
+from src.database.course_stats import CourseStats
+from src.database.event_series import SERIES_COLLECTIONS, create_series_collection, event_document
+from src.database.indexes import apply_indexes
+from src.database.memory_store import MemoryClient
+from src.database.rollups import DailyRollups
+
+MONDAY = datetime(2024, 3, 4)
+
+class TestDailyRollups(unittest.TestCase):
+    def setUp(self):
+        self.db = MemoryClient()['test']
+        for name in SERIES_COLLECTIONS:
+            create_series_collection(self.db, name)
+        apply_indexes(self.db)
+        self.rollups = DailyRollups(self.db)
+
+    def log(self, day, student_id, hand_raises=0, relevant=0, irrelevant=0, present=False):
+        at = MONDAY + timedelta(days=day, hours=10)
+        for _ in range(hand_raises):
+            self.db.hand_raises.insert_one(event_document('c1', student_id, timestamp=at))
+        for is_relevant in [True] * relevant + [False] * irrelevant:
+            self.db.questions.insert_one(event_document('c1', student_id, timestamp=at, is_relevant=is_relevant))
+        if present:
+            self.db.attendance.insert_one({'course_id': 'c1', 'student_id': student_id,
+                                           'date': MONDAY + timedelta(days=day), 'status': 'Present'})
+
+    def rollup(self, day, student_id):
+        return self.db.engagement_daily.find_one(
+            {'course_id': 'c1', 'student_id': student_id, 'day': MONDAY + timedelta(days=day)}, {'_id': 0}
+        )
+
+    def test_rolls_up_completed_days_incrementally(self):
+        self.log(0, 1, hand_raises=2, relevant=1, present=True)
+        self.log(1, 1, irrelevant=1)
+        self.log(2, 1, hand_raises=5)  # today: not rolled up yet
+
+        self.rollups.run(now=MONDAY + timedelta(days=2, hours=8))
+        self.assertEqual(self.rollup(0, 1), {'course_id': 'c1', 'student_id': 1, 'day': MONDAY,
+                                             'hand_raises': 2, 'relevant_questions': 1,
+                                             'irrelevant_questions': 0, 'present': 1})
+        self.assertIsNone(self.rollup(2, 1))
+
+        # A late event for day 1 is inside the lookback window; day 0 is not recomputed
+        self.log(1, 1, hand_raises=1)
+        result = self.rollups.run(now=MONDAY + timedelta(days=3), lookback_days=1)
+        self.assertEqual(result['start'], MONDAY + timedelta(days=1))
+        self.assertEqual(self.rollup(1, 1)['hand_raises'], 1)
+        self.assertEqual(self.rollup(2, 1)['hand_raises'], 5)
+        self.assertEqual(self.rollups.state()['rolled_through'], MONDAY + timedelta(days=3))
+
+    def test_retention_keeps_counters_and_rollups(self):
+        for day in range(6):
+            self.log(day, 1, hand_raises=1, relevant=1, present=True)
+            self.log(day, 2, irrelevant=2)
+        stats = CourseStats(self.db)
+        before = stats.compute_from_events('c1')
+
+        result = self.rollups.run(now=MONDAY + timedelta(days=6), retention_days=3)
+        self.assertEqual(result['deleted'], {'hand_raises': 3, 'questions': 9})
+        self.assertEqual(self.db.attendance.count_documents({}), 6)
+        self.assertEqual(stats.compute_from_events('c1'), before)
+
+        # Days before the horizon are final: later runs do not zero them
+        self.rollups.run(now=MONDAY + timedelta(days=7), lookback_days=5)
+        self.assertEqual(self.rollup(0, 2)['irrelevant_questions'], 2)
+
+    def test_weekly_trend_reads_rollups(self):
+        self.log(0, 1, hand_raises=4, relevant=2, present=True)
+        self.log(7, 1, hand_raises=2, relevant=1, irrelevant=2, present=True)
+        self.log(8, 2, present=True)
+        self.rollups.run(now=MONDAY + timedelta(days=10))
+        self.db.hand_raises.delete_many({})  # trends never touch raw events
+
+        trend = self.rollups.weekly_trend('c1', weeks=3, now=MONDAY + timedelta(days=10))
+        self.assertEqual([week['week'] for week in trend],
+                         [MONDAY - timedelta(days=7), MONDAY, MONDAY + timedelta(days=7)])
+        self.assertEqual([week['hand_raises'] for week in trend], [0, 4, 2])
+        self.assertEqual(trend[2]['questions'], 3)
+        self.assertEqual((trend[2]['attendance'], trend[2]['students']), (2, 2))
+        # The week in progress is not compared; the two weeks before it have no baseline
+        self.assertIsNone(DailyRollups.week_over_week(trend, 'hand_raises', now=MONDAY + timedelta(days=10)))
+        self.assertEqual(DailyRollups.week_over_week(trend, 'hand_raises', now=MONDAY + timedelta(days=14)), -50.0)
+        self.assertIsNone(DailyRollups.week_over_week(trend[:2], 'hand_raises', now=MONDAY + timedelta(days=14)))
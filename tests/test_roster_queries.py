@@ -0,0 +1,54 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+from src.database.cascade import LIVE
+from src.database.db_manager import DatabaseManager
+
+class TestRosterQueries(unittest.TestCase):
+    def setUp(self):
+        # Bypass __init__, which connects to Atlas
+        self.db_manager = DatabaseManager.__new__(DatabaseManager)
+        self.db_manager.db = MagicMock()
+        self.db_manager._rosters = {}
+        self.db_manager._roster_lock = threading.Lock()
+        self.db_manager.local = None
+        self.db_manager.event_writer = MagicMock(online=True)
+
+    def test_student_list_never_requests_photos(self):
+        self.db_manager.db.students.find.return_value = [{'student_id': 1, 'name': 'Ada'}, {'student_id': 2, 'name': 'Alan'}]
+
+        first = self.db_manager.get_course_student_list('c1')
+        second = self.db_manager.get_course_student_list('c1')
+
+        self.assertEqual(first, [{'student_id': 1, 'name': 'Ada'}, {'student_id': 2, 'name': 'Alan'}])
+        self.assertEqual(first, second)
+        self.db_manager.db.students.find.assert_called_once_with(
+            {'course_id': 'c1', **LIVE}, {'student_id': 1, 'name': 1, '_id': 0}
+        )
+
+    def test_course_questions_name_students_from_the_roster(self):
+        self.db_manager.db.students.find.return_value = [{'student_id': 1, 'name': 'Ada'}]
+        self.db_manager.db.questions.find.return_value.sort.return_value = [
+            {'_id': 'q1', 'meta': {'course_id': 'c1', 'student_id': 1}, 'question_text': 'Why?'}
+        ]
+        questions = self.db_manager.get_course_questions('c1')
+        self.assertEqual(questions[0]['student_name'], 'Ada')
+        self.db_manager.db.students.find.assert_called_once_with(
+            {'course_id': 'c1', **LIVE}, {'student_id': 1, 'name': 1, '_id': 0}
+        )
+
+    def test_embeddings_and_photo_projections(self):
+        self.db_manager.db.students.find.return_value = []
+        self.db_manager.get_course_student_embeddings('c1')
+        projection = self.db_manager.db.students.find.call_args[0][1]
+        self.assertNotIn('photo', projection)
+        self.assertEqual(projection['face_embedding'], 1)
+
+        # Students not yet migrated to student_photos fall back to the inline photo
+        self.db_manager.photos = MagicMock()
+        self.db_manager.photos.get_photo.return_value = None
+        self.db_manager.db.students.find_one.return_value = {'photo': b'jpeg'}
+        self.assertEqual(self.db_manager.get_student_photo(1, 'c1'), b'jpeg')
+        self.db_manager.db.students.find_one.assert_called_once_with(
+            {'student_id': 1, 'course_id': 'c1'}, {'_id': 0, 'photo': 1}
+        )
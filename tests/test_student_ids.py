@@ -0,0 +1,44 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from src.database.db_manager import DatabaseManager
+
+class TestStudentIds(unittest.TestCase):
+    def setUp(self):
+        # Bypass __init__, which connects to Atlas
+        self.db_manager = DatabaseManager.__new__(DatabaseManager)
+        self.db_manager.db = MagicMock()
+        self.db_manager.photos = MagicMock()
+        self.db_manager._rosters = {}
+        self.db_manager._roster_lock = threading.Lock()
+        self.db_manager.local = None
+        self.db_manager.event_writer = MagicMock(online=True)
+
+    def test_reserves_block_with_one_increment(self):
+        self.db_manager.db.counters.find_one_and_update.return_value = {'seq': 12}
+        self.assertEqual(self.db_manager.reserve_student_ids('c1', 3), [10, 11, 12])
+        args = self.db_manager.db.counters.find_one_and_update.call_args[0]
+        self.assertEqual(args, ({'_id': 'student_id:c1'}, {'$inc': {'seq': 3}}))
+        self.db_manager.db.students.find.assert_not_called()
+
+    def test_missing_counter_is_seeded_from_existing_students(self):
+        counters = self.db_manager.db.counters
+        counters.find_one_and_update.side_effect = [None, {'seq': 8}]
+        self.db_manager.db.students.aggregate.return_value = iter([{'_id': None, 'highest': 7}])
+
+        self.assertEqual(self.db_manager.reserve_student_ids('c1'), [8])
+        counters.update_one.assert_called_once_with({'_id': 'student_id:c1'}, {'$max': {'seq': 7}}, upsert=True)
+
+    def test_bulk_enrollment_uses_one_reservation(self):
+        self.db_manager.db.counters.find_one_and_update.return_value = {'seq': 5}
+        entries = [
+            {'name': name, 'face_embedding': np.zeros(128), 'photo_data': None}
+            for name in ('Ada', 'Alan')
+        ]
+
+        self.assertEqual(self.db_manager.add_students('c1', entries), [4, 5])
+
+        self.assertEqual(self.db_manager.db.counters.find_one_and_update.call_count, 1)
+        documents = self.db_manager.db.students.insert_many.call_args[0][0]
+        self.assertEqual([(d['student_id'], d['name']) for d in documents], [(4, 'Ada'), (5, 'Alan')])
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import MagicMock
+from src.utils.topic_classifier import TopicClassifier, HashedTfidfVectorizer
+
+RELEVANT = [
+    "Can you explain gradient descent?",
+    "How do you handle missing data in a dataset?",
+    "How does k-means clustering work?",
+    "What is the difference between supervised and unsupervised learning?",
+    "How do you prevent overfitting in a machine learning model?",
+    "What is a confusion matrix?",
+    "How do you choose features for a regression model?",
+    "What does cross validation do?",
+]
+
+IRRELEVANT = [
+    "What is the capital of France?",
+    "Who wrote 'The Catcher in the Rye'?",
+    "What time does the cafeteria open?",
+    "Who won the football game last night?",
+    "What is your favorite movie?",
+    "How tall is Mount Everest?",
+    "When was the French Revolution?",
+    "Who painted the Mona Lisa?",
+]
+
+class TestTopicClassifier(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = MagicMock()
+        self.db_manager.get_labelled_questions.return_value = (
+            [{'question_text': q, 'is_relevant': True} for q in RELEVANT] +
+            [{'question_text': q, 'is_relevant': False} for q in IRRELEVANT]
+        )
+        self.course = {
+            '_id': 'c1',
+            'course_name': 'Data Science',
+            'description': 'Machine learning models, regression, clustering and data preprocessing.'
+        }
+        self.classifier = TopicClassifier(self.db_manager, threshold=0.7)
+
+    def test_vectorizer_is_normalised(self):
+        vectorizer = HashedTfidfVectorizer(n_features=1024)
+        vectorizer.observe("gradient descent explained")
+        indices, values = vectorizer.transform("gradient descent")
+        self.assertEqual(len(indices), 3)
+        self.assertAlmostEqual(float((values ** 2).sum()), 1.0)
+
+    def test_confident_questions_are_local(self):
+        self.assertEqual(self.classifier.classify(self.course, "What is the capital of France?")[0], False)
+        self.assertEqual(self.classifier.classify(self.course, "Can you explain k-means clustering?")[0], True)
+        self.assertEqual(self.classifier.stats()['local'], 2)
+
+    def test_escalates_without_enough_labels(self):
+        self.db_manager.get_labelled_questions.return_value = []
+        classifier = TopicClassifier(self.db_manager, threshold=0.7)
+        self.assertIsNone(classifier.classify(self.course, "What is the capital of France?"))
+        self.assertEqual(classifier.stats()['escalated'], 1)
+
+    def test_rebuilds_when_description_changes(self):
+        model = self.classifier.get_model(self.course)
+        self.assertIs(self.classifier.get_model(self.course), model)
+        self.course['description'] = 'European history'
+        self.assertIsNot(self.classifier.get_model(self.course), model)
+
+    def test_learn_updates_model(self):
+        model = self.classifier.get_model(self.course)
+        before = model.predict_proba("What is a random forest?")
+        for _ in range(5):
+            self.classifier.learn(self.course, "What is a random forest?", True)
+        self.assertGreater(model.predict_proba("What is a random forest?"), before)
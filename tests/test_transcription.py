@@ -0,0 +1,81 @@
+import unittest
+from concurrent.futures import Future
+import numpy as np
+from src.utils.transcription import (detect_pauses, split_at_pauses, stitch_transcripts,
+                                     ChunkedTranscriber)
+
+RATE = 16000
+
+def speech_with_pauses(bursts, burst_seconds=1.5, pause_seconds=0.5):
+    """Tone bursts separated by near-silence"""
+    t = np.arange(int(RATE * burst_seconds)) / RATE
+    tone = (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+    pause = (np.random.RandomState(0).randn(int(RATE * pause_seconds)) * 20).astype(np.int16)
+    parts = []
+    for _ in range(bursts):
+        parts.extend([tone, pause])
+    return np.concatenate(parts)
+
+class FakeGateway:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio_file):
+        self.calls.append(audio_file.name)
+        return f"text {audio_file.name}"
+
+    def submit_transcription(self, audio_file):
+        future = Future()
+        future.set_result(self.transcribe(audio_file))
+        return future
+
+class TestTranscription(unittest.TestCase):
+    def test_detect_pauses(self):
+        samples = speech_with_pauses(3)
+        pauses = detect_pauses(samples, RATE)
+        self.assertEqual(len(pauses), 3)
+        self.assertAlmostEqual(pauses[0][0] / RATE, 1.5, delta=0.05)
+
+    def test_split_cuts_inside_pauses(self):
+        samples = speech_with_pauses(6)  # 12 seconds
+        segments = split_at_pauses(samples, RATE)
+        self.assertGreater(len(segments), 1)
+        self.assertEqual(segments[0][0], 0)
+        self.assertEqual(segments[-1][1], len(samples))
+        for (_, end, _), (start, _, overlapped) in zip(segments, segments[1:]):
+            self.assertEqual(end, start)
+            self.assertFalse(overlapped)
+        for start, end, _ in segments:
+            self.assertLessEqual((end - start) / RATE, 6.0)
+
+    def test_split_without_pauses_overlaps(self):
+        samples = (8000 * np.sin(np.arange(RATE * 10) / 10)).astype(np.int16)
+        segments = split_at_pauses(samples, RATE, overlap_seconds=0.5)
+        self.assertEqual(segments[1][0], segments[0][1] - RATE // 2)
+        self.assertEqual([overlapped for _, _, overlapped in segments[:2]], [False, True])
+
+    def test_stitch_removes_boundary_duplicates(self):
+        stitched = stitch_transcripts(["How does gradient", "gradient descent converge", "", "in practice?"],
+                                      [False, True, False, True])
+        self.assertEqual(stitched, "How does gradient descent converge in practice?")
+
+    def test_stitch_keeps_repeats_across_pause_cuts(self):
+        stitched = stitch_transcripts(["Why", "why does it diverge? No", "no, it converges"], [False, False, False])
+        self.assertEqual(stitched, "Why why does it diverge? No no, it converges")
+
+    def test_chunked_transcriber_orders_segments(self):
+        gateway = FakeGateway()
+        transcriber = ChunkedTranscriber(gateway, chunk_threshold_seconds=6.0)
+        first = []
+        samples = speech_with_pauses(6)
+        text = transcriber.transcribe_frames([samples.tobytes()], rate=RATE, on_first_segment=first.append)
+
+        self.assertEqual(first, ["text segment_0.wav"])
+        self.assertTrue(text.startswith("text segment_0.wav"))
+        self.assertGreater(len(gateway.calls), 1)
+
+    def test_short_clip_is_single_request(self):
+        gateway = FakeGateway()
+        transcriber = ChunkedTranscriber(gateway)
+        text = transcriber.transcribe_frames([speech_with_pauses(1).tobytes()], rate=RATE)
+        self.assertEqual(text, "text question.wav")
@@ -0,0 +1,95 @@
+import os
+import bson
+import tempfile
+import unittest
+import numpy as np
+from datetime import datetime
+from src.database.backends import MemoryBackend
+from src.database.db_manager import DatabaseManager
+from src.database.transfer import (
+    COLLECTIONS, export_collections, import_collections, imported_course_ids, refresh_course_counters,
+    shell_script_documents, write_documents
+)
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self):
+        self.source = DatabaseManager({}, backend=MemoryBackend())
+        self.course_id = self.source.create_course("Test Course", "TST101").inserted_id
+        other = self.source.create_course("Other Course", "OTH101").inserted_id
+        photo = np.zeros((120, 120, 3), dtype=np.uint8)
+        for course_id in (self.course_id, other):
+            self.source.add_students(course_id, [
+                {'name': name, 'face_embedding': np.random.rand(128), 'photo_data': photo}
+                for name in ("Ada", "Alan")
+            ])
+        self.source.mark_attendance(1, datetime(2024, 3, 1).date(), course_id=self.course_id)
+        self.source.log_question(1, self.course_id, "What is a gradient?", True)
+        self.source.log_hand_raise(2, self.course_id)
+        self.assertTrue(self.source.flush_events(timeout=2))
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.source.close()
+
+    def _round_trip(self, fmt):
+        exported = export_collections(self.source.db, self.directory, [self.course_id], fmt, batch_size=1)
+        self.assertEqual(exported['students']['documents'], 2)
+
+        target = DatabaseManager({}, backend=MemoryBackend())
+        imported = import_collections(target.db, self.directory, batch_documents=1)
+        self.assertEqual(imported_course_ids(imported), [self.course_id])
+        refresh_course_counters(target, imported_course_ids(imported))
+        self.assertEqual({c: r['documents'] for c, r in imported.items()},
+                         {c: r['documents'] for c, r in exported.items()})
+        for collection in COLLECTIONS:
+            query = {'_id': self.course_id} if collection == 'courses' else {'course_id': self.course_id}
+            # MongoDB stores datetimes to the millisecond; the memory store keeps microseconds
+            expected = [bson.decode(bson.encode(doc)) for doc in self.source.db[collection].find(query)]
+            self.assertEqual(list(target.db[collection].find(query)), expected)
+        self.assertIsNone(target.get_course_by_code("OTH101"))
+        self.assertEqual(target.get_course_analytics(self.course_id)['totals']['questions'], 1)
+        return target
+
+    def test_ndjson_round_trip_is_idempotent(self):
+        target = self._round_trip('ndjson')
+        again = import_collections(target.db, self.directory)
+        self.assertEqual(again['attendance']['documents'], 0)
+        self.assertEqual(again['attendance']['duplicates'], 1)
+        self.assertEqual(again['students']['failed'], 0)
+        target.close()
+
+    def test_bson_round_trip(self):
+        self._round_trip('bson').close()
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'students.bson')))
+
+    def test_import_without_courses_rebuilds_counters_and_reports_skipped_files(self):
+        raises = [{'course_id': self.course_id, 'student_id': 2, 'timestamp': datetime(2024, 3, 1, 10, i)}
+                  for i in range(3)]
+        write_documents(os.path.join(self.directory, 'hand_raises.ndjson'), raises)
+        write_documents(os.path.join(self.directory, 'notes.ndjson'), [{'text': "not a collection"}])
+
+        target = DatabaseManager({}, backend=MemoryBackend())
+        self.addCleanup(target.close)
+        with self.assertLogs('AiFred', 'WARNING') as logs:
+            imported = import_collections(target.db, self.directory)
+        self.assertIn("Skipping notes", logs.output[0])
+        self.assertEqual(list(imported), ['hand_raises'])
+        refresh_course_counters(target, imported_course_ids(imported))
+        self.assertEqual(target.get_student_hand_raises(2, self.course_id), 3)
+
+    def test_shell_script_literals(self):
+        script = """
+        // seed data
+        db.questions.insertMany([
+          {_id: ObjectId("65f000000000000000000001"), student_id: NumberInt(3), question: 'Isn\\'t it "linear"?',
+           is_relevant: true, timestamp: ISODate("2024-03-01T10:00:00Z"),},
+        ]);
+        db.getCollection("hand_raises").insertOne({student_id: NumberLong(1), timestamp: new Date(1709287200000)})
+        """
+        documents = list(shell_script_documents(script))
+        self.assertEqual([c for c, _ in documents], ['questions', 'hand_raises'])
+        question = documents[0][1]
+        self.assertEqual(str(question['_id']), "65f000000000000000000001")
+        self.assertEqual(question['question'], 'Isn\'t it "linear"?')
+        self.assertEqual(question['timestamp'], datetime(2024, 3, 1, 10, 0))
+        self.assertEqual(documents[1][1], {'student_id': 1, 'timestamp': datetime(2024, 3, 1, 10, 0)})